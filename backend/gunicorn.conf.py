@@ -0,0 +1,36 @@
+"""
+Configuração do gunicorn usada pela imagem (gunicorn -c gunicorn.conf.py).
+
+SERVIDOR_MODO escolhe a interface:
+
+- asgi (padrão): workers uvicorn sobre sistema_comissoes.asgi. As views
+  assíncronas (/api/async/...) rodam no event loop do worker; as síncronas
+  rodam em threads do asgiref. O stream /api/async/alteracoes/ mantém a
+  conexão aberta sem ocupar thread.
+- wsgi: workers gthread sobre sistema_comissoes.wsgi, com GUNICORN_THREADS
+  threads por worker. O stream de alterações responde o que houver e o
+  cliente reconecta.
+
+GUNICORN_WORKERS, GUNICORN_THREADS, GUNICORN_TIMEOUT e GUNICORN_BIND
+sobrescrevem os valores padrão.
+"""
+import multiprocessing
+import os
+
+MODOS = {
+    'asgi': ('sistema_comissoes.asgi:application', 'uvicorn_worker.UvicornWorker'),
+    'wsgi': ('sistema_comissoes.wsgi:application', 'gthread'),
+}
+
+modo = os.environ.get('SERVIDOR_MODO', 'asgi').lower()
+if modo not in MODOS:
+    raise RuntimeError(f"SERVIDOR_MODO deve ser {' ou '.join(MODOS)}, não {modo!r}.")
+wsgi_app, worker_class = MODOS[modo]
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+# Usado pelos workers gthread; o worker uvicorn atende requisições no event loop
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+keepalive = 5
+accesslog = '-'
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Cliente, Plano, Parcela, Consultor, Venda, ControleDeRecebimento
+from .models import Cliente, Plano, Parcela, Consultor, Venda, ControleDeRecebimento, Tarefa
 
 admin.site.register(Cliente)
 admin.site.register(Plano)
@@ -7,3 +7,5 @@ admin.site.register(Parcela)
 admin.site.register(Consultor)
 admin.site.register(Venda)
 admin.site.register(ControleDeRecebimento)
+
+admin.site.register(Tarefa)
@@ -0,0 +1,132 @@
+"""
+Feed de alterações de vendas e parcelas, base do stream /api/async/alteracoes/.
+
+Cada gravação ou remoção de Venda/ControleDeRecebimento acrescenta uma linha
+em Alteracao depois do commit: pelos sinais de save/delete e, nas gravações em
+massa (cronograma, reprogramação, conciliação, varredura de atrasadas,
+importação, reprecificação, arquivamento), por chamadas explícitas a
+registrar_depois_do_commit. O id da linha é o cursor: o cliente carrega a
+listagem uma vez e depois só aplica as alterações com id maior que o último
+recebido. As linhas guardam apenas tipo, id e se o registro foi removido; o
+stream lê o estado atual de cada registro alterado.
+
+Gravar depois do commit faz a ordem dos ids seguir a ordem dos commits.
+Transações concorrentes ainda podem confirmar fora de ordem por alguns
+milissegundos no PostgreSQL; por isso uma lacuna recente na sequência segura a
+entrega até ALTERACOES_ESPERA_LACUNA segundos (ids perdidos em rollbacks
+nunca aparecem). O comando podar_alteracoes remove as linhas mais antigas que
+ALTERACOES_RETENCAO_DIAS; um cursor anterior ao que restou pede ao cliente que
+recarregue a listagem.
+"""
+import datetime
+import functools
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+VENDA = 'venda'
+CONTROLE = 'controle'
+
+# Linhas gravadas por INSERT no registro de alterações em massa
+TAMANHO_LOTE_ALTERACOES = 1000
+# Alterações lidas por consulta do stream
+LIMITE_LEITURA = 500
+
+
+def registrar_alteracoes(tipo, ids, removido=False):
+    """Acrescenta ao feed uma linha por id de `tipo` ('venda' ou 'controle')."""
+    from .models import Alteracao
+
+    Alteracao.objects.bulk_create(
+        [Alteracao(tipo=tipo, objeto_id=objeto_id, removido=removido) for objeto_id in ids],
+        batch_size=TAMANHO_LOTE_ALTERACOES,
+    )
+
+
+def registrar_depois_do_commit(tipo, ids, removido=False):
+    """
+    Agenda registrar_alteracoes(tipo, ids, removido) para depois do commit da transação atual.
+
+    Chamada pelos sinais de save/delete; operações em massa (bulk_create,
+    bulk_update, update()) precisam chamá-la explicitamente. Uma falha no
+    registro é mantida no log sem desfazer a gravação já confirmada.
+    """
+    ids = [objeto_id for objeto_id in ids if objeto_id is not None]
+    if ids:
+        transaction.on_commit(functools.partial(registrar_alteracoes, tipo, ids, removido), robust=True)
+
+
+def ultimo_cursor():
+    """Id da alteração mais recente, ou 0 com o feed vazio."""
+    from .models import Alteracao
+
+    return Alteracao.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+
+async def aultimo_cursor():
+    from .models import Alteracao
+
+    return await Alteracao.objects.order_by('-id').values_list('id', flat=True).afirst() or 0
+
+
+def _entregaveis(cursor, linhas, agora):
+    """
+    Linhas (id, tipo, objeto_id, removido, criado_em) que já podem ser entregues.
+
+    Para na primeira lacuna recente da sequência: a alteração que falta pode
+    pertencer a um commit ainda em andamento.
+    """
+    espera = datetime.timedelta(seconds=getattr(settings, 'ALTERACOES_ESPERA_LACUNA', 2))
+    entregues = []
+    esperado = cursor + 1
+    for linha in linhas:
+        if linha[0] != esperado and agora - linha[4] < espera:
+            break
+        entregues.append(linha)
+        esperado = linha[0] + 1
+    return entregues
+
+
+def _cursor_expirado(cursor, menor_id):
+    return menor_id is not None and cursor < menor_id - 1
+
+
+async def aler_alteracoes(cursor, limite=LIMITE_LEITURA):
+    """
+    Alterações após `cursor`, como (novo cursor, {(tipo, objeto_id): removido}).
+
+    Várias alterações do mesmo registro viram uma só, com o estado da última.
+    Devolve (None, None) quando `cursor` é anterior às alterações podadas e o
+    cliente precisa recarregar a listagem.
+    """
+    from .models import Alteracao
+
+    linhas = [
+        linha async for linha in Alteracao.objects.filter(id__gt=cursor).order_by('id')
+        .values_list('id', 'tipo', 'objeto_id', 'removido', 'criado_em')[:limite]
+    ]
+    if linhas and linhas[0][0] != cursor + 1:
+        menor_id = await Alteracao.objects.order_by('id').values_list('id', flat=True).afirst()
+        if _cursor_expirado(cursor, menor_id):
+            return None, None
+    alteracoes = {}
+    for linha_id, tipo, objeto_id, removido, _ in _entregaveis(cursor, linhas, timezone.now()):
+        alteracoes[(tipo, objeto_id)] = removido
+        cursor = linha_id
+    return cursor, alteracoes
+
+
+def podar_alteracoes(dias=None):
+    """Remove as alterações com mais de `dias` (padrão: ALTERACOES_RETENCAO_DIAS); devolve quantas."""
+    from .models import Alteracao
+
+    if dias is None:
+        dias = getattr(settings, 'ALTERACOES_RETENCAO_DIAS', 7)
+    limite = timezone.now() - datetime.timedelta(days=dias)
+    ultimo_antigo = Alteracao.objects.filter(criado_em__lt=limite).order_by('-id').values_list('id', flat=True).first()
+    if ultimo_antigo is None:
+        return 0
+    # Por faixa de id, sempre um prefixo da sequência: cursores antigos são detectados pelo menor id restante
+    removidas, _ = Alteracao.objects.filter(id__lte=ultimo_antigo).delete()
+    return removidas
@@ -0,0 +1,190 @@
+"""
+Arquivamento das vendas quitadas.
+
+Vendas com todas as parcelas recebidas há mais de ARQUIVO_HORIZONTE_DIAS
+saem de core_venda/core_controlederecebimento e vão para as tabelas de
+arquivo (VendaArquivada, ControleDeRecebimentoArquivado), com os mesmos ids e
+nomes de campo. Assim as tabelas em operação e seus índices ficam do tamanho
+do que ainda está em aberto. O resumo mensal passa a cobrir só as vendas em
+operação; relatórios e exportações somam o arquivo quando pedido com
+?incluir_arquivo=1.
+"""
+import datetime
+import logging
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models import Count, F, Max, Q
+from django.utils import timezone
+
+from .alteracoes import CONTROLE, VENDA, registrar_depois_do_commit
+from .busca import indexar_depois_do_commit
+from .cache_respostas import invalidar_respostas
+from .filters import aplicar_filtros
+from .resumos import mes_de, retirar_recebidas_dos_resumos
+
+logger = logging.getLogger(__name__)
+
+# Vendas examinadas (e, no máximo, arquivadas) por transação
+TAMANHO_LOTE_ARQUIVAMENTO = 500
+
+CAMPOS_VENDA = (
+    'id', 'numero_proposta', 'cliente_id', 'plano_id', 'consultor_id', 'valor_plano', 'desconto_consultor',
+    'data_venda', 'data_vigencia', 'data_vencimento',
+)
+CAMPOS_CONTROLE = (
+    'id', 'venda_id', 'parcela_id', 'valor_parcela', 'data_prevista_recebimento', 'data_recebimento',
+    'status', 'numero_extrato',
+)
+
+
+def incluir_arquivo(parametros):
+    """?incluir_arquivo=1 pede que relatórios e exportações somem as vendas arquivadas."""
+    return str(parametros.get('incluir_arquivo', '')).lower() in ('1', 'true', 'sim')
+
+
+def modelo_arquivado(modelo):
+    """Tabela de arquivo correspondente a Venda ou ControleDeRecebimento."""
+    from .models import ControleDeRecebimento, ControleDeRecebimentoArquivado, Venda, VendaArquivada
+
+    return {Venda: VendaArquivada, ControleDeRecebimento: ControleDeRecebimentoArquivado}[modelo]
+
+
+def arquivados(modelo, parametros, filtros):
+    """
+    Queryset do arquivo de `modelo` com os mesmos `filtros` da consulta em operação.
+
+    Devolve None quando `parametros` não pedem ?incluir_arquivo=1.
+    """
+    if not incluir_arquivo(parametros):
+        return None
+    return aplicar_filtros(parametros, modelo_arquivado(modelo).objects.all(), filtros)
+
+
+def data_limite(hoje=None, horizonte_dias=None):
+    """Vendas com o último recebimento antes desta data podem ser arquivadas."""
+    if horizonte_dias is None:
+        horizonte_dias = getattr(settings, 'ARQUIVO_HORIZONTE_DIAS', 730)
+    return (hoje or datetime.date.today()) - datetime.timedelta(days=horizonte_dias)
+
+
+def _quitadas(primeiro_id, ultimo_id, limite):
+    """Ids das vendas da faixa com todas as parcelas recebidas, a última antes de `limite`."""
+    from .models import ControleDeRecebimento
+
+    return sorted(
+        ControleDeRecebimento.objects
+        .filter(venda_id__gte=primeiro_id, venda_id__lte=ultimo_id)
+        .values('venda_id')
+        .annotate(abertas=Count('id', filter=~Q(status='Recebido')), ultimo=Max('data_recebimento'))
+        .filter(abertas=0, ultimo__lt=limite)
+        .values_list('venda_id', flat=True)
+    )
+
+
+def _propostas_ja_arquivadas(venda_ids):
+    """
+    Ids das vendas cujo numero_proposta já está no arquivo.
+
+    Venda.clean e o serializer impedem isso; só vendas gravadas antes dessa
+    validação chegam aqui, e arquivá-las violaria o unique do arquivo.
+    """
+    from .models import Venda, VendaArquivada
+
+    return set(
+        Venda.objects.filter(pk__in=venda_ids, numero_proposta__in=VendaArquivada.objects.values('numero_proposta'))
+        .values_list('pk', flat=True)
+    )
+
+
+def _apagar(modelo, coluna, ids):
+    """
+    DELETE direto, sem carregar as linhas nem disparar os sinais de remoção.
+
+    Os sinais recalculariam o resumo e o índice da busca linha a linha; o
+    arquivamento faz isso uma vez por lote.
+    """
+    conexao = connections[router.db_for_write(modelo)]
+    sql = 'DELETE FROM {} WHERE {} IN ({})'.format(
+        conexao.ops.quote_name(modelo._meta.db_table), conexao.ops.quote_name(coluna), ', '.join(['%s'] * len(ids)),
+    )
+    with conexao.cursor() as cursor:
+        cursor.execute(sql, ids)
+
+
+def _arquivar_lote(venda_ids):
+    from .models import ControleDeRecebimento, ControleDeRecebimentoArquivado, Venda, VendaArquivada
+
+    agora = timezone.now()
+    vendas = [
+        VendaArquivada(arquivado_em=agora, **linha)
+        for linha in Venda.objects.filter(pk__in=venda_ids).values(*CAMPOS_VENDA)
+    ]
+    controles = []
+    # (consultor, operadora, mês) -> [valor, quantidade] das parcelas retiradas, todas recebidas
+    retiradas = defaultdict(lambda: [Decimal('0.00'), 0])
+    linhas = ControleDeRecebimento.objects.filter(venda_id__in=venda_ids).values(
+        *CAMPOS_CONTROLE, consultor_ref=F('venda__consultor_id'), operadora=F('venda__plano__operadora'),
+    )
+    for linha in linhas:
+        retirada = retiradas[(linha.pop('consultor_ref'), linha.pop('operadora'), mes_de(linha['data_prevista_recebimento']))]
+        retirada[0] += linha['valor_parcela']
+        retirada[1] += 1
+        controles.append(ControleDeRecebimentoArquivado(**linha))
+    VendaArquivada.objects.bulk_create(vendas)
+    ControleDeRecebimentoArquivado.objects.bulk_create(controles)
+    _apagar(ControleDeRecebimento, 'venda_id', venda_ids)
+    _apagar(Venda, 'id', venda_ids)
+    # O resumo mensal cobre só as vendas em operação
+    retirar_recebidas_dos_resumos(retiradas)
+    # Para as listagens em operação as vendas arquivadas foram removidas
+    registrar_depois_do_commit(VENDA, venda_ids, removido=True)
+    registrar_depois_do_commit(CONTROLE, [controle.pk for controle in controles], removido=True)
+    return len(vendas), len(controles)
+
+
+def arquivar_vendas(hoje=None, horizonte_dias=None, tamanho_lote=TAMANHO_LOTE_ARQUIVAMENTO, simular=False, progresso=None):
+    """
+    Move para o arquivo as vendas quitadas há mais de `horizonte_dias` (padrão: ARQUIVO_HORIZONTE_DIAS).
+
+    Percorre core_venda em faixas de `tamanho_lote` ids; cada faixa é examinada
+    com uma agregação e arquivada em uma transação própria, então uma
+    interrupção preserva os lotes já concluídos. Vendas com um número de
+    proposta já arquivado ficam em operação, com um aviso no log. Com
+    `simular` só conta. `progresso(examinadas, arquivadas)` é chamado após
+    cada lote. Devolve {'vendas': ..., 'parcelas': ...} arquivadas (ou arquiváveis, na simulação).
+    """
+    from .models import ControleDeRecebimento, Venda
+
+    limite = data_limite(hoje, horizonte_dias)
+    totais = {'vendas': 0, 'parcelas': 0}
+    examinadas = 0
+    ultimo_id = 0
+    while True:
+        ids = list(Venda.objects.filter(pk__gt=ultimo_id).order_by('pk').values_list('pk', flat=True)[:tamanho_lote])
+        if not ids:
+            break
+        examinadas += len(ids)
+        ultimo_id = ids[-1]
+        with transaction.atomic():
+            # Seleção e cópia na mesma transação: as parcelas não mudam entre uma e outra
+            quitadas = _quitadas(ids[0], ids[-1], limite)
+            repetidas = _propostas_ja_arquivadas(quitadas) if quitadas else set()
+            if repetidas:
+                logger.warning('Vendas %s não arquivadas: o número de proposta já está no arquivo.', sorted(repetidas))
+                quitadas = [venda_id for venda_id in quitadas if venda_id not in repetidas]
+            if quitadas and simular:
+                totais['vendas'] += len(quitadas)
+                totais['parcelas'] += ControleDeRecebimento.objects.filter(venda_id__in=quitadas).count()
+            elif quitadas:
+                vendas, parcelas = _arquivar_lote(quitadas)
+                invalidar_respostas()
+                # Os documentos das vendas que não existem mais saem do índice da busca
+                indexar_depois_do_commit('venda', quitadas)
+                totais['vendas'] += vendas
+                totais['parcelas'] += parcelas
+        if progresso:
+            progresso(examinadas, totais['vendas'])
+    return totais
@@ -0,0 +1,69 @@
+from datetime import date
+
+from django.db import transaction
+
+from .alteracoes import CONTROLE, registrar_depois_do_commit
+from .cache_respostas import invalidar_respostas
+from .resumos import recalcular_resumos_dos_meses
+
+ROTINA_VARREDURA = 'varredura_parcelas_atrasadas'
+
+
+def parcelas_atrasadas(hoje=None):
+    """
+    Parcelas em aberto com data prevista vencida.
+
+    O atraso é derivado da data, sem depender do status gravado pela
+    varredura, e a consulta usa o índice parcial de parcelas em aberto.
+    """
+    from .models import ControleDeRecebimento
+
+    hoje = hoje or date.today()
+    return ControleDeRecebimento.objects.exclude(status='Recebido').filter(data_prevista_recebimento__lt=hoje)
+
+
+def varrer_parcelas_atrasadas(hoje=None, completo=False, tamanho_lote=1000):
+    """
+    Atualiza o status gravado das parcelas conforme a data prevista.
+
+    Marca como 'Atrasado' todas as parcelas 'Não Recebido' vencidas, inclusive
+    as de vendas retroativas, importações e reprogramações gravadas depois da
+    última varredura, e devolve para 'Não Recebido' as atrasadas que foram
+    reprogramadas para o futuro. A consulta usa o índice parcial de parcelas
+    em aberto, e as atualizações são feitas em lotes curtos para não segurar o
+    banco travado para escrita. Os resumos mensais são recalculados a partir
+    do mês da última varredura (ou todos, com `completo`). Retorna a
+    quantidade de parcelas (atrasadas, reabertas).
+    """
+    from .models import ControleDeRecebimento, ExecucaoRotina
+
+    hoje = hoje or date.today()
+    rotina, _ = ExecucaoRotina.objects.get_or_create(nome=ROTINA_VARREDURA)
+
+    vencidas = ControleDeRecebimento.objects.filter(status='Não Recebido', data_prevista_recebimento__lt=hoje)
+    reprogramadas = ControleDeRecebimento.objects.filter(status='Atrasado', data_prevista_recebimento__gte=hoje)
+
+    atrasadas = _atualizar_status_em_lotes(vencidas, 'Atrasado', tamanho_lote)
+    reabertas = _atualizar_status_em_lotes(reprogramadas, 'Não Recebido', tamanho_lote)
+
+    # O atraso do resumo mensal depende da data: recalcula os meses que venceram desde a última varredura
+    inicio = rotina.ultima_data if rotina.ultima_data and not completo else date.min
+    recalcular_resumos_dos_meses(inicio, hoje, hoje)
+
+    rotina.ultima_data = hoje
+    rotina.save(update_fields=['ultima_data', 'atualizado_em'])
+    return atrasadas, reabertas
+
+
+def _atualizar_status_em_lotes(queryset, status, tamanho_lote):
+    from .models import ControleDeRecebimento
+
+    total = 0
+    while True:
+        ids = list(queryset.order_by().values_list('pk', flat=True)[:tamanho_lote])
+        if not ids:
+            return total
+        with transaction.atomic():
+            total += ControleDeRecebimento.objects.filter(pk__in=ids).update(status=status)
+            invalidar_respostas()
+            registrar_depois_do_commit(CONTROLE, ids)
@@ -0,0 +1,208 @@
+"""
+Busca por trechos de texto em clientes, consultores e propostas de venda.
+
+Cada registro tem um DocumentoBusca com o texto normalizado (minúsculo, sem
+acentos, com o telefone também só em dígitos). O índice textual é criado na
+migração 0011: FTS5 com tokenizador trigram no SQLite, ordenado por bm25, e
+pg_trgm no PostgreSQL, ordenado pela similaridade de palavras. Os sinais de
+save/delete agendam a atualização dos documentos para depois do commit;
+gravações em massa chamam indexar_depois_do_commit e o comando
+reconstruir_busca refaz o índice inteiro.
+"""
+import functools
+import re
+import unicodedata
+
+from django.apps import apps
+from django.db import connections, router, transaction
+from django.db.models import FloatField, Value
+
+TABELA_FTS = 'core_documentobusca_fts'
+
+# Tipo -> (modelo, campo do título, campos do detalhe); todos entram no texto indexado
+FONTES = {
+    'cliente': ('Cliente', 'nome', ('telefone', 'email')),
+    'consultor': ('Consultor', 'nome', ()),
+    'venda': ('Venda', 'numero_proposta', ()),
+}
+
+# O trigram só encontra trechos com 3 ou mais caracteres
+TAMANHO_MINIMO_TERMO = 3
+# Registros lidos e gravados por consulta na indexação
+TAMANHO_LOTE_INDEXACAO = 1000
+# Resultados alcançáveis pela paginação: a busca serve para achar, não para listar
+LIMITE_RESULTADOS = 1000
+
+
+def normalizar(texto):
+    """Minúsculo e sem acentos, para que 'João' e 'joao' se encontrem."""
+    decomposto = unicodedata.normalize('NFKD', texto or '')
+    return ''.join(letra for letra in decomposto if not unicodedata.combining(letra)).lower()
+
+
+def _texto_do_documento(valores):
+    partes = [valor for valor in valores if valor]
+    # Telefones também em dígitos: "(11) 91234-5678" é encontrado por "912345678"
+    partes += [re.sub(r'\D', '', valor) for valor in partes if re.search(r'\d', valor) and re.search(r'\D', valor)]
+    return normalizar(' '.join(partes))
+
+
+def _documentos(tipo, ids):
+    from .models import DocumentoBusca
+
+    nome_modelo, campo_titulo, campos_detalhe = FONTES[tipo]
+    modelo = apps.get_model('core', nome_modelo)
+    documentos = []
+    for objeto_id, *valores in modelo.objects.filter(pk__in=ids).values_list('pk', campo_titulo, *campos_detalhe):
+        detalhe = ' · '.join(valor for valor in valores[1:] if valor)
+        documentos.append(DocumentoBusca(
+            tipo=tipo, objeto_id=objeto_id, titulo=valores[0][:255], detalhe=detalhe[:255],
+            texto=_texto_do_documento(valores),
+        ))
+    return documentos
+
+
+def indexar(tipo, ids):
+    """Atualiza os documentos dos `ids` pelo estado atual no banco; ids removidos saem do índice."""
+    from .models import DocumentoBusca
+
+    ids = sorted(set(ids))
+    for inicio in range(0, len(ids), TAMANHO_LOTE_INDEXACAO):
+        lote = ids[inicio:inicio + TAMANHO_LOTE_INDEXACAO]
+        documentos = _documentos(tipo, lote)
+        DocumentoBusca.objects.bulk_create(
+            documentos, update_conflicts=True, unique_fields=['tipo', 'objeto_id'],
+            update_fields=['titulo', 'detalhe', 'texto'],
+        )
+        removidos = set(lote) - {documento.objeto_id for documento in documentos}
+        if removidos:
+            DocumentoBusca.objects.filter(tipo=tipo, objeto_id__in=removidos).delete()
+
+
+def indexar_depois_do_commit(tipo, ids):
+    """
+    Agenda indexar(tipo, ids) para depois do commit da transação atual.
+
+    Chamada pelos sinais de save/delete; operações em massa (bulk_create,
+    update()) precisam chamá-la explicitamente. Uma falha na indexação é
+    registrada no log sem afetar a gravação já confirmada.
+    """
+    transaction.on_commit(functools.partial(indexar, tipo, list(ids)), robust=True)
+
+
+def reconstruir_indice(tamanho_lote=TAMANHO_LOTE_INDEXACAO, progresso=None):
+    """Refaz os documentos de todos os registros em lotes; devolve a quantidade indexada por tipo."""
+    from .models import DocumentoBusca
+
+    quantidades = {}
+    for tipo, (nome_modelo, *_) in FONTES.items():
+        modelo = apps.get_model('core', nome_modelo)
+        quantidades[tipo] = 0
+        ultimo_id = 0
+        while True:
+            ids = list(
+                modelo.objects.filter(pk__gt=ultimo_id).order_by('pk').values_list('pk', flat=True)[:tamanho_lote]
+            )
+            if not ids:
+                break
+            with transaction.atomic():
+                indexar(tipo, ids)
+            quantidades[tipo] += len(ids)
+            ultimo_id = ids[-1]
+            if progresso:
+                progresso(tipo, quantidades[tipo])
+        DocumentoBusca.objects.filter(tipo=tipo).exclude(objeto_id__in=modelo.objects.values('pk')).delete()
+
+    conexao = connections[router.db_for_write(DocumentoBusca)]
+    if conexao.vendor == 'sqlite':
+        with conexao.cursor() as cursor:
+            # Junta os segmentos do FTS5 gerados pelas inserções em lote
+            cursor.execute(f"INSERT INTO {TABELA_FTS}({TABELA_FTS}) VALUES ('optimize')")
+    return quantidades
+
+
+def _termos(busca):
+    termos = normalizar(busca).split()
+    if not any(len(termo) >= TAMANHO_MINIMO_TERMO for termo in termos):
+        raise ValueError(f'Informe ao menos um termo com {TAMANHO_MINIMO_TERMO} caracteres.')
+    return termos
+
+
+def _escapar_like(termo):
+    return termo.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _buscar_sqlite(conexao, termos, tipos, limite, deslocamento):
+    longos = [termo for termo in termos if len(termo) >= TAMANHO_MINIMO_TERMO]
+    curtos = [termo for termo in termos if len(termo) < TAMANHO_MINIMO_TERMO]
+    # Cada termo entre aspas é um trecho literal para o trigram; todos precisam aparecer
+    expressao = ' '.join('"{}"'.format(termo.replace('"', '""')) for termo in longos)
+    condicoes = [f'{TABELA_FTS} MATCH %s']
+    parametros = [expressao]
+    for termo in curtos:
+        condicoes.append("d.texto LIKE %s ESCAPE '\\'")
+        parametros.append(f'%{_escapar_like(termo)}%')
+    if tipos:
+        condicoes.append(f"d.tipo IN ({', '.join(['%s'] * len(tipos))})")
+        parametros.extend(tipos)
+    sql = (
+        f'SELECT d.tipo, d.objeto_id, d.titulo, d.detalhe, -bm25({TABELA_FTS}) '
+        f'FROM {TABELA_FTS} JOIN core_documentobusca d ON d.id = {TABELA_FTS}.rowid '
+        f"WHERE {' AND '.join(condicoes)} "
+        f'ORDER BY bm25({TABELA_FTS}), d.id LIMIT %s OFFSET %s'
+    )
+    with conexao.cursor() as cursor:
+        cursor.execute(sql, [*parametros, limite, deslocamento])
+        return cursor.fetchall()
+
+
+def _buscar_orm(banco, termos, tipos, limite, deslocamento):
+    from .models import DocumentoBusca
+
+    queryset = DocumentoBusca.objects.using(banco)
+    for termo in termos:
+        # LIKE '%termo%': no PostgreSQL usa o índice GIN gin_trgm_ops
+        queryset = queryset.filter(texto__contains=termo)
+    if tipos:
+        queryset = queryset.filter(tipo__in=tipos)
+    if connections[banco].vendor == 'postgresql':
+        from django.contrib.postgres.search import TrigramWordSimilarity
+
+        queryset = queryset.annotate(relevancia=TrigramWordSimilarity(' '.join(termos), 'texto'))
+        queryset = queryset.order_by('-relevancia', 'id')
+    else:
+        queryset = queryset.annotate(relevancia=Value(None, output_field=FloatField())).order_by('id')
+    campos = ('tipo', 'objeto_id', 'titulo', 'detalhe', 'relevancia')
+    return list(queryset.values_list(*campos)[deslocamento:deslocamento + limite])
+
+
+def buscar(busca, tipos=None, limite=20, deslocamento=0):
+    """
+    Documentos que contêm todos os termos de `busca`, do mais ao menos relevante.
+
+    `tipos` restringe a cliente, consultor e/ou venda. Levanta ValueError para
+    uma busca sem termo de TAMANHO_MINIMO_TERMO caracteres ou tipo desconhecido.
+    """
+    from .models import DocumentoBusca
+
+    termos = _termos(busca)
+    desconhecidos = set(tipos or ()) - set(FONTES)
+    if desconhecidos:
+        raise ValueError(f"Tipo de busca inválido: {', '.join(sorted(desconhecidos))}.")
+    limite = max(0, min(limite, LIMITE_RESULTADOS - deslocamento))
+    if limite == 0:
+        return []
+
+    banco = router.db_for_read(DocumentoBusca)
+    conexao = connections[banco]
+    if conexao.vendor == 'sqlite':
+        linhas = _buscar_sqlite(conexao, termos, tipos, limite, deslocamento)
+    else:
+        linhas = _buscar_orm(banco, termos, tipos, limite, deslocamento)
+    return [
+        {
+            'tipo': tipo, 'id': objeto_id, 'titulo': titulo, 'detalhe': detalhe,
+            'relevancia': round(relevancia, 4) if relevancia is not None else None,
+        }
+        for tipo, objeto_id, titulo, detalhe, relevancia in linhas
+    ]
@@ -0,0 +1,112 @@
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+# Linha de VersaoDados das listagens em cache (vendas, recebimentos, atrasadas)
+VERSAO_LISTAGENS = 'listagens'
+CHAVE_RESPOSTA = 'respostas:{view}:{versao}:{consulta}'
+VALIDADE_RESPOSTAS = 10 * 60
+
+
+def versao_dados():
+    """
+    (versão, atualizado_em) atuais dos dados das listagens, ou None.
+
+    A versão é um token trocado a cada gravação; None enquanto nenhuma
+    gravação foi registrada, caso em que as respostas não vão para o cache.
+    """
+    from .models import VersaoDados
+
+    return VersaoDados.objects.filter(nome=VERSAO_LISTAGENS).values_list('versao', 'atualizado_em').first()
+
+
+def trocar_versao(nome):
+    """Grava um novo token na linha `nome` de VersaoDados, criando-a se preciso."""
+    from .models import VersaoDados
+
+    valores = {'versao': uuid.uuid4().hex, 'atualizado_em': timezone.now()}
+    if VersaoDados.objects.filter(nome=nome).update(**valores):
+        return
+    try:
+        with transaction.atomic():
+            VersaoDados.objects.create(nome=nome, **valores)
+    except IntegrityError:
+        # Criada por outro processo ao mesmo tempo
+        VersaoDados.objects.filter(nome=nome).update(**valores)
+
+
+def _nova_versao():
+    trocar_versao(VERSAO_LISTAGENS)
+
+
+def invalidar_respostas():
+    """
+    Troca a versão dos dados das listagens depois do commit da transação atual.
+
+    Chamada pelos sinais de save/delete; operações em massa (update(),
+    bulk_create, bulk_update) precisam chamá-la explicitamente. Várias
+    chamadas na mesma transação resultam em uma única troca.
+    """
+    conexao = transaction.get_connection()
+    if conexao.in_atomic_block:
+        # Já agendada no mesmo savepoint: o rollback dele descartaria as duas juntas
+        savepoints = set(conexao.savepoint_ids)
+        if any(funcao is _nova_versao and ids == savepoints for ids, funcao, *_ in conexao.run_on_commit):
+            return
+    transaction.on_commit(_nova_versao)
+
+
+def _cache_respostas():
+    return caches[getattr(settings, 'RESPOSTAS_CACHE', 'default')]
+
+
+class ListagemEmCacheMixin:
+    """
+    Listagem com ETag/Last-Modified pela versão dos dados e páginas em cache.
+
+    Uma requisição condicional sem alterações desde a última resposta recebe
+    304 com uma única leitura da versão, sem consultar a listagem nem
+    serializar. As páginas JSON serializadas ficam no cache RESPOSTAS_CACHE,
+    chaveadas pela versão e pela URL completa (com a query string).
+    """
+
+    def validadores(self, versao, atualizado_em):
+        """(token do ETag, Last-Modified) da listagem para a versão atual dos dados."""
+        return versao, atualizado_em
+
+    def list(self, request, *args, **kwargs):
+        atual = versao_dados()
+        if atual is None or request.accepted_renderer.format != 'json':
+            return super().list(request, *args, **kwargs)
+
+        token, atualizado_em = self.validadores(*atual)
+        etag = f'"{token}"'
+        nao_modificada = get_conditional_response(
+            request._request, etag=etag, last_modified=int(atualizado_em.timestamp()),
+        )
+        if nao_modificada is not None:
+            resposta = Response(status=nao_modificada.status_code)
+        else:
+            cache = _cache_respostas()
+            chave = CHAVE_RESPOSTA.format(
+                view=type(self).__name__, versao=token,
+                consulta=hashlib.md5(request.build_absolute_uri().encode()).hexdigest(),
+            )
+            dados = cache.get(chave)
+            if dados is None:
+                dados = super().list(request, *args, **kwargs).data
+                cache.set(chave, dados, VALIDADE_RESPOSTAS)
+            resposta = Response(dados)
+        resposta['ETag'] = etag
+        resposta['Last-Modified'] = http_date(atualizado_em.timestamp())
+        # O cliente guarda a resposta, mas revalida a cada uso
+        patch_cache_control(resposta, private=True, no_cache=True)
+        return resposta
+
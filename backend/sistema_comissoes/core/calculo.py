@@ -0,0 +1,269 @@
+import datetime
+from collections import defaultdict, namedtuple
+from decimal import Decimal
+
+try:
+    import numpy as np
+except ImportError:  # sem NumPy o modo em lote usa o mesmo cálculo com Decimal, venda a venda
+    np = None
+
+# Cálculo puro do cronograma de comissões: recebe dados do plano e da venda e
+# não consulta nem grava nada no banco. Valores são Decimal com arredondamento
+# bancário (ROUND_HALF_EVEN, o padrão do contexto decimal) para centavos.
+
+CENTAVOS = Decimal('0.01')
+INTERVALO_PARCELAS = datetime.timedelta(days=30)
+
+# `parcelas` é uma sequência de (numero_parcela, porcentagem_parcela) ordenada por número
+DadosPlano = namedtuple('DadosPlano', ['taxa_tipo', 'taxa_valor', 'parcelas'])
+DadosVenda = namedtuple('DadosVenda', ['valor_plano', 'desconto_consultor', 'data_vigencia'])
+ParcelaCalculada = namedtuple('ParcelaCalculada', ['numero_parcela', 'valor_parcela', 'data_prevista_recebimento'])
+
+# Situação já registrada de uma parcela: data de recebimento (ou None) e se está recebida
+Recebimento = namedtuple('Recebimento', ['data_recebimento', 'recebida'])
+
+# Inteiros em NumPy: valores líquidos em milionésimos de real, porcentagens em centésimos
+_ESCALA_LIQUIDO = 10 ** 4
+_DIVISOR_CENTAVOS = 10 ** 8
+_LIMITE_INT64 = 2 ** 62
+
+
+def valor_liquido(valor_plano, desconto_consultor, taxa_tipo, taxa_valor):
+    """Valor do plano menos o desconto do consultor e a taxa (fixa ou percentual) do plano."""
+    valor = valor_plano - desconto_consultor
+    if taxa_tipo == 'Valor Fixo':
+        valor -= taxa_valor
+    elif taxa_tipo == 'Porcentagem':
+        valor -= valor * (taxa_valor / 100)
+    return valor
+
+
+def _primeira_data(venda, numero_parcela):
+    if numero_parcela == 1:
+        return venda.data_vigencia + INTERVALO_PARCELAS
+    return venda.data_vigencia + datetime.timedelta(days=30 * (numero_parcela - 1)) + INTERVALO_PARCELAS
+
+
+def calcular_parcelas(venda, plano, datas_recebimento=None):
+    """
+    Calcula o cronograma de uma venda.
+
+    A parcela 1 é um percentual do valor líquido e vence 30 dias após a
+    vigência; as demais são percentuais do valor do plano e vencem 30 dias após
+    o recebimento (ou o vencimento) da anterior. `datas_recebimento` mapeia
+    numero_parcela -> data de recebimento já registrada.
+    """
+    datas_recebimento = datas_recebimento or {}
+    liquido = valor_liquido(venda.valor_plano, venda.desconto_consultor, plano.taxa_tipo, plano.taxa_valor)
+
+    parcelas = []
+    data_base = None
+    for numero_parcela, porcentagem in plano.parcelas:
+        if numero_parcela == 1:
+            valor_parcela = liquido * (porcentagem / 100)
+        else:
+            valor_parcela = venda.valor_plano * (porcentagem / 100)
+        data_prevista = data_base + INTERVALO_PARCELAS if data_base else _primeira_data(venda, numero_parcela)
+        parcelas.append(ParcelaCalculada(numero_parcela, valor_parcela.quantize(CENTAVOS), data_prevista))
+        data_base = datas_recebimento.get(numero_parcela) or data_prevista
+    return parcelas
+
+
+def _projetar_parcelas(venda, plano, recebimentos, hoje, atraso):
+    """Parcelas em aberto de uma venda como (data de recebimento projetada, valor)."""
+    liquido = valor_liquido(venda.valor_plano, venda.desconto_consultor, plano.taxa_tipo, plano.taxa_valor)
+    abertas = []
+    data_base = None
+    for numero_parcela, porcentagem in plano.parcelas:
+        base = liquido if numero_parcela == 1 else venda.valor_plano
+        data_prevista = data_base + INTERVALO_PARCELAS if data_base else _primeira_data(venda, numero_parcela)
+        recebimento = recebimentos.get(numero_parcela)
+        if recebimento and (recebimento.recebida or recebimento.data_recebimento):
+            data_base = recebimento.data_recebimento or data_prevista
+        else:
+            data_base = max(data_prevista, hoje) + atraso
+        if not (recebimento and recebimento.recebida):
+            abertas.append((data_base, (base * (porcentagem / 100)).quantize(CENTAVOS)))
+    return abertas
+
+
+def _centavos(valor):
+    """Decimal exato em centavos como inteiro, ou None se tiver mais casas decimais."""
+    centavos = Decimal(valor).scaleb(2)
+    return int(centavos) if centavos == centavos.to_integral_value() else None
+
+
+def _preparar_lote(vendas, plano):
+    """
+    Matriz (vendas x parcelas) dos valores em centavos, calculada com inteiros.
+
+    Devolve None quando algum valor não cabe na representação inteira exata
+    (mais de duas casas decimais ou risco de estouro); quem chama usa o
+    cálculo com Decimal nesse caso.
+    """
+    if np is None or not vendas or not plano.parcelas:
+        return None
+    valores = [_centavos(venda.valor_plano) for venda in vendas]
+    descontos = [_centavos(venda.desconto_consultor) for venda in vendas]
+    porcentagens = [_centavos(porcentagem) for _, porcentagem in plano.parcelas]
+    taxa = _centavos(plano.taxa_valor)
+    if None in valores or None in descontos or None in porcentagens or taxa is None:
+        return None
+
+    valor_plano = np.array(valores, dtype=np.int64)
+    base = valor_plano - np.array(descontos, dtype=np.int64)
+    if plano.taxa_tipo == 'Valor Fixo':
+        liquido = (base - taxa) * _ESCALA_LIQUIDO
+    elif plano.taxa_tipo == 'Porcentagem':
+        liquido = base * _ESCALA_LIQUIDO - base * taxa
+    else:
+        liquido = base * _ESCALA_LIQUIDO
+    bruto = valor_plano * _ESCALA_LIQUIDO
+
+    porcentagem = np.array(porcentagens, dtype=np.int64)
+    maior_base = max(int(np.abs(liquido).max()), int(np.abs(bruto).max()))
+    if maior_base * max(int(np.abs(porcentagem).max()), 1) >= _LIMITE_INT64:
+        return None
+
+    primeira = np.array([numero == 1 for numero, _ in plano.parcelas])
+    produto = np.where(primeira[None, :], liquido[:, None], bruto[:, None]) * porcentagem[None, :]
+    quociente, resto = np.divmod(produto, _DIVISOR_CENTAVOS)
+    # Arredondamento bancário, como Decimal.quantize: metade vai para o par
+    sobe = (2 * resto > _DIVISOR_CENTAVOS) | ((2 * resto == _DIVISOR_CENTAVOS) & (quociente % 2 == 1))
+    return quociente + sobe
+
+
+def _primeiras_datas(vendas, plano):
+    vigencias = np.array([venda.data_vigencia for venda in vendas], dtype='datetime64[D]')
+    numero = plano.parcelas[0][0]
+    dias = 30 if numero == 1 else 30 * (numero - 1) + 30
+    return vigencias + np.timedelta64(dias, 'D')
+
+
+def _matriz_de_datas(vendas, plano, mapas):
+    """Datas de recebimento registradas (NaT se não houver) e parcelas recebidas, por venda e parcela."""
+    numeros = [numero for numero, _ in plano.parcelas]
+    datas = np.full((len(vendas), len(numeros)), np.datetime64('NaT'), dtype='datetime64[D]')
+    recebidas = np.zeros((len(vendas), len(numeros)), dtype=bool)
+    indices = {numero: coluna for coluna, numero in enumerate(numeros)}
+    for linha, mapa in enumerate(mapas):
+        for numero, valor in (mapa or {}).items():
+            coluna = indices.get(numero)
+            if coluna is None:
+                continue
+            if isinstance(valor, Recebimento):
+                recebidas[linha, coluna] = valor.recebida
+                valor = valor.data_recebimento
+            if valor:
+                datas[linha, coluna] = valor
+    return datas, recebidas
+
+
+def calcular_lote(vendas, plano, datas_recebimento=None):
+    """
+    Versão em lote de `calcular_parcelas` para várias vendas do mesmo plano.
+
+    Com NumPy os valores são calculados em inteiros (centavos), coluna a
+    coluna para todas as vendas de uma vez, com o mesmo arredondamento do
+    Decimal; sem NumPy, ou com valores fora da representação exata, cada venda
+    passa por `calcular_parcelas`. `datas_recebimento` é uma lista paralela a
+    `vendas` de mapas numero_parcela -> data.
+    """
+    vendas = list(vendas)
+    datas_recebimento = datas_recebimento or [None] * len(vendas)
+    centavos = _preparar_lote(vendas, plano)
+    if centavos is None:
+        return [calcular_parcelas(venda, plano, datas) for venda, datas in zip(vendas, datas_recebimento)]
+
+    recebimentos, _ = _matriz_de_datas(vendas, plano, datas_recebimento)
+    previstas = np.empty_like(recebimentos)
+    data_base = _primeiras_datas(vendas, plano)
+    previstas[:, 0] = data_base
+    for coluna in range(len(plano.parcelas)):
+        if coluna:
+            previstas[:, coluna] = data_base + np.timedelta64(30, 'D')
+        data_base = np.where(np.isnat(recebimentos[:, coluna]), previstas[:, coluna], recebimentos[:, coluna])
+
+    numeros = [numero for numero, _ in plano.parcelas]
+    return [
+        [
+            ParcelaCalculada(numero, Decimal(int(valor)).scaleb(-2), data)
+            for numero, valor, data in zip(numeros, linha_valores, linha_datas.tolist())
+        ]
+        for linha_valores, linha_datas in zip(centavos, previstas)
+    ]
+
+
+def calcular_valores(vendas, plano):
+    """
+    Apenas os valores das parcelas de várias vendas do mesmo plano, na ordem de `plano.parcelas`.
+
+    Os valores não dependem das datas de recebimento: serve para recalcular
+    parcelas existentes sem refazer as datas previstas.
+    """
+    vendas = list(vendas)
+    centavos = _preparar_lote(vendas, plano)
+    if centavos is None:
+        return [[item.valor_parcela for item in calcular_parcelas(venda, plano)] for venda in vendas]
+    return [[Decimal(int(valor)).scaleb(-2) for valor in linha] for linha in centavos.tolist()]
+
+
+def projetar_fluxo(vendas, plano, recebimentos, hoje, meses, atraso_dias=0, grupos=None):
+    """
+    Fluxo de caixa projetado das parcelas em aberto, por grupo e mês.
+
+    Parcelas em aberto são consideradas recebidas em max(data prevista, hoje)
+    mais `atraso_dias`, e as seguintes são reprogramadas a partir dessa data,
+    como numa baixa real. `recebimentos` é uma lista paralela a `vendas` de
+    mapas numero_parcela -> Recebimento; `grupos` traz a chave de agrupamento
+    de cada venda. Considera os `meses` a partir do mês de `hoje` e devolve
+    {(grupo, mes): (valor, parcelas)}.
+    """
+    vendas = list(vendas)
+    grupos = grupos or [None] * len(vendas)
+    inicio = hoje.replace(day=1)
+    atraso = datetime.timedelta(days=atraso_dias)
+    centavos = _preparar_lote(vendas, plano)
+
+    if centavos is None:
+        totais = defaultdict(lambda: [Decimal('0.00'), 0])
+        for venda, mapa, grupo in zip(vendas, recebimentos, grupos):
+            for data, valor in _projetar_parcelas(venda, plano, mapa or {}, hoje, atraso):
+                indice = (data.year - inicio.year) * 12 + data.month - inicio.month
+                if 0 <= indice < meses:
+                    total = totais[(grupo, data.replace(day=1))]
+                    total[0] += valor
+                    total[1] += 1
+        return {chave: (valor, quantidade) for chave, (valor, quantidade) in totais.items()}
+
+    datas, recebidas = _matriz_de_datas(vendas, plano, recebimentos)
+    projetadas = np.empty_like(datas)
+    data_base = _primeiras_datas(vendas, plano)
+    hoje_np = np.datetime64(hoje, 'D')
+    atraso_np = np.timedelta64(atraso_dias, 'D')
+    for coluna in range(len(plano.parcelas)):
+        prevista = data_base if coluna == 0 else data_base + np.timedelta64(30, 'D')
+        registrada = recebidas[:, coluna] | ~np.isnat(datas[:, coluna])
+        data_registrada = np.where(np.isnat(datas[:, coluna]), prevista, datas[:, coluna])
+        data_base = np.where(registrada, data_registrada, np.maximum(prevista, hoje_np) + atraso_np)
+        projetadas[:, coluna] = data_base
+
+    mes_inicio = np.datetime64(inicio, 'M')
+    indice_mes = (projetadas.astype('datetime64[M]') - mes_inicio).astype(np.int64)
+    validas = ~recebidas & (indice_mes >= 0) & (indice_mes < meses)
+
+    indices = {}
+    indice_grupo = np.array([indices.setdefault(grupo, len(indices)) for grupo in grupos], dtype=np.int64)
+    chaves_grupo = list(indices)
+    posicao = (indice_grupo.reshape(-1, 1) * meses + indice_mes)[validas]
+    valores = np.zeros(len(chaves_grupo) * meses, dtype=np.int64)
+    np.add.at(valores, posicao, centavos[validas])
+    quantidades = np.bincount(posicao, minlength=len(valores))
+
+    resultado = {}
+    for posicao in np.flatnonzero(quantidades):
+        grupo, mes = divmod(int(posicao), meses)
+        ano, mes_do_ano = divmod(inicio.month - 1 + mes, 12)
+        chave = (chaves_grupo[grupo], datetime.date(inicio.year + ano, mes_do_ano + 1, 1))
+        resultado[chave] = (Decimal(int(valores[posicao])).scaleb(-2), int(quantidades[posicao]))
+    return resultado
@@ -0,0 +1,213 @@
+import codecs
+import csv
+import datetime
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+
+from .alteracoes import CONTROLE, registrar_depois_do_commit
+from .cache_respostas import invalidar_respostas
+from .cronograma import reprogramar_parcelas
+from .resumos import chaves_das_parcelas, pares_das_parcelas, recalcular_resumos
+
+CAMPOS_EXTRATO = ('numero_proposta', 'numero_parcela', 'valor_parcela', 'data_recebimento', 'numero_extrato')
+
+# Resultados possíveis de cada linha do extrato
+CONCILIADA = 'conciliada'
+VALOR_DIVERGENTE = 'valor_divergente'
+NAO_ENCONTRADA = 'nao_encontrada'
+JA_RECEBIDA = 'ja_recebida'
+DUPLICADA = 'duplicada'
+INVALIDA = 'invalida'
+
+# Maior trecho sem um objeto completo que ler_json mantém em memória (caracteres)
+TAMANHO_MAXIMO_OBJETO_JSON = 1024 * 1024
+
+
+class ExtratoInvalido(ValueError):
+    pass
+
+
+def ler_csv(arquivo):
+    """Lê linha a linha um extrato CSV binário, separado por ',' ou ';'."""
+    texto = codecs.iterdecode(arquivo, 'utf-8-sig')
+    cabecalho = next(texto, '')
+    delimitador = ';' if cabecalho.count(';') > cabecalho.count(',') else ','
+    campos = [campo.strip() for campo in next(csv.reader([cabecalho], delimiter=delimitador), [])]
+    yield from csv.DictReader(texto, fieldnames=campos, delimiter=delimitador)
+
+
+def ler_json(arquivo, tamanho_bloco=64 * 1024, tamanho_maximo=TAMANHO_MAXIMO_OBJETO_JSON):
+    """
+    Lê um extrato JSON binário de forma incremental.
+
+    Aceita tanto uma lista JSON de objetos quanto JSON Lines (um objeto por
+    linha); apenas o trecho em leitura fica em memória. Levanta
+    ExtratoInvalido se esse trecho passa de `tamanho_maximo` caracteres sem
+    formar um objeto: um objeto malformado no meio do arquivo faria o resto
+    do extrato acumular no buffer.
+    """
+    decodificador = codecs.getincrementaldecoder('utf-8-sig')()
+    decoder = json.JSONDecoder()
+    buffer = ''
+    while True:
+        bruto = arquivo.read(tamanho_bloco)
+        fim = not bruto
+        buffer += decodificador.decode(bruto, final=fim)
+        posicao = 0
+        while True:
+            while posicao < len(buffer) and buffer[posicao] in ' \t\r\n,[]':
+                posicao += 1
+            if posicao >= len(buffer):
+                break
+            try:
+                objeto, posicao = decoder.raw_decode(buffer, posicao)
+            except json.JSONDecodeError:
+                if fim:
+                    # Trecho final que não forma um objeto: vira uma linha inválida no relatório
+                    yield buffer[posicao:posicao + 200]
+                    return
+                break
+            yield objeto
+        buffer = buffer[posicao:]
+        if fim:
+            return
+        if len(buffer) > tamanho_maximo:
+            raise ExtratoInvalido(f'Extrato JSON malformado ou com um objeto maior que {tamanho_maximo} caracteres.')
+
+
+def converter_decimal(valor):
+    """Converte números e textos ("1234.56" ou no formato brasileiro "1.234,56") em Decimal."""
+    if isinstance(valor, (int, Decimal)):
+        return Decimal(valor)
+    if isinstance(valor, float):
+        return Decimal(str(valor))
+    texto = str(valor).strip()
+    if ',' in texto:
+        # Formato brasileiro: 1.234,56
+        texto = texto.replace('.', '').replace(',', '.')
+    return Decimal(texto)
+
+
+def converter_data(valor):
+    """Converte datas, datas ISO e datas no formato dd/mm/aaaa em date."""
+    if isinstance(valor, datetime.datetime):
+        return valor.date()
+    if isinstance(valor, datetime.date):
+        return valor
+    texto = str(valor).strip()
+    if '/' in texto:
+        return datetime.datetime.strptime(texto, '%d/%m/%Y').date()
+    return datetime.date.fromisoformat(texto)
+
+
+def normalizar_linha(linha):
+    """Converte uma linha bruta do extrato; levanta ValueError se estiver incompleta."""
+    if not isinstance(linha, dict):
+        raise ValueError('Linha não é um objeto JSON válido.')
+    faltando = [campo for campo in CAMPOS_EXTRATO[:4] if linha.get(campo) in (None, '')]
+    if faltando:
+        raise ValueError(f"Campos obrigatórios ausentes: {', '.join(faltando)}.")
+    try:
+        return {
+            'numero_proposta': str(linha['numero_proposta']).strip(),
+            'numero_parcela': int(linha['numero_parcela']),
+            'valor_parcela': converter_decimal(linha['valor_parcela']),
+            'data_recebimento': converter_data(linha['data_recebimento']),
+            'numero_extrato': (str(linha.get('numero_extrato') or '').strip() or None),
+        }
+    except (TypeError, ValueError, InvalidOperation) as exc:
+        raise ValueError(f'Valor inválido: {exc}')
+
+
+def conciliar_extrato(linhas, tolerancia=Decimal('0.00'), tamanho_lote=1000):
+    """
+    Concilia as linhas de um extrato com as parcelas em aberto.
+
+    As linhas são processadas em lotes: cada lote resolve as parcelas com uma
+    única consulta por (numero_proposta, numero_parcela) e grava recebimentos e
+    reprogramações em uma transação própria. Gera um relatório por linha,
+    seguido de um resumo, sem manter o extrato inteiro em memória.
+    """
+    resumo = {resultado: 0 for resultado in (CONCILIADA, VALOR_DIVERGENTE, NAO_ENCONTRADA, JA_RECEBIDA, DUPLICADA, INVALIDA)}
+    lote = []
+    for numero_linha, linha in enumerate(linhas, start=1):
+        lote.append((numero_linha, linha))
+        if len(lote) >= tamanho_lote:
+            yield from _conciliar_lote(lote, tolerancia, resumo)
+            lote = []
+    if lote:
+        yield from _conciliar_lote(lote, tolerancia, resumo)
+    yield {'resumo': resumo}
+
+
+def _conciliar_lote(lote, tolerancia, resumo):
+    from .models import ControleDeRecebimento
+
+    relatorio = []
+    validas = []
+    for numero_linha, linha in lote:
+        try:
+            validas.append((numero_linha, normalizar_linha(linha)))
+        except ValueError as exc:
+            relatorio.append({'linha': numero_linha, 'resultado': INVALIDA, 'erro': str(exc)})
+
+    propostas = {dados['numero_proposta'] for _, dados in validas}
+    controles = {}
+    if propostas:
+        consulta = (
+            ControleDeRecebimento.objects
+            .filter(venda__numero_proposta__in=propostas)
+            .select_related('venda', 'parcela')
+            .only(
+                'venda', 'parcela', 'venda__numero_proposta', 'parcela__numero_parcela', 'valor_parcela', 'status',
+                'data_prevista_recebimento', 'data_recebimento', 'numero_extrato',
+            )
+        )
+        controles = {(c.venda.numero_proposta, c.parcela.numero_parcela): c for c in consulta}
+
+    conciliados = {}
+    for numero_linha, dados in validas:
+        item = {
+            'linha': numero_linha,
+            'numero_proposta': dados['numero_proposta'],
+            'numero_parcela': dados['numero_parcela'],
+            'valor_informado': str(dados['valor_parcela']),
+        }
+        controle = controles.get((dados['numero_proposta'], dados['numero_parcela']))
+        if controle is None:
+            item['resultado'] = NAO_ENCONTRADA
+        else:
+            item['controle_id'] = controle.pk
+            item['valor_esperado'] = str(controle.valor_parcela)
+            if controle.pk in conciliados:
+                item['resultado'] = DUPLICADA
+            elif controle.status == 'Recebido':
+                item['resultado'] = JA_RECEBIDA
+            elif abs(controle.valor_parcela - dados['valor_parcela']) > tolerancia:
+                item['resultado'] = VALOR_DIVERGENTE
+            else:
+                controle.status = 'Recebido'
+                controle.data_recebimento = dados['data_recebimento']
+                controle.numero_extrato = dados['numero_extrato']
+                conciliados[controle.pk] = controle
+                item['resultado'] = CONCILIADA
+        relatorio.append(item)
+
+    if conciliados:
+        with transaction.atomic():
+            # Reprograma primeiro: parcelas conciliadas da mesma venda podem ter a data prevista ajustada
+            reprogramadas = reprogramar_parcelas(conciliados.values())
+            ControleDeRecebimento.objects.bulk_update(
+                conciliados.values(),
+                ['status', 'data_recebimento', 'numero_extrato', 'data_prevista_recebimento'],
+            )
+            recalcular_resumos(chaves_das_parcelas(pares_das_parcelas([*conciliados.values(), *reprogramadas])))
+            invalidar_respostas()
+            registrar_depois_do_commit(CONTROLE, conciliados)
+
+    relatorio.sort(key=lambda item: item['linha'])
+    for item in relatorio:
+        resumo[item['resultado']] += 1
+    return relatorio
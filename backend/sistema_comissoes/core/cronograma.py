@@ -0,0 +1,163 @@
+from collections import namedtuple
+
+from django.db import transaction
+
+from .alteracoes import CONTROLE, registrar_depois_do_commit
+from .calculo import INTERVALO_PARCELAS, DadosPlano, DadosVenda, calcular_parcelas
+
+# Campos da Venda que influenciam o cronograma de recebimento
+CAMPOS_CRONOGRAMA = {'plano', 'plano_id', 'valor_plano', 'desconto_consultor', 'data_vigencia'}
+
+ItemCronograma = namedtuple('ItemCronograma', ['parcela', 'valor_parcela', 'data_prevista_recebimento'])
+
+
+def dados_do_plano(plano, parcelas):
+    return DadosPlano(
+        plano.taxa_plano_tipo, plano.taxa_plano_valor,
+        tuple((parcela.numero_parcela, parcela.porcentagem_parcela) for parcela in parcelas),
+    )
+
+
+def dados_da_venda(venda):
+    return DadosVenda(venda.valor_plano, venda.desconto_consultor, venda.data_vigencia)
+
+
+def calcular_cronograma(venda, parcelas, datas_recebimento=None):
+    """
+    Calcula em memória o cronograma de recebimento de uma venda.
+
+    `parcelas` deve vir ordenado por numero_parcela. `datas_recebimento` mapeia
+    parcela_id -> data de recebimento já registrada; essa data passa a ser a
+    base da data prevista da parcela seguinte. O cálculo em si fica em
+    core.calculo, sem acesso ao banco.
+    """
+    datas_recebimento = datas_recebimento or {}
+    calculadas = calcular_parcelas(
+        dados_da_venda(venda),
+        dados_do_plano(venda.plano_em_cache(), parcelas),
+        {parcela.numero_parcela: datas_recebimento[parcela.pk] for parcela in parcelas if parcela.pk in datas_recebimento},
+    )
+    return [
+        ItemCronograma(parcela, calculada.valor_parcela, calculada.data_prevista_recebimento)
+        for parcela, calculada in zip(parcelas, calculadas)
+    ]
+
+
+def sincronizar_cronograma(venda, nova=False):
+    """
+    Grava o cronograma calculado comparando-o com as parcelas já existentes.
+
+    Parcelas novas entram com um único bulk_create, parcelas com valor ou data
+    diferentes são atualizadas com um único bulk_update e parcelas que não
+    pertencem mais ao plano são removidas. Parcelas já recebidas não são
+    alteradas. Retorna uma tupla (criadas, atualizadas, removidas).
+    """
+    from .models import ControleDeRecebimento
+    from .planos import parcelas_do_plano
+
+    parcelas = parcelas_do_plano(venda.plano_id)
+    if nova:
+        existentes = {}
+    else:
+        existentes = {c.parcela_id: c for c in ControleDeRecebimento.objects.filter(venda=venda)}
+
+    datas_recebimento = {
+        parcela_id: controle.data_recebimento
+        for parcela_id, controle in existentes.items()
+        if controle.data_recebimento
+    }
+
+    novos = []
+    alterados = []
+    for item in calcular_cronograma(venda, parcelas, datas_recebimento):
+        controle = existentes.pop(item.parcela.pk, None)
+        if controle is None:
+            novos.append(ControleDeRecebimento(
+                venda=venda,
+                parcela=item.parcela,
+                valor_parcela=item.valor_parcela,
+                data_prevista_recebimento=item.data_prevista_recebimento,
+                status='Não Recebido',
+            ))
+        elif controle.status != 'Recebido' and (
+            controle.valor_parcela != item.valor_parcela
+            or controle.data_prevista_recebimento != item.data_prevista_recebimento
+        ):
+            controle.valor_parcela = item.valor_parcela
+            controle.data_prevista_recebimento = item.data_prevista_recebimento
+            alterados.append(controle)
+
+    removidos = [controle.pk for controle in existentes.values()]
+
+    with transaction.atomic(savepoint=False):
+        if removidos:
+            ControleDeRecebimento.objects.filter(pk__in=removidos).delete()
+        if novos:
+            ControleDeRecebimento.objects.bulk_create(novos)
+        if alterados:
+            ControleDeRecebimento.objects.bulk_update(alterados, ['valor_parcela', 'data_prevista_recebimento'])
+        # Removidas passam pelo post_delete; bulk_create e bulk_update não disparam sinais
+        registrar_depois_do_commit(CONTROLE, [controle.pk for controle in [*novos, *alterados]])
+
+    return novos, alterados, removidos
+
+
+def reprogramar_parcelas(controles, tamanho_lote=500):
+    """
+    Recalcula as datas previstas das parcelas seguintes às informadas.
+
+    `controles` são instâncias de ControleDeRecebimento cuja data de
+    recebimento mudou, podendo pertencer a várias vendas. Os valores em memória
+    dessas instâncias prevalecem sobre o banco. As parcelas de cada venda são
+    lidas com uma consulta por lote de vendas e as novas datas são gravadas com
+    um único bulk_update, sem disparar os sinais de pre_save/post_save.
+    Instâncias informadas que também tenham a data prevista ajustada são
+    alteradas apenas em memória; gravá-las fica a cargo de quem chamou.
+    Retorna as parcelas gravadas.
+    """
+    from .models import ControleDeRecebimento
+
+    informados = {controle.pk: controle for controle in controles}
+    venda_ids = sorted({controle.venda_id for controle in informados.values()})
+
+    alterados = []
+    for inicio in range(0, len(venda_ids), tamanho_lote):
+        lote = venda_ids[inicio:inicio + tamanho_lote]
+        parcelas = (
+            ControleDeRecebimento.objects
+            .filter(venda_id__in=lote)
+            .only('venda', 'parcela', 'data_prevista_recebimento', 'data_recebimento', 'parcela__numero_parcela')
+            .select_related('parcela')
+            .order_by('venda_id', 'parcela__numero_parcela')
+        )
+
+        cadeia_por_venda = {}
+        for parcela in parcelas:
+            cadeia_por_venda.setdefault(parcela.venda_id, []).append(informados.get(parcela.pk, parcela))
+
+        for cadeia in cadeia_por_venda.values():
+            alterados.extend(_reprogramar_cadeia(cadeia, informados))
+
+    if alterados:
+        ControleDeRecebimento.objects.bulk_update(alterados, ['data_prevista_recebimento'])
+        registrar_depois_do_commit(CONTROLE, [controle.pk for controle in alterados])
+    return alterados
+
+
+def _reprogramar_cadeia(cadeia, informados):
+    """Percorre as parcelas de uma venda a partir da primeira informada."""
+    inicio = next((i for i, controle in enumerate(cadeia) if controle.pk in informados), None)
+    if inicio is None:
+        return []
+
+    alterados = []
+    previous_date = cadeia[inicio].data_recebimento or cadeia[inicio].data_prevista_recebimento
+    for installment in cadeia[inicio + 1:]:
+        new_data_prevista = previous_date + INTERVALO_PARCELAS
+        if installment.data_prevista_recebimento != new_data_prevista:
+            installment._data_prevista_anterior = installment.data_prevista_recebimento
+            installment.data_prevista_recebimento = new_data_prevista
+            if installment.pk not in informados:
+                alterados.append(installment)
+        previous_date = installment.data_recebimento or installment.data_prevista_recebimento
+    return alterados
@@ -0,0 +1,201 @@
+import datetime
+import random
+from decimal import Decimal
+
+from django.db import transaction
+
+from .atrasos import ROTINA_VARREDURA
+from .busca import indexar_depois_do_commit
+from .cache_respostas import invalidar_respostas
+from .calculo import CENTAVOS, INTERVALO_PARCELAS, calcular_lote
+from .cronograma import dados_da_venda, dados_do_plano
+from .planos import invalidar_planos, tabela_de_planos
+from .resumos import reconstruir_resumos
+
+OPERADORAS = (
+    'Unimed', 'Bradesco Saúde', 'SulAmérica', 'Amil', 'Hapvida', 'NotreDame', 'Porto Saúde', 'Prevent Senior',
+    'Golden Cross', 'Care Plus', 'Allianz Saúde', 'Seguros Unimed',
+)
+TIPOS = ('PME', 'PF', 'Adesão')
+NOMES = (
+    'Ana', 'Bruno', 'Carla', 'Diego', 'Eduarda', 'Felipe', 'Gabriela', 'Henrique', 'Isabela', 'João',
+    'Larissa', 'Marcos', 'Natália', 'Otávio', 'Paula', 'Rafael', 'Sofia', 'Thiago', 'Vitória', 'William',
+)
+SOBRENOMES = (
+    'Silva', 'Santos', 'Oliveira', 'Souza', 'Rodrigues', 'Ferreira', 'Alves', 'Pereira', 'Lima', 'Gomes',
+    'Costa', 'Ribeiro', 'Martins', 'Carvalho', 'Almeida', 'Lopes', 'Soares', 'Fernandes', 'Vieira', 'Barbosa',
+)
+
+# Parcelas vencidas recebidas, e atraso (em dias) do recebimento em relação à data prevista
+TAXA_RECEBIMENTO = 0.85
+ATRASO_RECEBIMENTO = (-5, 25)
+
+
+def _nome(rng):
+    return f'{rng.choice(NOMES)} {rng.choice(SOBRENOMES)} {rng.choice(SOBRENOMES)}'
+
+
+def _criar_planos(rng, prefixo, operadoras):
+    from .models import Parcela, Plano
+
+    planos = []
+    parcelas = []
+    for indice in range(operadoras):
+        operadora = f'{prefixo} {OPERADORAS[indice % len(OPERADORAS)]} {indice // len(OPERADORAS) + 1}'
+        for tipo in rng.sample(TIPOS, rng.randint(1, len(TIPOS))):
+            numero_parcelas = rng.choice((3, 6, 10, 12))
+            porcentagens = [Decimal('100.00')] + [
+                Decimal(rng.choice((30, 20, 10, 5))) for _ in range(numero_parcelas - 1)
+            ]
+            fixa = rng.random() < 0.6
+            plano = Plano.objects.create(
+                operadora=operadora,
+                tipo=tipo,
+                numero_parcelas=numero_parcelas,
+                comissionamento_total=sum(porcentagens),
+                taxa_plano_tipo='Valor Fixo' if fixa else 'Porcentagem',
+                taxa_plano_valor=Decimal(rng.choice((0, 10, 20, 50))) if fixa else Decimal(rng.choice(('5', '10', '12.5'))),
+            )
+            planos.append(plano.pk)
+            parcelas.extend(
+                Parcela(plano=plano, numero_parcela=numero, porcentagem_parcela=porcentagem)
+                for numero, porcentagem in enumerate(porcentagens, start=1)
+            )
+    Parcela.objects.bulk_create(parcelas)
+    # bulk_create não dispara os sinais que invalidam a tabela de planos em cache
+    invalidar_planos()
+    return planos
+
+
+def _criar_pessoas(modelo, tipo, rng, quantidade, tamanho_lote, dominio):
+    ids = []
+    for inicio in range(0, quantidade, tamanho_lote):
+        lote = []
+        for numero in range(inicio, min(quantidade, inicio + tamanho_lote)):
+            nome = _nome(rng)
+            lote.append(modelo(
+                nome=nome,
+                telefone=f'(11) 9{rng.randint(1000, 9999)}-{rng.randint(1000, 9999)}',
+                email=f"{nome.split()[0].lower()}.{numero}@{dominio}",
+            ))
+        ids.extend(pessoa.pk for pessoa in modelo.objects.bulk_create(lote))
+    indexar_depois_do_commit(tipo, ids)
+    return ids
+
+
+def _cronograma_com_recebimentos(rng, calculado, hoje):
+    """
+    Datas previstas, recebimentos e status de um cronograma calculado.
+
+    Segue a regra de core.calculo: cada parcela vence INTERVALO_PARCELAS após
+    o recebimento (ou a data prevista) da anterior.
+    """
+    itens = []
+    data_prevista = calculado[0].data_prevista_recebimento
+    for item in calculado:
+        data_recebimento = None
+        if data_prevista <= hoje and rng.random() < TAXA_RECEBIMENTO:
+            data_recebimento = min(hoje, data_prevista + datetime.timedelta(days=rng.randint(*ATRASO_RECEBIMENTO)))
+            status = 'Recebido'
+        else:
+            status = 'Atrasado' if data_prevista < hoje else 'Não Recebido'
+        itens.append((item, data_prevista, data_recebimento, status))
+        data_prevista = (data_recebimento or data_prevista) + INTERVALO_PARCELAS
+    return itens
+
+
+def _criar_lote_de_vendas(rng, inicio, quantidade, prefixo, hoje, meses, planos, consultores, clientes, tabela):
+    from .models import ControleDeRecebimento, Venda
+
+    vendas = []
+    for numero in range(inicio, inicio + quantidade):
+        data_venda = hoje - datetime.timedelta(days=rng.randint(0, meses * 30))
+        data_vigencia = data_venda + datetime.timedelta(days=rng.randint(0, 15))
+        valor_plano = Decimal(str(round(rng.lognormvariate(7.3, 0.8), 2))).quantize(CENTAVOS)
+        vendas.append(Venda(
+            numero_proposta=f'{prefixo}-{numero:08d}',
+            cliente_id=rng.choice(clientes),
+            plano_id=rng.choice(planos),
+            consultor_id=rng.choice(consultores),
+            valor_plano=min(valor_plano, Decimal('99999.99')),
+            desconto_consultor=Decimal(rng.choice((0, 0, 0, 25, 50, 100))).quantize(CENTAVOS),
+            data_venda=data_venda,
+            data_vigencia=data_vigencia,
+            data_vencimento=data_vigencia + datetime.timedelta(days=10),
+        ))
+    Venda.objects.bulk_create(vendas)
+    indexar_depois_do_commit('venda', [venda.pk for venda in vendas])
+
+    por_plano = {}
+    for venda in vendas:
+        por_plano.setdefault(venda.plano_id, []).append(venda)
+    controles = []
+    for plano_id, vendas_do_plano in por_plano.items():
+        plano, parcelas = tabela[plano_id]
+        calculados = calcular_lote([dados_da_venda(venda) for venda in vendas_do_plano], dados_do_plano(plano, parcelas))
+        for venda, calculado in zip(vendas_do_plano, calculados):
+            for parcela, (item, data_prevista, data_recebimento, status) in zip(
+                parcelas, _cronograma_com_recebimentos(rng, calculado, hoje)
+            ):
+                controles.append(ControleDeRecebimento(
+                    venda=venda,
+                    parcela=parcela,
+                    valor_parcela=item.valor_parcela,
+                    data_prevista_recebimento=data_prevista,
+                    data_recebimento=data_recebimento,
+                    status=status,
+                    numero_extrato=f'EXT-{data_recebimento:%Y%m}-{venda.pk}' if data_recebimento else None,
+                ))
+    ControleDeRecebimento.objects.bulk_create(controles, batch_size=5000)
+    return len(controles)
+
+
+def gerar_dados(vendas=10_000, consultores=50, clientes=None, operadoras=8, meses=24, semente=42,
+                prefixo='SINT', hoje=None, tamanho_lote=2000, progresso=None):
+    """
+    Gera dados sintéticos realistas e reprodutíveis para testes de carga.
+
+    Com a mesma `semente` e o mesmo `hoje` os dados gerados são os mesmos.
+    Cria operadoras (com o `prefixo` no nome) e seus planos com a tabela de
+    parcelas, consultores, clientes e vendas com data de venda nos últimos
+    `meses`; parcelas vencidas são recebidas com atraso variável (e as
+    seguintes reprogramadas) ou ficam atrasadas. Grava em lotes com
+    bulk_create, sem passar pelos sinais, e no fim reconstrói os resumos
+    mensais. `progresso`, se informado, recebe (vendas gravadas, total).
+    Retorna as quantidades criadas.
+    """
+    from .models import Consultor, Cliente, ExecucaoRotina, Venda
+
+    hoje = hoje or datetime.date.today()
+    clientes = clientes or max(1, vendas // 2)
+    if Venda.objects.filter(numero_proposta__startswith=f'{prefixo}-').exists():
+        raise ValueError(f'Já existem vendas com o prefixo {prefixo}; use outro prefixo ou um banco vazio.')
+
+    rng = random.Random(semente)
+    with transaction.atomic():
+        planos = _criar_planos(rng, prefixo, operadoras)
+        ids_consultores = _criar_pessoas(Consultor, 'consultor', rng, consultores, tamanho_lote, 'consultores.exemplo.com')
+        ids_clientes = _criar_pessoas(Cliente, 'cliente', rng, clientes, tamanho_lote, 'clientes.exemplo.com')
+
+    tabela = tabela_de_planos()
+    parcelas = 0
+    for inicio in range(0, vendas, tamanho_lote):
+        quantidade = min(tamanho_lote, vendas - inicio)
+        with transaction.atomic():
+            parcelas += _criar_lote_de_vendas(
+                rng, inicio, quantidade, prefixo, hoje, meses, planos, ids_consultores, ids_clientes, tabela,
+            )
+        if progresso:
+            progresso(inicio + quantidade, vendas)
+
+    # Status gravados já refletem `hoje`: a varredura continua a partir daqui
+    ExecucaoRotina.objects.update_or_create(nome=ROTINA_VARREDURA, defaults={'ultima_data': hoje})
+    reconstruir_resumos(hoje)
+    invalidar_respostas()
+    return {
+        'planos': len(planos),
+        'consultores': len(ids_consultores),
+        'clientes': len(ids_clientes),
+        'vendas': vendas,
+        'parcelas': parcelas,
+    }
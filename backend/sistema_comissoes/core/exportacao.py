@@ -0,0 +1,175 @@
+import csv
+import datetime
+import itertools
+import tempfile
+from decimal import Decimal
+
+from django.http import FileResponse, StreamingHttpResponse
+
+from .calculo import CENTAVOS
+from .models import ControleDeRecebimento, Venda, expressao_valor_liquido
+
+# Colunas exportadas: título -> campo (ou expressão) do values_list, com os relacionados em JOIN
+COLUNAS_VENDAS = {
+    'id': 'id',
+    'numero_proposta': 'numero_proposta',
+    'cliente': 'cliente__nome',
+    'consultor': 'consultor__nome',
+    'operadora': 'plano__operadora',
+    'tipo': 'plano__tipo',
+    'valor_plano': 'valor_plano',
+    'desconto_consultor': 'desconto_consultor',
+    'valor_liquido': expressao_valor_liquido(),
+    'data_venda': 'data_venda',
+    'data_vigencia': 'data_vigencia',
+    'data_vencimento': 'data_vencimento',
+}
+
+COLUNAS_RECEBIMENTOS = {
+    'id': 'id',
+    'numero_proposta': 'venda__numero_proposta',
+    'cliente': 'venda__cliente__nome',
+    'consultor': 'venda__consultor__nome',
+    'operadora': 'venda__plano__operadora',
+    'tipo': 'venda__plano__tipo',
+    'numero_parcela': 'parcela__numero_parcela',
+    'valor_parcela': 'valor_parcela',
+    'data_prevista_recebimento': 'data_prevista_recebimento',
+    'data_recebimento': 'data_recebimento',
+    'status': 'status',
+    'numero_extrato': 'numero_extrato',
+}
+
+# Exportações disponíveis para as tarefas em segundo plano: nome -> (modelo, colunas)
+EXPORTACOES = {
+    'vendas': (Venda, COLUNAS_VENDAS),
+    'recebimentos': (ControleDeRecebimento, COLUNAS_RECEBIMENTOS),
+}
+
+FORMATOS_EXPORTACAO = ('csv', 'xlsx')
+TIPOS_CONTEUDO = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+# Linhas lidas do banco por vez
+TAMANHO_LOTE_EXPORTACAO = 2000
+
+# Acima deste tamanho a planilha XLSX em montagem vai para o disco
+LIMITE_XLSX_MEMORIA = 8 * 1024 * 1024
+
+
+class _Eco:
+    """Pseudo-arquivo para o csv.writer: devolve a linha formatada em vez de gravá-la."""
+
+    def write(self, valor):
+        return valor
+
+
+def linhas_exportacao(queryset, colunas, tamanho_lote=TAMANHO_LOTE_EXPORTACAO, arquivados=None):
+    """
+    Tuplas no formato das colunas, lidas em blocos sem instanciar os modelos.
+
+    `arquivados` é um queryset da tabela de arquivo, com os mesmos nomes de
+    campo; suas linhas vêm depois das linhas em operação.
+    """
+    if arquivados is not None:
+        return itertools.chain(
+            linhas_exportacao(queryset, colunas, tamanho_lote), linhas_exportacao(arquivados, colunas, tamanho_lote),
+        )
+    diretos = {titulo: campo for titulo, campo in colunas.items() if isinstance(campo, str)}
+    anotados = {f'_exportacao_{titulo}': expressao for titulo, expressao in colunas.items() if not isinstance(expressao, str)}
+    campos = [diretos.get(titulo) or f'_exportacao_{titulo}' for titulo in colunas]
+    if anotados:
+        queryset = queryset.annotate(**anotados)
+    return queryset.values_list(*campos).iterator(chunk_size=tamanho_lote)
+
+
+def _valor_csv(valor):
+    if valor is None:
+        return ''
+    if isinstance(valor, (datetime.date, datetime.datetime)):
+        return valor.isoformat()
+    if isinstance(valor, Decimal):
+        # Expressões calculadas no SQLite voltam sem as casas decimais
+        return valor.quantize(CENTAVOS)
+    return valor
+
+
+def gerar_csv(colunas, linhas):
+    """Gera o CSV linha a linha (UTF-8 com BOM e ';', como o Excel em português espera)."""
+    escritor = csv.writer(_Eco(), delimiter=';')
+    yield '\ufeff' + escritor.writerow(list(colunas))
+    for linha in linhas:
+        yield escritor.writerow([_valor_csv(valor) for valor in linha])
+
+
+def gerar_xlsx(colunas, linhas, arquivo=None):
+    """
+    Monta a planilha XLSX em modo write_only e devolve o arquivo posicionado no início.
+
+    O XLSX é um zip e só pode ser enviado depois de fechado; sem `arquivo`, a
+    planilha é gravada em um arquivo temporário que passa para o disco quando
+    cresce.
+    """
+    try:
+        from openpyxl import Workbook
+    except ImportError:
+        raise ValueError('A exportação em XLSX requer o pacote openpyxl.')
+    planilha = Workbook(write_only=True)
+    aba = planilha.create_sheet()
+    aba.append(list(colunas))
+    for linha in linhas:
+        aba.append(list(linha))
+    if arquivo is None:
+        arquivo = tempfile.SpooledTemporaryFile(max_size=LIMITE_XLSX_MEMORIA)
+    planilha.save(arquivo)
+    arquivo.seek(0)
+    return arquivo
+
+
+def validar_formato(formato):
+    if formato not in FORMATOS_EXPORTACAO:
+        raise ValueError(f"Formato deve ser {' ou '.join(FORMATOS_EXPORTACAO)}.")
+
+
+def nome_arquivo_exportacao(nome, formato):
+    return f'{nome}-{datetime.date.today():%Y%m%d}.{formato}'
+
+
+def tipo_conteudo_exportacao(formato):
+    return TIPOS_CONTEUDO[formato]
+
+
+def resposta_exportacao(queryset, colunas, nome, formato='csv', arquivados=None):
+    """Resposta HTTP com a exportação do queryset; levanta ValueError para formato inválido."""
+    validar_formato(formato)
+    nome_arquivo = nome_arquivo_exportacao(nome, formato)
+    linhas = linhas_exportacao(queryset, colunas, arquivados=arquivados)
+    if formato == 'xlsx':
+        return FileResponse(
+            gerar_xlsx(colunas, linhas), as_attachment=True, filename=nome_arquivo,
+            content_type=tipo_conteudo_exportacao(formato),
+        )
+    resposta = StreamingHttpResponse(gerar_csv(colunas, linhas), content_type=tipo_conteudo_exportacao(formato))
+    resposta['Content-Disposition'] = f'attachment; filename="{nome_arquivo}"'
+    return resposta
+
+
+def gravar_exportacao(destino, queryset, colunas, formato='csv', filtrar_linhas=None, arquivados=None):
+    """
+    Grava a exportação completa no arquivo binário `destino`, para as tarefas em segundo plano.
+
+    As linhas vão para o arquivo à medida que são lidas, sem montar a
+    exportação em memória. `filtrar_linhas`, se informado, envolve o iterador
+    de linhas (por exemplo para registrar o progresso).
+    """
+    validar_formato(formato)
+    linhas = linhas_exportacao(queryset, colunas, arquivados=arquivados)
+    if filtrar_linhas is not None:
+        linhas = filtrar_linhas(linhas)
+    if formato == 'xlsx':
+        gerar_xlsx(colunas, linhas, destino)
+        return
+    for trecho in gerar_csv(colunas, linhas):
+        destino.write(trecho.encode('utf-8'))
@@ -0,0 +1,48 @@
+import functools
+import operator
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+
+class FiltroPorParametros(BaseFilterBackend):
+    """
+    Aplica os filtros declarados no atributo `filtros` da view.
+
+    `filtros` mapeia o parâmetro da query string para o lookup do ORM, por
+    exemplo {'consultor': 'consultor_id', 'data_venda_inicio': 'data_venda__gte'}.
+    Lookups terminados em __in aceitam valores separados por vírgula, e
+    lookups separados por '|' combinam as condições com OR.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        return aplicar_filtros(request.query_params, queryset, getattr(view, 'filtros', {}))
+
+
+def aplicar_filtros(parametros, queryset, filtros):
+    """
+    Filtra o queryset pelos `parametros` da query string mapeados em `filtros`.
+
+    `parametros` é o request.query_params das views DRF ou o request.GET das
+    views assíncronas.
+    """
+    condicoes = {}
+    alternativas = []
+    for parametro, lookup in filtros.items():
+        valor = parametros.get(parametro)
+        if valor in (None, ''):
+            continue
+        if '|' in lookup:
+            alternativas.append(functools.reduce(operator.or_, (Q(**{item: valor}) for item in lookup.split('|'))))
+            continue
+        if lookup.endswith('__in'):
+            valor = [item.strip() for item in valor.split(',') if item.strip()]
+        condicoes[lookup] = valor
+    if not condicoes and not alternativas:
+        return queryset
+    try:
+        return queryset.filter(*alternativas, **condicoes)
+    except (DjangoValidationError, ValueError, TypeError) as exc:
+        raise ValidationError({'detail': f'Filtro inválido: {exc}'})
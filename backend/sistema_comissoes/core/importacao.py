@@ -0,0 +1,256 @@
+import datetime
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+
+from .alteracoes import CONTROLE, VENDA, registrar_depois_do_commit
+from .busca import indexar_depois_do_commit
+from .cache_respostas import invalidar_respostas
+from .conciliacao import converter_data, converter_decimal
+from .calculo import CENTAVOS, calcular_lote
+from .cronograma import dados_da_venda, dados_do_plano
+from .planos import tabela_de_planos
+from .resumos import mes_de, recalcular_resumos
+
+CAMPOS_OBRIGATORIOS = (
+    'numero_proposta', 'cliente', 'consultor', 'operadora', 'tipo', 'valor_plano', 'data_vigencia', 'data_vencimento',
+)
+
+# Limite dos DecimalField(max_digits=10, decimal_places=2) da venda
+VALOR_MAXIMO = Decimal('100000000')
+
+
+def ler_xlsx(arquivo):
+    """
+    Abre uma planilha XLSX e devolve um iterador de dicionários por linha.
+
+    A primeira linha da planilha ativa é o cabeçalho. A leitura usa o modo
+    read_only do openpyxl, que carrega as linhas sob demanda. Levanta
+    ValueError se o openpyxl não estiver instalado ou o arquivo for inválido.
+    """
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ValueError('A importação de XLSX requer o pacote openpyxl.')
+    try:
+        planilha = load_workbook(arquivo, read_only=True, data_only=True).active
+    except Exception as exc:
+        raise ValueError(f'Planilha XLSX inválida: {exc}')
+
+    def linhas():
+        valores = planilha.iter_rows(values_only=True)
+        cabecalho = [str(campo).strip() if campo is not None else '' for campo in next(valores, ())]
+        for linha in valores:
+            if any(valor not in (None, '') for valor in linha):
+                yield dict(zip(cabecalho, linha))
+
+    return linhas()
+
+
+def _texto(valor):
+    return '' if valor is None else str(valor).strip()
+
+
+def normalizar_venda(linha):
+    """Converte uma linha bruta da planilha de vendas; levanta ValueError se for inválida."""
+    faltando = [campo for campo in CAMPOS_OBRIGATORIOS if _texto(linha.get(campo)) == '']
+    if faltando:
+        raise ValueError(f"Campos obrigatórios ausentes: {', '.join(faltando)}.")
+    try:
+        dados = {
+            'numero_proposta': _texto(linha['numero_proposta']),
+            'cliente': _texto(linha['cliente']),
+            'cliente_telefone': _texto(linha.get('cliente_telefone')) or None,
+            'cliente_email': _texto(linha.get('cliente_email')) or None,
+            'consultor': _texto(linha['consultor']),
+            'operadora': _texto(linha['operadora']),
+            'tipo': _texto(linha['tipo']),
+            'valor_plano': converter_decimal(linha['valor_plano']).quantize(CENTAVOS),
+            'desconto_consultor': converter_decimal(linha.get('desconto_consultor') or 0).quantize(CENTAVOS),
+            'data_venda': converter_data(linha['data_venda']) if _texto(linha.get('data_venda')) else datetime.date.today(),
+            'data_vigencia': converter_data(linha['data_vigencia']),
+            'data_vencimento': converter_data(linha['data_vencimento']),
+        }
+    except (TypeError, ValueError, InvalidOperation) as exc:
+        raise ValueError(f'Valor inválido: {exc}')
+
+    if len(dados['numero_proposta']) > 100:
+        raise ValueError('numero_proposta deve ter no máximo 100 caracteres.')
+    for campo in ('valor_plano', 'desconto_consultor'):
+        if not Decimal('0') <= dados[campo] < VALOR_MAXIMO:
+            raise ValueError(f'{campo} fora do intervalo permitido.')
+    if dados['cliente_email']:
+        try:
+            validate_email(dados['cliente_email'])
+        except ValidationError:
+            raise ValueError('cliente_email inválido.')
+    return dados
+
+
+def carregar_referencias():
+    """
+    Monta os mapas de consulta usados durante toda a importação.
+
+    Planos (com as parcelas já ordenadas) vêm da tabela em cache, consultores
+    são lidos uma única vez e clientes são resolvidos por lote e acumulados em
+    `clientes`.
+    """
+    from .models import Consultor
+
+    tabela = tabela_de_planos()
+    planos = {(plano.operadora, plano.tipo): plano for plano, _ in tabela.values()}
+    parcelas = {plano_id: parcelas for plano_id, (_, parcelas) in tabela.items()}
+    # Ordenado por -id: com nomes repetidos prevalece o cadastro mais antigo
+    consultores = dict(Consultor.objects.order_by('-id').values_list('nome', 'id'))
+    return {'planos': planos, 'parcelas': parcelas, 'consultores': consultores, 'clientes': {}}
+
+
+def importar_vendas(linhas, tamanho_lote=500):
+    """
+    Importa vendas em lote a partir de linhas já lidas de um CSV ou XLSX.
+
+    Cada lote resolve clientes com uma consulta, cria os que faltam com um
+    bulk_create e grava vendas e cronogramas com um bulk_create cada, em uma
+    transação própria. Linhas inválidas entram no relatório sem interromper a
+    importação. Gera os erros por linha e o progresso de cada lote, seguidos de
+    um resumo.
+    """
+    resumo = {'importadas': 0, 'erros': 0, 'clientes_criados': 0}
+    referencias = carregar_referencias()
+    propostas_vistas = set()
+    lote = []
+    numero_lote = 0
+    for numero_linha, linha in enumerate(linhas, start=1):
+        lote.append((numero_linha, linha))
+        if len(lote) >= tamanho_lote:
+            numero_lote += 1
+            yield from _importar_lote(numero_lote, lote, referencias, propostas_vistas, resumo)
+            lote = []
+    if lote:
+        numero_lote += 1
+        yield from _importar_lote(numero_lote, lote, referencias, propostas_vistas, resumo)
+    yield {'resumo': resumo}
+
+
+def _resolver_clientes(validas, clientes):
+    """Preenche o mapa nome -> id dos clientes do lote, criando em bulk os inexistentes."""
+    from .models import Cliente
+
+    faltando = {}
+    for _, dados in validas:
+        if dados['cliente'] not in clientes:
+            faltando.setdefault(dados['cliente'], dados)
+    if not faltando:
+        return 0
+
+    clientes.update(Cliente.objects.filter(nome__in=faltando).order_by('-id').values_list('nome', 'id'))
+    novos = [
+        Cliente(nome=nome, telefone=dados['cliente_telefone'], email=dados['cliente_email'])
+        for nome, dados in faltando.items() if nome not in clientes
+    ]
+    Cliente.objects.bulk_create(novos)
+    indexar_depois_do_commit('cliente', [cliente.pk for cliente in novos])
+    clientes.update((cliente.nome, cliente.pk) for cliente in novos)
+    return len(novos)
+
+
+def _importar_lote(numero_lote, lote, referencias, propostas_vistas, resumo):
+    from .models import ControleDeRecebimento, Venda, VendaArquivada
+
+    erros = []
+    validas = []
+    for numero_linha, linha in lote:
+        try:
+            validas.append((numero_linha, normalizar_venda(linha)))
+        except ValueError as exc:
+            erros.append({'linha': numero_linha, 'erro': str(exc)})
+
+    propostas = [dados['numero_proposta'] for _, dados in validas]
+    existentes = set(Venda.objects.filter(numero_proposta__in=propostas).values_list('numero_proposta', flat=True))
+    existentes.update(VendaArquivada.objects.filter(numero_proposta__in=propostas).values_list('numero_proposta', flat=True))
+    resolvidas = []
+    for numero_linha, dados in validas:
+        erro = None
+        plano = referencias['planos'].get((dados['operadora'], dados['tipo']))
+        if dados['numero_proposta'] in existentes:
+            erro = 'Proposta já cadastrada.'
+        elif dados['numero_proposta'] in propostas_vistas:
+            erro = 'Proposta repetida no arquivo.'
+        elif plano is None:
+            erro = f"Plano não encontrado: {dados['operadora']} - {dados['tipo']}."
+        elif dados['consultor'] not in referencias['consultores']:
+            erro = f"Consultor não encontrado: {dados['consultor']}."
+        if erro:
+            erros.append({'linha': numero_linha, 'numero_proposta': dados['numero_proposta'], 'erro': erro})
+            continue
+        propostas_vistas.add(dados['numero_proposta'])
+        resolvidas.append((numero_linha, dados, plano))
+
+    importadas = 0
+    if resolvidas:
+        clientes_conhecidos = dict(referencias['clientes'])
+        try:
+            with transaction.atomic():
+                clientes_criados = _resolver_clientes(
+                    [(n, dados) for n, dados, _ in resolvidas], referencias['clientes']
+                )
+                vendas = [
+                    Venda(
+                        numero_proposta=dados['numero_proposta'],
+                        cliente_id=referencias['clientes'][dados['cliente']],
+                        plano=plano,
+                        consultor_id=referencias['consultores'][dados['consultor']],
+                        valor_plano=dados['valor_plano'],
+                        desconto_consultor=dados['desconto_consultor'],
+                        data_venda=dados['data_venda'],
+                        data_vigencia=dados['data_vigencia'],
+                        data_vencimento=dados['data_vencimento'],
+                    )
+                    for _, dados, plano in resolvidas
+                ]
+                # bulk_create não chama Venda.save: o cronograma e o resumo mensal são gravados aqui
+                Venda.objects.bulk_create(vendas)
+                controles = []
+                chaves = set()
+                vendas_por_plano = {}
+                for venda in vendas:
+                    vendas_por_plano.setdefault(venda.plano_id, []).append(venda)
+                for plano_id, vendas_do_plano in vendas_por_plano.items():
+                    # Cronogramas calculados em lote para todas as vendas do plano
+                    parcelas = referencias['parcelas'].get(plano_id, [])
+                    calculados = calcular_lote(
+                        [dados_da_venda(venda) for venda in vendas_do_plano],
+                        dados_do_plano(vendas_do_plano[0].plano, parcelas),
+                    )
+                    for venda, cronograma in zip(vendas_do_plano, calculados):
+                        for parcela, item in zip(parcelas, cronograma):
+                            controles.append(ControleDeRecebimento(
+                                venda=venda,
+                                parcela=parcela,
+                                valor_parcela=item.valor_parcela,
+                                data_prevista_recebimento=item.data_prevista_recebimento,
+                                status='Não Recebido',
+                            ))
+                            chaves.add((venda.consultor_id, venda.plano.operadora, mes_de(item.data_prevista_recebimento)))
+                ControleDeRecebimento.objects.bulk_create(controles)
+                recalcular_resumos(chaves)
+                invalidar_respostas()
+                indexar_depois_do_commit('venda', [venda.pk for venda in vendas])
+                registrar_depois_do_commit(VENDA, [venda.pk for venda in vendas])
+                registrar_depois_do_commit(CONTROLE, [controle.pk for controle in controles])
+            importadas = len(vendas)
+            resumo['clientes_criados'] += clientes_criados
+        except IntegrityError as exc:
+            # Conflito gravado por outro processo durante o lote: nenhuma linha do lote é importada
+            referencias['clientes'] = clientes_conhecidos
+            for numero_linha, dados, _ in resolvidas:
+                propostas_vistas.discard(dados['numero_proposta'])
+                erros.append({'linha': numero_linha, 'numero_proposta': dados['numero_proposta'], 'erro': f'Erro ao gravar o lote: {exc}'})
+
+    resumo['importadas'] += importadas
+    resumo['erros'] += len(erros)
+    erros.sort(key=lambda item: item['linha'])
+    yield from erros
+    yield {'lote': numero_lote, 'ate_linha': lote[-1][0], 'importadas': importadas}
@@ -0,0 +1,234 @@
+"""
+Instrumentação de desempenho por requisição.
+
+O middleware mede, para cada requisição, o tempo total, a quantidade de
+consultas e o tempo gasto em SQL, além dos trechos marcados com `medido`
+(Venda.save e os sinais de ControleDeRecebimento). Os números vão para o
+cabeçalho Server-Timing, para um log estruturado (uma linha JSON por
+requisição) e para as estatísticas por rota deste processo, expostas em
+/api/metricas/rotas/. Consultas acima de LIMITE_CONSULTA_LENTA_MS são
+registradas com o trecho do código que as originou.
+
+A contagem de consultas vem de um execute_wrapper instalado em cada conexão,
+que soma na medição da requisição guardada em um ContextVar; o ORM assíncrono
+roda as consultas em outra thread com uma cópia do contexto, de modo que o
+middleware atende WSGI e ASGI sem adaptar a cadeia para síncrona.
+"""
+import contextvars
+import functools
+import json
+import logging
+import math
+import os
+import threading
+import time
+import traceback
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+logger = logging.getLogger(__name__)
+
+_medicao_atual = contextvars.ContextVar('medicao_atual', default=None)
+
+_estatisticas = defaultdict(lambda: deque(maxlen=getattr(settings, 'INSTRUMENTACAO_AMOSTRAS', 1000)))
+_trava_estatisticas = threading.Lock()
+
+
+class Medicao:
+    """Números acumulados durante uma requisição."""
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.consultas = 0
+        self.tempo_sql = 0.0
+        self.trechos = {}
+
+    def registrar_trecho(self, nome, duracao):
+        total, vezes = self.trechos.get(nome, (0.0, 0))
+        self.trechos[nome] = (total + duracao, vezes + 1)
+
+
+def percentil(valores_ordenados, fracao):
+    """Percentil pelo método do posto mais próximo; `valores_ordenados` não pode ser vazio."""
+    posicao = min(len(valores_ordenados), max(1, math.ceil(fracao * len(valores_ordenados)))) - 1
+    return valores_ordenados[posicao]
+
+
+def _origem_da_consulta():
+    """Últimos quadros da pilha dentro do projeto, do mais externo para o mais interno."""
+    raiz = str(settings.BASE_DIR)
+    quadros = [
+        quadro for quadro in traceback.extract_stack()
+        if quadro.filename.startswith(raiz) and 'site-packages' not in quadro.filename
+        and quadro.filename != __file__
+    ]
+    return [f'{os.path.relpath(quadro.filename, raiz)}:{quadro.lineno} em {quadro.name}' for quadro in quadros[-5:]]
+
+
+def _registrar_consulta(execute, sql, params, many, context):
+    medicao = _medicao_atual.get()
+    if medicao is None:
+        return execute(sql, params, many, context)
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duracao = time.perf_counter() - inicio
+        medicao.consultas += 1
+        medicao.tempo_sql += duracao
+        if duracao * 1000 >= getattr(settings, 'LIMITE_CONSULTA_LENTA_MS', 100):
+            logger.warning(json.dumps({
+                'evento': 'consulta_lenta',
+                'duracao_ms': round(duracao * 1000, 2),
+                'sql': sql,
+                'banco': context['connection'].alias,
+                'origem': _origem_da_consulta(),
+            }, ensure_ascii=False))
+
+
+def _instalar(conexao):
+    if _registrar_consulta not in conexao.execute_wrappers:
+        conexao.execute_wrappers.append(_registrar_consulta)
+
+
+def _instalar_na_nova_conexao(sender, connection, **kwargs):
+    _instalar(connection)
+
+
+connection_created.connect(_instalar_na_nova_conexao, dispatch_uid='instrumentacao_consultas')
+for _conexao in connections.all(initialized_only=True):
+    _instalar(_conexao)
+
+
+@contextmanager
+def medir(nome):
+    """Soma a duração do bloco ao trecho `nome` da requisição em andamento."""
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        medicao = _medicao_atual.get()
+        if medicao is not None:
+            medicao.registrar_trecho(nome, time.perf_counter() - inicio)
+
+
+def medido(nome):
+    """Decorador equivalente a `medir(nome)` em torno da função."""
+    def decorador(funcao):
+        @functools.wraps(funcao)
+        def wrapper(*args, **kwargs):
+            with medir(nome):
+                return funcao(*args, **kwargs)
+        return wrapper
+    return decorador
+
+
+def estatisticas_por_rota():
+    """Latência (p50/p95/máx.) e consultas por rota, a partir das amostras recentes deste processo."""
+    with _trava_estatisticas:
+        amostras = {rota: list(valores) for rota, valores in _estatisticas.items()}
+    resultado = []
+    for rota, valores in sorted(amostras.items()):
+        duracoes = sorted(valor[0] for valor in valores)
+        consultas = [valor[1] for valor in valores]
+        resultado.append({
+            'rota': rota,
+            'amostras': len(valores),
+            'p50_ms': round(percentil(duracoes, 0.50), 2),
+            'p95_ms': round(percentil(duracoes, 0.95), 2),
+            'max_ms': round(duracoes[-1], 2),
+            'consultas_media': round(sum(consultas) / len(consultas), 2),
+            'consultas_max': max(consultas),
+            'sql_ms_medio': round(sum(valor[2] for valor in valores) / len(valores), 2),
+        })
+    return resultado
+
+
+def limpar_estatisticas():
+    with _trava_estatisticas:
+        _estatisticas.clear()
+
+
+def _nome_da_rota(request):
+    correspondencia = getattr(request, 'resolver_match', None)
+    # Rotas do router DRF são regex: 'api/venda/$' vira 'api/venda/'
+    rota = correspondencia.route.rstrip('$') if correspondencia else 'nao_resolvida'
+    return f'{request.method} /{rota}'
+
+
+def _server_timing(total_ms, medicao):
+    partes = [
+        f'total;dur={total_ms:.1f}',
+        f'db;dur={medicao.tempo_sql * 1000:.1f};desc="{medicao.consultas} consultas"',
+    ]
+    for nome, (duracao, vezes) in medicao.trechos.items():
+        partes.append(f'{nome};dur={duracao * 1000:.1f};desc="{vezes}x"')
+    return ', '.join(partes)
+
+
+class InstrumentacaoMiddleware:
+    """Mede cada requisição; desligado com INSTRUMENTACAO_ATIVA=False."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.assincrono = iscoroutinefunction(get_response)
+        if self.assincrono:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.assincrono:
+            return self.__acall__(request)
+        if not getattr(settings, 'INSTRUMENTACAO_ATIVA', True):
+            return self.get_response(request)
+
+        medicao = Medicao()
+        token = _medicao_atual.set(medicao)
+        try:
+            response = self.get_response(request)
+        finally:
+            _medicao_atual.reset(token)
+        return self._concluir(request, response, medicao)
+
+    async def __acall__(self, request):
+        if not getattr(settings, 'INSTRUMENTACAO_ATIVA', True):
+            return await self.get_response(request)
+
+        medicao = Medicao()
+        token = _medicao_atual.set(medicao)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _medicao_atual.reset(token)
+        return self._concluir(request, response, medicao)
+
+    def _concluir(self, request, response, medicao):
+        total_ms = (time.perf_counter() - medicao.inicio) * 1000
+        sql_ms = medicao.tempo_sql * 1000
+        rota = _nome_da_rota(request)
+        response['Server-Timing'] = _server_timing(total_ms, medicao)
+        with _trava_estatisticas:
+            _estatisticas[rota].append((total_ms, medicao.consultas, sql_ms))
+
+        lenta = total_ms >= getattr(settings, 'LIMITE_REQUISICAO_LENTA_MS', 1000)
+        nivel = logging.WARNING if lenta else logging.INFO
+        if logger.isEnabledFor(nivel):
+            logger.log(nivel, json.dumps({
+                'evento': 'requisicao',
+                'metodo': request.method,
+                'caminho': request.path,
+                'rota': rota,
+                'status': response.status_code,
+                'duracao_ms': round(total_ms, 2),
+                'consultas': medicao.consultas,
+                'sql_ms': round(sql_ms, 2),
+                'trechos': {nome: round(duracao * 1000, 2) for nome, (duracao, _) in medicao.trechos.items()},
+            }, ensure_ascii=False))
+        return response
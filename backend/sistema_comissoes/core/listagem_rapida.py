@@ -0,0 +1,76 @@
+from rest_framework.response import Response
+
+from .serializers import campos_solicitados
+
+
+def linhas_rapidas(queryset, campos):
+    """
+    Prepara a leitura da representação `campos` direto do banco.
+
+    `campos` mapeia cada chave da representação para um campo do ORM, uma
+    expressão ou um dicionário com os campos de um objeto aninhado. Retorna o
+    queryset de tuplas nomeadas (paginável pela paginação por cursor, que lê
+    os campos de ordenação pelo nome) e a função que converte uma lista dessas
+    tuplas nos dicionários da resposta.
+    """
+    colunas = []
+    anotados = {}
+
+    def coluna(chave, origem):
+        if not isinstance(origem, str):
+            nome = f'rapido_{chave}'
+            anotados[nome] = origem
+            origem = nome
+        if origem not in colunas:
+            colunas.append(origem)
+        return colunas.index(origem)
+
+    estrutura = []
+    for chave, origem in campos.items():
+        if isinstance(origem, dict):
+            estrutura.append((chave, tuple((sub, coluna(f'{chave}_{sub}', campo)) for sub, campo in origem.items())))
+        else:
+            estrutura.append((chave, coluna(chave, origem)))
+
+    if anotados:
+        queryset = queryset.annotate(**anotados)
+    linhas = queryset.values_list(*colunas, named=True)
+
+    chaves = tuple(campos)
+    if all(indice == posicao for posicao, (_, indice) in enumerate(estrutura)) and len(colunas) == len(chaves):
+        # Representação plana na mesma ordem das colunas
+        def montar(tuplas):
+            return [dict(zip(chaves, tupla)) for tupla in tuplas]
+    else:
+        def montar(tuplas):
+            return [
+                {
+                    chave: {sub: tupla[j] for sub, j in indice} if isinstance(indice, tuple) else tupla[indice]
+                    for chave, indice in estrutura
+                }
+                for tupla in tuplas
+            ]
+    return linhas, montar
+
+
+class ListagemRapidaMixin:
+    """
+    Listagem somente leitura montada a partir de values_list.
+
+    `campos_listagem` reproduz a representação padrão da listagem (ver
+    linhas_rapidas) sem instanciar modelos nem passar pelos campos do
+    serializer, que seguem valendo para detalhe, escrita e ?fields=.
+    """
+    campos_listagem = None
+
+    def usa_listagem_rapida(self):
+        return self.campos_listagem is not None and not campos_solicitados(self.request)
+
+    def list(self, request, *args, **kwargs):
+        if not self.usa_listagem_rapida():
+            return super().list(request, *args, **kwargs)
+        linhas, montar = linhas_rapidas(self.filter_queryset(self.get_queryset()), self.campos_listagem)
+        pagina = self.paginate_queryset(linhas)
+        if pagina is None:
+            return Response(montar(linhas))
+        return self.get_paginated_response(montar(pagina))
@@ -0,0 +1,36 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.arquivamento import TAMANHO_LOTE_ARQUIVAMENTO, arquivar_vendas, data_limite
+
+
+class Command(BaseCommand):
+    help = (
+        'Move para as tabelas de arquivo as vendas com todas as parcelas recebidas há mais de '
+        'ARQUIVO_HORIZONTE_DIAS (ou --dias), em lotes com transação própria.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, help='Horizonte, em dias, desde o último recebimento da venda.')
+        parser.add_argument('--hoje', type=date.fromisoformat, help='Data de referência (AAAA-MM-DD); padrão: hoje.')
+        parser.add_argument('--tamanho-lote', type=int, default=TAMANHO_LOTE_ARQUIVAMENTO, help='Vendas examinadas por transação.')
+        parser.add_argument('--simular', action='store_true', help='Apenas conta as vendas que seriam arquivadas.')
+
+    def handle(self, *args, **options):
+        if options['tamanho_lote'] < 1 or (options['dias'] is not None and options['dias'] < 0):
+            raise CommandError('--tamanho-lote deve ser positivo e --dias não pode ser negativo.')
+
+        def progresso(examinadas, arquivadas):
+            if examinadas % (options['tamanho_lote'] * 100) == 0:
+                self.stdout.write(f'{examinadas} vendas examinadas, {arquivadas} arquivada(s)')
+
+        totais = arquivar_vendas(
+            hoje=options['hoje'], horizonte_dias=options['dias'], tamanho_lote=options['tamanho_lote'],
+            simular=options['simular'], progresso=progresso,
+        )
+        limite = data_limite(options['hoje'], options['dias'])
+        verbo = 'seriam arquivada(s)' if options['simular'] else 'arquivada(s)'
+        self.stdout.write(self.style.SUCCESS(
+            f"{totais['vendas']} venda(s) e {totais['parcelas']} parcela(s) quitadas antes de {limite:%d/%m/%Y} {verbo}."
+        ))
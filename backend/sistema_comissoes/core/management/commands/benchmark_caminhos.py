@@ -0,0 +1,227 @@
+import json
+import random
+import statistics
+import subprocess
+import time
+import uuid
+from datetime import date, datetime
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APIClient
+
+from core.instrumentacao import percentil
+from core.models import Cliente, Consultor, ControleDeRecebimento, Plano, Venda
+
+# Cenários medidos, na ordem de execução; as gravações são desfeitas a cada repetição
+CENARIOS = (
+    'criar_venda',
+    'marcar_recebida',
+    'parcelas_atrasadas',
+    'listar_vendas',
+    'listar_recebimentos',
+    'relatorio_comissoes',
+    'relatorio_comissoes_bruto',
+    'relatorio_vendas',
+    'dashboard',
+    'projecao',
+)
+LEITURAS = {
+    'parcelas_atrasadas': '/api/parcelas-atrasadas/',
+    'listar_vendas': '/api/venda/',
+    'listar_recebimentos': '/api/controlederecebimento/',
+    'relatorio_comissoes': '/api/relatorios/comissoes/?agrupar=consultor,mes',
+    'relatorio_comissoes_bruto': '/api/relatorios/comissoes/?agrupar=consultor,mes&fonte=bruto',
+    'relatorio_vendas': '/api/relatorios/vendas/?agrupar=operadora,mes',
+    'dashboard': '/api/dashboard/comissoes/',
+    'projecao': '/api/projecoes/comissoes/?agrupar=operadora',
+}
+# Amostra de registros sorteados para as gravações
+TAMANHO_AMOSTRA = 1000
+VERSAO_FORMATO = 1
+
+
+def _commit_atual():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def comparar(base, atual, tolerancia):
+    """
+    Compara dois resultados do benchmark, cenário a cenário.
+
+    Há regressão quando o p50 passa de `tolerancia` (fração) acima do da base
+    ou quando o cenário passa a fazer mais consultas.
+    """
+    comparacoes = []
+    for nome, medido in atual['cenarios'].items():
+        anterior = base.get('cenarios', {}).get(nome)
+        if anterior is None:
+            continue
+        variacao = (medido['p50_ms'] - anterior['p50_ms']) / anterior['p50_ms'] if anterior['p50_ms'] else 0.0
+        comparacoes.append({
+            'cenario': nome,
+            'p50_base_ms': anterior['p50_ms'],
+            'p50_ms': medido['p50_ms'],
+            'variacao': round(variacao, 4),
+            'consultas_base': anterior['consultas'],
+            'consultas': medido['consultas'],
+            'regressao': variacao > tolerancia or medido['consultas'] > anterior['consultas'],
+        })
+    return comparacoes
+
+
+class Command(BaseCommand):
+    help = (
+        'Mede os caminhos principais (criação de venda, recebimento com reprogramação, parcelas '
+        'atrasadas, listagens e agregações) sobre os dados do banco, em processo e sem cache de '
+        'páginas. O resultado em JSON pode ser comparado com o de outro commit via --comparar.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeticoes', type=int, default=20, help='Medições por cenário.')
+        parser.add_argument('--aquecimento', type=int, default=2, help='Execuções descartadas antes de cada cenário.')
+        parser.add_argument('--cenarios', default=','.join(CENARIOS), help=f"Cenários, separados por vírgula ({', '.join(CENARIOS)}).")
+        parser.add_argument('--semente', type=int, default=42, help='Semente do sorteio dos registros usados nas gravações.')
+        parser.add_argument('--saida', help='Arquivo onde gravar o resultado em JSON.')
+        parser.add_argument('--comparar', help='Resultado JSON de referência (por exemplo, de outro commit).')
+        parser.add_argument('--tolerancia', type=float, default=0.2, help='Aumento relativo do p50 tolerado na comparação.')
+        parser.add_argument('--json', action='store_true', help='Imprime o resultado como JSON.')
+
+    def handle(self, *args, **options):
+        cenarios = [nome.strip() for nome in options['cenarios'].split(',') if nome.strip()]
+        invalidos = [nome for nome in cenarios if nome not in CENARIOS]
+        if invalidos:
+            raise CommandError(f"Cenários inválidos: {', '.join(invalidos)}.")
+        if options['repeticoes'] < 1 or options['aquecimento'] < 0:
+            raise CommandError('--repeticoes deve ser positivo e --aquecimento não pode ser negativo.')
+        if not Venda.objects.exists():
+            raise CommandError('Não há vendas no banco; gere dados com o comando gerar_dados.')
+        base = None
+        if options['comparar']:
+            with open(options['comparar'], encoding='utf-8') as arquivo:
+                base = json.load(arquivo)
+
+        resultado = {
+            'formato': VERSAO_FORMATO,
+            'commit': _commit_atual(),
+            'executado_em': datetime.now().isoformat(timespec='seconds'),
+            'banco': connection.vendor,
+            'escala': {
+                'vendas': Venda.objects.count(),
+                'parcelas': ControleDeRecebimento.objects.count(),
+                'planos': Plano.objects.count(),
+                'consultores': Consultor.objects.count(),
+                'clientes': Cliente.objects.count(),
+            },
+            'repeticoes': options['repeticoes'],
+            'cenarios': self.medir(cenarios, options),
+        }
+
+        if options['saida']:
+            with open(options['saida'], 'w', encoding='utf-8') as arquivo:
+                json.dump(resultado, arquivo, indent=2, ensure_ascii=False)
+        comparacoes = comparar(base, resultado, options['tolerancia']) if base else []
+        if options['json']:
+            self.stdout.write(json.dumps({**resultado, 'comparacao': comparacoes} if base else resultado))
+        else:
+            self.imprimir(resultado, comparacoes)
+
+        regressoes = [comparacao['cenario'] for comparacao in comparacoes if comparacao['regressao']]
+        if regressoes:
+            raise CommandError(f"Regressão em relação a {options['comparar']}: {', '.join(regressoes)}.")
+
+    def medir(self, cenarios, options):
+        rng = random.Random(options['semente'])
+        # Tudo roda em uma transação desfeita ao final: o banco fica como estava
+        with transaction.atomic(), override_settings(
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+            CACHES={**settings.CACHES, 'benchmark': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}},
+            RESPOSTAS_CACHE='benchmark',
+            INSTRUMENTACAO_ATIVA=False,
+        ):
+            usuario = User.objects.create_user(f'benchmark-{uuid.uuid4().hex[:8]}', is_staff=True)
+            self.client = APIClient()
+            self.client.force_authenticate(usuario)
+            self.amostras = {
+                'clientes': self.amostra(Cliente.objects.all()),
+                'planos': self.amostra(Plano.objects.filter(parcela__isnull=False).distinct()),
+                'consultores': self.amostra(Consultor.objects.all()),
+                'abertas': self.amostra(ControleDeRecebimento.objects.exclude(status='Recebido')),
+            }
+            resultados = {}
+            for nome in cenarios:
+                for _ in range(options['aquecimento']):
+                    self.executar(nome, rng)
+                resultados[nome] = self.resumir([self.executar(nome, rng) for _ in range(options['repeticoes'])])
+            transaction.set_rollback(True)
+        return resultados
+
+    def amostra(self, queryset):
+        return list(queryset.order_by('pk').values_list('pk', flat=True)[:TAMANHO_AMOSTRA])
+
+    def requisicao(self, nome, rng):
+        if nome in LEITURAS:
+            return 'get', LEITURAS[nome], None
+        if nome == 'marcar_recebida':
+            if not self.amostras['abertas']:
+                raise CommandError('Não há parcelas em aberto para o cenário marcar_recebida.')
+            return 'post', f"/api/parcelas/{rng.choice(self.amostras['abertas'])}/marcar-recebida/", None
+        data_vigencia = date.today()
+        return 'post', '/api/venda/', {
+            'numero_proposta': f'BENCH-{uuid.uuid4().hex[:12]}',
+            'cliente_id': rng.choice(self.amostras['clientes']),
+            'plano_id': rng.choice(self.amostras['planos']),
+            'consultor_id': rng.choice(self.amostras['consultores']),
+            'valor_plano': f'{rng.uniform(300, 5000):.2f}',
+            'desconto_consultor': '0.00',
+            'data_venda': data_vigencia.isoformat(),
+            'data_vigencia': data_vigencia.isoformat(),
+            'data_vencimento': data_vigencia.isoformat(),
+        }
+
+    def executar(self, nome, rng):
+        metodo, caminho, dados = self.requisicao(nome, rng)
+        with transaction.atomic(), CaptureQueriesContext(connection) as consultas:
+            inicio = time.perf_counter()
+            resposta = getattr(self.client, metodo)(caminho, dados, format='json', HTTP_ACCEPT='application/json')
+            duracao = (time.perf_counter() - inicio) * 1000
+            transaction.set_rollback(True)
+        return duracao, len(consultas.captured_queries), resposta.status_code
+
+    def resumir(self, medicoes):
+        duracoes = sorted(medicao[0] for medicao in medicoes)
+        return {
+            'p50_ms': round(percentil(duracoes, 0.50), 2),
+            'p95_ms': round(percentil(duracoes, 0.95), 2),
+            'media_ms': round(statistics.fmean(duracoes), 2),
+            'max_ms': round(duracoes[-1], 2),
+            'consultas': max(medicao[1] for medicao in medicoes),
+            'erros': sum(1 for medicao in medicoes if medicao[2] >= 400),
+        }
+
+    def imprimir(self, resultado, comparacoes):
+        escala = resultado['escala']
+        self.stdout.write(
+            f"commit {resultado['commit'] or '?'} ({resultado['banco']}): "
+            f"{escala['vendas']} vendas, {escala['parcelas']} parcelas"
+        )
+        for nome, medido in resultado['cenarios'].items():
+            self.stdout.write(
+                f"{nome:<26} p50 {medido['p50_ms']:8.1f} ms  p95 {medido['p95_ms']:8.1f} ms  "
+                f"{medido['consultas']:4d} consultas  ({medido['erros']} erros)"
+            )
+        for comparacao in comparacoes:
+            marca = 'REGRESSÃO' if comparacao['regressao'] else 'ok'
+            self.stdout.write(
+                f"{comparacao['cenario']:<26} {comparacao['p50_base_ms']:8.1f} -> {comparacao['p50_ms']:8.1f} ms "
+                f"({comparacao['variacao']:+.0%}), consultas {comparacao['consultas_base']} -> {comparacao['consultas']}  {marca}"
+            )
@@ -0,0 +1,118 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from decimal import Decimal
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections
+
+from core.models import Cliente, Consultor, Parcela, Plano, Venda
+from core.planos import invalidar_planos
+
+# Configurações comparadas no modo "comparar", aplicadas por variáveis de ambiente
+MODOS_SQLITE = {
+    'sqlite_padrao': {'DB_SQLITE_TUNED': 'False'},
+    'sqlite_ajustado': {'DB_SQLITE_TUNED': 'True'},
+}
+
+
+class Command(BaseCommand):
+    help = 'Mede a vazão de criação de vendas em paralelo e compara o SQLite padrão com o modo ajustado.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modo', choices=['comparar', 'atual'], default='comparar',
+                            help='"atual" mede o banco configurado; "comparar" roda cada modo do SQLite em um banco temporário.')
+        parser.add_argument('--threads', type=int, default=8, help='Quantidade de threads criando vendas.')
+        parser.add_argument('--vendas', type=int, default=50, help='Vendas criadas por thread.')
+        parser.add_argument('--parcelas', type=int, default=12, help='Parcelas do plano usado nas vendas.')
+        parser.add_argument('--json', action='store_true', help='Imprime o resultado como JSON.')
+
+    def handle(self, *args, **options):
+        if options['modo'] == 'atual':
+            resultados = {'atual': self.medir(options['threads'], options['vendas'], options['parcelas'])}
+        else:
+            resultados = {nome: self.medir_em_subprocesso(ambiente, options) for nome, ambiente in MODOS_SQLITE.items()}
+
+        if options['json']:
+            self.stdout.write(json.dumps(resultados))
+            return
+        for nome, resultado in resultados.items():
+            self.stdout.write(
+                f"{nome}: {resultado['vendas_por_segundo']:.1f} vendas/s "
+                f"({resultado['criadas']} criadas, {resultado['erros']} erros em {resultado['segundos']:.2f}s)"
+            )
+
+    def medir_em_subprocesso(self, ambiente, options):
+        manage = Path(settings.BASE_DIR) / 'manage.py'
+        with tempfile.TemporaryDirectory() as diretorio:
+            env = dict(os.environ, DB_ENGINE='sqlite', DB_NAME=str(Path(diretorio) / 'benchmark.sqlite3'), **ambiente)
+            subprocess.run([sys.executable, str(manage), 'migrate', '-v', '0'], env=env, check=True, stdout=subprocess.DEVNULL)
+            saida = subprocess.run(
+                [sys.executable, str(manage), 'benchmark_concorrencia', '--modo', 'atual', '--json',
+                 '--threads', str(options['threads']), '--vendas', str(options['vendas']),
+                 '--parcelas', str(options['parcelas'])],
+                env=env, check=True, capture_output=True, text=True,
+            ).stdout
+        # settings.py também escreve no stdout; o resultado é a última linha
+        return json.loads(saida.strip().splitlines()[-1])['atual']
+
+    def medir(self, threads, vendas_por_thread, numero_parcelas):
+        prefixo = f'BENCH-{uuid.uuid4().hex[:8]}'
+        plano = Plano.objects.create(
+            operadora=prefixo, comissionamento_total=Decimal('300.00'), tipo='PME',
+            numero_parcelas=numero_parcelas, taxa_plano_valor=Decimal('0.00'),
+        )
+        Parcela.objects.bulk_create([
+            Parcela(plano=plano, numero_parcela=numero, porcentagem_parcela=Decimal('10.00'))
+            for numero in range(1, numero_parcelas + 1)
+        ])
+        invalidar_planos()
+        cliente = Cliente.objects.create(nome=prefixo)
+        consultor = Consultor.objects.create(nome=prefixo)
+        inicio = threading.Barrier(threads)
+
+        def criar_vendas(indice):
+            criadas = erros = 0
+            inicio.wait()
+            try:
+                for numero in range(vendas_por_thread):
+                    try:
+                        Venda.objects.create(
+                            numero_proposta=f'{prefixo}-{indice}-{numero}', cliente=cliente, plano=plano,
+                            consultor=consultor, valor_plano=Decimal('500.00'), desconto_consultor=Decimal('0.00'),
+                            data_vigencia=date.today(), data_vencimento=date.today(),
+                        )
+                        criadas += 1
+                    except OperationalError:
+                        erros += 1
+            finally:
+                connections.close_all()
+            return criadas, erros
+
+        comeco = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            parciais = list(executor.map(criar_vendas, range(threads)))
+        segundos = time.perf_counter() - comeco
+
+        # Remove os dados do benchmark (as vendas e parcelas caem em cascata)
+        plano.delete()
+        cliente.delete()
+        consultor.delete()
+
+        criadas = sum(parcial[0] for parcial in parciais)
+        return {
+            'threads': threads,
+            'criadas': criadas,
+            'erros': sum(parcial[1] for parcial in parciais),
+            'segundos': segundos,
+            'vendas_por_segundo': criadas / segundos if segundos else 0.0,
+        }
@@ -0,0 +1,120 @@
+import json
+import time
+import uuid
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from core.listagem_rapida import linhas_rapidas
+from core.models import Cliente, Consultor, ControleDeRecebimento, Parcela, Plano, Venda
+from core.renderers import JSONRapidoRenderer, orjson
+from core.serializers import ControleDeRecebimentoSerializer
+from core.views import ControleDeRecebimentoViewSet
+
+PARCELAS_POR_VENDA = 12
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara a serialização de parcelas pelo ControleDeRecebimentoSerializer + JSONRenderer '
+        'com a leitura rápida (values_list + JSONRapidoRenderer). Os dados são criados em uma '
+        'transação desfeita ao final.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--parcelas', type=int, default=100_000, help='Quantidade de parcelas serializadas.')
+        parser.add_argument('--json', action='store_true', help='Imprime o resultado como JSON.')
+
+    def handle(self, *args, **options):
+        if options['parcelas'] < 1:
+            raise CommandError('--parcelas deve ser positivo.')
+        with transaction.atomic():
+            queryset = self.criar_dados(options['parcelas'])
+            resultado = {
+                'parcelas': options['parcelas'],
+                'orjson': orjson is not None,
+                'serializer': self.medir_serializer(queryset),
+                'rapida': self.medir_rapida(queryset),
+            }
+            transaction.set_rollback(True)
+
+        serializer, rapida = resultado.pop('serializer'), resultado.pop('rapida')
+        resultado['identicos'] = json.loads(serializer.pop('conteudo')) == json.loads(rapida.pop('conteudo'))
+        resultado.update(serializer=serializer, rapida=rapida)
+        resultado['ganho'] = round(serializer['total'] / rapida['total'], 2) if rapida['total'] else None
+
+        if options['json']:
+            self.stdout.write(json.dumps(resultado))
+            return
+        for nome in ('serializer', 'rapida'):
+            tempos = resultado[nome]
+            self.stdout.write(
+                f"{nome:<10} leitura+montagem {tempos['montagem']:7.3f}s  render {tempos['render']:7.3f}s  "
+                f"total {tempos['total']:7.3f}s  ({tempos['bytes']} bytes)"
+            )
+        self.stdout.write(
+            f"{resultado['parcelas']} parcelas: {resultado['ganho']}x mais rápido "
+            f"(orjson {'sim' if resultado['orjson'] else 'não'}; saídas idênticas: {'sim' if resultado['identicos'] else 'não'})"
+        )
+
+    def criar_dados(self, quantidade):
+        prefixo = f'BENCH-{uuid.uuid4().hex[:8]}'
+        plano = Plano.objects.create(
+            operadora=prefixo, comissionamento_total=Decimal('300.00'), tipo='PME',
+            numero_parcelas=PARCELAS_POR_VENDA, taxa_plano_valor=Decimal('0.00'),
+        )
+        parcelas = Parcela.objects.bulk_create([
+            Parcela(plano=plano, numero_parcela=numero, porcentagem_parcela=Decimal('10.00'))
+            for numero in range(1, PARCELAS_POR_VENDA + 1)
+        ])
+        cliente = Cliente.objects.create(nome=prefixo)
+        consultor = Consultor.objects.create(nome=prefixo)
+        # bulk_create não passa por Venda.save: o cronograma é gravado direto, sem cálculo
+        vendas = Venda.objects.bulk_create([
+            Venda(
+                numero_proposta=f'{prefixo}-{numero}', cliente=cliente, plano=plano, consultor=consultor,
+                valor_plano=Decimal('500.00'), desconto_consultor=Decimal('0.00'),
+                data_vigencia=date(2024, 1, 10), data_vencimento=date(2024, 1, 20),
+            )
+            for numero in range(-(-quantidade // PARCELAS_POR_VENDA))
+        ], batch_size=2000)
+        controles = (
+            ControleDeRecebimento(
+                venda=venda, parcela=parcela, valor_parcela=Decimal('50.00'),
+                data_prevista_recebimento=date(2024, 2, 10) + timedelta(days=30 * indice),
+                data_recebimento=date(2024, 2, 12) if indice == 0 else None,
+                status='Recebido' if indice == 0 else 'Não Recebido',
+            )
+            for venda in vendas for indice, parcela in enumerate(parcelas)
+        )
+        ControleDeRecebimento.objects.bulk_create(
+            [controle for _, controle in zip(range(quantidade), controles)], batch_size=5000,
+        )
+        return ControleDeRecebimento.objects.filter(venda__plano=plano).order_by('id')
+
+    def medir_serializer(self, queryset):
+        inicio = time.perf_counter()
+        dados = ControleDeRecebimentoSerializer(queryset, many=True).data
+        montado = time.perf_counter()
+        conteudo = JSONRenderer().render(dados)
+        return self.tempos(inicio, montado, time.perf_counter(), conteudo)
+
+    def medir_rapida(self, queryset):
+        inicio = time.perf_counter()
+        linhas, montar = linhas_rapidas(queryset, ControleDeRecebimentoViewSet.campos_listagem)
+        dados = montar(linhas)
+        montado = time.perf_counter()
+        conteudo = JSONRapidoRenderer().render(dados)
+        return self.tempos(inicio, montado, time.perf_counter(), conteudo)
+
+    def tempos(self, inicio, montado, fim, conteudo):
+        return {
+            'montagem': round(montado - inicio, 4),
+            'render': round(fim - montado, 4),
+            'total': round(fim - inicio, 4),
+            'bytes': len(conteudo),
+            'conteudo': conteudo,
+        }
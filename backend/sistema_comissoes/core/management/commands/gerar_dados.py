@@ -0,0 +1,56 @@
+import json
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.dados_sinteticos import gerar_dados
+
+
+class Command(BaseCommand):
+    help = (
+        'Gera dados sintéticos reprodutíveis (operadoras, planos, consultores, clientes, vendas e parcelas) '
+        'na escala pedida, para testes de carga e benchmark_caminhos.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--vendas', type=int, default=10_000, help='Quantidade de vendas.')
+        parser.add_argument('--consultores', type=int, default=50, help='Quantidade de consultores.')
+        parser.add_argument('--clientes', type=int, help='Quantidade de clientes (padrão: metade das vendas).')
+        parser.add_argument('--operadoras', type=int, default=8, help='Quantidade de operadoras.')
+        parser.add_argument('--meses', type=int, default=24, help='Período, em meses, das datas de venda.')
+        parser.add_argument('--semente', type=int, default=42, help='Semente do gerador aleatório.')
+        parser.add_argument('--prefixo', default='SINT', help='Prefixo das propostas e operadoras geradas.')
+        parser.add_argument('--hoje', type=date.fromisoformat, help='Data de referência (AAAA-MM-DD); padrão: hoje.')
+        parser.add_argument('--tamanho-lote', type=int, default=2000, help='Vendas gravadas por transação.')
+        parser.add_argument('--json', action='store_true', help='Imprime o resultado como JSON.')
+
+    def handle(self, *args, **options):
+        for opcao in ('vendas', 'consultores', 'operadoras', 'meses', 'tamanho_lote'):
+            if options[opcao] < 1:
+                raise CommandError(f"--{opcao.replace('_', '-')} deve ser positivo.")
+
+        def progresso(gravadas, total):
+            if not options['json']:
+                self.stdout.write(f'{gravadas}/{total} vendas gravadas')
+
+        inicio = time.perf_counter()
+        try:
+            quantidades = gerar_dados(
+                vendas=options['vendas'], consultores=options['consultores'], clientes=options['clientes'],
+                operadoras=options['operadoras'], meses=options['meses'], semente=options['semente'],
+                prefixo=options['prefixo'], hoje=options['hoje'], tamanho_lote=options['tamanho_lote'],
+                progresso=progresso,
+            )
+        except ValueError as erro:
+            raise CommandError(str(erro))
+        segundos = round(time.perf_counter() - inicio, 2)
+
+        if options['json']:
+            self.stdout.write(json.dumps({**quantidades, 'segundos': segundos}))
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f"{quantidades['vendas']} vendas e {quantidades['parcelas']} parcelas geradas "
+            f"({quantidades['planos']} planos, {quantidades['consultores']} consultores, "
+            f"{quantidades['clientes']} clientes) em {segundos}s."
+        ))
@@ -0,0 +1,43 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.conciliacao import ler_csv
+from core.importacao import importar_vendas, ler_xlsx
+
+
+class Command(BaseCommand):
+    help = 'Importa vendas em lote de uma planilha CSV ou XLSX, gerando os cronogramas de recebimento.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('arquivo', help='Caminho da planilha.')
+        parser.add_argument('--formato', choices=['csv', 'xlsx'], help='Formato da planilha (padrão: pela extensão).')
+        parser.add_argument('--tamanho-lote', type=int, default=500, help='Quantidade de linhas gravadas por transação.')
+        parser.add_argument('--relatorio', help='Grava os erros por linha neste arquivo JSON Lines.')
+
+    def handle(self, *args, **options):
+        formato = options['formato'] or ('xlsx' if options['arquivo'].lower().endswith('.xlsx') else 'csv')
+        relatorio = open(options['relatorio'], 'w', encoding='utf-8') if options['relatorio'] else None
+        try:
+            with open(options['arquivo'], 'rb') as arquivo:
+                try:
+                    linhas = ler_xlsx(arquivo) if formato == 'xlsx' else ler_csv(arquivo)
+                except ValueError as exc:
+                    raise CommandError(str(exc))
+                for item in importar_vendas(linhas, tamanho_lote=options['tamanho_lote']):
+                    if 'resumo' in item:
+                        resumo = item['resumo']
+                    elif 'lote' in item:
+                        self.stdout.write(f"Lote {item['lote']}: {item['importadas']} venda(s) até a linha {item['ate_linha']}.")
+                    elif relatorio:
+                        relatorio.write(json.dumps(item, ensure_ascii=False) + '\n')
+                    else:
+                        self.stderr.write(f"Linha {item['linha']}: {item['erro']}")
+        finally:
+            if relatorio:
+                relatorio.close()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{resumo['importadas']} venda(s) importada(s), {resumo['clientes_criados']} cliente(s) criado(s), "
+            f"{resumo['erros']} linha(s) com erro."
+        ))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.alteracoes import podar_alteracoes
+
+
+class Command(BaseCommand):
+    help = (
+        'Remove do feed de alterações as linhas com mais de ALTERACOES_RETENCAO_DIAS (ou --dias); '
+        'clientes com cursor anterior recarregam a listagem.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, help='Dias de alterações mantidos no feed.')
+
+    def handle(self, *args, **options):
+        if options['dias'] is not None and options['dias'] < 0:
+            raise CommandError('--dias não pode ser negativo.')
+        removidas = podar_alteracoes(options['dias'])
+        self.stdout.write(self.style.SUCCESS(f'{removidas} alteração(ões) removida(s) do feed.'))
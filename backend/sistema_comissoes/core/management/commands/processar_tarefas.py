@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from core.tarefas import executar_tarefa, liberar_abandonadas, nome_do_trabalhador, reservar_proxima
+
+
+class Command(BaseCommand):
+    help = (
+        'Trabalhador da fila de tarefas em segundo plano (importações, conciliações, exportações e '
+        'reconstrução de resumos). Vários trabalhadores podem rodar ao mesmo tempo sobre o mesmo banco.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--intervalo', type=float, default=2, help='Segundos de espera quando a fila está vazia.')
+        parser.add_argument('--uma-vez', action='store_true', help='Processa as tarefas pendentes e termina.')
+        parser.add_argument('--nome', help='Identificação do trabalhador gravada nas tarefas (padrão: host:pid).')
+
+    def handle(self, *args, **options):
+        trabalhador = options['nome'] or nome_do_trabalhador()
+        while True:
+            # Processo de longa duração: descarta conexões velhas como faz o ciclo de requisições
+            close_old_connections()
+            liberadas = liberar_abandonadas()
+            if liberadas:
+                self.stderr.write(f'{liberadas} tarefa(s) abandonada(s) devolvida(s) à fila ou encerrada(s).')
+
+            tarefa = reservar_proxima(trabalhador)
+            if tarefa is not None:
+                inicio = time.perf_counter()
+                concluida = executar_tarefa(tarefa)
+                mensagem = f'Tarefa {tarefa.pk} ({tarefa.tipo}) {"concluída" if concluida else "falhou"} em {time.perf_counter() - inicio:.1f}s.'
+                self.stdout.write(self.style.SUCCESS(mensagem) if concluida else self.style.ERROR(mensagem))
+                continue
+            if options['uma_vez']:
+                break
+            time.sleep(options['intervalo'])
+        self.stdout.write('Nenhuma tarefa pendente.')
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.busca import TAMANHO_LOTE_INDEXACAO, reconstruir_indice
+
+
+class Command(BaseCommand):
+    help = 'Reconstrói o índice da busca (clientes, consultores e propostas) a partir dos registros.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tamanho-lote', type=int, default=TAMANHO_LOTE_INDEXACAO, help='Registros indexados por transação.')
+
+    def handle(self, *args, **options):
+        if options['tamanho_lote'] < 1:
+            raise CommandError('--tamanho-lote deve ser positivo.')
+
+        def progresso(tipo, quantidade):
+            if quantidade % (options['tamanho_lote'] * 50) == 0:
+                self.stdout.write(f'{tipo}: {quantidade} indexado(s)')
+
+        quantidades = reconstruir_indice(tamanho_lote=options['tamanho_lote'], progresso=progresso)
+        self.stdout.write(self.style.SUCCESS(
+            'Índice da busca reconstruído: ' + ', '.join(f'{quantidade} {tipo}(s)' for tipo, quantidade in quantidades.items()) + '.'
+        ))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.resumos import reconstruir_resumos, verificar_resumos
+
+
+class Command(BaseCommand):
+    help = 'Reconstrói o resumo mensal de comissões a partir das parcelas, ou apenas o confere com --verificar.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verificar', action='store_true', help='Apenas compara o resumo gravado com as parcelas.')
+        parser.add_argument('--tamanho-lote', type=int, default=1000, help='Quantidade de resumos gravados por inserção.')
+
+    def handle(self, *args, **options):
+        if not options['verificar']:
+            total = reconstruir_resumos(tamanho_lote=options['tamanho_lote'])
+            self.stdout.write(self.style.SUCCESS(f'{total} resumo(s) reconstruído(s).'))
+            return
+
+        divergencias = verificar_resumos()
+        for divergencia in divergencias[:20]:
+            consultor_id, operadora, mes = divergencia['chave']
+            self.stderr.write(
+                f"consultor={consultor_id} operadora={operadora} mes={mes:%Y-%m}: "
+                f"gravado={divergencia['gravado']} esperado={divergencia['esperado']}"
+            )
+        if divergencias:
+            raise CommandError(f'{len(divergencias)} resumo(s) divergente(s); execute reconstruir_resumos para corrigir.')
+        self.stdout.write(self.style.SUCCESS('Resumo mensal confere com as parcelas.'))
@@ -0,0 +1,67 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Plano
+from core.reprecificacao import TAMANHO_LOTE_REPRECIFICACAO, reprecificar_plano
+
+
+class Command(BaseCommand):
+    help = (
+        'Aplica novas porcentagens de parcela e/ou nova taxa a um plano, recalculando as parcelas em aberto '
+        'de todas as suas vendas. Com --simular apenas mostra as diferenças.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('plano', type=int, help='Id do plano.')
+        parser.add_argument(
+            '--parcela', action='append', default=[], metavar='NUMERO=PORCENTAGEM',
+            help='Nova porcentagem de uma parcela; pode ser repetido.',
+        )
+        parser.add_argument('--taxa-tipo', choices=[tipo for tipo, _ in Plano.TAXA_TIPO_CHOICES], help='Novo tipo de taxa do plano.')
+        parser.add_argument('--taxa-valor', help='Novo valor da taxa do plano.')
+        parser.add_argument('--simular', action='store_true', help='Não grava nada; só calcula as diferenças.')
+        parser.add_argument('--saida', help='Arquivo JSON Lines onde gravar as diferenças por parcela.')
+        parser.add_argument('--tamanho-lote', type=int, default=TAMANHO_LOTE_REPRECIFICACAO, help='Vendas recalculadas por consulta.')
+
+    def handle(self, *args, **options):
+        porcentagens = {}
+        for item in options['parcela']:
+            numero, separador, porcentagem = item.partition('=')
+            if not separador:
+                raise CommandError(f'--parcela deve ter o formato NUMERO=PORCENTAGEM: {item}.')
+            porcentagens[numero.strip()] = porcentagem.strip()
+        if options['tamanho_lote'] < 1:
+            raise CommandError('--tamanho-lote deve ser positivo.')
+
+        try:
+            relatorio = reprecificar_plano(
+                options['plano'], porcentagens, options['taxa_tipo'], options['taxa_valor'],
+                simular=options['simular'], tamanho_lote=options['tamanho_lote'],
+            )
+        except Plano.DoesNotExist:
+            raise CommandError(f"Plano {options['plano']} não encontrado.")
+        except ValueError as erro:
+            raise CommandError(str(erro))
+
+        saida = open(options['saida'], 'w', encoding='utf-8') if options['saida'] else None
+        try:
+            for item in relatorio:
+                if 'resumo' in item:
+                    resumo = item['resumo']
+                elif 'controle' in item and saida:
+                    saida.write(json.dumps(item, ensure_ascii=False) + '\n')
+        finally:
+            if saida:
+                saida.close()
+
+        alteracoes = dict(resumo['alteracoes'])
+        for numero, (anterior, novo) in alteracoes.pop('parcelas', {}).items():
+            self.stdout.write(f'parcela {numero}: {anterior}% -> {novo}%')
+        for campo, (anterior, novo) in alteracoes.items():
+            self.stdout.write(f'{campo}: {anterior} -> {novo}')
+        verbo = 'seriam alterada(s)' if resumo['simulacao'] else 'alterada(s)'
+        self.stdout.write(self.style.SUCCESS(
+            f"{resumo['parcelas_alteradas']} parcela(s) em aberto de {resumo['vendas']} venda(s) {verbo}; "
+            f"diferença total {resumo['diferenca']}."
+        ))
@@ -0,0 +1,138 @@
+import http.client
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.instrumentacao import percentil
+
+# Rotas medidas: nome -> caminho da view síncrona (DRF) e da variante assíncrona
+ROTAS = {
+    'parcelas_atrasadas': ('/api/parcelas-atrasadas/', '/api/async/parcelas-atrasadas/'),
+    'dashboard': ('/api/dashboard/comissoes/', '/api/async/dashboard/comissoes/'),
+    'relatorio_comissoes': ('/api/relatorios/comissoes/?agrupar=consultor,mes', '/api/async/relatorios/comissoes/?agrupar=consultor,mes'),
+    'relatorio_vendas': ('/api/relatorios/vendas/?agrupar=operadora', '/api/async/relatorios/vendas/?agrupar=operadora'),
+}
+
+MODOS = {'sync': 0, 'async': 1}
+
+
+class Command(BaseCommand):
+    help = (
+        'Teste de carga contra uma instância local: mede latência p50/p99 e requisições por '
+        'segundo das leituras pesadas nas views síncronas e nas variantes assíncronas.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help='Endereço da instância em execução.')
+        parser.add_argument('--usuario', help='Usuário para obter o token em /api/token/.')
+        parser.add_argument('--senha', help='Senha do usuário.')
+        parser.add_argument('--token', help='Token de acesso JWT já emitido (dispensa usuário e senha).')
+        parser.add_argument('--modo', choices=['sync', 'async', 'ambos'], default='ambos', help='Variantes medidas.')
+        parser.add_argument('--rotas', default=','.join(ROTAS), help=f"Rotas medidas, separadas por vírgula ({', '.join(ROTAS)}).")
+        parser.add_argument('--concorrencia', type=int, default=16, help='Conexões simultâneas.')
+        parser.add_argument('--requisicoes', type=int, default=500, help='Requisições por rota e modo.')
+        parser.add_argument('--aquecimento', type=int, default=10, help='Requisições descartadas antes de cada medição.')
+        parser.add_argument('--json', action='store_true', help='Imprime o resultado como JSON.')
+
+    def handle(self, *args, **options):
+        endereco = urlsplit(options['url'])
+        if endereco.scheme not in ('http', 'https') or not endereco.hostname:
+            raise CommandError('Informe --url no formato http://host:porta.')
+        rotas = [nome.strip() for nome in options['rotas'].split(',') if nome.strip()]
+        invalidas = [nome for nome in rotas if nome not in ROTAS]
+        if invalidas:
+            raise CommandError(f"Rotas inválidas: {', '.join(invalidas)}.")
+        if options['concorrencia'] < 1 or options['requisicoes'] < 1:
+            raise CommandError('--concorrencia e --requisicoes devem ser positivos.')
+
+        self.endereco = endereco
+        token = options['token'] or self.obter_token(options['usuario'], options['senha'])
+        self.cabecalhos = {'Authorization': f'Bearer {token}', 'Accept': 'application/json'}
+        modos = list(MODOS) if options['modo'] == 'ambos' else [options['modo']]
+
+        resultados = []
+        for nome in rotas:
+            for modo in modos:
+                caminho = ROTAS[nome][MODOS[modo]]
+                self.executar(caminho, options['aquecimento'], options['concorrencia'])
+                resultado = self.executar(caminho, options['requisicoes'], options['concorrencia'])
+                resultados.append({'rota': nome, 'modo': modo, 'caminho': caminho, **resultado})
+
+        if options['json']:
+            self.stdout.write(json.dumps(resultados))
+            return
+        for resultado in resultados:
+            self.stdout.write(
+                f"{resultado['rota']:<22} {resultado['modo']:<5} "
+                f"p50 {resultado['p50_ms']:8.1f} ms  p99 {resultado['p99_ms']:8.1f} ms  "
+                f"{resultado['requisicoes_por_segundo']:8.1f} req/s  ({resultado['erros']} erros)"
+            )
+
+    def conectar(self):
+        classe = http.client.HTTPSConnection if self.endereco.scheme == 'https' else http.client.HTTPConnection
+        return classe(self.endereco.hostname, self.endereco.port, timeout=60)
+
+    def obter_token(self, usuario, senha):
+        if not usuario or not senha:
+            raise CommandError('Informe --token ou --usuario e --senha.')
+        conexao = self.conectar()
+        try:
+            conexao.request(
+                'POST', '/api/token/', body=json.dumps({'username': usuario, 'password': senha}),
+                headers={'Content-Type': 'application/json'},
+            )
+            resposta = conexao.getresponse()
+            corpo = resposta.read()
+        except OSError as exc:
+            raise CommandError(f'Não foi possível conectar em {self.endereco.geturl()}: {exc}')
+        finally:
+            conexao.close()
+        if resposta.status != 200:
+            raise CommandError(f'Falha na autenticação ({resposta.status}): {corpo.decode(errors="replace")}')
+        return json.loads(corpo)['access']
+
+    def executar(self, caminho, quantidade, concorrencia):
+        """Dispara `quantidade` GETs com `concorrencia` conexões keep-alive e mede cada um."""
+        local = threading.local()
+        trava = threading.Lock()
+        latencias = []
+        erros = [0]
+
+        def requisitar(_):
+            if not hasattr(local, 'conexao'):
+                local.conexao = self.conectar()
+            inicio = time.perf_counter()
+            try:
+                local.conexao.request('GET', caminho, headers=self.cabecalhos)
+                resposta = local.conexao.getresponse()
+                resposta.read()
+                ok = resposta.status == 200
+            except (OSError, http.client.HTTPException):
+                local.conexao.close()
+                del local.conexao
+                ok = False
+            duracao = time.perf_counter() - inicio
+            with trava:
+                if ok:
+                    latencias.append(duracao)
+                else:
+                    erros[0] += 1
+
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concorrencia) as executor:
+            list(executor.map(requisitar, range(quantidade)))
+        segundos = time.perf_counter() - inicio
+
+        latencias.sort()
+        return {
+            'requisicoes': quantidade,
+            'erros': erros[0],
+            'segundos': round(segundos, 3),
+            'requisicoes_por_segundo': round(len(latencias) / segundos, 1) if segundos else 0.0,
+            'p50_ms': round(percentil(latencias, 0.50) * 1000, 2) if latencias else 0.0,
+            'p99_ms': round(percentil(latencias, 0.99) * 1000, 2) if latencias else 0.0,
+        }
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.atrasos import varrer_parcelas_atrasadas
+
+
+class Command(BaseCommand):
+    help = 'Marca como atrasadas as parcelas em aberto vencidas.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--completo', action='store_true', help='Recalcula todos os resumos mensais, ignorando a data da última varredura.')
+        parser.add_argument('--intervalo', type=int, default=0, help='Repete a varredura a cada N segundos (0 executa uma única vez).')
+        parser.add_argument('--tamanho-lote', type=int, default=1000, help='Quantidade de parcelas atualizadas por transação.')
+
+    def handle(self, *args, **options):
+        completo = options['completo']
+        while True:
+            atrasadas, reabertas = varrer_parcelas_atrasadas(completo=completo, tamanho_lote=options['tamanho_lote'])
+            self.stdout.write(self.style.SUCCESS(
+                f'{atrasadas} parcela(s) marcada(s) como atrasada(s), {reabertas} reaberta(s).'
+            ))
+            if not options['intervalo']:
+                break
+            completo = False
+            time.sleep(options['intervalo'])
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.3 on 2026-10-18 11:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_alter_controlederecebimento_status'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='controlederecebimento',
+            index=models.Index(fields=['data_prevista_recebimento'], name='controle_data_prevista_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='controlederecebimento',
+            index=models.Index(fields=['status', 'data_prevista_recebimento'], name='controle_status_data_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='venda',
+            index=models.Index(fields=['data_venda'], name='venda_data_venda_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='venda',
+            index=models.Index(fields=['consultor', 'data_venda'], name='venda_consultor_data_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='venda',
+            index=models.Index(fields=['plano', 'data_venda'], name='venda_plano_data_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.1.3 on 2026-10-18 11:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_indices_filtros'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='controlederecebimento',
+            index=models.Index(condition=models.Q(('status', 'Recebido'), _negated=True), fields=['data_prevista_recebimento'], name='controle_aberto_data_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='controlederecebimento',
+            constraint=models.UniqueConstraint(fields=('venda', 'parcela'), name='controle_venda_parcela_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='parcela',
+            constraint=models.UniqueConstraint(fields=('plano', 'numero_parcela'), name='parcela_plano_numero_uniq'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.1.3 on 2026-10-18 11:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_execucao_rotina'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumoComissaoMensal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('operadora', models.CharField(max_length=255)),
+                ('mes', models.DateField()),
+                ('esperado', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('recebido', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('atrasado', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('parcelas', models.PositiveIntegerField(default=0)),
+                ('parcelas_recebidas', models.PositiveIntegerField(default=0)),
+                ('parcelas_atrasadas', models.PositiveIntegerField(default=0)),
+                ('atualizado_em', models.DateTimeField(auto_now=True)),
+                ('consultor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.consultor')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['mes'], name='resumo_mes_idx')],
+                'constraints': [models.UniqueConstraint(fields=('consultor', 'operadora', 'mes'), name='resumo_consultor_op_mes_uniq')],
+            },
+        ),
+    ]
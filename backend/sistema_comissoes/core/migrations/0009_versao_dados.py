@@ -0,0 +1,22 @@
+# Generated by Django 5.1.3 on 2026-10-18 11:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_resumo_comissao_mensal'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VersaoDados',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nome', models.CharField(max_length=100, unique=True)),
+                ('versao', models.CharField(max_length=32)),
+                ('atualizado_em', models.DateTimeField()),
+            ],
+        ),
+    ]
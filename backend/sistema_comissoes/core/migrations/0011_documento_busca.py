@@ -0,0 +1,69 @@
+# Generated by Django 5.1.3 on 2026-10-18 11:50
+
+from django.db import migrations, models
+
+# Índice textual de core_documentobusca: FTS5 com tokenizador trigram no SQLite
+# (casa trechos de palavras, como parte do número da proposta) e pg_trgm no
+# PostgreSQL. Os gatilhos mantêm a tabela FTS5 igual à de documentos.
+SQLITE_CRIAR = (
+    "CREATE VIRTUAL TABLE core_documentobusca_fts USING fts5("
+    "texto, content='core_documentobusca', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER core_documentobusca_ai AFTER INSERT ON core_documentobusca BEGIN "
+    "INSERT INTO core_documentobusca_fts(rowid, texto) VALUES (new.id, new.texto); END",
+    "CREATE TRIGGER core_documentobusca_ad AFTER DELETE ON core_documentobusca BEGIN "
+    "INSERT INTO core_documentobusca_fts(core_documentobusca_fts, rowid, texto) VALUES ('delete', old.id, old.texto); END",
+    "CREATE TRIGGER core_documentobusca_au AFTER UPDATE OF texto ON core_documentobusca BEGIN "
+    "INSERT INTO core_documentobusca_fts(core_documentobusca_fts, rowid, texto) VALUES ('delete', old.id, old.texto); "
+    "INSERT INTO core_documentobusca_fts(rowid, texto) VALUES (new.id, new.texto); END",
+)
+SQLITE_REMOVER = (
+    'DROP TRIGGER IF EXISTS core_documentobusca_au',
+    'DROP TRIGGER IF EXISTS core_documentobusca_ad',
+    'DROP TRIGGER IF EXISTS core_documentobusca_ai',
+    'DROP TABLE IF EXISTS core_documentobusca_fts',
+)
+POSTGRES_CRIAR = (
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX busca_texto_trgm_idx ON core_documentobusca USING gin (texto gin_trgm_ops)',
+)
+POSTGRES_REMOVER = (
+    'DROP INDEX IF EXISTS busca_texto_trgm_idx',
+)
+
+
+def _executar(schema_editor, comandos):
+    for comando in comandos.get(schema_editor.connection.vendor, ()):
+        schema_editor.execute(comando)
+
+
+def criar_indice_textual(apps, schema_editor):
+    _executar(schema_editor, {'sqlite': SQLITE_CRIAR, 'postgresql': POSTGRES_CRIAR})
+
+
+def remover_indice_textual(apps, schema_editor):
+    _executar(schema_editor, {'sqlite': SQLITE_REMOVER, 'postgresql': POSTGRES_REMOVER})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_tarefa'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentoBusca',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(max_length=20)),
+                ('objeto_id', models.BigIntegerField()),
+                ('titulo', models.CharField(max_length=255)),
+                ('detalhe', models.CharField(blank=True, max_length=255)),
+                ('texto', models.TextField()),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('tipo', 'objeto_id'), name='busca_tipo_objeto_uniq')],
+            },
+        ),
+        migrations.RunPython(criar_indice_textual, remover_indice_textual),
+    ]
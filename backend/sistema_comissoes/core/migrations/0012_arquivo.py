@@ -0,0 +1,51 @@
+# Generated by Django 5.1.3 on 2026-10-18 12:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_documento_busca'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VendaArquivada',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('numero_proposta', models.CharField(max_length=100, unique=True)),
+                ('valor_plano', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('desconto_consultor', models.DecimalField(decimal_places=2, default=0.0, max_digits=10)),
+                ('data_venda', models.DateField()),
+                ('data_vigencia', models.DateField()),
+                ('data_vencimento', models.DateField()),
+                ('arquivado_em', models.DateTimeField()),
+                ('cliente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.cliente')),
+                ('consultor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.consultor')),
+                ('plano', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.plano')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ControleDeRecebimentoArquivado',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('valor_parcela', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('data_prevista_recebimento', models.DateField()),
+                ('data_recebimento', models.DateField(blank=True, null=True)),
+                ('status', models.CharField(choices=[('Recebido', 'Recebido'), ('Não Recebido', 'Não Recebido'), ('Atrasado', 'Atrasado')], max_length=20)),
+                ('numero_extrato', models.CharField(blank=True, max_length=100, null=True)),
+                ('parcela', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.parcela')),
+                ('venda', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.vendaarquivada')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='vendaarquivada',
+            index=models.Index(fields=['data_venda'], name='venda_arq_data_venda_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='controlederecebimentoarquivado',
+            index=models.Index(fields=['data_prevista_recebimento'], name='controle_arq_data_prev_idx'),
+        ),
+    ]
@@ -0,0 +1,70 @@
+import datetime
+from decimal import Decimal
+
+from django.db import migrations
+from django.db.models import Count, DecimalField, F, Q, Sum, Value
+from django.db.models.functions import Coalesce, TruncMonth
+
+TAMANHO_LOTE = 1000
+
+
+def _soma(campo, **kwargs):
+    return Coalesce(
+        Sum(campo, **kwargs), Value(Decimal('0.00')),
+        output_field=DecimalField(max_digits=14, decimal_places=2),
+    )
+
+
+def preencher_resumos(apps, schema_editor):
+    # Bancos que já tinham parcelas chegaram à 0008 com a tabela de resumos vazia;
+    # num banco novo não há o que calcular. A agregação é a de core.resumos.agregar_parcelas
+    # copiada aqui, sobre os modelos históricos, para a migração não depender do código atual.
+    alias = schema_editor.connection.alias
+    ControleDeRecebimento = apps.get_model('core', 'ControleDeRecebimento')
+    ResumoComissaoMensal = apps.get_model('core', 'ResumoComissaoMensal')
+    if not ControleDeRecebimento.objects.using(alias).exists():
+        return
+
+    hoje = datetime.date.today()
+    recebido = Q(status='Recebido')
+    atrasado = ~Q(status='Recebido') & Q(data_prevista_recebimento__lt=hoje)
+    linhas = (
+        ControleDeRecebimento.objects.using(alias)
+        .values(
+            consultor_ref=F('venda__consultor_id'),
+            operadora=F('venda__plano__operadora'),
+            mes=TruncMonth('data_prevista_recebimento'),
+        )
+        .annotate(
+            esperado=_soma('valor_parcela'),
+            recebido=_soma('valor_parcela', filter=recebido),
+            atrasado=_soma('valor_parcela', filter=atrasado),
+            parcelas=Count('id'),
+            parcelas_recebidas=Count('id', filter=recebido),
+            parcelas_atrasadas=Count('id', filter=atrasado),
+        )
+        .order_by()
+    )
+
+    ResumoComissaoMensal.objects.using(alias).all().delete()
+    lote = []
+    for linha in linhas.iterator(chunk_size=TAMANHO_LOTE):
+        lote.append(ResumoComissaoMensal(
+            consultor_id=linha.pop('consultor_ref'), **linha,
+        ))
+        if len(lote) >= TAMANHO_LOTE:
+            ResumoComissaoMensal.objects.using(alias).bulk_create(lote)
+            lote = []
+    if lote:
+        ResumoComissaoMensal.objects.using(alias).bulk_create(lote)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_alteracao'),
+    ]
+
+    operations = [
+        migrations.RunPython(preencher_resumos, migrations.RunPython.noop),
+    ]
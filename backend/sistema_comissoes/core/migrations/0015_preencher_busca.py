@@ -0,0 +1,60 @@
+import re
+import unicodedata
+
+from django.db import migrations
+
+TAMANHO_LOTE = 1000
+
+# Cópia de core.busca.FONTES e da normalização do texto no estado desta migração,
+# para que ela não dependa do código atual
+FONTES = {
+    'cliente': ('Cliente', 'nome', ('telefone', 'email')),
+    'consultor': ('Consultor', 'nome', ()),
+    'venda': ('Venda', 'numero_proposta', ()),
+}
+
+
+def _normalizar(texto):
+    decomposto = unicodedata.normalize('NFKD', texto or '')
+    return ''.join(letra for letra in decomposto if not unicodedata.combining(letra)).lower()
+
+
+def _texto_do_documento(valores):
+    partes = [valor for valor in valores if valor]
+    partes += [re.sub(r'\D', '', valor) for valor in partes if re.search(r'\d', valor) and re.search(r'\D', valor)]
+    return _normalizar(' '.join(partes))
+
+
+def preencher_busca(apps, schema_editor):
+    # Clientes, consultores e vendas anteriores à 0011 não têm DocumentoBusca;
+    # num banco novo não há o que indexar. Os gatilhos da 0011 copiam cada
+    # documento inserido para a tabela FTS5.
+    banco = schema_editor.connection.alias
+    DocumentoBusca = apps.get_model('core', 'DocumentoBusca')
+    for tipo, (nome_modelo, campo_titulo, campos_detalhe) in FONTES.items():
+        modelo = apps.get_model('core', nome_modelo)
+        DocumentoBusca.objects.using(banco).filter(tipo=tipo).delete()
+        linhas = modelo.objects.using(banco).order_by('pk').values_list('pk', campo_titulo, *campos_detalhe)
+        lote = []
+        for objeto_id, *valores in linhas.iterator(chunk_size=TAMANHO_LOTE):
+            detalhe = ' · '.join(valor for valor in valores[1:] if valor)
+            lote.append(DocumentoBusca(
+                tipo=tipo, objeto_id=objeto_id, titulo=valores[0][:255], detalhe=detalhe[:255],
+                texto=_texto_do_documento(valores),
+            ))
+            if len(lote) >= TAMANHO_LOTE:
+                DocumentoBusca.objects.using(banco).bulk_create(lote)
+                lote = []
+        if lote:
+            DocumentoBusca.objects.using(banco).bulk_create(lote)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_preencher_resumos'),
+    ]
+
+    operations = [
+        migrations.RunPython(preencher_busca, migrations.RunPython.noop),
+    ]
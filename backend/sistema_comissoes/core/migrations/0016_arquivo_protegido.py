@@ -0,0 +1,34 @@
+# Generated by Django 5.1.3 on 2026-10-18 12:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_preencher_busca'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='controlederecebimentoarquivado',
+            name='parcela',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='core.parcela'),
+        ),
+        migrations.AlterField(
+            model_name='vendaarquivada',
+            name='cliente',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='core.cliente'),
+        ),
+        migrations.AlterField(
+            model_name='vendaarquivada',
+            name='consultor',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='core.consultor'),
+        ),
+        migrations.AlterField(
+            model_name='vendaarquivada',
+            name='plano',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='core.plano'),
+        ),
+    ]
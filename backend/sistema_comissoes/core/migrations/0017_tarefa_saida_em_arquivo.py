@@ -0,0 +1,45 @@
+from django.core.files.base import ContentFile
+from django.db import migrations, models
+
+
+def mover_saidas_para_o_storage(apps, schema_editor):
+    # Arquivos já gerados saem da coluna binária para o storage, com o mesmo nome de download
+    Tarefa = apps.get_model('core', 'Tarefa')
+    tarefas = Tarefa.objects.using(schema_editor.connection.alias).filter(saida__isnull=False)
+    for tarefa in tarefas.only('pk', 'saida', 'saida_nome').iterator(chunk_size=100):
+        tarefa.saida_arquivo.save(tarefa.saida_nome or f'tarefa-{tarefa.pk}', ContentFile(bytes(tarefa.saida)), save=False)
+        Tarefa.objects.using(schema_editor.connection.alias).filter(pk=tarefa.pk).update(saida_arquivo=tarefa.saida_arquivo.name)
+
+
+def trazer_saidas_do_storage(apps, schema_editor):
+    Tarefa = apps.get_model('core', 'Tarefa')
+    tarefas = Tarefa.objects.using(schema_editor.connection.alias).exclude(saida_arquivo='')
+    for tarefa in tarefas.only('pk', 'saida_arquivo').iterator(chunk_size=100):
+        with tarefa.saida_arquivo.open('rb') as arquivo:
+            conteudo = arquivo.read()
+        Tarefa.objects.using(schema_editor.connection.alias).filter(pk=tarefa.pk).update(saida=conteudo)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_arquivo_protegido'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tarefa',
+            name='saida_arquivo',
+            field=models.FileField(blank=True, upload_to='tarefas/'),
+        ),
+        migrations.RunPython(mover_saidas_para_o_storage, trazer_saidas_do_storage),
+        migrations.RemoveField(
+            model_name='tarefa',
+            name='saida',
+        ),
+        migrations.RenameField(
+            model_name='tarefa',
+            old_name='saida_arquivo',
+            new_name='saida',
+        ),
+    ]
@@ -0,0 +1,45 @@
+from django.core.files.base import ContentFile
+from django.db import migrations, models
+
+
+def mover_entradas_para_o_storage(apps, schema_editor):
+    # Arquivos enviados às tarefas saem da coluna binária para o storage, como as saídas na 0017
+    Tarefa = apps.get_model('core', 'Tarefa')
+    tarefas = Tarefa.objects.using(schema_editor.connection.alias).filter(entrada__isnull=False)
+    for tarefa in tarefas.only('pk', 'tipo', 'entrada').iterator(chunk_size=100):
+        tarefa.entrada_arquivo.save(tarefa.tipo, ContentFile(bytes(tarefa.entrada)), save=False)
+        Tarefa.objects.using(schema_editor.connection.alias).filter(pk=tarefa.pk).update(entrada_arquivo=tarefa.entrada_arquivo.name)
+
+
+def trazer_entradas_do_storage(apps, schema_editor):
+    Tarefa = apps.get_model('core', 'Tarefa')
+    tarefas = Tarefa.objects.using(schema_editor.connection.alias).exclude(entrada_arquivo='')
+    for tarefa in tarefas.only('pk', 'entrada_arquivo').iterator(chunk_size=100):
+        with tarefa.entrada_arquivo.open('rb') as arquivo:
+            conteudo = arquivo.read()
+        Tarefa.objects.using(schema_editor.connection.alias).filter(pk=tarefa.pk).update(entrada=conteudo)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_tarefa_saida_em_arquivo'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tarefa',
+            name='entrada_arquivo',
+            field=models.FileField(blank=True, upload_to='tarefas/entradas/'),
+        ),
+        migrations.RunPython(mover_entradas_para_o_storage, trazer_entradas_do_storage),
+        migrations.RemoveField(
+            model_name='tarefa',
+            name='entrada',
+        ),
+        migrations.RenameField(
+            model_name='tarefa',
+            old_name='entrada_arquivo',
+            new_name='entrada',
+        ),
+    ]
@@ -1,9 +1,30 @@
-from django.db import models
+import functools
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.db.models import DEFERRED, F
 from django.utils import timezone
-import datetime
-from django.db.models.signals import pre_save, post_save
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
 from django.dispatch import receiver
 
+from . import calculo
+from .alteracoes import registrar_depois_do_commit
+from .busca import indexar_depois_do_commit
+from .cache_respostas import invalidar_respostas
+from .instrumentacao import medido, medir
+from .cronograma import CAMPOS_CRONOGRAMA, reprogramar_parcelas, sincronizar_cronograma
+from .planos import invalidar_planos, obter_plano
+from .resumos import (
+    chaves_da_venda,
+    chaves_das_parcelas,
+    chaves_do_plano,
+    marcar_venda_em_remocao,
+    pares_das_parcelas,
+    recalcular_resumos,
+    venda_em_remocao,
+)
+
 class Cliente(models.Model):
     nome = models.CharField(max_length=255)
     telefone = models.CharField(max_length=20, blank=True, null=True)
@@ -42,6 +63,12 @@ class Parcela(models.Model):
     numero_parcela = models.PositiveIntegerField()
     porcentagem_parcela = models.DecimalField(max_digits=6, decimal_places=2)
 
+    class Meta:
+        constraints = [
+            # Também serve de índice para a leitura ordenada da tabela de parcelas do plano
+            models.UniqueConstraint(fields=['plano', 'numero_parcela'], name='parcela_plano_numero_uniq'),
+        ]
+
     def __str__(self):
         return f"Parcela {self.numero_parcela} - Plano {self.plano.operadora}"
 
@@ -54,6 +81,33 @@ class Consultor(models.Model):
         return self.nome
 
 
+def expressao_valor_liquido(prefixo=''):
+    """
+    Equivalente em ORM de Venda.valor_liquido, para somar o valor líquido no banco.
+
+    `prefixo` permite usar a expressão a partir de modelos relacionados, por
+    exemplo expressao_valor_liquido('venda__') em ControleDeRecebimento.
+    """
+    valor = F(f'{prefixo}valor_plano') - F(f'{prefixo}desconto_consultor')
+    taxa_valor = F(f'{prefixo}plano__taxa_plano_valor')
+    return models.Case(
+        models.When(**{f'{prefixo}plano__taxa_plano_tipo': 'Valor Fixo'}, then=valor - taxa_valor),
+        models.When(**{f'{prefixo}plano__taxa_plano_tipo': 'Porcentagem'}, then=valor - valor * taxa_valor / 100),
+        default=valor,
+        output_field=models.DecimalField(max_digits=12, decimal_places=2),
+    )
+
+
+class VendaQuerySet(models.QuerySet):
+    def com_valor_liquido(self, nome='valor_liquido_calculado'):
+        return self.annotate(**{nome: expressao_valor_liquido()})
+
+
+def proposta_arquivada(numero_proposta, venda_id=None):
+    """Se `numero_proposta` já é de uma venda arquivada (que não seja `venda_id`)."""
+    return VendaArquivada.objects.filter(numero_proposta=numero_proposta).exclude(pk=venda_id).exists()
+
+
 class Venda(models.Model):
     numero_proposta = models.CharField(max_length=100, unique=True)
     cliente = models.ForeignKey('Cliente', on_delete=models.CASCADE)
@@ -65,60 +119,47 @@ class Venda(models.Model):
     data_vigencia = models.DateField()
     data_vencimento = models.DateField()
 
-    def valor_liquido(self):
-        valor = self.valor_plano - self.desconto_consultor
-
-        taxa_valor = self.plano.taxa_plano_valor
-        taxa_tipo = self.plano.taxa_plano_tipo
+    objects = VendaQuerySet.as_manager()
 
-        if taxa_tipo == 'Valor Fixo':
-            valor -= taxa_valor
-        elif taxa_tipo == 'Porcentagem':
-            valor -= valor * (taxa_valor / 100)
+    class Meta:
+        indexes = [
+            models.Index(fields=['data_venda'], name='venda_data_venda_idx'),
+            models.Index(fields=['consultor', 'data_venda'], name='venda_consultor_data_idx'),
+            models.Index(fields=['plano', 'data_venda'], name='venda_plano_data_idx'),
+        ]
+
+    def clean(self):
+        super().clean()
+        # O arquivamento leva a venda com o mesmo número para VendaArquivada
+        if self.numero_proposta and proposta_arquivada(self.numero_proposta, self.pk):
+            raise ValidationError({'numero_proposta': 'Já existe uma venda arquivada com este número de proposta.'})
+
+    def plano_em_cache(self):
+        # Sem o plano já carregado na instância, usa a tabela de planos em cache
+        return self.plano if Venda.plano.is_cached(self) else obter_plano(self.plano_id)
 
-        return valor
+    def valor_liquido(self):
+        plano = self.plano_em_cache()
+        return calculo.valor_liquido(
+            self.valor_plano, self.desconto_consultor, plano.taxa_plano_tipo, plano.taxa_plano_valor
+        )
 
     def __str__(self):
         return f"Proposta {self.numero_proposta} - {self.cliente.nome}"
 
     def save(self, *args, **kwargs):
-        super(Venda, self).save(*args, **kwargs)
-        # Exclui controles de recebimento existentes para evitar duplicações
-        self.controlederecebimento_set.all().delete()
-        # Gera controles de recebimento correspondentes
-        valor_liquido = self.valor_liquido()
-        valor_plano_sem_descontos = self.valor_plano
-
-        parcelas = Parcela.objects.filter(plano=self.plano).order_by('numero_parcela')
-        previous_data_recebimento_or_prevista = None
-
-        for parcela in parcelas:
-            if parcela.numero_parcela == 1:
-                valor_parcela = valor_liquido * (parcela.porcentagem_parcela / 100)
-                data_prevista = self.data_vigencia + datetime.timedelta(days=30)
-            else:
-                valor_parcela = valor_plano_sem_descontos * (parcela.porcentagem_parcela / 100)
-                if previous_data_recebimento_or_prevista:
-                    data_base = previous_data_recebimento_or_prevista
-                else:
-                    data_base = self.data_vigencia + datetime.timedelta(days=30 * (parcela.numero_parcela - 1))
-                data_prevista = data_base + datetime.timedelta(days=30)
-
-            # Cria o controle de recebimento
-            controle = ControleDeRecebimento.objects.create(
-                venda=self,
-                parcela=parcela,
-                valor_parcela=valor_parcela,
-                data_prevista_recebimento=data_prevista,
-                status='Não Recebido'
-            )
-
-            # Atualiza a data para a próxima iteração
-            previous_data_recebimento_or_prevista = controle.data_recebimento or controle.data_prevista_recebimento
-
-
-
-
+        nova = self._state.adding
+        update_fields = kwargs.get('update_fields')
+        with medir('venda-save'), transaction.atomic():
+            chaves_anteriores = set() if nova else chaves_da_venda(self.pk)
+            super(Venda, self).save(*args, **kwargs)
+            # Só recalcula o cronograma quando algum campo que o influencia foi gravado
+            alteracoes = ()
+            if update_fields is None or CAMPOS_CRONOGRAMA.intersection(update_fields):
+                alteracoes = sincronizar_cronograma(self, nova=nova)
+            chaves = chaves_da_venda(self.pk)
+            if any(alteracoes) or chaves != chaves_anteriores:
+                recalcular_resumos(chaves | chaves_anteriores)
 
 
 class ControleDeRecebimento(models.Model):
@@ -135,38 +176,302 @@ class ControleDeRecebimento(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='Não Recebido')
     numero_extrato = models.CharField(max_length=100, blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['data_prevista_recebimento'], name='controle_data_prevista_idx'),
+            models.Index(fields=['status', 'data_prevista_recebimento'], name='controle_status_data_idx'),
+            # Apenas parcelas em aberto, usadas na varredura e na listagem de atrasadas
+            models.Index(
+                fields=['data_prevista_recebimento'],
+                condition=~models.Q(status='Recebido'),
+                name='controle_aberto_data_idx',
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['venda', 'parcela'], name='controle_venda_parcela_uniq'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Guarda as datas carregadas para detectar alterações sem nova consulta
+        instance._loaded_data_recebimento = instance.__dict__.get('data_recebimento', DEFERRED)
+        instance._loaded_data_prevista_recebimento = instance.__dict__.get('data_prevista_recebimento', DEFERRED)
+        return instance
+
     def __str__(self):
         return f"Recebimento Parcela {self.parcela.numero_parcela} - Venda {self.venda.numero_proposta}"
     
 
+class VendaArquivada(models.Model):
+    """
+    Venda quitada movida para fora das tabelas em operação pelo arquivamento (core.arquivamento).
+
+    Mantém o id e os nomes de campo de Venda, de modo que relatórios,
+    filtros e exportações usem os mesmos lookups nas duas tabelas.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    numero_proposta = models.CharField(max_length=100, unique=True)
+    cliente = models.ForeignKey('Cliente', on_delete=models.PROTECT)
+    plano = models.ForeignKey('Plano', on_delete=models.PROTECT)
+    consultor = models.ForeignKey('Consultor', on_delete=models.PROTECT)
+    valor_plano = models.DecimalField(max_digits=10, decimal_places=2)
+    desconto_consultor = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
+    data_venda = models.DateField()
+    data_vigencia = models.DateField()
+    data_vencimento = models.DateField()
+    arquivado_em = models.DateTimeField()
+
+    objects = VendaQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['data_venda'], name='venda_arq_data_venda_idx'),
+        ]
+
+    def __str__(self):
+        return f"Proposta {self.numero_proposta} (arquivada)"
+
+
+class ControleDeRecebimentoArquivado(models.Model):
+    """Parcela de uma VendaArquivada, com o id e os campos de ControleDeRecebimento."""
+    id = models.BigIntegerField(primary_key=True)
+    venda = models.ForeignKey(VendaArquivada, on_delete=models.CASCADE)
+    parcela = models.ForeignKey(Parcela, on_delete=models.PROTECT)
+    valor_parcela = models.DecimalField(max_digits=10, decimal_places=2)
+    data_prevista_recebimento = models.DateField()
+    data_recebimento = models.DateField(blank=True, null=True)
+    status = models.CharField(max_length=20, choices=ControleDeRecebimento.STATUS_CHOICES)
+    numero_extrato = models.CharField(max_length=100, blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['data_prevista_recebimento'], name='controle_arq_data_prev_idx'),
+        ]
+
+    def __str__(self):
+        return f"Recebimento arquivado {self.pk} - Venda {self.venda_id}"
+
+
+class ExecucaoRotina(models.Model):
+    """Guarda até que data uma rotina periódica (ex.: varredura de atrasadas) já foi executada."""
+    nome = models.CharField(max_length=100, unique=True)
+    ultima_data = models.DateField(blank=True, null=True)
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.nome} - {self.ultima_data}"
+
+
+class VersaoDados(models.Model):
+    """Token trocado a cada gravação dos dados de um grupo de listagens; base dos ETags e do cache de respostas."""
+    nome = models.CharField(max_length=100, unique=True)
+    versao = models.CharField(max_length=32)
+    atualizado_em = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.nome} - {self.versao}"
+
+
+class ResumoComissaoMensal(models.Model):
+    """Totais de comissão por consultor, operadora e mês previsto, mantidos a cada gravação de parcelas."""
+    consultor = models.ForeignKey(Consultor, on_delete=models.CASCADE)
+    operadora = models.CharField(max_length=255)
+    mes = models.DateField()
+    esperado = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    recebido = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    atrasado = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    parcelas = models.PositiveIntegerField(default=0)
+    parcelas_recebidas = models.PositiveIntegerField(default=0)
+    parcelas_atrasadas = models.PositiveIntegerField(default=0)
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['consultor', 'operadora', 'mes'], name='resumo_consultor_op_mes_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['mes'], name='resumo_mes_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.consultor_id} - {self.operadora} - {self.mes:%m/%Y}"
+
+
+class DocumentoBusca(models.Model):
+    """Texto normalizado de um cliente, consultor ou venda no índice da busca (core.busca)."""
+    tipo = models.CharField(max_length=20)
+    objeto_id = models.BigIntegerField()
+    titulo = models.CharField(max_length=255)
+    detalhe = models.CharField(max_length=255, blank=True)
+    texto = models.TextField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['tipo', 'objeto_id'], name='busca_tipo_objeto_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.tipo} #{self.objeto_id} - {self.titulo}"
+
+
+class Tarefa(models.Model):
+    """Operação pesada (importação, conciliação, exportação...) executada pelo comando processar_tarefas."""
+    PENDENTE = 'Pendente'
+    EM_EXECUCAO = 'Em Execução'
+    CONCLUIDA = 'Concluída'
+    FALHOU = 'Falhou'
+    STATUS_CHOICES = (
+        (PENDENTE, 'Pendente'),
+        (EM_EXECUCAO, 'Em Execução'),
+        (CONCLUIDA, 'Concluída'),
+        (FALHOU, 'Falhou'),
+    )
+    tipo = models.CharField(max_length=50)
+    parametros = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=PENDENTE)
+    progresso = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(blank=True, null=True)
+    mensagem = models.CharField(max_length=255, blank=True)
+    resultado = models.JSONField(blank=True, null=True)
+    erro = models.TextField(blank=True)
+    # Arquivos enviado e gerado ficam no storage (MEDIA_ROOT), compartilhado entre
+    # o trabalhador e os processos web; a tabela que a fila consulta guarda só os caminhos
+    entrada = models.FileField(upload_to='tarefas/entradas/', blank=True)
+    saida = models.FileField(upload_to='tarefas/', blank=True)
+    saida_nome = models.CharField(max_length=255, blank=True)
+    saida_tipo = models.CharField(max_length=100, blank=True)
+    usuario = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, blank=True, null=True)
+    trabalhador = models.CharField(max_length=100, blank=True)
+    tentativas = models.PositiveSmallIntegerField(default=0)
+    criado_em = models.DateTimeField(auto_now_add=True)
+    iniciado_em = models.DateTimeField(blank=True, null=True)
+    concluido_em = models.DateTimeField(blank=True, null=True)
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'id'], name='tarefa_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.tipo} #{self.pk} - {self.status}"
+
+
+
+class Alteracao(models.Model):
+    """Entrada do feed de alterações (core.alteracoes): venda ou parcela gravada ou removida; o id é o cursor."""
+    tipo = models.CharField(max_length=20)
+    objeto_id = models.BigIntegerField()
+    removido = models.BooleanField(default=False)
+    criado_em = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['criado_em'], name='alteracao_criado_em_idx'),
+        ]
+
+    def __str__(self):
+        return f"#{self.pk} {self.tipo} {self.objeto_id}{' (removido)' if self.removido else ''}"
+
+
 # Definição dos sinais fora da classe Venda
 
+@receiver([post_save, post_delete], sender=Plano)
+@receiver([post_save, post_delete], sender=Parcela)
+def invalidar_cache_de_planos(sender, **kwargs):
+    invalidar_planos()
+
+# O resumo mensal é agrupado pela operadora do plano: renomeá-la move as parcelas de chave
+@receiver(pre_save, sender=Plano)
+def guardar_operadora_anterior(sender, instance, **kwargs):
+    instance._operadora_anterior = (
+        Plano.objects.filter(pk=instance.pk).values_list('operadora', flat=True).first() if instance.pk else None
+    )
+
+@receiver(post_save, sender=Plano)
+def atualizar_resumos_da_operadora(sender, instance, created, **kwargs):
+    anterior = getattr(instance, '_operadora_anterior', None)
+    if not created and anterior is not None and anterior != instance.operadora:
+        recalcular_resumos(chaves_do_plano(instance.pk, [anterior, instance.operadora]))
+
+@receiver(pre_delete, sender=Plano)
+def guardar_resumos_do_plano(sender, instance, **kwargs):
+    instance._chaves_resumo = chaves_do_plano(instance.pk, [instance.operadora])
+
+@receiver(post_delete, sender=Plano)
+def atualizar_resumos_do_plano_removido(sender, instance, **kwargs):
+    recalcular_resumos(getattr(instance, '_chaves_resumo', set()))
+
+# As listagens em cache incluem vendas, parcelas, planos e os nomes de clientes e consultores
+@receiver([post_save, post_delete], sender=Venda)
+@receiver([post_save, post_delete], sender=ControleDeRecebimento)
+@receiver([post_save, post_delete], sender=Plano)
+@receiver([post_save, post_delete], sender=Cliente)
+@receiver([post_save, post_delete], sender=Consultor)
+def invalidar_listagens_em_cache(sender, **kwargs):
+    invalidar_respostas()
+
+# Índice da busca atualizado depois do commit, pelo estado gravado
+@receiver([post_save, post_delete], sender=Cliente)
+@receiver([post_save, post_delete], sender=Consultor)
+@receiver([post_save, post_delete], sender=Venda)
+def atualizar_indice_de_busca(sender, instance, **kwargs):
+    indexar_depois_do_commit(sender.__name__.lower(), [instance.pk])
+
+# Feed de alterações lido pelo stream de /api/async/alteracoes/
+@receiver([post_save, post_delete], sender=Venda)
+@receiver([post_save, post_delete], sender=ControleDeRecebimento)
+def registrar_no_feed_de_alteracoes(sender, instance, **kwargs):
+    tipo = 'venda' if sender is Venda else 'controle'
+    registrar_depois_do_commit(tipo, [instance.pk], removido=kwargs['signal'] is post_delete)
+
 @receiver(pre_save, sender=ControleDeRecebimento)
+@medido('controle-pre-save')
 def store_previous_data_recebimento(sender, instance, **kwargs):
     if instance.pk:
-        # Obtém a instância antes da atualização
-        previous_instance = ControleDeRecebimento.objects.get(pk=instance.pk)
-        instance._previous_data_recebimento = previous_instance.data_recebimento
+        # Usa o valor guardado em from_db; só consulta o banco se ele não foi carregado
+        previous_data_recebimento = getattr(instance, '_loaded_data_recebimento', DEFERRED)
+        if previous_data_recebimento is DEFERRED:
+            previous_data_recebimento = ControleDeRecebimento.objects.filter(
+                pk=instance.pk
+            ).values_list('data_recebimento', flat=True).first()
+        instance._previous_data_recebimento = previous_data_recebimento
     else:
         instance._previous_data_recebimento = None
 
 @receiver(post_save, sender=ControleDeRecebimento)
+@medido('controle-post-save')
 def update_expected_dates(sender, instance, created, **kwargs):
-    if not created:
-        previous_data_recebimento = getattr(instance, '_previous_data_recebimento', None)
-        if previous_data_recebimento != instance.data_recebimento:
-            # A data de recebimento foi alterada
-            subsequent_installments = ControleDeRecebimento.objects.filter(
-                venda=instance.venda,
-                parcela__numero_parcela__gt=instance.parcela.numero_parcela
-            ).order_by('parcela__numero_parcela')
-
-            previous_date = instance.data_recebimento or instance.data_prevista_recebimento
-
-            for installment in subsequent_installments:
-                data_base = previous_date
-                new_data_prevista = data_base + datetime.timedelta(days=30)
-                if installment.data_prevista_recebimento != new_data_prevista:
-                    installment.data_prevista_recebimento = new_data_prevista
-                    installment.save(update_fields=['data_prevista_recebimento'])
-                previous_date = installment.data_recebimento or installment.data_prevista_recebimento
+    previous_data_recebimento = getattr(instance, '_previous_data_recebimento', None)
+    reprogramadas = []
+    if not created and previous_data_recebimento != instance.data_recebimento:
+        # A data de recebimento foi alterada
+        reprogramadas = reprogramar_parcelas([instance])
+    recalcular_resumos(chaves_das_parcelas(pares_das_parcelas([instance, *reprogramadas])))
+    instance._loaded_data_recebimento = instance.data_recebimento
+    instance._loaded_data_prevista_recebimento = instance.data_prevista_recebimento
+
+@receiver(post_delete, sender=ControleDeRecebimento)
+@medido('controle-post-delete')
+def atualizar_resumo_parcela_removida(sender, instance, **kwargs):
+    # Na remoção da venda inteira o resumo é recalculado uma única vez, no post_delete da venda
+    if not venda_em_remocao(instance.venda_id):
+        recalcular_resumos(chaves_das_parcelas(pares_das_parcelas([instance])))
+
+@receiver(pre_delete, sender=Venda)
+def guardar_resumos_da_venda(sender, instance, **kwargs):
+    instance._chaves_resumo = chaves_da_venda(instance.pk)
+    marcar_venda_em_remocao(instance.pk)
+
+@receiver(post_delete, sender=Venda)
+def atualizar_resumos_da_venda_removida(sender, instance, **kwargs):
+    marcar_venda_em_remocao(instance.pk, removendo=False)
+    recalcular_resumos(getattr(instance, '_chaves_resumo', set()))
+
+@receiver(post_delete, sender=Tarefa)
+def apagar_arquivos_da_tarefa(sender, instance, **kwargs):
+    # Os arquivos ficam no storage, fora da linha removida
+    for arquivo in (instance.entrada, instance.saida):
+        if arquivo:
+            transaction.on_commit(functools.partial(arquivo.delete, save=False))
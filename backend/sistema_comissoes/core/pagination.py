@@ -0,0 +1,15 @@
+from rest_framework.pagination import CursorPagination
+
+
+class PaginacaoPorCursor(CursorPagination):
+    """
+    Paginação padrão da API.
+
+    O cursor evita OFFSET, então páginas profundas custam o mesmo que a
+    primeira. A ordenação pode ser trocada com ?ordering= nas views que
+    declaram ordering_fields.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    ordering = '-id'
@@ -0,0 +1,185 @@
+import contextvars
+import threading
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+# Chaves no cache compartilhado: a versão muda a cada alteração de Plano/Parcela
+CHAVE_VERSAO = 'planos:versao'
+CHAVE_TABELA = 'planos:tabela:{versao}'
+VALIDADE_TABELA = 24 * 60 * 60
+# Linha de VersaoDados com a versão dos planos quando não há cache compartilhado
+VERSAO_PLANOS = 'planos'
+
+# (versão, tabela) carregada neste processo; substituída de uma vez, sem travas na leitura
+_tabela_local = (None, None)
+_trava = threading.Lock()
+# Versão lida uma vez por requisição ou tarefa (ver versao_fixa); None fora delas
+_versao_memorizada = contextvars.ContextVar('versao_planos', default=None)
+
+
+def _cache_compartilhado():
+    alias = getattr(settings, 'PLANOS_CACHE', '')
+    return caches[alias] if alias else None
+
+
+def _versao_atual(cache):
+    if cache is None:
+        # Sem cache compartilhado a versão fica no banco, visível a todos os processos
+        from .models import VersaoDados
+
+        versao = VersaoDados.objects.filter(nome=VERSAO_PLANOS).values_list('versao', flat=True).first()
+        return versao or ''
+    versao = cache.get(CHAVE_VERSAO)
+    if versao is None:
+        cache.add(CHAVE_VERSAO, 1, timeout=None)
+        versao = cache.get(CHAVE_VERSAO, 1)
+    return versao
+
+
+def _versao(cache):
+    memoria = _versao_memorizada.get()
+    if memoria is None:
+        return _versao_atual(cache)
+    if 'versao' not in memoria:
+        memoria['versao'] = _versao_atual(cache)
+    return memoria['versao']
+
+
+@contextmanager
+def versao_fixa():
+    """
+    Lê a versão dos planos uma única vez dentro do bloco.
+
+    Sem PLANOS_CACHE cada leitura da versão é uma consulta a VersaoDados; o
+    PlanosMiddleware e o trabalhador da fila envolvem cada requisição e cada
+    tarefa neste bloco. Alterações de planos feitas dentro dele descartam a
+    versão lida.
+    """
+    token = _versao_memorizada.set({})
+    try:
+        yield
+    finally:
+        _versao_memorizada.reset(token)
+
+
+class PlanosMiddleware:
+    """Lê a versão dos planos no máximo uma vez por requisição."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.assincrono = iscoroutinefunction(get_response)
+        if self.assincrono:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.assincrono:
+            return self.__acall__(request)
+        with versao_fixa():
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        with versao_fixa():
+            return await self.get_response(request)
+
+
+def _carregar_do_banco():
+    from .models import Parcela, Plano
+
+    tabela = {plano.pk: (plano, []) for plano in Plano.objects.all()}
+    for parcela in Parcela.objects.order_by('plano_id', 'numero_parcela'):
+        tabela[parcela.plano_id][1].append(parcela)
+    return tabela
+
+
+def tabela_de_planos():
+    """
+    Mapa plano_id -> (Plano, parcelas ordenadas por numero_parcela).
+
+    Fica na memória do processo enquanto a versão não mudar. Com PLANOS_CACHE
+    configurado, a versão e a própria tabela vêm do cache compartilhado; sem
+    ele, a versão é lida da linha 'planos' de VersaoDados a cada uso, ou uma vez
+    por bloco versao_fixa (requisição ou tarefa). Nos dois
+    casos uma alteração feita em um worker vale para todos. As instâncias
+    devolvidas são compartilhadas e não devem ser alteradas.
+    """
+    global _tabela_local
+    cache = _cache_compartilhado()
+    versao = _versao(cache)
+    versao_local, tabela = _tabela_local
+    if versao_local == versao and tabela is not None:
+        return tabela
+
+    with _trava:
+        versao_local, tabela = _tabela_local
+        if versao_local == versao and tabela is not None:
+            return tabela
+        tabela = cache.get(CHAVE_TABELA.format(versao=versao)) if cache is not None else None
+        if tabela is None:
+            tabela = _carregar_do_banco()
+            if cache is not None:
+                cache.set(CHAVE_TABELA.format(versao=versao), tabela, VALIDADE_TABELA)
+        _tabela_local = (versao, tabela)
+    return tabela
+
+
+def _entrada(plano_id):
+    tabela = tabela_de_planos()
+    if plano_id not in tabela:
+        # Plano criado sem passar pelos sinais (ex.: bulk_create): recarrega uma vez
+        _invalidar()
+        tabela = tabela_de_planos()
+    return tabela.get(plano_id)
+
+
+def obter_plano(plano_id):
+    """Plano em cache; levanta Plano.DoesNotExist se não existir."""
+    from .models import Plano
+
+    entrada = _entrada(plano_id)
+    if entrada is None:
+        raise Plano.DoesNotExist(f'Plano {plano_id} não encontrado.')
+    return entrada[0]
+
+
+def parcelas_do_plano(plano_id):
+    """Parcelas do plano em cache, ordenadas por numero_parcela."""
+    entrada = _entrada(plano_id)
+    return entrada[1] if entrada else []
+
+
+def _invalidar():
+    global _tabela_local
+    with _trava:
+        _tabela_local = (None, None)
+    memoria = _versao_memorizada.get()
+    if memoria is not None:
+        memoria.clear()
+    cache = _cache_compartilhado()
+    if cache is None:
+        from .cache_respostas import trocar_versao
+
+        trocar_versao(VERSAO_PLANOS)
+        return
+    try:
+        cache.incr(CHAVE_VERSAO)
+    except ValueError:
+        cache.add(CHAVE_VERSAO, 1, timeout=None)
+
+
+def invalidar_planos():
+    """
+    Descarta a tabela de planos em cache.
+
+    Chamada pelos sinais de save/delete de Plano e Parcela; operações em massa
+    (update(), bulk_create) precisam chamá-la explicitamente. Invalida de novo
+    no commit para que outro processo não guarde dados lidos antes dele.
+    """
+    _invalidar()
+    transaction.on_commit(_invalidar)
@@ -0,0 +1,99 @@
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+
+from django.db.models import Exists, OuterRef, Q
+
+from .calculo import DadosVenda, Recebimento, projetar_fluxo
+from .cronograma import dados_do_plano
+from .models import ControleDeRecebimento, Venda
+from .planos import tabela_de_planos
+
+DIMENSOES_PROJECAO = ('consultor', 'operadora')
+
+
+def vendas_em_aberto(queryset=None):
+    """Vendas com ao menos uma parcela ainda não recebida."""
+    if queryset is None:
+        queryset = Venda.objects.all()
+    return queryset.filter(
+        Exists(ControleDeRecebimento.objects.filter(venda=OuterRef('pk')).exclude(status='Recebido'))
+    )
+
+
+def _recebimentos_do_lote(venda_ids):
+    """Parcelas já recebidas ou com data de recebimento, por venda: numero_parcela -> Recebimento."""
+    recebimentos = defaultdict(dict)
+    linhas = (
+        ControleDeRecebimento.objects
+        .filter(venda_id__in=venda_ids)
+        .filter(Q(status='Recebido') | Q(data_recebimento__isnull=False))
+        .values_list('venda_id', 'parcela__numero_parcela', 'status', 'data_recebimento')
+    )
+    for venda_id, numero_parcela, status, data_recebimento in linhas:
+        recebimentos[venda_id][numero_parcela] = Recebimento(data_recebimento, status == 'Recebido')
+    return recebimentos
+
+
+def projetar_comissoes(queryset=None, meses=12, atraso_dias=0, agrupar=None, hoje=None, tamanho_lote=5000):
+    """
+    Projeta o fluxo mensal de comissões das vendas em aberto, sem gravar nada.
+
+    Os cronogramas são recalculados em memória com o plano atual (core.calculo),
+    em lotes de vendas do mesmo plano. Parcelas em aberto são consideradas
+    recebidas na data prevista (ou hoje, se vencidas) mais `atraso_dias`, e as
+    seguintes são reprogramadas a partir dessa data. Retorna uma linha por mês
+    e combinação das dimensões de `agrupar` (consultor, operadora).
+    """
+    hoje = hoje or date.today()
+    agrupar = agrupar or []
+    tabela = tabela_de_planos()
+    totais = defaultdict(lambda: [Decimal('0.00'), 0])
+    consultores = {}
+
+    def processar(plano_id, lote):
+        plano, parcelas = tabela[plano_id]
+        recebimentos = _recebimentos_do_lote([linha[0] for linha in lote])
+        grupos = []
+        for venda_id, _, consultor_id, consultor_nome, *_ in lote:
+            consultores[consultor_id] = consultor_nome
+            grupos.append(tuple(
+                consultor_id if dimensao == 'consultor' else plano.operadora for dimensao in agrupar
+            ))
+        fluxo = projetar_fluxo(
+            [DadosVenda(*linha[4:]) for linha in lote], dados_do_plano(plano, parcelas),
+            [recebimentos.get(linha[0]) for linha in lote], hoje, meses, atraso_dias, grupos,
+        )
+        for chave, (valor, quantidade) in fluxo.items():
+            total = totais[chave]
+            total[0] += valor
+            total[1] += quantidade
+
+    linhas = (
+        vendas_em_aberto(queryset)
+        .order_by('plano_id', 'pk')
+        .values_list('pk', 'plano_id', 'consultor_id', 'consultor__nome', 'valor_plano', 'desconto_consultor', 'data_vigencia')
+        .iterator(chunk_size=tamanho_lote)
+    )
+    lote = []
+    for linha in linhas:
+        if linha[1] not in tabela:
+            continue
+        if lote and (lote[-1][1] != linha[1] or len(lote) >= tamanho_lote):
+            processar(lote[0][1], lote)
+            lote = []
+        lote.append(linha)
+    if lote:
+        processar(lote[0][1], lote)
+
+    resultados = []
+    for (grupo, mes), (valor, quantidade) in sorted(totais.items(), key=lambda item: (item[0][1], item[0][0])):
+        linha = {'mes': mes.isoformat()}
+        for dimensao, valor_dimensao in zip(agrupar, grupo):
+            if dimensao == 'consultor':
+                linha.update(consultor_id=valor_dimensao, consultor_nome=consultores[valor_dimensao])
+            else:
+                linha['operadora'] = valor_dimensao
+        linha.update(previsto=str(valor), parcelas=quantidade)
+        resultados.append(linha)
+    return resultados
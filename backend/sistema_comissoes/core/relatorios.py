@@ -0,0 +1,231 @@
+from datetime import date
+from decimal import Decimal
+
+from django.db.models import Count, DecimalField, F, Q, Sum, Value
+from django.db.models.functions import Coalesce, TruncMonth
+
+from .arquivamento import incluir_arquivo
+from .calculo import CENTAVOS
+from .models import ControleDeRecebimento, ResumoComissaoMensal, Venda, expressao_valor_liquido
+
+# Dimensões de agrupamento: nome -> campos (ou expressão) relativos ao modelo consultado
+DIMENSOES_COMISSOES = {
+    'consultor': {'consultor_id': 'venda__consultor_id', 'consultor_nome': 'venda__consultor__nome'},
+    'operadora': {'operadora': 'venda__plano__operadora'},
+    'tipo': {'tipo': 'venda__plano__tipo'},
+    'mes': {'mes': TruncMonth('data_prevista_recebimento')},
+}
+
+# Dimensões disponíveis no resumo mensal materializado (ResumoComissaoMensal)
+DIMENSOES_RESUMO = {
+    'consultor': {'consultor_id': 'consultor_id', 'consultor_nome': 'consultor__nome'},
+    'operadora': {'operadora': 'operadora'},
+    'mes': {'mes': 'mes'},
+}
+
+# Filtros aceitos pelo resumo mensal: parâmetro -> campo do ResumoComissaoMensal
+FILTROS_RESUMO = {'consultor': 'consultor_id', 'operadora': 'operadora'}
+
+DIMENSOES_VENDAS = {
+    'consultor': {'consultor_id': 'consultor_id', 'consultor_nome': 'consultor__nome'},
+    'operadora': {'operadora': 'plano__operadora'},
+    'tipo': {'tipo': 'plano__tipo'},
+    'mes': {'mes': TruncMonth('data_venda')},
+}
+
+
+class ParametroInvalido(ValueError):
+    pass
+
+
+def ler_dimensoes(valor, disponiveis):
+    dimensoes = [item.strip() for item in (valor or '').split(',') if item.strip()]
+    invalidas = [item for item in dimensoes if item not in disponiveis]
+    if invalidas:
+        raise ParametroInvalido(
+            f"Agrupamento inválido: {', '.join(invalidas)}. Use: {', '.join(disponiveis)}."
+        )
+    return dimensoes
+
+
+def _consulta_agrupada(queryset, dimensoes, disponiveis, agregados):
+    """Queryset agrupado pelas dimensões, ou None quando não há dimensões (total geral)."""
+    campos = {}
+    for dimensao in dimensoes:
+        campos.update(disponiveis[dimensao])
+    if not campos:
+        return None
+
+    diretos = [nome for nome, origem in campos.items() if origem == nome]
+    nomeados = {
+        nome: F(origem) if isinstance(origem, str) else origem
+        for nome, origem in campos.items() if origem != nome
+    }
+    return queryset.values(*diretos, **nomeados).annotate(**agregados).order_by(*campos)
+
+
+def _agrupar(queryset, dimensoes, disponiveis, agregados):
+    agrupado = _consulta_agrupada(queryset, dimensoes, disponiveis, agregados)
+    if agrupado is None:
+        return [queryset.aggregate(**agregados)]
+    return list(agrupado)
+
+
+async def _aagrupar(queryset, dimensoes, disponiveis, agregados):
+    """Versão assíncrona de `_agrupar`, com as APIs assíncronas do ORM."""
+    agrupado = _consulta_agrupada(queryset, dimensoes, disponiveis, agregados)
+    if agrupado is None:
+        return [await queryset.aaggregate(**agregados)]
+    return [linha async for linha in agrupado]
+
+
+def _somar_linhas(agregados, *fontes):
+    """
+    Junta linhas agrupadas de mais de uma fonte (tabelas em operação e arquivo).
+
+    Linhas com as mesmas dimensões têm os agregados somados; o resultado segue
+    ordenado pelas dimensões, como em `_consulta_agrupada`.
+    """
+    totais = {}
+    for linhas in fontes:
+        for linha in linhas:
+            chave = tuple((nome, valor) for nome, valor in linha.items() if nome not in agregados)
+            if chave not in totais:
+                totais[chave] = dict(linha)
+                continue
+            total = totais[chave]
+            for nome in agregados:
+                total[nome] += linha[nome]
+    return [totais[chave] for chave in sorted(totais, key=lambda chave: [(valor is None, valor) for _, valor in chave])]
+
+
+def _agrupar_com_arquivo(consulta, arquivados):
+    queryset, agrupar, disponiveis, agregados = consulta
+    linhas = _agrupar(*consulta)
+    if arquivados is None:
+        return linhas
+    return _somar_linhas(agregados, linhas, _agrupar(arquivados, agrupar, disponiveis, agregados))
+
+
+async def _aagrupar_com_arquivo(consulta, arquivados):
+    queryset, agrupar, disponiveis, agregados = consulta
+    linhas = await _aagrupar(*consulta)
+    if arquivados is None:
+        return linhas
+    return _somar_linhas(agregados, linhas, await _aagrupar(arquivados, agrupar, disponiveis, agregados))
+
+
+def _soma(expressao, **kwargs):
+    return Coalesce(
+        Sum(expressao, **kwargs), Value(Decimal('0.00')),
+        output_field=DecimalField(max_digits=14, decimal_places=2),
+    )
+
+
+def _formatar(linhas):
+    resultado = []
+    for linha in linhas:
+        item = {}
+        for nome, valor in linha.items():
+            if hasattr(valor, 'isoformat'):
+                valor = valor.isoformat()
+            elif isinstance(valor, Decimal):
+                valor = str(valor.quantize(CENTAVOS))
+            item[nome] = valor
+        resultado.append(item)
+    return resultado
+
+
+def usa_resumo(parametros, agrupar, filtros):
+    """
+    Indica se o relatório de comissões pode ser lido do resumo mensal.
+
+    Vale quando o agrupamento cabe em DIMENSOES_RESUMO e os filtros informados
+    (dentre `filtros`) estão em FILTROS_RESUMO; ?fonte=bruto força as parcelas,
+    assim como ?incluir_arquivo=1, já que o resumo cobre só as vendas em operação.
+    """
+    if parametros.get('fonte') == 'bruto' or incluir_arquivo(parametros):
+        return False
+    informados = {parametro for parametro in filtros if parametros.get(parametro) not in (None, '')}
+    return set(agrupar) <= set(DIMENSOES_RESUMO) and informados <= set(FILTROS_RESUMO)
+
+
+def _consulta_comissoes(queryset, agrupar, hoje):
+    hoje = hoje or date.today()
+    if queryset is None:
+        queryset = ControleDeRecebimento.objects.all()
+    recebido = Q(status='Recebido')
+    atrasado = ~Q(status='Recebido') & Q(data_prevista_recebimento__lt=hoje)
+    agregados = {
+        'esperado': _soma('valor_parcela'),
+        'recebido': _soma('valor_parcela', filter=recebido),
+        'atrasado': _soma('valor_parcela', filter=atrasado),
+        'parcelas': Count('id'),
+        'parcelas_recebidas': Count('id', filter=recebido),
+        'parcelas_atrasadas': Count('id', filter=atrasado),
+    }
+    return queryset, agrupar or [], DIMENSOES_COMISSOES, agregados
+
+
+def _consulta_comissoes_resumida(queryset, agrupar):
+    if queryset is None:
+        queryset = ResumoComissaoMensal.objects.all()
+    agregados = {campo: _soma(campo) for campo in ('esperado', 'recebido', 'atrasado')}
+    agregados.update({
+        campo: Coalesce(Sum(campo), Value(0))
+        for campo in ('parcelas', 'parcelas_recebidas', 'parcelas_atrasadas')
+    })
+    return queryset, agrupar or [], DIMENSOES_RESUMO, agregados
+
+
+def _consulta_vendas(queryset, agrupar):
+    if queryset is None:
+        queryset = Venda.objects.all()
+    agregados = {
+        'vendas': Count('id'),
+        'total_valor_plano': _soma('valor_plano'),
+        'total_valor_liquido': _soma(expressao_valor_liquido()),
+    }
+    return queryset, agrupar or [], DIMENSOES_VENDAS, agregados
+
+
+def relatorio_comissoes(queryset=None, agrupar=None, hoje=None, arquivados=None):
+    """
+    Totais de comissão previstos, recebidos e em atraso, calculados no banco.
+
+    `agrupar` combina as dimensões consultor, operadora, tipo e mes (mês da
+    data prevista de recebimento); sem dimensões retorna o total geral.
+    `arquivados`, se informado, é um queryset de ControleDeRecebimentoArquivado
+    somado às parcelas em operação.
+    """
+    return _formatar(_agrupar_com_arquivo(_consulta_comissoes(queryset, agrupar, hoje), arquivados))
+
+
+def relatorio_comissoes_resumido(queryset=None, agrupar=None):
+    """
+    Mesmos totais de `relatorio_comissoes`, somados a partir do resumo mensal.
+
+    O custo depende da quantidade de resumos (consultor x operadora x mês), não
+    da quantidade de parcelas; só aceita as dimensões de DIMENSOES_RESUMO.
+    """
+    return _formatar(_agrupar(*_consulta_comissoes_resumida(queryset, agrupar)))
+
+
+def relatorio_vendas(queryset=None, agrupar=None, arquivados=None):
+    """Quantidade de vendas, valor bruto e valor líquido somados no banco; `arquivados` soma VendaArquivada."""
+    return _formatar(_agrupar_com_arquivo(_consulta_vendas(queryset, agrupar), arquivados))
+
+
+async def arelatorio_comissoes(queryset=None, agrupar=None, hoje=None, arquivados=None):
+    """Versão assíncrona de `relatorio_comissoes`."""
+    return _formatar(await _aagrupar_com_arquivo(_consulta_comissoes(queryset, agrupar, hoje), arquivados))
+
+
+async def arelatorio_comissoes_resumido(queryset=None, agrupar=None):
+    """Versão assíncrona de `relatorio_comissoes_resumido`."""
+    return _formatar(await _aagrupar(*_consulta_comissoes_resumida(queryset, agrupar)))
+
+
+async def arelatorio_vendas(queryset=None, agrupar=None, arquivados=None):
+    """Versão assíncrona de `relatorio_vendas`."""
+    return _formatar(await _aagrupar_com_arquivo(_consulta_vendas(queryset, agrupar), arquivados))
@@ -0,0 +1,37 @@
+from decimal import Decimal
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - o orjson é opcional
+    orjson = None
+
+
+class EncoderDecimalComoTexto(JSONEncoder):
+    """Encoder do DRF com Decimal em texto, como os serializers fazem (COERCE_DECIMAL_TO_STRING)."""
+
+    def default(self, obj):
+        if isinstance(obj, Decimal):
+            return str(obj)
+        return super().default(obj)
+
+
+class JSONRapidoRenderer(JSONRenderer):
+    """
+    Renderer JSON padrão da API, com o orjson quando instalado.
+
+    A saída é a mesma do JSONRenderer (UTF-8, compacta, datas ISO 8601 com
+    "Z" em UTC); tipos que o orjson não conhece passam pelo encoder do DRF.
+    Respostas com indentação pedida no Accept usam o JSONRenderer.
+    """
+    encoder_class = EncoderDecimalComoTexto
+    opcoes_orjson = (orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS) if orjson else 0
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        conteudo = orjson.dumps(data, default=self.encoder_class().default, option=self.opcoes_orjson)
+        # Mesmo escape do JSONRenderer para os separadores de linha do JavaScript
+        return conteudo.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
@@ -0,0 +1,238 @@
+"""
+Reprecificação de um plano: novas porcentagens de parcela e/ou nova taxa,
+aplicadas de uma vez às parcelas em aberto de todas as vendas do plano.
+
+Editar Parcela/Plano pela API só corrige o cronograma de cada venda quando ela
+é gravada de novo. Aqui as vendas são lidas em lotes por faixa de id, os
+valores recalculados com calculo.calcular_valores (NumPy quando disponível) e
+só as parcelas que mudaram são gravadas, com um UPDATE em lote por chave e uma
+transação curta por lote. Parcelas recebidas e datas previstas não mudam: o
+valor não depende das datas. Sem novas condições, alinha as vendas a um plano
+já editado pela API.
+"""
+import datetime
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+
+from django.db import connections, router, transaction
+
+from .alteracoes import CONTROLE, registrar_depois_do_commit
+from .cache_respostas import invalidar_respostas
+from .calculo import DadosPlano, DadosVenda, calcular_valores
+from .planos import invalidar_planos
+from .resumos import ajustar_resumos, mes_de
+
+# Vendas lidas e recalculadas por consulta
+TAMANHO_LOTE_REPRECIFICACAO = 2000
+# Leituras de um lote cujas parcelas outra gravação alterou antes do UPDATE
+TENTATIVAS_LOTE = 3
+
+# Limites dos DecimalField de Parcela.porcentagem_parcela e Plano.taxa_plano_valor
+PORCENTAGEM_MAXIMA = Decimal('10000')
+TAXA_MAXIMA = Decimal('100000000')
+
+
+def _decimal(valor, campo, maximo):
+    try:
+        numero = Decimal(str(valor).strip().replace(',', '.'))
+    except (InvalidOperation, ValueError):
+        raise ValueError(f'{campo}: valor inválido ({valor}).')
+    if not numero.is_finite() or numero < 0 or numero >= maximo or numero != numero.quantize(Decimal('0.01')):
+        raise ValueError(f'{campo}: informe um valor entre 0 e {maximo} com até duas casas decimais.')
+    return numero.quantize(Decimal('0.01'))
+
+
+def novas_condicoes(plano, parcelas, porcentagens=None, taxa_plano_tipo=None, taxa_plano_valor=None):
+    """
+    Valida a reprecificação e devolve (DadosPlano novo, alterações).
+
+    `porcentagens` mapeia numero_parcela -> nova porcentagem; parcelas não
+    informadas mantêm a atual. A quantidade de parcelas do plano não muda.
+    `alterações` descreve apenas o que difere do plano atual, como
+    {campo: [anterior, novo]}. Levanta ValueError para dados inválidos.
+    """
+    from .models import Plano
+
+    atuais = {parcela.numero_parcela: parcela.porcentagem_parcela for parcela in parcelas}
+    novas = dict(atuais)
+    for numero, porcentagem in (porcentagens or {}).items():
+        try:
+            numero = int(numero)
+        except (TypeError, ValueError):
+            raise ValueError(f'Número de parcela inválido: {numero}.')
+        if numero not in atuais:
+            raise ValueError(f'O plano não tem a parcela {numero}.')
+        novas[numero] = _decimal(porcentagem, f'Parcela {numero}', PORCENTAGEM_MAXIMA)
+
+    tipo = plano.taxa_plano_tipo if taxa_plano_tipo is None else taxa_plano_tipo
+    if tipo not in dict(Plano.TAXA_TIPO_CHOICES):
+        raise ValueError(f'taxa_plano_tipo inválido: {tipo}.')
+    valor = plano.taxa_plano_valor if taxa_plano_valor is None else _decimal(taxa_plano_valor, 'taxa_plano_valor', TAXA_MAXIMA)
+
+    alteracoes = {}
+    if tipo != plano.taxa_plano_tipo:
+        alteracoes['taxa_plano_tipo'] = [plano.taxa_plano_tipo, tipo]
+    if valor != plano.taxa_plano_valor:
+        alteracoes['taxa_plano_valor'] = [str(plano.taxa_plano_valor), str(valor)]
+    mudadas = {numero: [str(atuais[numero]), str(novas[numero])] for numero in sorted(novas) if novas[numero] != atuais[numero]}
+    if mudadas:
+        alteracoes['parcelas'] = mudadas
+    return DadosPlano(tipo, valor, tuple(sorted(novas.items()))), alteracoes
+
+
+def reprecificar_plano(
+    plano_id, porcentagens=None, taxa_plano_tipo=None, taxa_plano_valor=None, simular=False,
+    tamanho_lote=TAMANHO_LOTE_REPRECIFICACAO,
+):
+    """
+    Recalcula os valores das parcelas em aberto das vendas do plano com as novas condições.
+
+    Gera uma diferença por parcela alterada ({controle, venda, parcela,
+    valor_anterior, valor_novo}), o progresso de cada lote ({lote, vendas}) e
+    termina com um resumo. Com `simular` nada é gravado. Sem ele, plano e
+    parcelas do plano são gravados primeiro e cada lote de vendas é confirmado
+    em sua própria transação, antes de suas linhas serem geradas. Interrompida
+    no meio, basta repetir a reprecificação: o plano já tem as condições novas
+    e as parcelas já recalculadas não mudam de novo. Levanta
+    Plano.DoesNotExist ou ValueError antes de gerar qualquer linha.
+    """
+    from .models import Parcela, Plano
+
+    plano = Plano.objects.get(pk=plano_id)
+    parcelas = list(Parcela.objects.filter(plano_id=plano_id).order_by('numero_parcela'))
+    dados_plano, alteracoes = novas_condicoes(plano, parcelas, porcentagens, taxa_plano_tipo, taxa_plano_valor)
+    return _reprecificar(plano, parcelas, dados_plano, alteracoes, simular, tamanho_lote)
+
+
+def _gravar_valores(alteradas):
+    """
+    Grava trios (valor_novo, id, valor_anterior) com um UPDATE por chave primária em executemany.
+
+    Para centenas de milhares de parcelas é bem mais rápido que o CASE/WHEN
+    gerado pelo bulk_update, e também não dispara sinais. Cada UPDATE só vale
+    se a parcela ainda tem o valor anterior; devolve quantas foram gravadas.
+    """
+    from .models import ControleDeRecebimento
+
+    conexao = connections[router.db_for_write(ControleDeRecebimento)]
+    campo = ControleDeRecebimento._meta.get_field('valor_parcela')
+    coluna = conexao.ops.quote_name(campo.column)
+    sql = 'UPDATE {} SET {} = %s WHERE {} = %s AND {} = %s'.format(
+        conexao.ops.quote_name(ControleDeRecebimento._meta.db_table),
+        coluna,
+        conexao.ops.quote_name(ControleDeRecebimento._meta.pk.column),
+        coluna,
+    )
+    with conexao.cursor() as cursor:
+        cursor.executemany(sql, [
+            (campo.get_db_prep_save(novo, conexao), pk, campo.get_db_prep_save(anterior, conexao))
+            for novo, pk, anterior in alteradas
+        ])
+        return cursor.rowcount
+
+
+def _reprecificar_lote(plano, vendas, dados_plano, coluna_da_parcela, simular, hoje):
+    """
+    Recalcula as parcelas em aberto de um lote de vendas e, sem `simular`, grava o lote.
+
+    Devolve as parcelas alteradas, como (controle, venda, parcela, valor
+    anterior, valor novo). Valores, registro de
+    alterações e resumos do lote são confirmados juntos em uma transação
+    curta. Se outra gravação mudou alguma das parcelas entre a leitura e o
+    UPDATE, o lote é desfeito e lido de novo.
+    """
+    from .models import ControleDeRecebimento
+
+    primeiro_id, ultimo_id = vendas[0][0], vendas[-1][0]
+    valores = calcular_valores([DadosVenda(*venda[2:]) for venda in vendas], dados_plano)
+    valores_por_venda = dict(zip((venda[0] for venda in vendas), valores))
+    consultores = {venda[0]: venda[1] for venda in vendas}
+
+    for _ in range(TENTATIVAS_LOTE):
+        with transaction.atomic():
+            # Faixa de ids em vez de IN: a consulta não cresce com o lote
+            abertas = (
+                ControleDeRecebimento.objects
+                .filter(venda__plano_id=plano.pk, venda_id__gte=primeiro_id, venda_id__lte=ultimo_id)
+                .exclude(status='Recebido')
+                .order_by('venda_id', 'parcela_id')
+                .values_list('pk', 'venda_id', 'parcela_id', 'valor_parcela', 'data_prevista_recebimento')
+            )
+            alteradas = []
+            # (consultor, operadora, mês) -> [variação do esperado, variação do atrasado]
+            variacoes = defaultdict(lambda: [Decimal('0.00'), Decimal('0.00')])
+            for controle_id, venda_id, parcela_id, valor_atual, data_prevista in abertas:
+                coluna = coluna_da_parcela.get(parcela_id)
+                if coluna is None:
+                    continue
+                valor_novo = valores_por_venda[venda_id][coluna]
+                if valor_novo == valor_atual:
+                    continue
+                alteradas.append((controle_id, venda_id, parcela_id, valor_atual, valor_novo))
+                diferenca = valor_novo - valor_atual
+                variacao = variacoes[(consultores[venda_id], plano.operadora, mes_de(data_prevista))]
+                variacao[0] += diferenca
+                if data_prevista < hoje:
+                    variacao[1] += diferenca
+
+            if simular or not alteradas:
+                return alteradas
+            if _gravar_valores([(novo, controle_id, anterior) for controle_id, _, _, anterior, novo in alteradas]) == len(alteradas):
+                registrar_depois_do_commit(CONTROLE, [alterada[0] for alterada in alteradas])
+                # As gravações não passam pelos sinais: só valores em aberto mudaram, o resumo recebe as diferenças
+                ajustar_resumos(variacoes)
+                invalidar_respostas()
+                return alteradas
+            transaction.set_rollback(True)
+    raise RuntimeError(
+        f'Parcelas das vendas {primeiro_id} a {ultimo_id} foram alteradas durante a reprecificação; repita a operação.'
+    )
+
+
+def _reprecificar(plano, parcelas, dados_plano, alteracoes, simular, tamanho_lote):
+    from .models import Parcela, Plano, Venda
+
+    coluna_da_parcela = {parcela.pk: coluna for coluna, parcela in enumerate(parcelas)}
+    numero_da_parcela = {parcela.pk: parcela.numero_parcela for parcela in parcelas}
+    resumo = {
+        'plano': plano.pk, 'simulacao': simular, 'alteracoes': alteracoes,
+        'vendas': 0, 'parcelas_alteradas': 0, 'diferenca': Decimal('0.00'),
+    }
+    hoje = datetime.date.today()
+
+    if not simular:
+        with transaction.atomic():
+            Plano.objects.filter(pk=plano.pk).update(
+                taxa_plano_tipo=dados_plano.taxa_tipo, taxa_plano_valor=dados_plano.taxa_valor,
+            )
+            porcentagens = dict(dados_plano.parcelas)
+            for parcela in parcelas:
+                parcela.porcentagem_parcela = porcentagens[parcela.numero_parcela]
+            Parcela.objects.bulk_update(parcelas, ['porcentagem_parcela'])
+            invalidar_planos()
+
+    ultimo_id = 0
+    numero_lote = 0
+    while True:
+        vendas = list(
+            Venda.objects.filter(plano_id=plano.pk, pk__gt=ultimo_id).order_by('pk')
+            .values_list('pk', 'consultor_id', 'valor_plano', 'desconto_consultor', 'data_vigencia')[:tamanho_lote]
+        )
+        if not vendas:
+            break
+        numero_lote += 1
+        ultimo_id = vendas[-1][0]
+        # Nada é gerado com a transação do lote aberta: quem consome pode gravar progresso
+        alteradas = _reprecificar_lote(plano, vendas, dados_plano, coluna_da_parcela, simular, hoje)
+        for controle_id, venda_id, parcela_id, valor_atual, valor_novo in alteradas:
+            resumo['diferenca'] += valor_novo - valor_atual
+            yield {
+                'controle': controle_id, 'venda': venda_id, 'parcela': numero_da_parcela[parcela_id],
+                'valor_anterior': str(valor_atual), 'valor_novo': str(valor_novo),
+            }
+        resumo['vendas'] += len(vendas)
+        resumo['parcelas_alteradas'] += len(alteradas)
+        yield {'lote': numero_lote, 'vendas': resumo['vendas']}
+
+    resumo['diferenca'] = str(resumo['diferenca'])
+    yield {'resumo': resumo}
@@ -0,0 +1,291 @@
+import contextvars
+import datetime
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, Q, Sum, Value
+from django.db.models.functions import Coalesce, TruncMonth
+from django.utils import timezone
+
+# Quantidade de grupos (consultor, operadora) combinados por consulta de recálculo
+GRUPOS_POR_CONSULTA = 100
+
+# Vendas sendo removidas: suas parcelas não recalculam o resumo uma a uma
+_vendas_em_remocao = contextvars.ContextVar('vendas_em_remocao', default=frozenset())
+
+CAMPOS_TOTAIS = ['esperado', 'recebido', 'atrasado', 'parcelas', 'parcelas_recebidas', 'parcelas_atrasadas']
+
+
+def mes_de(data):
+    return data.replace(day=1)
+
+
+def proximo_mes(mes):
+    return (mes + datetime.timedelta(days=32)).replace(day=1)
+
+
+def _soma(campo, **kwargs):
+    return Coalesce(
+        Sum(campo, **kwargs), Value(Decimal('0.00')),
+        output_field=DecimalField(max_digits=14, decimal_places=2),
+    )
+
+
+def agregar_parcelas(queryset, hoje=None):
+    """Agrupa parcelas por (consultor, operadora, mês da data prevista) com os totais do resumo."""
+    hoje = hoje or datetime.date.today()
+    recebido = Q(status='Recebido')
+    atrasado = ~Q(status='Recebido') & Q(data_prevista_recebimento__lt=hoje)
+    return (
+        queryset
+        .values(
+            consultor_ref=F('venda__consultor_id'),
+            operadora=F('venda__plano__operadora'),
+            mes=TruncMonth('data_prevista_recebimento'),
+        )
+        .annotate(
+            esperado=_soma('valor_parcela'),
+            recebido=_soma('valor_parcela', filter=recebido),
+            atrasado=_soma('valor_parcela', filter=atrasado),
+            parcelas=Count('id'),
+            parcelas_recebidas=Count('id', filter=recebido),
+            parcelas_atrasadas=Count('id', filter=atrasado),
+        )
+        .order_by()
+    )
+
+
+def _resumo(linha):
+    from .models import ResumoComissaoMensal
+
+    return ResumoComissaoMensal(
+        consultor_id=linha['consultor_ref'],
+        operadora=linha['operadora'],
+        mes=linha['mes'],
+        **{campo: linha[campo] for campo in CAMPOS_TOTAIS},
+    )
+
+
+def chaves_da_venda(venda_id):
+    """Chaves (consultor_id, operadora, mes) dos resumos que contêm parcelas da venda."""
+    from .models import ControleDeRecebimento
+
+    linhas = (
+        ControleDeRecebimento.objects
+        .filter(venda_id=venda_id)
+        .values_list('venda__consultor_id', 'venda__plano__operadora', 'data_prevista_recebimento')
+    )
+    return {(consultor_id, operadora, mes_de(data)) for consultor_id, operadora, data in linhas}
+
+
+def chaves_do_plano(plano_id, operadoras):
+    """Chaves dos resumos que contêm parcelas das vendas do plano, sob cada uma das `operadoras`."""
+    from .models import ControleDeRecebimento
+
+    pares = (
+        ControleDeRecebimento.objects
+        .filter(venda__plano_id=plano_id)
+        .annotate(mes=TruncMonth('data_prevista_recebimento'))
+        .values_list('venda__consultor_id', 'mes')
+        .distinct()
+        .order_by()
+    )
+    return {(consultor_id, operadora, mes) for consultor_id, mes in pares for operadora in operadoras}
+
+
+def chaves_das_parcelas(pares):
+    """Converte pares (venda_id, data prevista) nas chaves de resumo correspondentes."""
+    from .models import Venda
+
+    pares = [(venda_id, data) for venda_id, data in pares if data is not None]
+    venda_ids = {venda_id for venda_id, _ in pares}
+    if not venda_ids:
+        return set()
+    vendas = {
+        pk: (consultor_id, operadora)
+        for pk, consultor_id, operadora in Venda.objects.filter(pk__in=venda_ids).values_list(
+            'pk', 'consultor_id', 'plano__operadora'
+        )
+    }
+    return {vendas[venda_id] + (mes_de(data),) for venda_id, data in pares if venda_id in vendas}
+
+
+def pares_das_parcelas(controles):
+    """Pares (venda_id, data) com as datas previstas atual e anteriores das parcelas."""
+    pares = set()
+    for controle in controles:
+        pares.add((controle.venda_id, controle.data_prevista_recebimento))
+        for atributo in ('_loaded_data_prevista_recebimento', '_data_prevista_anterior'):
+            anterior = getattr(controle, atributo, None)
+            if isinstance(anterior, datetime.date):
+                pares.add((controle.venda_id, anterior))
+    return pares
+
+
+def marcar_venda_em_remocao(venda_id, removendo=True):
+    vendas = _vendas_em_remocao.get()
+    _vendas_em_remocao.set(vendas | {venda_id} if removendo else vendas - {venda_id})
+
+
+def venda_em_remocao(venda_id):
+    return venda_id in _vendas_em_remocao.get()
+
+
+def recalcular_resumos(chaves, hoje=None):
+    """
+    Recalcula os resumos mensais das chaves (consultor_id, operadora, mes) informadas.
+
+    Cada lote de grupos é agregado com uma consulta sobre as parcelas, gravado
+    com um único upsert, e resumos que ficaram sem parcelas são removidos.
+    """
+    from .models import ControleDeRecebimento, ResumoComissaoMensal
+
+    meses_por_grupo = defaultdict(set)
+    for consultor_id, operadora, mes in chaves:
+        meses_por_grupo[(consultor_id, operadora)].add(mes)
+    grupos = list(meses_por_grupo.items())
+
+    with transaction.atomic(savepoint=False):
+        for inicio in range(0, len(grupos), GRUPOS_POR_CONSULTA):
+            lote = grupos[inicio:inicio + GRUPOS_POR_CONSULTA]
+            condicao = Q()
+            for (consultor_id, operadora), meses in lote:
+                condicao |= Q(
+                    venda__consultor_id=consultor_id,
+                    venda__plano__operadora=operadora,
+                    data_prevista_recebimento__gte=min(meses),
+                    data_prevista_recebimento__lt=proximo_mes(max(meses)),
+                )
+
+            solicitadas = {
+                (consultor_id, operadora, mes) for (consultor_id, operadora), meses in lote for mes in meses
+            }
+            resumos = [
+                _resumo(linha)
+                for linha in agregar_parcelas(ControleDeRecebimento.objects.filter(condicao), hoje)
+                if (linha['consultor_ref'], linha['operadora'], linha['mes']) in solicitadas
+            ]
+            if resumos:
+                ResumoComissaoMensal.objects.bulk_create(
+                    resumos,
+                    update_conflicts=True,
+                    unique_fields=['consultor', 'operadora', 'mes'],
+                    update_fields=CAMPOS_TOTAIS + ['atualizado_em'],
+                )
+
+            vazias = solicitadas - {(r.consultor_id, r.operadora, r.mes) for r in resumos}
+            if vazias:
+                remover = Q()
+                for consultor_id, operadora, mes in vazias:
+                    remover |= Q(consultor_id=consultor_id, operadora=operadora, mes=mes)
+                ResumoComissaoMensal.objects.filter(remover).delete()
+
+
+def ajustar_resumos(variacoes):
+    """
+    Soma variações de valor aos resumos, sem agregar as parcelas de novo.
+
+    `variacoes` mapeia (consultor_id, operadora, mes) -> (variação do esperado,
+    variação do atrasado). Serve a alterações apenas do valor de parcelas em
+    aberto, em que quantidades e recebido não mudam, como na reprecificação de
+    um plano: o custo depende só das chaves alteradas.
+    """
+    from .models import ResumoComissaoMensal
+
+    agora = timezone.now()
+    with transaction.atomic(savepoint=False):
+        for (consultor_id, operadora, mes), (esperado, atrasado) in variacoes.items():
+            ResumoComissaoMensal.objects.filter(consultor_id=consultor_id, operadora=operadora, mes=mes).update(
+                esperado=F('esperado') + esperado, atrasado=F('atrasado') + atrasado, atualizado_em=agora,
+            )
+
+
+def retirar_recebidas_dos_resumos(retiradas):
+    """
+    Desconta dos resumos parcelas recebidas que deixam as tabelas em operação.
+
+    `retiradas` mapeia (consultor_id, operadora, mes) -> (valor, quantidade)
+    das parcelas recebidas retiradas, como no arquivamento: esperado e recebido
+    caem pelo valor, as quantidades pela quantidade e o atrasado não muda.
+    Resumos que ficam sem parcelas são removidos.
+    """
+    from .models import ResumoComissaoMensal
+
+    agora = timezone.now()
+    with transaction.atomic(savepoint=False):
+        for (consultor_id, operadora, mes), (valor, quantidade) in retiradas.items():
+            ResumoComissaoMensal.objects.filter(consultor_id=consultor_id, operadora=operadora, mes=mes).update(
+                esperado=F('esperado') - valor, recebido=F('recebido') - valor,
+                parcelas=F('parcelas') - quantidade, parcelas_recebidas=F('parcelas_recebidas') - quantidade,
+                atualizado_em=agora,
+            )
+        ResumoComissaoMensal.objects.filter(parcelas__lte=0).delete()
+
+
+def recalcular_resumos_dos_meses(inicio, fim, hoje=None):
+    """Recalcula todos os resumos existentes com mês entre as datas informadas."""
+    from .models import ResumoComissaoMensal
+
+    chaves = ResumoComissaoMensal.objects.filter(mes__gte=mes_de(inicio), mes__lte=mes_de(fim)).values_list(
+        'consultor_id', 'operadora', 'mes'
+    )
+    recalcular_resumos(set(chaves), hoje)
+
+
+def reconstruir_resumos(hoje=None, tamanho_lote=1000, progresso=None):
+    """
+    Recria todos os resumos a partir das parcelas. Retorna a quantidade gravada.
+
+    Cada lote é gravado com upsert na sua própria transação e, em seguida,
+    informado a `progresso(quantidade)`: o andamento fica visível a outros
+    processos durante a reconstrução. Ao final saem os resumos que não foram
+    regravados, isto é, os que ficaram sem parcelas.
+    """
+    from .models import ControleDeRecebimento, ResumoComissaoMensal
+
+    inicio = timezone.now()
+    total = 0
+    lote = []
+
+    def gravar():
+        nonlocal total, lote
+        with transaction.atomic():
+            ResumoComissaoMensal.objects.bulk_create(
+                lote,
+                update_conflicts=True,
+                unique_fields=['consultor', 'operadora', 'mes'],
+                update_fields=CAMPOS_TOTAIS + ['atualizado_em'],
+            )
+        total += len(lote)
+        lote = []
+        if progresso:
+            progresso(total)
+
+    for linha in agregar_parcelas(ControleDeRecebimento.objects.all(), hoje).iterator(chunk_size=tamanho_lote):
+        lote.append(_resumo(linha))
+        if len(lote) >= tamanho_lote:
+            gravar()
+    if lote:
+        gravar()
+    ResumoComissaoMensal.objects.filter(atualizado_em__lt=inicio).delete()
+    return total
+
+
+def verificar_resumos(hoje=None):
+    """Compara os resumos gravados com as parcelas; retorna a lista de divergências."""
+    from .models import ControleDeRecebimento, ResumoComissaoMensal
+
+    esperados = {
+        (linha['consultor_ref'], linha['operadora'], linha['mes']): {campo: linha[campo] for campo in CAMPOS_TOTAIS}
+        for linha in agregar_parcelas(ControleDeRecebimento.objects.all(), hoje).iterator()
+    }
+    divergencias = []
+    for resumo in ResumoComissaoMensal.objects.all().iterator():
+        chave = (resumo.consultor_id, resumo.operadora, resumo.mes)
+        gravado = {campo: getattr(resumo, campo) for campo in CAMPOS_TOTAIS}
+        esperado = esperados.pop(chave, None)
+        if esperado != gravado:
+            divergencias.append({'chave': chave, 'gravado': gravado, 'esperado': esperado})
+    divergencias.extend({'chave': chave, 'gravado': None, 'esperado': esperado} for chave, esperado in esperados.items())
+    return divergencias
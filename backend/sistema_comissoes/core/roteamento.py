@@ -0,0 +1,85 @@
+"""
+Leituras pesadas (atrasadas, relatórios, exportações e busca) na réplica somente leitura.
+
+Com o alias ALIAS_LEITURA configurado em DATABASES (ver settings: réplica do
+PostgreSQL ou, no SQLite, uma segunda conexão mode=ro ao mesmo arquivo em
+WAL), as views marcadas com LeituraNaReplicaMixin/leitura_na_replica leem dele
+e deixam a conexão principal para o lançamento de vendas e recebimentos. O
+RoteadorLeitura só troca de banco dentro desse contexto: toda gravação vai
+para o principal, assim como qualquer leitura feita dentro de uma transação
+aberta no principal, que precisa enxergar o que a própria transação gravou.
+Sem o alias, tudo continua no banco padrão.
+"""
+import contextvars
+import functools
+from contextlib import contextmanager
+
+from django.db import DEFAULT_DB_ALIAS, connections
+
+ALIAS_LEITURA = 'leitura'
+
+_na_replica = contextvars.ContextVar('leitura_na_replica', default=False)
+
+
+def replica_configurada():
+    return ALIAS_LEITURA in connections.settings
+
+
+def banco_de_leitura():
+    """Alias usado pelas leituras no contexto atual."""
+    if not _na_replica.get() or not replica_configurada():
+        return DEFAULT_DB_ALIAS
+    # Ler o que a transação aberta acabou de gravar só é possível no principal
+    if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+        return DEFAULT_DB_ALIAS
+    return ALIAS_LEITURA
+
+
+@contextmanager
+def na_replica():
+    """Envia para a réplica as leituras feitas dentro do bloco."""
+    token = _na_replica.set(True)
+    try:
+        yield
+    finally:
+        _na_replica.reset(token)
+
+
+class LeituraNaReplicaMixin:
+    """
+    View DRF somente leitura atendida pela réplica.
+
+    Respostas em streaming são consumidas depois do dispatch: o queryset delas
+    precisa ser fixado com .using(banco_de_leitura()) ainda dentro da view.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        with na_replica():
+            return super().dispatch(request, *args, **kwargs)
+
+
+def leitura_na_replica(view):
+    """Equivalente ao LeituraNaReplicaMixin para as views assíncronas."""
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        # As consultas do ORM assíncrono rodam em outra thread com uma cópia deste contexto
+        with na_replica():
+            return await view(request, *args, **kwargs)
+    return wrapper
+
+
+class RoteadorLeitura:
+    """Router de DATABASE_ROUTERS: leituras marcadas na réplica, o resto no banco padrão."""
+
+    def db_for_read(self, model, **hints):
+        return banco_de_leitura()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Réplica e principal têm os mesmos dados
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != ALIAS_LEITURA
@@ -1,7 +1,31 @@
+from django.urls import reverse
 from rest_framework import serializers
-from .models import Cliente, Plano, Parcela, Consultor, Venda, ControleDeRecebimento
+from .models import Cliente, Plano, Parcela, Consultor, Venda, ControleDeRecebimento, Tarefa, proposta_arquivada
 from django.contrib.auth.models import User
 
+
+def campos_solicitados(request):
+    """Retorna o conjunto de campos pedido em ?fields=, ou None se não houver."""
+    if request is None:
+        return None
+    valor = request.query_params.get('fields', '')
+    campos = {campo.strip() for campo in valor.split(',') if campo.strip()}
+    return campos or None
+
+
+class CamposDinamicosMixin:
+    """Permite que leituras escolham os campos retornados com ?fields=campo1,campo2."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is None or request.method not in ('GET', 'HEAD'):
+            return
+        campos = campos_solicitados(request)
+        if campos:
+            for nome in set(self.fields) - campos:
+                self.fields.pop(nome)
+
 class UserSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True)
   
@@ -45,7 +69,15 @@ class ControleDeRecebimentoSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
-class VendaSerializer(serializers.ModelSerializer):
+class ParcelaAtrasadaSerializer(ControleDeRecebimentoSerializer):
+    # O atraso é derivado da data prevista, mesmo antes da varredura gravar o status
+    status = serializers.SerializerMethodField()
+
+    def get_status(self, obj):
+        return 'Atrasado'
+
+
+class VendaSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     # Campos de leitura (read-only)
     cliente = ClienteSerializer(read_only=True)
     plano = PlanoSerializer(read_only=True)
@@ -62,6 +94,12 @@ class VendaSerializer(serializers.ModelSerializer):
         model = Venda
         fields = '__all__'
 
+    def validate_numero_proposta(self, valor):
+        # O unique do campo só olha as vendas em operação
+        if proposta_arquivada(valor, self.instance.pk if self.instance else None):
+            raise serializers.ValidationError('Já existe uma venda arquivada com este número de proposta.')
+        return valor
+
     def create(self, validated_data):
         # Extraia os campos relacionados
         cliente = validated_data.pop('cliente')
@@ -80,3 +118,50 @@ class VendaSerializer(serializers.ModelSerializer):
         return venda
 
 
+class ClienteResumoSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Cliente
+        fields = ['id', 'nome']
+
+class PlanoResumoSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Plano
+        fields = ['id', 'operadora', 'tipo']
+
+class ConsultorResumoSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Consultor
+        fields = ['id', 'nome']
+
+
+class VendaListSerializer(serializers.ModelSerializer):
+    # Representação compacta usada na listagem, sem as parcelas de recebimento
+    cliente = ClienteResumoSerializer(read_only=True)
+    plano = PlanoResumoSerializer(read_only=True)
+    consultor = ConsultorResumoSerializer(read_only=True)
+
+    class Meta:
+        model = Venda
+        fields = [
+            'id', 'numero_proposta', 'cliente', 'plano', 'consultor', 'valor_plano',
+            'desconto_consultor', 'data_venda', 'data_vigencia', 'data_vencimento',
+        ]
+
+
+class TarefaSerializer(serializers.ModelSerializer):
+    # Endereço para baixar o arquivo gerado, quando houver
+    arquivo = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Tarefa
+        fields = [
+            'id', 'tipo', 'status', 'progresso', 'total', 'mensagem', 'resultado', 'erro', 'arquivo',
+            'criado_em', 'iniciado_em', 'concluido_em',
+        ]
+
+    def get_arquivo(self, tarefa):
+        if not tarefa.saida_nome:
+            return None
+        request = self.context.get('request')
+        url = reverse('tarefa-arquivo', args=[tarefa.pk])
+        return request.build_absolute_uri(url) if request else url
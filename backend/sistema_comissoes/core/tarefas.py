@@ -0,0 +1,274 @@
+"""
+Fila de tarefas em segundo plano guardada no próprio banco.
+
+As views enfileiram uma Tarefa e respondem na hora com o id; o comando
+processar_tarefas reserva as pendentes, executa a função registrada para o
+tipo e grava progresso e resultado na própria tarefa; o arquivo de saída vai
+para o storage padrão e a tarefa guarda só o caminho. Não há broker: a
+reserva usa select_for_update(skip_locked=True) onde o banco suporta e,
+sempre, um UPDATE condicional no status, que também resolve a disputa entre
+trabalhadores no SQLite.
+"""
+import datetime
+import json
+import logging
+import os
+import socket
+import tempfile
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.files import File
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .arquivamento import arquivados
+from .busca import reconstruir_indice
+from .conciliacao import conciliar_extrato, ler_csv, ler_json
+from .exportacao import (
+    EXPORTACOES,
+    TAMANHO_LOTE_EXPORTACAO,
+    gravar_exportacao,
+    nome_arquivo_exportacao,
+    tipo_conteudo_exportacao,
+)
+from .filters import aplicar_filtros
+from .importacao import importar_vendas, ler_xlsx
+from .planos import versao_fixa
+from .reprecificacao import reprecificar_plano
+from .resumos import reconstruir_resumos
+from .roteamento import na_replica
+
+logger = logging.getLogger(__name__)
+
+# Funções executadas pelo trabalhador: tipo -> função(tarefa) que devolve o resultado (JSON)
+TIPOS_TAREFA = {}
+
+# Linhas processadas entre duas gravações do progresso de conciliações
+INTERVALO_PROGRESSO = 1000
+
+
+def tipo_tarefa(nome):
+    """Registra a função que executa as tarefas do tipo `nome`."""
+    def decorador(funcao):
+        TIPOS_TAREFA[nome] = funcao
+        return funcao
+    return decorador
+
+
+def enfileirar(tipo, parametros=None, entrada=None, usuario=None):
+    """
+    Cria uma tarefa pendente do `tipo` registrado; levanta ValueError para tipo desconhecido.
+
+    `entrada`, um django.core.files.File, é copiada em blocos para o storage
+    antes de a tarefa ser gravada e ficar visível para os trabalhadores.
+    """
+    from .models import Tarefa
+
+    if tipo not in TIPOS_TAREFA:
+        raise ValueError(f'Tipo de tarefa desconhecido: {tipo}.')
+    tarefa = Tarefa(
+        tipo=tipo, parametros=parametros or {},
+        usuario=usuario if usuario is not None and usuario.is_authenticated else None,
+    )
+    if entrada is not None:
+        tarefa.entrada.save(os.path.basename(entrada.name or '') or tipo, entrada, save=False)
+    tarefa.save()
+    return tarefa
+
+
+def nome_do_trabalhador():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def reservar_proxima(trabalhador):
+    """Marca como em execução e devolve a tarefa pendente mais antiga, ou None se a fila está vazia."""
+    from .models import Tarefa
+
+    while True:
+        with transaction.atomic():
+            pendentes = Tarefa.objects.filter(status=Tarefa.PENDENTE).order_by('id')
+            if connection.features.has_select_for_update_skip_locked:
+                pendentes = pendentes.select_for_update(skip_locked=True)
+            tarefa_id = pendentes.values_list('id', flat=True).first()
+            if tarefa_id is None:
+                return None
+            # Sem FOR UPDATE (SQLite) outro trabalhador pode ter lido a mesma
+            # tarefa: fica com ela quem trocar o status primeiro
+            agora = timezone.now()
+            reservada = Tarefa.objects.filter(pk=tarefa_id, status=Tarefa.PENDENTE).update(
+                status=Tarefa.EM_EXECUCAO, trabalhador=trabalhador, iniciado_em=agora,
+                atualizado_em=agora, tentativas=F('tentativas') + 1,
+            )
+        if reservada:
+            return Tarefa.objects.get(pk=tarefa_id)
+
+
+def liberar_abandonadas():
+    """
+    Devolve à fila as tarefas em execução sem notícias há TAREFAS_TEMPO_LIMITE segundos.
+
+    Acontece quando o trabalhador morre no meio da tarefa. Depois de
+    TAREFAS_MAX_TENTATIVAS execuções a tarefa é dada como falha.
+    """
+    from .models import Tarefa
+
+    limite = timezone.now() - datetime.timedelta(seconds=getattr(settings, 'TAREFAS_TEMPO_LIMITE', 1800))
+    abandonadas = Tarefa.objects.filter(status=Tarefa.EM_EXECUCAO, atualizado_em__lt=limite)
+    falhas = abandonadas.filter(tentativas__gte=getattr(settings, 'TAREFAS_MAX_TENTATIVAS', 3)).update(
+        status=Tarefa.FALHOU, erro='Trabalhador interrompido durante a execução.', concluido_em=timezone.now(),
+    )
+    return abandonadas.update(status=Tarefa.PENDENTE, trabalhador='') + falhas
+
+
+def registrar_progresso(tarefa, progresso, total=None, mensagem=None):
+    """Grava o andamento da tarefa; também serve de sinal de vida para liberar_abandonadas."""
+    from .models import Tarefa
+
+    campos = {'progresso': progresso, 'atualizado_em': timezone.now()}
+    if total is not None:
+        campos['total'] = total
+    if mensagem is not None:
+        campos['mensagem'] = mensagem[:255]
+    Tarefa.objects.filter(pk=tarefa.pk).update(**campos)
+    for campo, valor in campos.items():
+        setattr(tarefa, campo, valor)
+
+
+def executar_tarefa(tarefa):
+    """Executa uma tarefa já reservada e grava o desfecho; devolve True se ela foi concluída."""
+    from .models import Tarefa
+
+    try:
+        funcao = TIPOS_TAREFA.get(tarefa.tipo)
+        if funcao is None:
+            raise ValueError(f'Tipo de tarefa desconhecido: {tarefa.tipo}.')
+        with versao_fixa():
+            resultado = funcao(tarefa)
+    except Exception as exc:
+        logger.exception('Falha na tarefa %s (%s)', tarefa.pk, tarefa.tipo)
+        Tarefa.objects.filter(pk=tarefa.pk).update(
+            status=Tarefa.FALHOU, erro=f'{type(exc).__name__}: {exc}',
+            concluido_em=timezone.now(), atualizado_em=timezone.now(),
+        )
+        return False
+
+    Tarefa.objects.filter(pk=tarefa.pk).update(
+        status=Tarefa.CONCLUIDA, resultado=resultado, progresso=tarefa.total or tarefa.progresso,
+        saida=tarefa.saida.name or '', saida_nome=tarefa.saida_nome, saida_tipo=tarefa.saida_tipo,
+        concluido_em=timezone.now(), atualizado_em=timezone.now(),
+    )
+    return True
+
+
+def processar_fila(trabalhador=None, limite=None):
+    """Executa tarefas pendentes até esvaziar a fila (ou até `limite` tarefas); devolve quantas executou."""
+    trabalhador = trabalhador or nome_do_trabalhador()
+    executadas = 0
+    while limite is None or executadas < limite:
+        tarefa = reservar_proxima(trabalhador)
+        if tarefa is None:
+            break
+        executar_tarefa(tarefa)
+        executadas += 1
+    return executadas
+
+
+def _gravar_relatorio(tarefa, relatorio, nome):
+    """
+    Consome um relatório em linhas (importação/conciliação) e o guarda como saída JSON Lines.
+
+    As linhas passam por um arquivo temporário em disco antes de ir para o
+    storage: relatórios grandes não ficam inteiros em memória.
+    """
+    resumo = None
+    with tempfile.TemporaryFile() as saida:
+        for item in relatorio:
+            saida.write((json.dumps(item, ensure_ascii=False) + '\n').encode('utf-8'))
+            if 'resumo' in item:
+                resumo = item['resumo']
+            elif 'ate_linha' in item:
+                registrar_progresso(tarefa, item['ate_linha'], mensagem=f"Lote {item['lote']} gravado.")
+            elif 'lote' in item and 'vendas' in item:
+                registrar_progresso(tarefa, item['vendas'], mensagem=f"Lote {item['lote']} processado.")
+            elif 'linha' in item and item['linha'] % INTERVALO_PROGRESSO == 0:
+                registrar_progresso(tarefa, item['linha'])
+        saida.seek(0)
+        tarefa.saida_nome = f'{nome}-{tarefa.pk}.jsonl'
+        tarefa.saida.save(tarefa.saida_nome, File(saida), save=False)
+    tarefa.saida_tipo = 'application/x-ndjson'
+    return resumo
+
+
+@tipo_tarefa('importar_vendas')
+def _importar_vendas(tarefa):
+    parametros = tarefa.parametros
+    # Lida do storage em blocos; o XLSX usa o acesso aleatório do arquivo aberto
+    with tarefa.entrada.open('rb') as arquivo:
+        linhas = ler_xlsx(arquivo) if parametros.get('formato') == 'xlsx' else ler_csv(arquivo)
+        relatorio = importar_vendas(linhas, tamanho_lote=parametros.get('tamanho_lote', 500))
+        return _gravar_relatorio(tarefa, relatorio, 'importacao')
+
+
+@tipo_tarefa('conciliar_extrato')
+def _conciliar_extrato(tarefa):
+    parametros = tarefa.parametros
+    with tarefa.entrada.open('rb') as arquivo:
+        linhas = ler_json(arquivo) if parametros.get('formato') == 'json' else ler_csv(arquivo)
+        relatorio = conciliar_extrato(linhas, tolerancia=Decimal(parametros.get('tolerancia', '0.00')))
+        return _gravar_relatorio(tarefa, relatorio, 'conciliacao')
+
+
+@tipo_tarefa('reprecificar_plano')
+def _reprecificar_plano(tarefa):
+    return _gravar_relatorio(tarefa, reprecificar_plano(**tarefa.parametros), 'reprecificacao')
+
+
+@tipo_tarefa('reconstruir_resumos')
+def _reconstruir_resumos(tarefa):
+    return {'resumos': reconstruir_resumos(
+        tamanho_lote=tarefa.parametros.get('tamanho_lote', 1000),
+        progresso=lambda quantidade: registrar_progresso(tarefa, quantidade),
+    )}
+
+
+@tipo_tarefa('reconstruir_busca')
+def _reconstruir_busca(tarefa):
+    return reconstruir_indice(progresso=lambda tipo, quantidade: registrar_progresso(tarefa, quantidade, mensagem=tipo))
+
+
+@tipo_tarefa('exportar')
+def _exportar(tarefa):
+    # Leituras na réplica; o progresso continua gravado no banco principal
+    with na_replica():
+        return _gerar_exportacao(tarefa)
+
+
+def _gerar_exportacao(tarefa):
+    parametros = tarefa.parametros
+    modelo, colunas = EXPORTACOES[parametros['exportacao']]
+    queryset = aplicar_filtros(parametros.get('consulta', {}), modelo.objects.all(), parametros.get('filtros', {}))
+    queryset = queryset.order_by(*parametros.get('ordenacao', ['id']))
+    arquivo = arquivados(modelo, parametros.get('consulta', {}), parametros.get('filtros', {}))
+    if arquivo is not None:
+        arquivo = arquivo.order_by(*parametros.get('ordenacao', ['id']))
+    registrar_progresso(tarefa, 0, total=queryset.count() + (arquivo.count() if arquivo is not None else 0))
+
+    def com_progresso(linhas):
+        for numero, linha in enumerate(linhas, start=1):
+            if numero % TAMANHO_LOTE_EXPORTACAO == 0:
+                registrar_progresso(tarefa, numero)
+            yield linha
+
+    formato = parametros.get('formato', 'csv')
+    # Gravada em um arquivo temporário e copiada para o storage, como os relatórios
+    with tempfile.TemporaryFile() as saida:
+        gravar_exportacao(saida, queryset, colunas, formato, com_progresso, arquivados=arquivo)
+        # O XLSX volta posicionado no início; o fim do arquivo dá o tamanho nos dois formatos
+        tamanho = saida.seek(0, os.SEEK_END)
+        saida.seek(0)
+        tarefa.saida_nome = nome_arquivo_exportacao(parametros['exportacao'], formato)
+        tarefa.saida.save(tarefa.saida_nome, File(saida), save=False)
+    tarefa.saida_tipo = tipo_conteudo_exportacao(formato)
+    return {'linhas': tarefa.total, 'bytes': tamanho}
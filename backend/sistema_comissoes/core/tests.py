@@ -1,3 +1,1928 @@
-from django.test import TestCase
+import datetime
+import csv
+import io
+import json
+import os
+import re
+import tempfile
+from contextlib import contextmanager
+from decimal import Decimal
+from importlib import import_module
+from importlib.util import find_spec
+from types import SimpleNamespace
+from unittest import skipUnless
+from unittest.mock import patch
+from urllib.parse import urlencode
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management import CommandError, call_command
+from django.db import connection, connections, transaction
+from django.db.migrations.loader import MigrationLoader
+from django.test import AsyncClient, Client, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.exceptions import ErrorDetail
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .alteracoes import ultimo_cursor
+from .arquivamento import arquivar_vendas
+from .atrasos import ROTINA_VARREDURA, parcelas_atrasadas, varrer_parcelas_atrasadas
+from .busca import buscar
+from .calculo import DadosPlano, DadosVenda, Recebimento, calcular_lote, calcular_parcelas, projetar_fluxo
+from .conciliacao import ExtratoInvalido, conciliar_extrato, ler_json
+from .dados_sinteticos import gerar_dados
+from .cronograma import reprogramar_parcelas
+from .importacao import importar_vendas
+from .instrumentacao import InstrumentacaoMiddleware, limpar_estatisticas
+from .management.commands import benchmark_caminhos
+from . import planos
+from .planos import CHAVE_VERSAO, PlanosMiddleware, invalidar_planos, tabela_de_planos, versao_fixa
+from .projecao import projetar_comissoes
+from .renderers import JSONRapidoRenderer
+from .reprecificacao import reprecificar_plano
+from .roteamento import ALIAS_LEITURA, RoteadorLeitura, na_replica
+from .tarefas import liberar_abandonadas, processar_fila, registrar_progresso, reservar_proxima
+from .views_async import _eventos_alteracoes
+from .serializers import ControleDeRecebimentoSerializer, ParcelaAtrasadaSerializer, VendaListSerializer
+from .models import (
+    Cliente, Plano, Parcela, Consultor, Venda, ControleDeRecebimento, ExecucaoRotina, ResumoComissaoMensal,
+    Alteracao, ControleDeRecebimentoArquivado, DocumentoBusca, Tarefa, VendaArquivada, VersaoDados,
+)
+from .resumos import reconstruir_resumos, verificar_resumos
+
+
+def apps_da_migracao(nome):
+    """Modelos históricos do app core no estado em que a migração `nome` os vê."""
+    return MigrationLoader(connection).project_state(('core', nome)).apps
+
+
+def criar_plano(numero_parcelas, operadora='Operadora', tipo='PME'):
+    plano = Plano.objects.create(
+        operadora=operadora,
+        comissionamento_total=Decimal('300.00'),
+        tipo=tipo,
+        numero_parcelas=numero_parcelas,
+        taxa_plano_valor=Decimal('10.00'),
+        taxa_plano_tipo='Valor Fixo',
+    )
+    Parcela.objects.bulk_create([
+        Parcela(plano=plano, numero_parcela=numero, porcentagem_parcela=Decimal('100.00') if numero == 1 else Decimal('5.00'))
+        for numero in range(1, numero_parcelas + 1)
+    ])
+    # bulk_create não dispara os sinais que invalidam a tabela de planos em cache
+    invalidar_planos()
+    return plano
+
+
+class DadosBaseMixin:
+    @classmethod
+    def setUpTestData(cls):
+        cls.cliente = Cliente.objects.create(nome='Cliente')
+        cls.consultor = Consultor.objects.create(nome='Consultor')
+
+    def criar_venda(self, plano, numero_proposta='P-1', **kwargs):
+        dados = {
+            'numero_proposta': numero_proposta,
+            'cliente': self.cliente,
+            'plano': plano,
+            'consultor': self.consultor,
+            'valor_plano': Decimal('1000.00'),
+            'desconto_consultor': Decimal('0.00'),
+            'data_venda': datetime.date(2024, 1, 5),
+            'data_vigencia': datetime.date(2024, 1, 10),
+            'data_vencimento': datetime.date(2024, 1, 20),
+        }
+        dados.update(kwargs)
+        return Venda.objects.create(**dados)
+
+
+class ArquivosDeTarefaMixin:
+    """Arquivos gerados pelas tarefas em um MEDIA_ROOT temporário, apagado ao fim de cada teste."""
+
+    def setUp(self):
+        super().setUp()
+        diretorio = tempfile.TemporaryDirectory()
+        self.addCleanup(diretorio.cleanup)
+        configuracao = override_settings(MEDIA_ROOT=diretorio.name)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+
+    def conteudo_da_saida(self, tarefa):
+        with tarefa.saida.open('rb') as arquivo:
+            return arquivo.read()
+
+
+class CronogramaTests(DadosBaseMixin, TestCase):
+    def test_gera_cronograma(self):
+        venda = self.criar_venda(criar_plano(3))
+        controles = list(venda.controlederecebimento_set.order_by('parcela__numero_parcela'))
+
+        self.assertEqual([c.valor_parcela for c in controles], [Decimal('990.00'), Decimal('50.00'), Decimal('50.00')])
+        self.assertEqual(
+            [c.data_prevista_recebimento for c in controles],
+            [datetime.date(2024, 2, 9), datetime.date(2024, 3, 10), datetime.date(2024, 4, 9)],
+        )
+        self.assertTrue(all(c.status == 'Não Recebido' for c in controles))
+
+    def test_edicao_preserva_parcelas_existentes(self):
+        venda = self.criar_venda(criar_plano(3))
+        ids = set(venda.controlederecebimento_set.values_list('pk', flat=True))
+
+        venda.data_vencimento = datetime.date(2024, 1, 25)
+        venda.save()
+        self.assertEqual(set(venda.controlederecebimento_set.values_list('pk', flat=True)), ids)
+
+        venda.valor_plano = Decimal('2000.00')
+        venda.save()
+        self.assertEqual(set(venda.controlederecebimento_set.values_list('pk', flat=True)), ids)
+        self.assertEqual(
+            venda.controlederecebimento_set.get(parcela__numero_parcela=2).valor_parcela, Decimal('100.00')
+        )
+
+    def test_edicao_nao_altera_parcela_recebida(self):
+        venda = self.criar_venda(criar_plano(3))
+        primeira = venda.controlederecebimento_set.get(parcela__numero_parcela=1)
+        ControleDeRecebimento.objects.filter(pk=primeira.pk).update(
+            status='Recebido', data_recebimento=datetime.date(2024, 2, 20)
+        )
+
+        venda.valor_plano = Decimal('2000.00')
+        venda.save()
+
+        primeira.refresh_from_db()
+        self.assertEqual(primeira.valor_parcela, Decimal('990.00'))
+        self.assertEqual(
+            venda.controlederecebimento_set.get(parcela__numero_parcela=2).data_prevista_recebimento,
+            datetime.date(2024, 3, 21),
+        )
+
+    def test_troca_de_plano_substitui_parcelas(self):
+        venda = self.criar_venda(criar_plano(3))
+        venda.plano = criar_plano(2, tipo='PF')
+        venda.save()
+
+        self.assertEqual(
+            set(venda.controlederecebimento_set.values_list('parcela__plano', flat=True)), {venda.plano.pk}
+        )
+        self.assertEqual(venda.controlederecebimento_set.count(), 2)
+
+
+class CronogramaQueryCountTests(DadosBaseMixin, TestCase):
+    """Benchmark de consultas: o custo de gravar uma venda não depende do número de parcelas."""
+
+    TAMANHOS = (1, 12, 60)
+
+    def medir(self, funcao):
+        with CaptureQueriesContext(connection) as contexto:
+            funcao()
+        return len(contexto.captured_queries)
+
+    def test_consultas_constantes(self):
+        criacao = {}
+        edicao_sem_mudanca = {}
+        edicao_valor = {}
+        for tamanho in self.TAMANHOS:
+            plano = criar_plano(tamanho, operadora=f'Operadora {tamanho}')
+            tabela_de_planos()
+            vendas = []
+            criacao[tamanho] = self.medir(
+                lambda: vendas.append(self.criar_venda(plano, numero_proposta=f'P-{tamanho}'))
+            )
+            venda = vendas[0]
+            self.assertEqual(venda.controlederecebimento_set.count(), tamanho)
+
+            venda.data_vencimento = datetime.date(2024, 1, 30)
+            edicao_sem_mudanca[tamanho] = self.medir(venda.save)
+
+            venda.valor_plano = Decimal('1500.00')
+            edicao_valor[tamanho] = self.medir(venda.save)
+
+        for medicoes in (criacao, edicao_sem_mudanca, edicao_valor):
+            self.assertEqual(len(set(medicoes.values())), 1, medicoes)
+        # Inclui a manutenção do resumo mensal (chaves da venda, agregação e upsert)
+        # e a leitura da versão dos planos
+        self.assertLessEqual(criacao[60], 8)
+        self.assertLessEqual(edicao_sem_mudanca[60], 8)
+        self.assertLessEqual(edicao_valor[60], 10)
+
+
+class PlanoCacheTests(DadosBaseMixin, TestCase):
+    def consultas_de_plano(self, contexto):
+        return [q['sql'] for q in contexto.captured_queries if re.search(r'FROM "core_(plano|parcela)"', q['sql'])]
+
+    def test_criacao_sem_consultas_de_plano_com_cache_quente(self):
+        plano = criar_plano(12)
+        tabela_de_planos()
+
+        with CaptureQueriesContext(connection) as contexto:
+            venda = Venda.objects.create(
+                numero_proposta='C-1', cliente=self.cliente, consultor=self.consultor, plano_id=plano.pk,
+                valor_plano=Decimal('1000.00'), desconto_consultor=Decimal('0.00'),
+                data_vigencia=datetime.date(2024, 1, 10), data_vencimento=datetime.date(2024, 1, 20),
+            )
+            list(importar_vendas([{
+                'numero_proposta': 'C-2', 'cliente': 'Cliente', 'consultor': 'Consultor', 'operadora': 'Operadora',
+                'tipo': 'PME', 'valor_plano': '1000', 'data_vigencia': '2024-01-10', 'data_vencimento': '2024-01-20',
+            }]))
+        self.assertEqual(self.consultas_de_plano(contexto), [])
+        self.assertEqual(venda.controlederecebimento_set.count(), 12)
+        self.assertEqual(Venda.objects.get(numero_proposta='C-2').controlederecebimento_set.count(), 12)
+
+    def test_alteracao_de_parcela_invalida_cache(self):
+        plano = criar_plano(2)
+        tabela_de_planos()
+        parcela = plano.parcela_set.get(numero_parcela=2)
+        parcela.porcentagem_parcela = Decimal('10.00')
+        parcela.save()
+
+        venda = self.criar_venda(plano)
+        self.assertEqual(
+            venda.controlederecebimento_set.get(parcela=parcela).valor_parcela, Decimal('100.00')
+        )
+
+    @override_settings(PLANOS_CACHE='')
+    def test_alteracao_em_outro_processo_sem_cache_compartilhado(self):
+        plano = criar_plano(2)
+        tabela_de_planos()
+        estado_deste_processo = planos._tabela_local
+
+        # Outro worker altera o plano pelos caminhos normais; este processo não vê a invalidação local
+        with self.captureOnCommitCallbacks(execute=True), transaction.atomic():
+            plano.taxa_plano_valor = Decimal('50.00')
+            plano.save()
+        planos._tabela_local = estado_deste_processo
+
+        self.assertEqual(tabela_de_planos()[plano.pk][0].taxa_plano_valor, Decimal('50.00'))
+        with self.assertNumQueries(1):
+            tabela_de_planos()
+
+    @override_settings(PLANOS_CACHE='')
+    def test_versao_lida_uma_vez_por_requisicao(self):
+        plano = criar_plano(2)
+        tabela_de_planos()
+
+        def vista(request):
+            for _ in range(5):
+                tabela_de_planos()
+            return 'resposta'
+
+        with self.assertNumQueries(1):
+            self.assertEqual(PlanosMiddleware(vista)(None), 'resposta')
+
+        # Uma alteração dentro do bloco descarta a versão lida
+        with versao_fixa():
+            tabela_de_planos()
+            plano.taxa_plano_valor = Decimal('50.00')
+            plano.save()
+            with self.assertNumQueries(3):
+                self.assertEqual(tabela_de_planos()[plano.pk][0].taxa_plano_valor, Decimal('50.00'))
+            with self.assertNumQueries(0):
+                tabela_de_planos()
+
+    @override_settings(PLANOS_CACHE='default')
+    def test_versao_no_cache_compartilhado(self):
+        cache.clear()
+        plano = criar_plano(2)
+        tabela_de_planos()
+        with self.assertNumQueries(0):
+            tabela_de_planos()
+
+        # Outro processo altera o plano: só a versão compartilhada muda
+        Plano.objects.filter(pk=plano.pk).update(taxa_plano_valor=Decimal('50.00'))
+        cache.incr(CHAVE_VERSAO)
+        with self.assertNumQueries(2):
+            self.assertEqual(tabela_de_planos()[plano.pk][0].taxa_plano_valor, Decimal('50.00'))
+
+
+class CalculoTests(SimpleTestCase):
+    PLANOS = (
+        DadosPlano('Porcentagem', Decimal('12.35'), ((1, Decimal('100.00')), (2, Decimal('33.33')), (3, Decimal('1.00')))),
+        DadosPlano('Valor Fixo', Decimal('10.00'), ((1, Decimal('87.50')), (2, Decimal('1.00')))),
+    )
+    VENDAS = [
+        DadosVenda(Decimal(valor), Decimal(desconto), datetime.date(2024, 1, 10) + datetime.timedelta(days=dias))
+        for valor, desconto, dias in (
+            ('1000.00', '0.00', 0), ('0.50', '0.00', 3), ('1.50', '0.00', 7),
+            ('987654.31', '123.45', 40), ('333.33', '33.33', 15),
+        )
+    ]
+
+    def datas_recebimento(self):
+        return [{1: datetime.date(2024, 3, 1)}, None, {2: datetime.date(2024, 5, 5)}, {}, None]
+
+    def test_lote_igual_ao_calculo_decimal(self):
+        for plano in self.PLANOS:
+            esperado = [calcular_parcelas(venda, plano, datas) for venda, datas in zip(self.VENDAS, self.datas_recebimento())]
+            self.assertEqual(calcular_lote(self.VENDAS, plano, self.datas_recebimento()), esperado)
+            with patch('core.calculo.np', None):
+                self.assertEqual(calcular_lote(self.VENDAS, plano, self.datas_recebimento()), esperado)
+
+        # 0,50 x 1% = 0,005 e 1,50 x 1% = 0,015: arredondamento bancário para o par
+        valores = [lote[2].valor_parcela for lote in calcular_lote(self.VENDAS[1:3], self.PLANOS[0])]
+        self.assertEqual(valores, [Decimal('0.00'), Decimal('0.02')])
+
+    def test_projecao_vetorizada_igual_ao_calculo_decimal(self):
+        recebimentos = [
+            {1: Recebimento(datetime.date(2024, 2, 19), True)}, {}, {1: Recebimento(None, True), 2: Recebimento(None, True)},
+            {2: Recebimento(datetime.date(2024, 9, 1), False)}, {},
+        ]
+        for plano in self.PLANOS:
+            for atraso in (0, 45):
+                argumentos = (self.VENDAS, plano, recebimentos, datetime.date(2024, 3, 15), 12, atraso, ['a', 'b', 'a', 'b', 'a'])
+                with patch('core.calculo.np', None):
+                    esperado = projetar_fluxo(*argumentos)
+                self.assertEqual(projetar_fluxo(*argumentos), esperado)
+                self.assertTrue(esperado)
+
+
+class ProjecaoComissoesTests(DadosBaseMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='projecao', password='senha'))
+        self.venda = self.criar_venda(criar_plano(3))
+        primeira = self.venda.controlederecebimento_set.get(parcela__numero_parcela=1)
+        primeira.status = 'Recebido'
+        primeira.data_recebimento = datetime.date(2024, 2, 19)
+        primeira.save()
+        outro = Consultor.objects.create(nome='Outro')
+        self.criar_venda(criar_plano(2, operadora='Outra'), numero_proposta='P-2', consultor=outro)
+
+    def test_projecao_por_mes_com_atraso(self):
+        hoje = datetime.date(2024, 3, 1)
+        queryset = Venda.objects.filter(pk=self.venda.pk)
+        self.assertEqual(projetar_comissoes(queryset, meses=3, hoje=hoje), [
+            {'mes': '2024-03-01', 'previsto': '50.00', 'parcelas': 1},
+            {'mes': '2024-04-01', 'previsto': '50.00', 'parcelas': 1},
+        ])
+        # Atraso de 15 dias em cada recebimento empurra a cadeia de parcelas
+        self.assertEqual(
+            [linha['mes'] for linha in projetar_comissoes(queryset, meses=3, atraso_dias=15, hoje=hoje)],
+            ['2024-04-01', '2024-05-01'],
+        )
+
+    def test_endpoint_agrupado_sem_gravar(self):
+        with CaptureQueriesContext(connection) as contexto:
+            resposta = self.client.get('/api/projecoes/comissoes/?meses=3&agrupar=consultor,operadora')
+        self.assertFalse([q for q in contexto.captured_queries if q['sql'].split()[0] in ('INSERT', 'UPDATE', 'DELETE')])
+
+        resultados = resposta.json()['resultados']
+        self.assertEqual({linha['operadora'] for linha in resultados}, {'Operadora', 'Outra'})
+        # Parcelas vencidas são projetadas para o mês atual
+        self.assertEqual(resultados[0]['mes'], datetime.date.today().replace(day=1).isoformat())
+        self.assertEqual(sum(linha['parcelas'] for linha in resultados), 4)
+        self.assertEqual(self.client.get('/api/projecoes/comissoes/?meses=0').status_code, 400)
+
+
+class ReprogramacaoTests(DadosBaseMixin, TestCase):
+    def datas_previstas(self, venda):
+        return list(
+            venda.controlederecebimento_set.order_by('parcela__numero_parcela')
+            .values_list('data_prevista_recebimento', flat=True)
+        )
+
+    def test_recebimento_reprograma_parcelas_seguintes(self):
+        venda = self.criar_venda(criar_plano(4))
+        primeira = venda.controlederecebimento_set.get(parcela__numero_parcela=1)
+        primeira.data_recebimento = datetime.date(2024, 2, 19)
+        primeira.status = 'Recebido'
+        primeira.save()
+
+        self.assertEqual(self.datas_previstas(venda), [
+            datetime.date(2024, 2, 9),
+            datetime.date(2024, 3, 20),
+            datetime.date(2024, 4, 19),
+            datetime.date(2024, 5, 19),
+        ])
+
+    def test_consultas_constantes_no_recebimento(self):
+        medicoes = {}
+        for tamanho in (2, 12, 60):
+            venda = self.criar_venda(criar_plano(tamanho, operadora=f'Operadora {tamanho}'), numero_proposta=f'P-{tamanho}')
+            primeira = venda.controlederecebimento_set.get(parcela__numero_parcela=1)
+            primeira.data_recebimento = datetime.date(2024, 2, 19)
+            with CaptureQueriesContext(connection) as contexto:
+                primeira.save()
+            medicoes[tamanho] = len(contexto.captured_queries)
+
+        self.assertEqual(len(set(medicoes.values())), 1, medicoes)
+        self.assertLessEqual(medicoes[60], 6)
+
+    def test_lote_com_varias_vendas(self):
+        vendas = [self.criar_venda(criar_plano(3, operadora=f'Op {i}'), numero_proposta=f'P-{i}') for i in range(3)]
+        recebidas = []
+        for venda in vendas:
+            segunda = venda.controlederecebimento_set.get(parcela__numero_parcela=2)
+            segunda.data_recebimento = datetime.date(2024, 3, 1)
+            recebidas.append(segunda)
+
+        with CaptureQueriesContext(connection) as contexto:
+            alterados = reprogramar_parcelas(recebidas)
+
+        self.assertEqual(len(contexto.captured_queries), 2)
+        self.assertEqual(len(alterados), 3)
+        for venda in vendas:
+            self.assertEqual(self.datas_previstas(venda)[2], datetime.date(2024, 3, 31))
+
+
+class ReprecificacaoTests(ArquivosDeTarefaMixin, DadosBaseMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.plano = criar_plano(3)
+        self.vendas = [
+            self.criar_venda(self.plano, numero_proposta=f'R-{numero}', valor_plano=Decimal(valor))
+            for numero, valor in enumerate(('1000.00', '2500.00', '333.33'), start=1)
+        ]
+        primeira = self.vendas[0].controlederecebimento_set.get(parcela__numero_parcela=1)
+        primeira.status = 'Recebido'
+        primeira.data_recebimento = datetime.date(2024, 2, 9)
+        primeira.save()
+
+    def valores(self):
+        return dict(ControleDeRecebimento.objects.filter(venda__plano=self.plano).values_list('pk', 'valor_parcela'))
+
+    def test_simulacao_lista_diferencas_sem_gravar(self):
+        antes = self.valores()
+        relatorio = list(reprecificar_plano(self.plano.pk, {2: '8.00'}, taxa_plano_valor='20.00', simular=True))
+
+        diferencas = [item for item in relatorio if 'controle' in item]
+        resumo = relatorio[-1]['resumo']
+        # Parcela 1 de R-1 já recebida; as demais parcelas 1 mudam pela taxa e as 2 pela porcentagem
+        self.assertEqual(len(diferencas), 5)
+        self.assertEqual(resumo['parcelas_alteradas'], 5)
+        self.assertEqual(resumo['vendas'], 3)
+        self.assertEqual(resumo['alteracoes'], {
+            'taxa_plano_valor': ['10.00', '20.00'], 'parcelas': {2: ['5.00', '8.00']},
+        })
+        r1 = next(item for item in diferencas if item['venda'] == self.vendas[0].pk)
+        self.assertEqual(r1, {**r1, 'parcela': 2, 'valor_anterior': '50.00', 'valor_novo': '80.00'})
+        self.assertEqual(self.valores(), antes)
+        self.plano.refresh_from_db()
+        self.assertEqual(self.plano.taxa_plano_valor, Decimal('10.00'))
+
+    def test_aplica_em_lote_o_mesmo_valor_da_gravacao_da_venda(self):
+        recebida = self.vendas[0].controlederecebimento_set.get(parcela__numero_parcela=1)
+        relatorio = list(reprecificar_plano(
+            self.plano.pk, {'1': '90', '3': '7.5'}, taxa_plano_tipo='Porcentagem', taxa_plano_valor='2.5', tamanho_lote=2,
+        ))
+        self.assertEqual([item['lote'] for item in relatorio if 'lote' in item], [1, 2])
+        reprecificados = self.valores()
+
+        self.assertEqual(reprecificados[recebida.pk], recebida.valor_parcela)
+        self.assertEqual(Parcela.objects.get(plano=self.plano, numero_parcela=3).porcentagem_parcela, Decimal('7.50'))
+        self.assertEqual(verificar_resumos(), [])
+        # Gravar cada venda de novo com o plano novo não muda mais nada
+        for venda in Venda.objects.filter(plano=self.plano):
+            venda.save()
+        self.assertEqual(self.valores(), reprecificados)
+        self.assertEqual(
+            Venda.objects.get(numero_proposta='R-2').controlederecebimento_set.get(parcela__numero_parcela=1).valor_parcela,
+            Decimal('2193.75'),
+        )
+
+    def test_lotes_confirmados_separadamente_e_retomada(self):
+        savepoints = list(connection.savepoint_ids)
+        relatorio = reprecificar_plano(self.plano.pk, {2: '8.00'}, tamanho_lote=2)
+        for item in relatorio:
+            if 'lote' in item:
+                # A transação do lote já foi confirmada quando o progresso chega a quem consome
+                self.assertEqual(connection.savepoint_ids, savepoints)
+                break
+        relatorio.close()
+        # Interrompida depois do primeiro lote: R-1 e R-2 gravadas, R-3 ainda não
+        self.assertEqual(verificar_resumos(), [])
+        segunda = {venda.numero_proposta: venda.controlederecebimento_set.get(parcela__numero_parcela=2).valor_parcela
+                   for venda in Venda.objects.filter(plano=self.plano)}
+        self.assertEqual(segunda, {'R-1': Decimal('80.00'), 'R-2': Decimal('200.00'), 'R-3': Decimal('16.67')})
+
+        resumo = list(reprecificar_plano(self.plano.pk, {2: '8.00'}, tamanho_lote=2))[-1]['resumo']
+        self.assertEqual(resumo['alteracoes'], {})
+        self.assertEqual(resumo['parcelas_alteradas'], 1)
+        self.assertEqual(
+            Venda.objects.get(numero_proposta='R-3').controlederecebimento_set.get(parcela__numero_parcela=2).valor_parcela,
+            Decimal('26.67'),
+        )
+        self.assertEqual(verificar_resumos(), [])
+
+    def test_sem_condicoes_novas_alinha_vendas_a_plano_editado(self):
+        Parcela.objects.filter(plano=self.plano, numero_parcela=2).update(porcentagem_parcela=Decimal('6.00'))
+        invalidar_planos()
+        resumo = list(reprecificar_plano(self.plano.pk))[-1]['resumo']
+        self.assertEqual(resumo['alteracoes'], {})
+        self.assertEqual(resumo['parcelas_alteradas'], 3)
+        self.assertEqual(resumo['diferenca'], '38.33')
+
+    def test_condicoes_invalidas(self):
+        for argumentos in ({'porcentagens': {4: '1'}}, {'porcentagens': {1: 'x'}}, {'taxa_plano_tipo': 'Outra'},
+                           {'taxa_plano_valor': '-1'}, {'porcentagens': {1: '1.234'}}):
+            with self.subTest(argumentos=argumentos), self.assertRaises(ValueError):
+                reprecificar_plano(self.plano.pk, **argumentos)
+
+    def test_endpoint_simula_aplica_e_enfileira(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user(username='comum'))
+        url = f'/api/plano/{self.plano.pk}/reprecificar/'
+        self.assertEqual(client.post(url, {'porcentagens': {'2': '8'}}, format='json').status_code, 403)
+
+        client.force_authenticate(User.objects.create_user(username='admin', is_staff=True))
+        self.assertEqual(client.post(url, {'porcentagens': {'9': '8'}}, format='json').status_code, 400)
+        simulada = client.post(url + '?simular=1', {'porcentagens': {'2': '8'}}, format='json').json()
+        self.assertEqual(simulada['resumo']['parcelas_alteradas'], 3)
+        self.assertEqual(len(simulada['diferencas']), 3)
+        self.assertEqual(Parcela.objects.get(plano=self.plano, numero_parcela=2).porcentagem_parcela, Decimal('5.00'))
+
+        resposta = client.post(url + '?assincrono=1', {'porcentagens': {'2': '8'}}, format='json')
+        self.assertEqual(resposta.status_code, 202)
+        processar_fila()
+        tarefa = Tarefa.objects.get(pk=resposta.json()['id'])
+        self.assertEqual(tarefa.status, Tarefa.CONCLUIDA)
+        self.assertEqual(tarefa.resultado['parcelas_alteradas'], 3)
+        self.assertEqual(len(self.conteudo_da_saida(tarefa).splitlines()), 3 + 1 + 1)
+        self.assertEqual(Parcela.objects.get(plano=self.plano, numero_parcela=2).porcentagem_parcela, Decimal('8.00'))
+
+
+class ConciliacaoExtratoTests(DadosBaseMixin, TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='financeiro', password='senha')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.venda = self.criar_venda(criar_plano(3))
+
+    def conciliar(self, conteudo, content_type, **params):
+        resposta = self.client.post(
+            '/api/parcelas/conciliar-extrato/' + ('?' + urlencode(params) if params else ''),
+            data=conteudo, content_type=content_type,
+        )
+        self.assertEqual(resposta.status_code, 200)
+        return [json.loads(linha) for linha in b''.join(resposta.streaming_content).splitlines()]
+
+    def test_conciliacao_csv(self):
+        ControleDeRecebimento.objects.filter(venda=self.venda, parcela__numero_parcela=3).update(status='Recebido')
+        conteudo = (
+            'numero_proposta;numero_parcela;valor_parcela;data_recebimento;numero_extrato\n'
+            'P-1;1;990,00;19/02/2024;EXT-1\n'
+            'P-1;2;40,00;2024-03-20;EXT-1\n'
+            'P-1;3;50.00;2024-03-20;EXT-1\n'
+            'P-9;1;10,00;2024-03-20;EXT-1\n'
+            'P-1;1;990,00;19/02/2024;EXT-1\n'
+            'P-1;;990,00;19/02/2024;EXT-1\n'
+        )
+        relatorio = self.conciliar(conteudo, 'text/csv')
+
+        self.assertEqual(
+            [item['resultado'] for item in relatorio[:-1]],
+            ['conciliada', 'valor_divergente', 'ja_recebida', 'nao_encontrada', 'duplicada', 'invalida'],
+        )
+        self.assertEqual(relatorio[-1]['resumo']['conciliada'], 1)
+
+        primeira = ControleDeRecebimento.objects.get(venda=self.venda, parcela__numero_parcela=1)
+        self.assertEqual((primeira.status, primeira.data_recebimento, primeira.numero_extrato),
+                         ('Recebido', datetime.date(2024, 2, 19), 'EXT-1'))
+        segunda = ControleDeRecebimento.objects.get(venda=self.venda, parcela__numero_parcela=2)
+        self.assertEqual(segunda.data_prevista_recebimento, datetime.date(2024, 3, 20))
+
+    def test_conciliacao_json_em_lotes(self):
+        linhas = [
+            {'numero_proposta': 'P-1', 'numero_parcela': numero, 'valor_parcela': valor,
+             'data_recebimento': '2024-03-01', 'numero_extrato': 'EXT-2'}
+            for numero, valor in ((1, '990.00'), (2, '50.00'), (3, 50))
+        ]
+        relatorio = list(conciliar_extrato(ler_json(io.BytesIO(json.dumps(linhas).encode())), tamanho_lote=2))
+
+        self.assertEqual([item['resultado'] for item in relatorio[:-1]], ['conciliada'] * 3)
+        self.assertEqual(
+            ControleDeRecebimento.objects.filter(venda=self.venda, status='Recebido').count(), 3
+        )
+        terceira = ControleDeRecebimento.objects.get(venda=self.venda, parcela__numero_parcela=3)
+        self.assertEqual(terceira.data_prevista_recebimento, datetime.date(2024, 3, 31))
+
+    def test_json_lines_com_trecho_invalido(self):
+        conteudo = b'{"numero_proposta": "P-1", "numero_parcela": 1}\n{"quebrado": '
+        relatorio = list(conciliar_extrato(ler_json(io.BytesIO(conteudo))))
+
+        self.assertEqual([item['resultado'] for item in relatorio[:-1]], ['invalida', 'invalida'])
+
+    def test_trecho_malformado_nao_acumula_o_resto_do_extrato(self):
+        linha = b'{"numero_proposta": "P-1", "numero_parcela": 1}\n'
+        conteudo = linha + b'{"quebrado": \n' + linha * 200
+        with self.assertRaises(ExtratoInvalido):
+            list(ler_json(io.BytesIO(conteudo), tamanho_bloco=64, tamanho_maximo=1024))
+        # Pela API o relatório já começou a sair: o erro vem na última linha
+        relatorio = self.conciliar(linha + b'{"quebrado": \n' + linha * 25000, 'application/json')
+        self.assertEqual(relatorio[-1], {'erro': 'Extrato JSON malformado ou com um objeto maior que 1048576 caracteres.'})
+
+
+class ImportacaoVendasTests(ArquivosDeTarefaMixin, DadosBaseMixin, TestCase):
+    CABECALHO = 'numero_proposta;cliente;cliente_email;consultor;operadora;tipo;valor_plano;data_vigencia;data_vencimento\n'
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='importacao', password='senha'))
+        self.plano = criar_plano(3)
+
+    def linha(self, numero_proposta, cliente='Novo cliente', consultor='Consultor', operadora='Operadora', **kwargs):
+        dados = {
+            'numero_proposta': numero_proposta, 'cliente': cliente, 'consultor': consultor, 'operadora': operadora,
+            'tipo': 'PME', 'valor_plano': '1000.00', 'data_vigencia': '2024-01-10', 'data_vencimento': '2024-01-20',
+        }
+        dados.update(kwargs)
+        return dados
+
+    def test_importacao_csv_com_relatorio_de_erros(self):
+        self.criar_venda(self.plano, numero_proposta='EXISTENTE')
+        conteudo = self.CABECALHO + (
+            'I-1;Novo cliente;novo@exemplo.com;Consultor;Operadora;PME;1.000,00;10/01/2024;20/01/2024\n'
+            'I-2;Cliente;;Consultor;Operadora;PME;1000.00;2024-01-10;2024-01-20\n'
+            'I-3;Novo cliente;;Consultor;Inexistente;PME;1000.00;2024-01-10;2024-01-20\n'
+            'I-4;Novo cliente;;Ninguém;Operadora;PME;1000.00;2024-01-10;2024-01-20\n'
+            'I-1;Novo cliente;;Consultor;Operadora;PME;1000.00;2024-01-10;2024-01-20\n'
+            'I-5;Novo cliente;;Consultor;Operadora;PME;1000.00;31/02/2024;2024-01-20\n'
+            'EXISTENTE;Novo cliente;;Consultor;Operadora;PME;1000.00;2024-01-10;2024-01-20\n'
+        )
+        resposta = self.client.post('/api/vendas/importar/?tamanho_lote=3', data=conteudo, content_type='text/csv')
+        self.assertEqual(resposta.status_code, 200)
+        relatorio = [json.loads(linha) for linha in b''.join(resposta.streaming_content).splitlines()]
+
+        self.assertEqual([item['linha'] for item in relatorio if 'erro' in item], [3, 4, 5, 6, 7])
+        self.assertEqual(relatorio[-1]['resumo'], {'importadas': 2, 'erros': 5, 'clientes_criados': 1})
+        self.assertEqual(Cliente.objects.get(nome='Novo cliente').email, 'novo@exemplo.com')
+        self.assertEqual(Venda.objects.get(numero_proposta='I-2').cliente, self.cliente)
+
+        # O cronograma gravado em lote é o mesmo gerado por Venda.save
+        campos = ('parcela__numero_parcela', 'valor_parcela', 'data_prevista_recebimento', 'status')
+        for proposta in ('I-1', 'I-2'):
+            self.assertEqual(
+                list(ControleDeRecebimento.objects.filter(venda__numero_proposta=proposta).order_by('parcela__numero_parcela').values_list(*campos)),
+                list(ControleDeRecebimento.objects.filter(venda__numero_proposta='EXISTENTE').order_by('parcela__numero_parcela').values_list(*campos)),
+            )
+        self.assertEqual(verificar_resumos(), [])
+
+    def test_consultas_constantes_por_lote(self):
+        medicoes = {}
+        for quantidade in (10, 100):
+            linhas = [self.linha(f'Q{quantidade}-{numero}', cliente=f'Cliente {quantidade}-{numero}') for numero in range(quantidade)]
+            with CaptureQueriesContext(connection) as contexto:
+                relatorio = list(importar_vendas(linhas, tamanho_lote=1000))
+            self.assertEqual(relatorio[-1]['resumo']['importadas'], quantidade)
+            medicoes[quantidade] = len(contexto.captured_queries)
+
+        # Só os INSERTs em bulk crescem, divididos pelo limite de parâmetros do banco
+        self.assertLessEqual(medicoes[100], medicoes[10] + 4, medicoes)
+        self.assertEqual(ControleDeRecebimento.objects.count(), 330)
+
+    @skipUnless(find_spec('openpyxl'), 'openpyxl não instalado')
+    def test_importacao_xlsx(self):
+        from openpyxl import Workbook
+
+        def planilha_com(numero_proposta):
+            planilha = Workbook()
+            aba = planilha.active
+            aba.append(list(self.linha(numero_proposta)))
+            aba.append([datetime.date(2024, 1, 10) if campo.startswith('data_') else valor
+                        for campo, valor in self.linha(numero_proposta, valor_plano=1000.5).items()])
+            arquivo = io.BytesIO()
+            planilha.save(arquivo)
+            arquivo.seek(0)
+            arquivo.name = 'vendas.xlsx'
+            return arquivo
+
+        resposta = self.client.post('/api/vendas/importar/', {'arquivo': planilha_com('X-1')}, format='multipart')
+        relatorio = [json.loads(linha) for linha in b''.join(resposta.streaming_content).splitlines()]
+        self.assertEqual(relatorio[-1]['resumo']['importadas'], 1)
+        self.assertEqual(Venda.objects.get(numero_proposta='X-1').valor_plano, Decimal('1000.50'))
+
+        # Em segundo plano o trabalhador lê a planilha guardada no storage
+        resposta = self.client.post('/api/vendas/importar/?assincrono=1', {'arquivo': planilha_com('X-2')}, format='multipart')
+        processar_fila()
+        self.assertEqual(Tarefa.objects.get(pk=resposta.json()['id']).resultado['importadas'], 1)
+        self.assertTrue(Venda.objects.filter(numero_proposta='X-2').exists())
+
+    def test_comando_grava_relatorio(self):
+        with tempfile.TemporaryDirectory() as diretorio:
+            planilha = os.path.join(diretorio, 'vendas.csv')
+            relatorio = os.path.join(diretorio, 'erros.jsonl')
+            with open(planilha, 'w', encoding='utf-8') as arquivo:
+                arquivo.write(self.CABECALHO + 'C-1;Cliente;;Consultor;Operadora;PME;500;2024-01-10;2024-01-20\nC-2;;;;;;;;\n')
+            saida = io.StringIO()
+            call_command('importar_vendas', planilha, '--relatorio', relatorio, stdout=saida)
+            with open(relatorio, encoding='utf-8') as arquivo:
+                erros = [json.loads(linha) for linha in arquivo]
+
+        self.assertIn('1 venda(s) importada(s)', saida.getvalue())
+        self.assertEqual([erro['linha'] for erro in erros], [2])
+
+
+class ExportacaoTests(DadosBaseMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='exportacao', password='senha'))
+        self.outro_consultor = Consultor.objects.create(nome='Outro')
+        plano = criar_plano(3)
+        self.criar_venda(plano, numero_proposta='E-1')
+        self.criar_venda(plano, numero_proposta='E-2', consultor=self.outro_consultor)
+
+    def exportar_csv(self, url):
+        with CaptureQueriesContext(connection) as contexto:
+            resposta = self.client.get(url)
+            self.assertTrue(resposta.streaming)
+            conteudo = b''.join(resposta.streaming_content).decode('utf-8-sig')
+        self.assertEqual(len(contexto.captured_queries), 1)
+        return list(csv.reader(io.StringIO(conteudo), delimiter=';'))
+
+    def test_exporta_vendas_com_filtros_da_listagem(self):
+        linhas = self.exportar_csv(f'/api/venda/exportar/?consultor={self.consultor.pk}')
+
+        self.assertEqual(linhas[0][:3], ['id', 'numero_proposta', 'cliente'])
+        self.assertEqual(len(linhas), 2)
+        venda = dict(zip(linhas[0], linhas[1]))
+        self.assertEqual((venda['numero_proposta'], venda['consultor']), ('E-1', 'Consultor'))
+        self.assertEqual((venda['valor_liquido'], venda['data_vigencia']), ('990.00', '2024-01-10'))
+
+    def test_exporta_parcelas_ordenadas(self):
+        linhas = self.exportar_csv('/api/controlederecebimento/exportar/?operadora=Operadora&ordering=-id')
+
+        self.assertEqual(len(linhas), 7)
+        ids = [int(linha[0]) for linha in linhas[1:]]
+        self.assertEqual(ids, sorted(ids, reverse=True))
+        self.assertEqual(linhas[0][6:8], ['numero_parcela', 'valor_parcela'])
+
+    @skipUnless(find_spec('openpyxl'), 'openpyxl não instalado')
+    def test_exporta_xlsx(self):
+        from openpyxl import load_workbook
+
+        resposta = self.client.get('/api/venda/exportar/?formato=xlsx')
+        planilha = load_workbook(io.BytesIO(b''.join(resposta.streaming_content))).active
+        self.assertEqual([linha[1] for linha in planilha.iter_rows(values_only=True)], ['numero_proposta', 'E-1', 'E-2'])
+
+    def test_formato_invalido(self):
+        self.assertEqual(self.client.get('/api/venda/exportar/?formato=pdf').status_code, 400)
+
+
+class TarefasTests(ArquivosDeTarefaMixin, DadosBaseMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.usuario = User.objects.create_user(username='tarefas', password='senha')
+        self.client = APIClient()
+        self.client.force_authenticate(self.usuario)
+        self.plano = criar_plano(3)
+
+    def test_importacao_em_segundo_plano(self):
+        conteudo = ImportacaoVendasTests.CABECALHO + (
+            'T-1;Cliente;;Consultor;Operadora;PME;1000.00;2024-01-10;2024-01-20\n'
+            'T-2;Cliente;;Ninguém;Operadora;PME;1000.00;2024-01-10;2024-01-20\n'
+        )
+        resposta = self.client.post('/api/vendas/importar/?assincrono=1', data=conteudo, content_type='text/csv')
+        self.assertEqual(resposta.status_code, 202)
+        self.assertEqual(resposta.json()['status'], 'Pendente')
+        self.assertTrue(resposta['Location'].endswith(f"/api/tarefas/{resposta.json()['id']}/"))
+        self.assertFalse(Venda.objects.filter(numero_proposta='T-1').exists())
+        # O corpo enviado vai para o storage; a tarefa guarda só o caminho
+        enfileirada = Tarefa.objects.get(pk=resposta.json()['id'])
+        self.assertTrue(enfileirada.entrada.name.startswith('tarefas/entradas/'))
+        with enfileirada.entrada.open('rb') as entrada:
+            self.assertEqual(entrada.read(), conteudo.encode())
+
+        self.assertEqual(processar_fila(), 1)
+        tarefa = self.client.get(resposta['Location']).json()
+        self.assertEqual(tarefa['status'], 'Concluída')
+        self.assertEqual(tarefa['resultado'], {'importadas': 1, 'erros': 1, 'clientes_criados': 0})
+        self.assertEqual(tarefa['progresso'], 2)
+        self.assertTrue(Venda.objects.filter(numero_proposta='T-1').exists())
+
+        arquivo = self.client.get(tarefa['arquivo'])
+        self.assertEqual(arquivo['Content-Type'], 'application/x-ndjson')
+        self.assertIn(f'filename="importacao-{tarefa["id"]}.jsonl"', arquivo['Content-Disposition'])
+        relatorio = [json.loads(linha) for linha in b''.join(arquivo.streaming_content).splitlines()]
+        self.assertEqual(relatorio[0]['linha'], 2)
+
+    def test_exportacao_em_segundo_plano_igual_a_sincrona(self):
+        self.criar_venda(self.plano, numero_proposta='E-1')
+        self.criar_venda(self.plano, numero_proposta='E-2', consultor=Consultor.objects.create(nome='Outro'))
+        url = f'/api/controlederecebimento/exportar/?consultor={self.consultor.pk}&ordering=-id'
+
+        esperado = b''.join(self.client.get(url).streaming_content)
+        resposta = self.client.get(url + '&assincrono=1')
+        self.assertEqual(resposta.status_code, 202)
+        processar_fila()
+
+        tarefa = Tarefa.objects.get(pk=resposta.json()['id'])
+        self.assertEqual((tarefa.status, tarefa.progresso, tarefa.total), ('Concluída', 3, 3))
+        # No banco fica só o caminho do arquivo no storage
+        self.assertTrue(tarefa.saida.name.startswith('tarefas/'))
+        self.assertEqual(self.conteudo_da_saida(tarefa), esperado)
+        self.assertEqual(tarefa.resultado['bytes'], len(esperado))
+        self.assertEqual(b''.join(self.client.get(f'/api/tarefas/{tarefa.pk}/arquivo/').streaming_content), esperado)
+        caminho = tarefa.saida.name
+        with self.captureOnCommitCallbacks(execute=True):
+            tarefa.delete()
+        self.assertFalse(tarefa.saida.storage.exists(caminho))
+        self.assertEqual(self.client.get(url + '&assincrono=1&formato=pdf').status_code, 400)
+
+    @skipUnless(find_spec('openpyxl'), 'openpyxl não instalado')
+    def test_exportacao_xlsx_em_segundo_plano(self):
+        from openpyxl import load_workbook
+
+        self.criar_venda(self.plano, numero_proposta='E-1')
+        resposta = self.client.get('/api/venda/exportar/?formato=xlsx&assincrono=1')
+        processar_fila()
+        tarefa = Tarefa.objects.get(pk=resposta.json()['id'])
+        conteudo = self.conteudo_da_saida(tarefa)
+        self.assertEqual(tarefa.resultado, {'linhas': 1, 'bytes': len(conteudo)})
+        planilha = load_workbook(io.BytesIO(conteudo)).active
+        self.assertEqual([linha[1] for linha in planilha.iter_rows(values_only=True)], ['numero_proposta', 'E-1'])
+
+    def test_reconstrucao_de_resumos_registra_progresso(self):
+        self.criar_venda(self.plano)
+        ResumoComissaoMensal.objects.create(consultor=self.consultor, operadora='Extinta', mes=datetime.date(2020, 1, 1))
+
+        tarefa = Tarefa.objects.create(tipo='reconstruir_resumos', parametros={'tamanho_lote': 1})
+        with patch('core.tarefas.registrar_progresso', wraps=registrar_progresso) as progresso:
+            processar_fila()
+        # Um sinal de vida por lote gravado, fora de uma transação única
+        self.assertEqual([chamada.args[1] for chamada in progresso.call_args_list], [1, 2, 3])
+        tarefa.refresh_from_db()
+        self.assertEqual((tarefa.status, tarefa.resultado, tarefa.progresso), (Tarefa.CONCLUIDA, {'resumos': 3}, 3))
+        self.assertFalse(ResumoComissaoMensal.objects.filter(operadora='Extinta').exists())
+        self.assertEqual(verificar_resumos(), [])
+
+    def test_reserva_em_ordem_e_libera_abandonadas(self):
+        primeira = Tarefa.objects.create(tipo='reconstruir_resumos')
+        segunda = Tarefa.objects.create(tipo='reconstruir_resumos')
+
+        self.assertEqual(reservar_proxima('a').pk, primeira.pk)
+        self.assertEqual(reservar_proxima('b').pk, segunda.pk)
+        self.assertIsNone(reservar_proxima('c'))
+
+        antigo = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+        Tarefa.objects.filter(pk=primeira.pk).update(atualizado_em=antigo)
+        Tarefa.objects.filter(pk=segunda.pk).update(atualizado_em=antigo, tentativas=3)
+        self.assertEqual(liberar_abandonadas(), 2)
+        self.assertEqual(Tarefa.objects.get(pk=primeira.pk).status, Tarefa.PENDENTE)
+        self.assertEqual(Tarefa.objects.get(pk=segunda.pk).status, Tarefa.FALHOU)
+
+        call_command('processar_tarefas', '--uma-vez', stdout=io.StringIO())
+        primeira.refresh_from_db()
+        self.assertEqual((primeira.status, primeira.tentativas), (Tarefa.CONCLUIDA, 2))
+
+    def test_falha_e_visibilidade_por_usuario(self):
+        tarefa = Tarefa.objects.create(tipo='inexistente', usuario=self.usuario)
+        with self.assertLogs('core.tarefas', 'ERROR'):
+            processar_fila()
+        tarefa.refresh_from_db()
+        self.assertEqual(tarefa.status, Tarefa.FALHOU)
+        self.assertIn('inexistente', tarefa.erro)
+
+        outro = APIClient()
+        outro.force_authenticate(User.objects.create_user(username='outro', password='senha'))
+        self.assertEqual(outro.get(f'/api/tarefas/{tarefa.pk}/').status_code, 404)
+        self.assertEqual(outro.post('/api/resumos/reconstruir/').status_code, 403)
+        self.assertEqual(self.client.get(f'/api/tarefas/{tarefa.pk}/arquivo/').status_code, 404)
+        self.assertEqual([item['id'] for item in self.client.get('/api/tarefas/').json()['results']], [tarefa.pk])
+
+
+class BuscaTests(DadosBaseMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='busca', password='senha'))
+        self.plano = criar_plano(1)
+        with self.gravacao():
+            self.joao = Cliente.objects.create(nome='João Conceição', telefone='(11) 91234-5678', email='joao@exemplo.com')
+            self.maria = Cliente.objects.create(nome='Maria Joana', telefone='(21) 99999-0000')
+            self.vendedor = Consultor.objects.create(nome='Joaquim Vendas')
+            self.venda = self.criar_venda(self.plano, numero_proposta='PROP-2024-00917', cliente=self.joao)
+
+    @contextmanager
+    def gravacao(self):
+        # Transação própria, com os callbacks de commit executados como fora dos testes
+        with self.captureOnCommitCallbacks(execute=True), transaction.atomic():
+            yield
+
+    def buscar(self, consulta, **parametros):
+        resposta = self.client.get('/api/busca/', {'q': consulta, **parametros})
+        self.assertEqual(resposta.status_code, 200, resposta.content)
+        return resposta.json()
+
+    def test_busca_ignora_acentos_e_maiusculas(self):
+        resultados = self.buscar('JOAO conceicao')['resultados']
+        self.assertEqual([(r['tipo'], r['id']) for r in resultados], [('cliente', self.joao.pk)])
+        self.assertEqual(resultados[0]['titulo'], 'João Conceição')
+        self.assertIn('joao@exemplo.com', resultados[0]['detalhe'])
+
+    def test_busca_por_trecho_do_telefone_e_da_proposta(self):
+        self.assertEqual([r['id'] for r in self.buscar('912345')['resultados']], [self.joao.pk])
+        self.assertEqual([r['id'] for r in self.buscar('91234-56')['resultados']], [self.joao.pk])
+        resultados = self.buscar('00917')['resultados']
+        self.assertEqual([(r['tipo'], r['id']) for r in resultados], [('venda', self.venda.pk)])
+
+    def test_filtra_por_tipo_e_pagina(self):
+        tipos = {r['tipo'] for r in self.buscar('joa')['resultados']}
+        self.assertEqual(tipos, {'cliente', 'consultor'})
+        self.assertEqual([r['id'] for r in self.buscar('joa', tipo='consultor')['resultados']], [self.vendedor.pk])
+
+        primeira = self.buscar('joa', page_size=2)
+        self.assertEqual(len(primeira['resultados']), 2)
+        self.assertIn('pagina=2', primeira['proxima'])
+        segunda = self.client.get(primeira['proxima']).json()
+        self.assertEqual(len(segunda['resultados']), 1)
+        self.assertIsNone(segunda['proxima'])
+        ids = {(r['tipo'], r['id']) for r in primeira['resultados'] + segunda['resultados']}
+        self.assertEqual(len(ids), 3)
+
+    def test_rejeita_termo_curto_e_tipo_invalido(self):
+        self.assertEqual(self.client.get('/api/busca/', {'q': 'jo'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/busca/', {'q': 'joao', 'tipo': 'plano'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/busca/', {'q': 'joao', 'page_size': 500}).status_code, 400)
+
+    def test_alteracao_e_exclusao_atualizam_o_indice(self):
+        with self.gravacao():
+            self.maria.nome = 'Mariana Souza'
+            self.maria.save()
+        self.assertEqual([r['id'] for r in buscar('mariana')], [self.maria.pk])
+        self.assertEqual(buscar('maria joana'), [])
+
+        with self.gravacao():
+            self.vendedor.delete()
+        self.assertEqual(buscar('joaquim'), [])
+        self.assertFalse(DocumentoBusca.objects.filter(tipo='consultor', objeto_id=self.vendedor.pk).exists())
+
+    def test_comando_reconstroi_o_indice(self):
+        DocumentoBusca.objects.all().delete()
+        self.assertEqual(buscar('joao'), [])
+
+        saida = io.StringIO()
+        call_command('reconstruir_busca', '--tamanho-lote', '1', stdout=saida)
+        self.assertIn('Índice da busca reconstruído', saida.getvalue())
+        self.assertEqual([r['id'] for r in buscar('joao', tipos=['cliente'])], [self.joao.pk])
+        self.assertEqual(DocumentoBusca.objects.count(), Cliente.objects.count() + Consultor.objects.count() + 1)
+
+    def test_migracao_indexa_registros_existentes(self):
+        migracao = import_module('core.migrations.0015_preencher_busca')
+        DocumentoBusca.objects.all().delete()
+
+        migracao.preencher_busca(apps_da_migracao('0015_preencher_busca'), SimpleNamespace(connection=connection))
+        self.assertEqual([r['id'] for r in buscar('joao', tipos=['cliente'])], [self.joao.pk])
+        self.assertEqual(DocumentoBusca.objects.count(), Cliente.objects.count() + Consultor.objects.count() + 1)
+
+
+class ArquivamentoTests(ArquivosDeTarefaMixin, DadosBaseMixin, TestCase):
+    HOJE = datetime.date(2026, 6, 1)
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='arquivo', password='senha'))
+        self.outro_consultor = Consultor.objects.create(nome='Outro')
+        plano = criar_plano(2)
+        self.antiga = self.criar_venda(plano, numero_proposta='A-1')
+        self.recente = self.criar_venda(plano, numero_proposta='A-2', consultor=self.outro_consultor)
+        self.aberta = self.criar_venda(plano, numero_proposta='A-3')
+        for venda, recebimento in ((self.antiga, datetime.date(2024, 3, 15)), (self.recente, datetime.date(2026, 1, 10))):
+            for numero in (1, 2):
+                # Lida de novo a cada volta: receber a parcela 1 reprograma a 2
+                controle = venda.controlederecebimento_set.get(parcela__numero_parcela=numero)
+                controle.status = 'Recebido'
+                controle.data_recebimento = recebimento
+                controle.save()
+        recebida = self.aberta.controlederecebimento_set.get(parcela__numero_parcela=1)
+        recebida.status = 'Recebido'
+        recebida.data_recebimento = datetime.date(2024, 2, 9)
+        recebida.save()
+
+    def test_move_apenas_vendas_quitadas_antes_do_horizonte(self):
+        self.assertEqual(arquivar_vendas(hoje=self.HOJE, horizonte_dias=365, simular=True), {'vendas': 1, 'parcelas': 2})
+        self.assertTrue(Venda.objects.filter(pk=self.antiga.pk).exists())
+
+        ids_parcelas = set(self.antiga.controlederecebimento_set.values_list('pk', flat=True))
+        with self.captureOnCommitCallbacks(execute=True):
+            totais = arquivar_vendas(hoje=self.HOJE, horizonte_dias=365, tamanho_lote=1)
+        self.assertEqual(totais, {'vendas': 1, 'parcelas': 2})
+
+        self.assertEqual(set(Venda.objects.values_list('numero_proposta', flat=True)), {'A-2', 'A-3'})
+        arquivada = VendaArquivada.objects.get(pk=self.antiga.pk)
+        self.assertEqual((arquivada.numero_proposta, arquivada.valor_plano), ('A-1', Decimal('1000.00')))
+        self.assertEqual(set(ControleDeRecebimentoArquivado.objects.values_list('pk', flat=True)), ids_parcelas)
+        self.assertFalse(ControleDeRecebimento.objects.filter(pk__in=ids_parcelas).exists())
+        self.assertEqual(verificar_resumos(), [])
+        self.assertFalse(DocumentoBusca.objects.filter(tipo='venda', objeto_id=self.antiga.pk).exists())
+        # Nada mais a arquivar com o mesmo horizonte
+        self.assertEqual(arquivar_vendas(hoje=self.HOJE, horizonte_dias=365), {'vendas': 0, 'parcelas': 0})
+
+    def test_numero_de_proposta_unico_com_o_arquivo(self):
+        arquivar_vendas(hoje=self.HOJE, horizonte_dias=365)
+        dados = {
+            'numero_proposta': 'A-1', 'cliente_id': self.cliente.pk, 'plano_id': self.aberta.plano_id,
+            'consultor_id': self.consultor.pk, 'valor_plano': '1000.00',
+            'data_vigencia': '2024-01-10', 'data_vencimento': '2024-01-20',
+        }
+        resposta = self.client.post('/api/venda/', dados, format='json')
+        self.assertEqual(resposta.status_code, 400)
+        self.assertIn('numero_proposta', resposta.json())
+        with self.assertRaises(ValidationError):
+            Venda(numero_proposta='A-1', cliente=self.cliente, plano=self.aberta.plano, consultor=self.consultor,
+                  valor_plano=Decimal('10.00'), data_vigencia=self.HOJE, data_vencimento=self.HOJE).full_clean()
+
+        # Venda repetida gravada antes da validação: fica em operação em vez de violar o unique do arquivo
+        Venda.objects.filter(pk=self.recente.pk).update(numero_proposta='A-1')
+        with self.assertLogs('core.arquivamento', 'WARNING'):
+            self.assertEqual(arquivar_vendas(hoje=self.HOJE, horizonte_dias=30), {'vendas': 0, 'parcelas': 0})
+        self.assertTrue(Venda.objects.filter(pk=self.recente.pk).exists())
+
+    def test_cadastros_de_vendas_arquivadas_nao_sao_removidos(self):
+        arquivar_vendas(hoje=self.HOJE, horizonte_dias=365)
+        resposta = self.client.delete(f'/api/consultor/{self.consultor.pk}/')
+        self.assertEqual(resposta.status_code, 400)
+        self.assertTrue(VendaArquivada.objects.filter(pk=self.antiga.pk, consultor=self.consultor).exists())
+        self.assertTrue(Venda.objects.filter(pk=self.aberta.pk).exists())
+
+    def test_relatorios_e_exportacoes_incluem_o_arquivo_quando_pedido(self):
+        urls = (
+            '/api/relatorios/vendas/?agrupar=consultor,mes',
+            '/api/relatorios/comissoes/?agrupar=consultor,mes&fonte=bruto',
+            f'/api/relatorios/comissoes/?consultor={self.consultor.pk}&fonte=bruto',
+        )
+        antes = {url: self.client.get(url).json()['resultados'] for url in urls}
+        exportacao = '/api/controlederecebimento/exportar/?ordering=-id'
+        linhas_antes = b''.join(self.client.get(exportacao).streaming_content).decode('utf-8-sig').splitlines()
+
+        arquivar_vendas(hoje=self.HOJE, horizonte_dias=365)
+
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertNotEqual(self.client.get(url).json()['resultados'], antes[url])
+                self.assertEqual(self.client.get(url + '&incluir_arquivo=1').json()['resultados'], antes[url])
+        resposta = self.client.get('/api/relatorios/comissoes/?agrupar=consultor&incluir_arquivo=1').json()
+        self.assertEqual(resposta['fonte'], 'bruto')
+
+        linhas = b''.join(self.client.get(exportacao + '&incluir_arquivo=1').streaming_content).decode('utf-8-sig').splitlines()
+        self.assertEqual(len(linhas), len(linhas_antes))
+        self.assertEqual(sorted(linhas), sorted(linhas_antes))
+        self.assertEqual(len(b''.join(self.client.get(exportacao).streaming_content).splitlines()), len(linhas_antes) - 2)
+
+    def test_exportacao_em_segundo_plano_inclui_o_arquivo(self):
+        arquivar_vendas(hoje=self.HOJE, horizonte_dias=365)
+        resposta = self.client.get(f'/api/venda/exportar/?consultor={self.consultor.pk}&incluir_arquivo=1&assincrono=1')
+        processar_fila()
+        tarefa = Tarefa.objects.get(pk=resposta.json()['id'])
+        self.assertEqual(tarefa.status, Tarefa.CONCLUIDA)
+        propostas = [linha.split(';')[1] for linha in self.conteudo_da_saida(tarefa).decode('utf-8-sig').splitlines()[1:]]
+        self.assertEqual(propostas, ['A-3', 'A-1'])
+
+
+class VendaListagemTests(DadosBaseMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.user = User.objects.create_user(username='consulta', password='senha')
+        plano = criar_plano(3)
+        parcelas = list(plano.parcela_set.all())
+        vendas = Venda.objects.bulk_create([
+            Venda(
+                numero_proposta=f'L-{i}', cliente=cls.cliente, plano=plano, consultor=cls.consultor,
+                valor_plano=Decimal('100.00'), data_vigencia=datetime.date(2024, 1, 1),
+                data_vencimento=datetime.date(2024, 1, 10),
+            )
+            for i in range(1000)
+        ])
+        ControleDeRecebimento.objects.bulk_create([
+            ControleDeRecebimento(
+                venda=venda, parcela=parcela, valor_parcela=Decimal('10.00'),
+                data_prevista_recebimento=datetime.date(2024, 2, 1),
+            )
+            for venda in vendas for parcela in parcelas
+        ])
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def listar(self, url):
+        with CaptureQueriesContext(connection) as contexto:
+            resposta = self.client.get(url)
+        self.assertEqual(resposta.status_code, 200)
+        # Desconta a leitura da versão dos dados (ETag)
+        return resposta.json(), len(contexto.captured_queries) - 1
+
+    def test_listagem_compacta_em_consulta_unica(self):
+        dados, consultas = self.listar('/api/venda/?page_size=500')
+
+        self.assertEqual(len(dados['results']), 500)
+        self.assertEqual(consultas, 1)
+        self.assertNotIn('parcelas_recebimento', dados['results'][0])
+        self.assertEqual(set(dados['results'][0]['plano']), {'id', 'operadora', 'tipo'})
+
+        # Páginas seguintes custam o mesmo número de consultas
+        proxima, consultas = self.listar(dados['next'])
+        self.assertEqual(len(proxima['results']), 500)
+        self.assertEqual(consultas, 1)
+        self.assertIsNone(proxima['next'])
+
+    def test_fields_com_parcelas_usa_prefetch(self):
+        dados, consultas = self.listar('/api/venda/?page_size=500&fields=id,numero_proposta,cliente,parcelas_recebimento')
+
+        self.assertEqual(len(dados['results']), 500)
+        self.assertEqual(consultas, 2)
+        self.assertEqual(set(dados['results'][0]), {'id', 'numero_proposta', 'cliente', 'parcelas_recebimento'})
+        self.assertEqual(len(dados['results'][0]['parcelas_recebimento']), 3)
+
+    def test_detalhe_mantem_representacao_completa(self):
+        venda = Venda.objects.first()
+        resposta = self.client.get(f'/api/venda/{venda.pk}/')
+
+        self.assertEqual(len(resposta.json()['parcelas_recebimento']), 3)
+        self.assertIn('taxa_plano_valor', resposta.json()['plano'])
+
+
+class ListagemRapidaTests(DadosBaseMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='rapida', password='senha'))
+        plano = criar_plano(4)
+        for numero in range(3):
+            self.criar_venda(plano, numero_proposta=f'L-{numero}', desconto_consultor=Decimal('12.50'))
+        ControleDeRecebimento.objects.filter(parcela__numero_parcela=1).update(
+            status='Recebido', data_recebimento=datetime.date(2024, 2, 11), numero_extrato='EXT-1',
+        )
+
+    def renderizado(self, dados):
+        return json.loads(JSONRenderer().render(dados))
+
+    def test_listagens_iguais_as_dos_serializers(self):
+        casos = (
+            ('/api/controlederecebimento/', ControleDeRecebimentoSerializer, ControleDeRecebimento.objects.order_by('-id')),
+            ('/api/venda/', VendaListSerializer, Venda.objects.order_by('-id')),
+            ('/api/parcelas-atrasadas/', ParcelaAtrasadaSerializer, parcelas_atrasadas().order_by('data_prevista_recebimento', 'id')),
+        )
+        for url, serializer, queryset in casos:
+            with self.subTest(url=url):
+                resposta = self.client.get(f'{url}?page_size=500')
+                self.assertEqual(resposta['Content-Type'], 'application/json')
+                self.assertEqual(resposta.json()['results'], self.renderizado(serializer(queryset, many=True).data))
+
+    def test_paginacao_e_ordenacao(self):
+        ids = []
+        url = '/api/controlederecebimento/?' + urlencode({
+            'page_size': 5, 'ordering': 'data_prevista_recebimento', 'status': 'Recebido,Não Recebido',
+        })
+        while url:
+            dados = self.client.get(url).json()
+            ids.extend(item['id'] for item in dados['results'])
+            url = dados['next']
+        esperados = ControleDeRecebimento.objects.order_by('data_prevista_recebimento', 'id').values_list('id', flat=True)
+        self.assertEqual(ids, list(esperados))
+
+    def test_renderer_igual_ao_do_drf(self):
+        dados = {
+            'valor': Decimal('10.50'),
+            'data': datetime.date(2024, 1, 2),
+            'momento': datetime.datetime(2024, 1, 2, 3, 4, 5, 600, tzinfo=datetime.timezone.utc),
+            'texto': 'linha\u2028nova ç',
+            'lista': [ErrorDetail('erro')],
+        }
+        renderer = JSONRapidoRenderer()
+        self.assertEqual(
+            renderer.render(dados),
+            JSONRenderer().render({**dados, 'valor': '10.50'}),
+        )
+
+
+class FiltrosTests(DadosBaseMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='filtros', password='senha'))
+        self.plano_pme = criar_plano(2)
+        self.plano_pf = criar_plano(2, operadora='Outra', tipo='PF')
+        self.outro_consultor = Consultor.objects.create(nome='Outro')
+        self.criar_venda(self.plano_pme, numero_proposta='F-1', data_venda=datetime.date(2024, 1, 5))
+        self.criar_venda(self.plano_pf, numero_proposta='F-2', data_venda=datetime.date(2024, 2, 5))
+        self.criar_venda(
+            self.plano_pf, numero_proposta='F-3', consultor=self.outro_consultor,
+            data_venda=datetime.date(2024, 3, 5), data_vigencia=datetime.date(2024, 3, 10),
+        )
+
+    def propostas(self, url):
+        resposta = self.client.get(url)
+        self.assertEqual(resposta.status_code, 200, resposta.content)
+        return [item['numero_proposta'] for item in resposta.json()['results']]
+
+    def test_filtros_de_venda(self):
+        self.assertEqual(self.propostas(f'/api/venda/?plano={self.plano_pf.pk}&ordering=data_venda'), ['F-2', 'F-3'])
+        self.assertEqual(self.propostas(f'/api/venda/?consultor={self.outro_consultor.pk}'), ['F-3'])
+        self.assertEqual(self.propostas('/api/venda/?operadora=Operadora'), ['F-1'])
+        self.assertEqual(
+            self.propostas('/api/venda/?data_venda_inicio=2024-01-10&data_venda_fim=2024-02-28'), ['F-2']
+        )
+
+    def test_busca_e_situacao_de_venda(self):
+        Venda.objects.filter(numero_proposta='F-2').update(cliente=Cliente.objects.create(nome='Fulano F-9'))
+        self.assertEqual(self.propostas('/api/venda/?busca=f-9'), ['F-2'])
+        self.assertEqual(self.propostas('/api/venda/?busca=f-3'), ['F-3'])
+        self.assertEqual(self.propostas('/api/venda/?busca=FULANO&situacao=em_andamento'), ['F-2'])
+
+        ControleDeRecebimento.objects.filter(venda__numero_proposta='F-1').update(status='Recebido')
+        self.assertEqual(self.propostas('/api/venda/?situacao=finalizada'), ['F-1'])
+        self.assertEqual(self.propostas('/api/venda/?situacao=em_andamento&ordering=id'), ['F-2', 'F-3'])
+        self.assertEqual(self.client.get('/api/venda/?situacao=todas').status_code, 400)
+
+    def test_filtros_de_recebimento(self):
+        ControleDeRecebimento.objects.filter(venda__numero_proposta='F-1').update(status='Recebido')
+        resposta = self.client.get(
+            '/api/controlederecebimento/?status=Não Recebido,Atrasado&data_prevista_inicio=2024-04-01'
+            '&ordering=data_prevista_recebimento'
+        )
+        datas = [item['data_prevista_recebimento'] for item in resposta.json()['results']]
+
+        self.assertEqual(datas, ['2024-04-09', '2024-05-09'])
+
+    def test_filtro_invalido_retorna_400(self):
+        resposta = self.client.get('/api/venda/?data_venda_inicio=ontem')
+        self.assertEqual(resposta.status_code, 400)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Planos de execução verificados no formato do SQLite.')
+class IndicesConsultasFrequentesTests(DadosBaseMixin, TestCase):
+    """Garante via EXPLAIN que as consultas quentes usam índices e não varrem a tabela."""
+
+    def assertUsaIndice(self, queryset, indice=None):
+        plano = queryset.explain()
+        self.assertNotRegex(plano, r'\bSCAN\b', plano)
+        self.assertIn('USING', plano)
+        if indice:
+            self.assertIn(indice, plano)
+
+    def test_atrasadas_por_status_e_data(self):
+        hoje = datetime.date(2024, 6, 1)
+        self.assertUsaIndice(
+            ControleDeRecebimento.objects.filter(status='Não Recebido', data_prevista_recebimento__lt=hoje),
+            'controle_status_data_idx',
+        )
+        self.assertUsaIndice(ControleDeRecebimento.objects.filter(status='Atrasado'), 'controle_status_data_idx')
+
+    def test_parcelas_em_aberto_usam_indice_parcial(self):
+        self.assertUsaIndice(
+            ControleDeRecebimento.objects.exclude(status='Recebido').filter(
+                data_prevista_recebimento__lt=datetime.date(2024, 6, 1)
+            ),
+            'controle_aberto_data_idx',
+        )
+
+    def test_parcelas_seguintes_da_venda(self):
+        self.assertUsaIndice(
+            ControleDeRecebimento.objects.filter(venda_id=1, parcela__numero_parcela__gt=1)
+            .order_by('parcela__numero_parcela')
+        )
+        self.assertUsaIndice(
+            ControleDeRecebimento.objects.filter(venda_id__in=[1, 2]).select_related('parcela')
+            .order_by('venda_id', 'parcela__numero_parcela')
+        )
+
+    def test_tabela_de_parcelas_do_plano(self):
+        plano = Parcela.objects.filter(plano_id=1).order_by('numero_parcela').explain()
+        self.assertNotRegex(plano, r'\bSCAN\b|TEMP B-TREE', plano)
+
+    def test_conciliacao_por_numero_proposta(self):
+        self.assertUsaIndice(
+            ControleDeRecebimento.objects.filter(venda__numero_proposta__in=['P-1', 'P-2'])
+            .select_related('venda', 'parcela')
+        )
+
+
+class InstrumentacaoTests(DadosBaseMixin, TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='senha', is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        self.plano = criar_plano(3)
+        limpar_estatisticas()
+
+    def metricas(self, server_timing):
+        return {parte.split(';')[0]: parte for parte in server_timing.split(', ')}
+
+    def test_server_timing_e_log_estruturado(self):
+        dados = {
+            'numero_proposta': 'I-1', 'cliente_id': self.cliente.pk, 'plano_id': self.plano.pk,
+            'consultor_id': self.consultor.pk, 'valor_plano': '1000.00', 'desconto_consultor': '0.00',
+            'data_venda': '2024-01-05', 'data_vigencia': '2024-01-10', 'data_vencimento': '2024-01-20',
+        }
+        with self.assertLogs('core.instrumentacao', 'INFO') as logs, CaptureQueriesContext(connection) as contexto:
+            resposta = self.client.post('/api/venda/', dados, format='json')
+        self.assertEqual(resposta.status_code, 201)
+
+        metricas = self.metricas(resposta['Server-Timing'])
+        self.assertIn('total', metricas)
+        self.assertIn(f'desc="{len(contexto.captured_queries)} consultas"', metricas['db'])
+        self.assertIn('venda-save', metricas)
+
+        registro = json.loads(logs.records[-1].getMessage())
+        self.assertEqual(registro['rota'], 'POST /api/venda/')
+        self.assertEqual(registro['status'], 201)
+        self.assertEqual(registro['consultas'], len(contexto.captured_queries))
+        self.assertIn('venda-save', registro['trechos'])
+
+    @override_settings(LIMITE_CONSULTA_LENTA_MS=0)
+    def test_consulta_lenta_registrada_com_origem(self):
+        with self.assertLogs('core.instrumentacao', 'WARNING') as logs:
+            self.client.get('/api/relatorios/vendas/')
+        lentas = [json.loads(registro.getMessage()) for registro in logs.records if 'consulta_lenta' in registro.getMessage()]
+        self.assertTrue(lentas)
+        self.assertTrue(any('core/relatorios.py' in quadro for lenta in lentas for quadro in lenta['origem']))
+
+    def test_estatisticas_por_rota(self):
+        venda = self.criar_venda(self.plano)
+        for _ in range(3):
+            self.client.get('/api/venda/')
+        self.client.get(f'/api/venda/{venda.pk}/')
+
+        rotas = {linha['rota']: linha for linha in self.client.get('/api/metricas/rotas/').json()['rotas']}
+        listagem = rotas['GET /api/venda/']
+        self.assertEqual(listagem['amostras'], 3)
+        self.assertLessEqual(listagem['p50_ms'], listagem['p95_ms'])
+        self.assertGreaterEqual(listagem['consultas_max'], 1)
+        self.assertIn('GET /api/venda/(?P<pk>[^/.]+)/', rotas)
+
+        outro = APIClient()
+        outro.force_authenticate(User.objects.create_user(username='comum', password='senha'))
+        self.assertEqual(outro.get('/api/metricas/rotas/').status_code, 403)
+
+    def test_cadeia_de_middlewares_continua_assincrona_sob_asgi(self):
+        # Com DEBUG o Django registra em django.request cada middleware adaptado entre síncrono e assíncrono
+        with override_settings(DEBUG=True), self.assertNoLogs('django.request', 'DEBUG'):
+            handler = ASGIHandler()
+        middleware = handler._middleware_chain.__wrapped__
+        self.assertIsInstance(middleware, InstrumentacaoMiddleware)
+        self.assertTrue(iscoroutinefunction(middleware))
+        self.assertTrue(iscoroutinefunction(middleware.get_response))
+
+        token = RefreshToken.for_user(self.admin).access_token
+        self.criar_venda(self.plano)
+        resposta = async_to_sync(AsyncClient().get)(
+            '/api/async/relatorios/vendas/', headers={'Authorization': f'Bearer {token}'}
+        )
+        self.assertEqual(resposta.status_code, 200)
+        consultas = int(re.search(r'desc="(\d+) consultas"', self.metricas(resposta['Server-Timing'])['db']).group(1))
+        self.assertGreater(consultas, 0)
+
+
+class ListagensCondicionaisTests(DadosBaseMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='etag', password='senha'))
+        self.plano = criar_plano(3)
+        with self.gravacao():
+            self.venda = self.criar_venda(self.plano)
+
+    @contextmanager
+    def gravacao(self):
+        # Transação própria, com os callbacks de commit executados como fora dos testes
+        with self.captureOnCommitCallbacks(execute=True), transaction.atomic():
+            yield
+
+    def test_requisicao_condicional_sem_alteracoes_retorna_304_sem_consultar_a_listagem(self):
+        for url in ('/api/venda/', '/api/controlederecebimento/?page_size=2', '/api/parcelas-atrasadas/'):
+            with self.subTest(url=url):
+                primeira = self.client.get(url)
+                self.assertEqual(primeira.status_code, 200)
+                self.assertIn('Last-Modified', primeira)
+
+                with CaptureQueriesContext(connection) as contexto:
+                    resposta = self.client.get(url, HTTP_IF_NONE_MATCH=primeira['ETag'])
+                self.assertEqual(resposta.status_code, 304)
+                self.assertEqual(len(contexto.captured_queries), 1)
+
+                resposta = self.client.get(url, HTTP_IF_MODIFIED_SINCE=primeira['Last-Modified'])
+                self.assertEqual(resposta.status_code, 304)
+
+                # Sem validadores, a página volta do cache de respostas
+                with CaptureQueriesContext(connection) as contexto:
+                    repetida = self.client.get(url)
+                self.assertEqual(len(contexto.captured_queries), 1)
+                self.assertEqual(repetida.json(), primeira.json())
+
+    def test_gravacao_troca_a_versao(self):
+        primeira = self.client.get('/api/controlederecebimento/')
+        etag_atrasadas = self.client.get('/api/parcelas-atrasadas/')['ETag']
+        parcela = self.venda.controlederecebimento_set.get(parcela__numero_parcela=1)
+        with self.gravacao():
+            self.client.post(f'/api/parcelas/{parcela.pk}/marcar-recebida/')
+
+        resposta = self.client.get('/api/controlederecebimento/', HTTP_IF_NONE_MATCH=primeira['ETag'])
+        self.assertEqual(resposta.status_code, 200)
+        self.assertNotEqual(resposta['ETag'], primeira['ETag'])
+        self.assertIn('Recebido', {item['status'] for item in resposta.json()['results']})
+        self.assertEqual(
+            self.client.get('/api/parcelas-atrasadas/', HTTP_IF_NONE_MATCH=etag_atrasadas).status_code, 200
+        )
+
+    def test_atualizacao_em_massa_troca_a_versao(self):
+        etag = self.client.get('/api/controlederecebimento/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            varrer_parcelas_atrasadas(hoje=datetime.date(2024, 3, 1))
+        self.assertEqual(self.client.get('/api/controlederecebimento/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_sem_versao_registrada_nao_usa_cache(self):
+        VersaoDados.objects.all().delete()
+        resposta = self.client.get('/api/venda/')
+        self.assertEqual(resposta.status_code, 200)
+        self.assertNotIn('ETag', resposta)
+
+
+class ParcelasAtrasadasTests(DadosBaseMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='atrasos', password='senha'))
+        self.venda = self.criar_venda(criar_plano(3))
+
+    def test_listagem_nao_grava_e_e_paginada(self):
+        with CaptureQueriesContext(connection) as contexto:
+            resposta = self.client.get('/api/parcelas-atrasadas/?page_size=2')
+
+        self.assertFalse([q for q in contexto.captured_queries if q['sql'].startswith('UPDATE')])
+        dados = resposta.json()
+        self.assertEqual(len(dados['results']), 2)
+        self.assertEqual({item['status'] for item in dados['results']}, {'Atrasado'})
+        self.assertIsNotNone(dados['next'])
+        self.assertEqual(ControleDeRecebimento.objects.filter(status='Atrasado').count(), 0)
+
+    def test_varredura(self):
+        atrasadas, reabertas = varrer_parcelas_atrasadas(hoje=datetime.date(2024, 3, 1))
+        self.assertEqual((atrasadas, reabertas), (1, 0))
+
+        # Parcela vencida antes da última varredura também entra na seguinte
+        ControleDeRecebimento.objects.filter(parcela__numero_parcela=1).update(status='Não Recebido')
+        self.assertEqual(varrer_parcelas_atrasadas(hoje=datetime.date(2024, 3, 15)), (2, 0))
+        self.assertEqual(varrer_parcelas_atrasadas(hoje=datetime.date(2024, 3, 15), completo=True), (0, 0))
+        self.assertEqual(ExecucaoRotina.objects.get(nome=ROTINA_VARREDURA).ultima_data, datetime.date(2024, 3, 15))
+
+        # Parcelas reprogramadas para depois de hoje voltam a ficar em aberto
+        ControleDeRecebimento.objects.filter(parcela__numero_parcela=2).update(
+            data_prevista_recebimento=datetime.date(2024, 4, 1)
+        )
+        self.assertEqual(varrer_parcelas_atrasadas(hoje=datetime.date(2024, 3, 20)), (0, 1))
+
+    def test_venda_retroativa_gravada_depois_da_varredura(self):
+        varrer_parcelas_atrasadas(hoje=datetime.date(2024, 3, 1))
+
+        venda = self.criar_venda(
+            criar_plano(2, operadora='Outra'), numero_proposta='P-RETRO', data_venda=datetime.date(2023, 6, 5),
+            data_vigencia=datetime.date(2023, 6, 10), data_vencimento=datetime.date(2023, 6, 20),
+        )
+        self.assertEqual(varrer_parcelas_atrasadas(hoje=datetime.date(2024, 3, 2)), (2, 0))
+        self.assertEqual(set(venda.controlederecebimento_set.values_list('status', flat=True)), {'Atrasado'})
+
+
+class RelatoriosTests(DadosBaseMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='relatorios', password='senha'))
+        self.plano_fixo = criar_plano(2)
+        self.plano_percentual = criar_plano(2, operadora='Outra', tipo='PF')
+        Plano.objects.filter(pk=self.plano_percentual.pk).update(taxa_plano_tipo='Porcentagem', taxa_plano_valor=Decimal('12.50'))
+        self.plano_percentual.refresh_from_db()
+        self.venda_fixo = self.criar_venda(self.plano_fixo, numero_proposta='R-1', desconto_consultor=Decimal('100.00'))
+        self.venda_percentual = self.criar_venda(self.plano_percentual, numero_proposta='R-2')
+        ControleDeRecebimento.objects.filter(venda=self.venda_fixo, parcela__numero_parcela=1).update(status='Recebido')
+        # update() não passa pelos sinais: o resumo mensal é reconstruído
+        reconstruir_resumos()
+
+    def test_valor_liquido_no_banco_igual_ao_python(self):
+        for venda in Venda.objects.com_valor_liquido().select_related('plano'):
+            self.assertEqual(venda.valor_liquido_calculado, venda.valor_liquido())
+
+    def test_comissoes_por_consultor_e_mes(self):
+        with CaptureQueriesContext(connection) as contexto:
+            resposta = self.client.get('/api/relatorios/comissoes/?agrupar=consultor,mes')
+        self.assertEqual(len(contexto.captured_queries), 1)
+
+        self.assertEqual(resposta.json()['fonte'], 'resumo')
+        resultados = resposta.json()['resultados']
+        self.assertEqual(resultados, self.client.get('/api/relatorios/comissoes/?agrupar=consultor,mes&fonte=bruto').json()['resultados'])
+        self.assertEqual([linha['mes'] for linha in resultados], ['2024-02-01', '2024-03-01'])
+        fevereiro = resultados[0]
+        self.assertEqual(fevereiro['consultor_nome'], 'Consultor')
+        self.assertEqual(fevereiro['esperado'], '1765.00')
+        self.assertEqual(fevereiro['recebido'], '890.00')
+        self.assertEqual(fevereiro['atrasado'], '875.00')
+        self.assertEqual((fevereiro['parcelas'], fevereiro['parcelas_recebidas']), (2, 1))
+
+    def test_total_geral_e_filtros(self):
+        resposta = self.client.get(f'/api/relatorios/comissoes/?plano={self.plano_percentual.pk}')
+        self.assertEqual(resposta.json()['fonte'], 'bruto')
+        self.assertEqual(resposta.json()['resultados'], [{
+            'esperado': '925.00', 'recebido': '0.00', 'atrasado': '925.00',
+            'parcelas': 2, 'parcelas_recebidas': 0, 'parcelas_atrasadas': 2,
+        }])
+
+    def test_vendas_por_operadora(self):
+        resposta = self.client.get('/api/relatorios/vendas/?agrupar=operadora')
+        self.assertEqual(resposta.json()['resultados'], [
+            {'operadora': 'Operadora', 'vendas': 1, 'total_valor_plano': '1000.00', 'total_valor_liquido': '890.00'},
+            {'operadora': 'Outra', 'vendas': 1, 'total_valor_plano': '1000.00', 'total_valor_liquido': '875.00'},
+        ])
+
+    def test_agrupamento_invalido(self):
+        self.assertEqual(self.client.get('/api/relatorios/vendas/?agrupar=cliente').status_code, 400)
+
+
+class LeiturasAssincronasTests(DadosBaseMixin, TestCase):
+    def setUp(self):
+        usuario = User.objects.create_user(username='assincrono', password='senha')
+        self.api = APIClient()
+        self.api.force_authenticate(usuario)
+        self.client = Client(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(usuario).access_token}')
+        self.venda = self.criar_venda(criar_plano(5))
+        self.criar_venda(criar_plano(3, operadora='Outra'), numero_proposta='P-2')
+
+    def test_exige_token(self):
+        self.assertEqual(Client().get('/api/async/parcelas-atrasadas/').status_code, 401)
+        self.assertEqual(Client(HTTP_AUTHORIZATION='Bearer invalido').get('/api/async/relatorios/vendas/').status_code, 401)
+        self.assertEqual(self.client.post('/api/async/relatorios/vendas/').status_code, 405)
+
+    def test_parcelas_atrasadas_paginadas_iguais_a_versao_sincrona(self):
+        esperadas = self.api.get('/api/parcelas-atrasadas/?page_size=500').json()['results']
+        recebidas = []
+        url = '/api/async/parcelas-atrasadas/?page_size=3'
+        while url:
+            dados = self.client.get(url).json()
+            self.assertLessEqual(len(dados['results']), 3)
+            recebidas.extend(dados['results'])
+            url = dados['next']
+        self.assertEqual(len(recebidas), 8)
+        self.assertEqual(recebidas, esperadas)
+
+        filtradas = self.client.get(f'/api/async/parcelas-atrasadas/?venda={self.venda.pk}').json()['results']
+        self.assertEqual({item['venda'] for item in filtradas}, {self.venda.pk})
+        self.assertEqual(self.client.get('/api/async/parcelas-atrasadas/?cursor=x').status_code, 400)
+        self.assertEqual(self.client.get('/api/async/parcelas-atrasadas/?venda=abc').status_code, 400)
+
+    def test_relatorios_e_dashboard_iguais_aos_sincronos(self):
+        for caminho in (
+            'relatorios/comissoes/?agrupar=consultor,mes',
+            'relatorios/comissoes/?agrupar=tipo',
+            f'relatorios/comissoes/?venda={self.venda.pk}',
+            'relatorios/vendas/?agrupar=operadora',
+            'relatorios/vendas/',
+            'dashboard/comissoes/?operadora=Outra',
+        ):
+            with self.subTest(caminho=caminho):
+                resposta = self.client.get(f'/api/async/{caminho}')
+                self.assertEqual(resposta.status_code, 200)
+                self.assertEqual(resposta.json(), self.api.get(f'/api/{caminho}').json())
+        self.assertEqual(self.client.get('/api/async/relatorios/vendas/?agrupar=cliente').status_code, 400)
+
+
+class AlteracoesTests(DadosBaseMixin, TestCase):
+    def setUp(self):
+        self.usuario = User.objects.create_user(username='stream', password='senha')
+        self.token = str(RefreshToken.for_user(self.usuario).access_token)
+        self.client = Client(HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        self.plano = criar_plano(3)
+
+    @contextmanager
+    def gravacao(self):
+        # Transação própria, com os callbacks de commit executados como fora dos testes
+        with self.captureOnCommitCallbacks(execute=True), transaction.atomic():
+            yield
+
+    def eventos(self, url='/api/async/alteracoes/', **cabecalhos):
+        resposta = self.client.get(url, headers=cabecalhos)
+        self.assertEqual(resposta.status_code, 200, resposta.content)
+        self.assertEqual(resposta['Content-Type'], 'text/event-stream')
+        eventos = []
+        for bloco in resposta.content.decode().split('\n\n'):
+            campos = dict(linha.split(': ', 1) for linha in bloco.splitlines() if ': ' in linha and not linha.startswith(':'))
+            if 'event' in campos:
+                eventos.append((campos['event'], int(campos['id']), json.loads(campos['data'])))
+        return eventos
+
+    def feed(self, desde=0):
+        return list(Alteracao.objects.filter(id__gt=desde).order_by('id').values_list('tipo', 'objeto_id', 'removido'))
+
+    def test_gravacoes_recebimentos_e_remocoes_entram_no_feed(self):
+        with self.gravacao():
+            venda = self.criar_venda(self.plano)
+        controles = list(venda.controlederecebimento_set.order_by('parcela__numero_parcela').values_list('pk', flat=True))
+        self.assertEqual(set(self.feed()), {('venda', venda.pk, False), *(('controle', pk, False) for pk in controles)})
+
+        cursor = ultimo_cursor()
+        with self.gravacao():
+            # Receber a primeira parcela fora da data reprograma as seguintes
+            primeira = ControleDeRecebimento.objects.get(pk=controles[0])
+            primeira.status = 'Recebido'
+            primeira.data_recebimento = primeira.data_prevista_recebimento + datetime.timedelta(days=5)
+            primeira.save()
+        self.assertEqual({objeto_id for _, objeto_id, _ in self.feed(cursor)}, set(controles))
+
+        cursor = ultimo_cursor()
+        segunda = ControleDeRecebimento.objects.get(pk=controles[1])
+        with self.gravacao():
+            list(conciliar_extrato([{
+                'numero_proposta': 'P-1', 'numero_parcela': '2', 'valor_parcela': str(segunda.valor_parcela),
+                'data_recebimento': '2024-03-15', 'numero_extrato': 'E-1',
+            }]))
+        self.assertIn(('controle', controles[1], False), self.feed(cursor))
+
+        cursor = ultimo_cursor()
+        venda_id = venda.pk
+        with self.gravacao():
+            venda.delete()
+        self.assertEqual(set(self.feed(cursor)), {('venda', venda_id, True), *(('controle', pk, True) for pk in controles)})
+
+    def test_stream_entrega_o_estado_atual_desde_o_cursor(self):
+        self.assertEqual(Client().get('/api/async/alteracoes/').status_code, 401)
+        self.assertEqual(self.client.get('/api/async/alteracoes/?cursor=abc').status_code, 400)
+
+        with self.gravacao():
+            venda = self.criar_venda(self.plano)
+        # Primeira conexão: só o ponto de partida
+        [(nome, cursor, dados)] = self.eventos()
+        self.assertEqual((nome, dados), ('cursor', {'cursor': ultimo_cursor()}))
+        self.assertEqual(self.eventos(f'/api/async/alteracoes/?cursor={cursor}'), [])
+
+        controle = venda.controlederecebimento_set.get(parcela__numero_parcela=3)
+        with self.gravacao():
+            controle.numero_extrato = 'E-9'
+            controle.save()
+            controle.numero_extrato = 'E-10'
+            controle.save()
+        # Sem cabeçalho, com o token na URL, como o EventSource do navegador
+        resposta = Client().get(f'/api/async/alteracoes/?cursor={cursor}&token={self.token}')
+        self.assertEqual(resposta.status_code, 200)
+        [(nome, novo_cursor, dados)] = self.eventos(f'/api/async/alteracoes/?cursor={cursor}')
+        self.assertEqual((nome, novo_cursor, dados['cursor']), ('alteracoes', ultimo_cursor(), ultimo_cursor()))
+        # Duas gravações do mesmo registro chegam como uma, na representação da listagem
+        listagem = APIClient()
+        listagem.force_authenticate(self.usuario)
+        esperado = next(
+            item for item in listagem.get(f'/api/controlederecebimento/?venda={venda.pk}').json()['results']
+            if item['id'] == controle.pk
+        )
+        self.assertEqual(dados['alteracoes'], [{'tipo': 'controle', 'id': controle.pk, 'removido': False, 'dados': esperado}])
+
+        with self.gravacao():
+            venda.delete()
+        # Last-Event-ID, enviado pelo EventSource ao reconectar, prevalece sobre ?cursor=
+        [(_, _, dados)] = self.eventos('/api/async/alteracoes/?cursor=0', last_event_id=str(novo_cursor))
+        self.assertEqual(len(dados['alteracoes']), 4)
+        self.assertTrue(all(item['removido'] and item['dados'] is None for item in dados['alteracoes']))
+
+    def test_lacuna_recente_segura_a_entrega_e_cursor_podado_pede_recarga(self):
+        with self.gravacao():
+            self.criar_venda(self.plano)
+        ids = list(Alteracao.objects.order_by('id').values_list('id', flat=True))
+        # Alteração de um commit ainda não visível: a entrega para antes da lacuna
+        Alteracao.objects.filter(pk=ids[2]).delete()
+        [(_, cursor, _)] = self.eventos(f'/api/async/alteracoes/?cursor={ids[0]}')
+        self.assertEqual(cursor, ids[1])
+        with override_settings(ALTERACOES_ESPERA_LACUNA=0):
+            [(_, cursor, _)] = self.eventos(f'/api/async/alteracoes/?cursor={ids[0]}')
+        self.assertEqual(cursor, ids[-1])
+
+        Alteracao.objects.filter(pk__lte=ids[1]).update(
+            criado_em=datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=30),
+        )
+        call_command('podar_alteracoes', '--dias', '7', stdout=io.StringIO())
+        self.assertEqual(Alteracao.objects.filter(pk__lte=ids[1]).count(), 0)
+        [(nome, cursor, dados)] = self.eventos(f'/api/async/alteracoes/?cursor={ids[0] - 1}')
+        self.assertEqual((nome, cursor, dados), ('reiniciar', ids[-1], {'cursor': ids[-1]}))
+        self.assertEqual(self.eventos(f'/api/async/alteracoes/?cursor={ids[-1]}'), [])
+
+
+class AlteracoesConexaoTests(TransactionTestCase):
+    @override_settings(ALTERACOES_INTERVALO=0.01, ALTERACOES_DURACAO_MAXIMA=0.05)
+    def test_stream_continuo_nao_prende_a_conexao(self):
+        async def consumir():
+            return [parte async for parte in _eventos_alteracoes(0, continuo=True)]
+
+        # As consultas do stream rodam nesta thread, como na thread da requisição sob ASGI
+        with patch.object(connection, 'close', wraps=connection.close) as fechar:
+            async_to_sync(consumir)()
+        self.assertGreater(fechar.call_count, 0)
+
+
+class RoteamentoLeituraTests(DadosBaseMixin, TransactionTestCase):
+    """Com dados confirmados, para que a conexão 'leitura' enxergue o que o principal gravou."""
+
+    def setUp(self):
+        # Alias 'leitura' no mesmo banco de teste, como o TEST MIRROR das configurações. Criado
+        # depois da preparação do banco de teste, ele não está em `databases`: conectar direto
+        # evita a checagem de conexões não declaradas do TransactionTestCase
+        connections.settings[ALIAS_LEITURA] = {**connection.settings_dict, 'TEST': {'MIRROR': 'default'}}
+        connections[ALIAS_LEITURA].connect()
+        self.addCleanup(self.remover_replica)
+        self.cliente = Cliente.objects.create(nome='Cliente Réplica')
+        self.consultor = Consultor.objects.create(nome='Consultor')
+        self.usuario = User.objects.create_user(username='replica', password='senha')
+        self.api = APIClient()
+        self.api.force_authenticate(self.usuario)
+        self.plano = criar_plano(3)
+        self.venda = self.criar_venda(self.plano)
+
+    def remover_replica(self):
+        connections[ALIAS_LEITURA].close()
+        del connections[ALIAS_LEITURA]
+        del connections.settings[ALIAS_LEITURA]
+
+    @contextmanager
+    def replica(self):
+        with CaptureQueriesContext(connections[ALIAS_LEITURA]) as leitura, CaptureQueriesContext(connection) as principal:
+            yield leitura, principal
+
+    def test_atrasadas_relatorios_exportacoes_e_busca_leem_da_replica(self):
+        for url in (
+            '/api/parcelas-atrasadas/',
+            '/api/relatorios/comissoes/?fonte=bruto&agrupar=consultor',
+            '/api/relatorios/vendas/?agrupar=operadora',
+            '/api/dashboard/comissoes/',
+            '/api/projecoes/comissoes/',
+            '/api/busca/?q=replica',
+            '/api/controlederecebimento/exportar/',
+        ):
+            with self.subTest(url=url), self.replica() as (leitura, principal):
+                resposta = self.api.get(url)
+                self.assertEqual(resposta.status_code, 200)
+                # A exportação em streaming é lida depois que a view retorna
+                if resposta.streaming:
+                    self.assertEqual(len(b''.join(resposta.streaming_content).splitlines()), 4)
+                self.assertGreater(len(leitura), 0)
+                self.assertEqual(len(principal), 0, [consulta['sql'] for consulta in principal.captured_queries])
+        self.assertEqual(self.api.get('/api/busca/?q=replica').json()['resultados'][0]['titulo'], 'Cliente Réplica')
+
+        cliente = Client(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.usuario).access_token}')
+        with self.replica() as (leitura, principal):
+            self.assertEqual(cliente.get('/api/async/relatorios/vendas/').json()['resultados'][0]['vendas'], 1)
+            self.assertGreater(len(leitura), 0)
+            # Só a leitura do usuário do token fica no principal
+            self.assertEqual(len(principal), 1)
+
+    def test_gravacoes_e_leituras_logo_apos_gravar_ficam_no_principal(self):
+        with self.replica() as (leitura, principal):
+            resposta = self.api.post('/api/venda/', {
+                'numero_proposta': 'P-2', 'cliente_id': self.cliente.pk, 'plano_id': self.plano.pk,
+                'consultor_id': self.consultor.pk, 'valor_plano': '500.00', 'desconto_consultor': '0.00',
+                'data_venda': '2024-02-05', 'data_vigencia': '2024-02-10', 'data_vencimento': '2024-02-20',
+            }, format='json')
+            self.assertEqual(resposta.status_code, 201)
+            # A resposta do save já traz o cronograma, lido no principal
+            self.assertEqual(len(resposta.json()['parcelas_recebimento']), 3)
+            self.assertEqual(len(self.api.get('/api/venda/').json()['results']), 2)
+            with na_replica():
+                # Dentro de uma transação do principal a leitura precisa ver o que ela gravou
+                with transaction.atomic():
+                    Venda.objects.filter(pk=self.venda.pk).update(valor_plano=Decimal('900.00'))
+                    self.assertEqual(Venda.objects.get(pk=self.venda.pk).valor_plano, Decimal('900.00'))
+                self.assertEqual(RoteadorLeitura().db_for_write(Venda), 'default')
+            self.assertEqual(len(leitura), 0)
+            self.assertGreater(len(principal), 0)
+        self.assertFalse(RoteadorLeitura().allow_migrate(ALIAS_LEITURA, 'core'))
+
+        # Sem o alias configurado tudo fica no banco padrão
+        with na_replica(), patch('core.roteamento.replica_configurada', return_value=False):
+            self.assertEqual(RoteadorLeitura().db_for_read(Venda), 'default')
+
+
+class ResumoComissaoMensalTests(DadosBaseMixin, TestCase):
+    def assertResumoConfere(self):
+        self.assertEqual(verificar_resumos(), [])
+
+    def test_manutencao_incremental(self):
+        plano = criar_plano(4)
+        venda = self.criar_venda(plano)
+        outra = self.criar_venda(criar_plano(3, operadora='Outra'), numero_proposta='P-2')
+        self.assertResumoConfere()
+        self.assertEqual(ResumoComissaoMensal.objects.filter(consultor=self.consultor).count(), 7)
+
+        # Recebimento com atraso reprograma as parcelas seguintes para outros meses
+        primeira = venda.controlederecebimento_set.get(parcela__numero_parcela=1)
+        primeira.status = 'Recebido'
+        primeira.data_recebimento = datetime.date(2024, 3, 25)
+        primeira.save()
+        self.assertResumoConfere()
+
+        venda.valor_plano = Decimal('2000.00')
+        venda.save()
+        self.assertResumoConfere()
+
+        novo_consultor = Consultor.objects.create(nome='Outro consultor')
+        venda.consultor = novo_consultor
+        venda.save()
+        self.assertResumoConfere()
+        self.assertTrue(ResumoComissaoMensal.objects.filter(consultor=novo_consultor).exists())
+
+        outra.controlederecebimento_set.get(parcela__numero_parcela=3).delete()
+        self.assertResumoConfere()
+
+        venda.delete()
+        self.assertResumoConfere()
+        self.assertFalse(ResumoComissaoMensal.objects.filter(consultor=novo_consultor).exists())
+
+    def test_operadora_renomeada_e_plano_removido(self):
+        plano = criar_plano(3)
+        self.criar_venda(plano)
+        self.criar_venda(criar_plano(2, operadora='Outra'), numero_proposta='P-2')
+
+        plano.operadora = 'Renomeada'
+        plano.save()
+        self.assertResumoConfere()
+        self.assertFalse(ResumoComissaoMensal.objects.filter(operadora='Operadora').exists())
+
+        plano.delete()
+        self.assertResumoConfere()
+        self.assertEqual(set(ResumoComissaoMensal.objects.values_list('operadora', flat=True)), {'Outra'})
+
+    def test_conciliacao_e_varredura_atualizam_resumo(self):
+        venda = self.criar_venda(criar_plano(3))
+        list(conciliar_extrato([{
+            'numero_proposta': venda.numero_proposta, 'numero_parcela': 1,
+            'valor_parcela': '890.00', 'data_recebimento': '2024-04-01',
+        }]))
+        self.assertResumoConfere()
+
+        varrer_parcelas_atrasadas(hoje=datetime.date(2024, 5, 15))
+        self.assertEqual(
+            verificar_resumos(hoje=datetime.date(2024, 5, 15)), [],
+        )
+
+    def test_comando_verifica_e_reconstroi(self):
+        self.criar_venda(criar_plano(2))
+        ResumoComissaoMensal.objects.update(esperado=Decimal('0.00'))
+
+        with self.assertRaises(CommandError):
+            call_command('reconstruir_resumos', '--verificar', stdout=io.StringIO(), stderr=io.StringIO())
+        call_command('reconstruir_resumos', stdout=io.StringIO())
+        call_command('reconstruir_resumos', '--verificar', stdout=io.StringIO())
+        self.assertResumoConfere()
+
+    def test_migracao_preenche_resumos_de_banco_existente(self):
+        migracao = import_module('core.migrations.0014_preencher_resumos')
+        self.criar_venda(criar_plano(3))
+        ResumoComissaoMensal.objects.all().delete()
+
+        migracao.preencher_resumos(apps_da_migracao('0014_preencher_resumos'), SimpleNamespace(connection=connection))
+        self.assertEqual(ResumoComissaoMensal.objects.count(), 3)
+        self.assertResumoConfere()
+
+    def test_dashboard_le_apenas_o_resumo(self):
+        cliente = APIClient()
+        cliente.force_authenticate(User.objects.create_user(username='dashboard', password='senha'))
+        self.criar_venda(criar_plano(3))
+
+        with CaptureQueriesContext(connection) as contexto:
+            dados = cliente.get('/api/dashboard/comissoes/').json()
+        tabelas = {q['sql'].split('FROM')[1].split()[0] for q in contexto.captured_queries if 'FROM' in q['sql']}
+        self.assertEqual(tabelas, {'"core_resumocomissaomensal"'})
+        self.assertEqual(dados['totais']['parcelas'], 3)
+        self.assertEqual(dados['totais']['esperado'], '1090.00')
+        self.assertEqual(len(dados['por_mes']), 3)
+        self.assertEqual(dados['por_consultor'][0]['consultor_nome'], 'Consultor')
+
+
+class DadosSinteticosTests(TestCase):
+    HOJE = datetime.date(2024, 6, 15)
+
+    def gerar(self, prefixo):
+        return gerar_dados(
+            vendas=40, consultores=3, clientes=10, operadoras=2, meses=6, semente=7,
+            prefixo=prefixo, hoje=self.HOJE, tamanho_lote=15,
+        )
+
+    def cronograma(self, prefixo):
+        return list(
+            ControleDeRecebimento.objects.filter(venda__numero_proposta__startswith=f'{prefixo}-')
+            .order_by('venda__numero_proposta', 'parcela__numero_parcela')
+            .values_list('valor_parcela', 'data_prevista_recebimento', 'data_recebimento', 'status')
+        )
+
+    def test_mesma_semente_gera_os_mesmos_dados(self):
+        quantidades = self.gerar('A')
+        self.assertEqual(self.gerar('B'), quantidades)
+        self.assertEqual(quantidades['vendas'], 40)
+        self.assertEqual(ControleDeRecebimento.objects.count(), quantidades['parcelas'] * 2)
+        self.assertEqual(self.cronograma('A'), self.cronograma('B'))
+        self.assertEqual(verificar_resumos(hoje=self.HOJE), [])
+        self.assertEqual(ExecucaoRotina.objects.get(nome=ROTINA_VARREDURA).ultima_data, self.HOJE)
+
+        with self.assertRaises(CommandError):
+            call_command('gerar_dados', '--prefixo', 'A', '--vendas', '1', stdout=io.StringIO())
+
+    def test_benchmark_mede_todos_os_cenarios_e_compara(self):
+        self.gerar('S')
+        saida = io.StringIO()
+        call_command('benchmark_caminhos', '--repeticoes', '2', '--aquecimento', '0', '--json', stdout=saida)
+        resultado = json.loads(saida.getvalue())
+
+        self.assertEqual(resultado['escala']['vendas'], 40)
+        self.assertEqual(Venda.objects.count(), 40)
+        self.assertEqual(set(resultado['cenarios']), set(benchmark_caminhos.CENARIOS))
+        for nome, medido in resultado['cenarios'].items():
+            self.assertEqual(medido['erros'], 0, nome)
+            self.assertGreater(medido['consultas'], 0, nome)
+
+        base = json.loads(json.dumps(resultado))
+        base['cenarios']['criar_venda']['consultas'] -= 1
+        comparacoes = {item['cenario']: item for item in benchmark_caminhos.comparar(base, resultado, tolerancia=100)}
+        self.assertTrue(comparacoes['criar_venda']['regressao'])
+        self.assertFalse(comparacoes['listar_vendas']['regressao'])
@@ -1,5 +1,5 @@
 from rest_framework import viewsets, generics, status
-from .models import Cliente, Plano, Parcela, Consultor, Venda, ControleDeRecebimento
+from .models import Cliente, Plano, Parcela, Consultor, Venda, ControleDeRecebimento, ResumoComissaoMensal, Tarefa
 from .serializers import (
     UserSerializer,
     ClienteSerializer,
@@ -7,65 +7,302 @@ from .serializers import (
     ParcelaSerializer,
     ConsultorSerializer,
     VendaSerializer,
+    VendaListSerializer,
     ControleDeRecebimentoSerializer,
+    ParcelaAtrasadaSerializer,
+    TarefaSerializer,
+    campos_solicitados,
 )
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from rest_framework.utils.urls import replace_query_param
 from django.utils import timezone
-from rest_framework.decorators import api_view
-from datetime import date
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.decorators import action, api_view
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.parsers import MultiPartParser
 from django.contrib.auth.models import User
+from django.core.files import File
+from django.db.models import Exists, OuterRef, ProtectedError, Value
+from django.http import FileResponse, StreamingHttpResponse
+from django.urls import reverse
+from decimal import Decimal, InvalidOperation
+import json
+from .arquivamento import arquivados
+from .atrasos import parcelas_atrasadas
+from .busca import buscar
+from .cache_respostas import ListagemEmCacheMixin
+from .listagem_rapida import ListagemRapidaMixin
+from .filters import FiltroPorParametros, aplicar_filtros
+from .relatorios import (
+    DIMENSOES_COMISSOES,
+    DIMENSOES_VENDAS,
+    FILTROS_RESUMO,
+    ParametroInvalido,
+    ler_dimensoes,
+    relatorio_comissoes,
+    relatorio_comissoes_resumido,
+    relatorio_vendas,
+    usa_resumo,
+)
+from .conciliacao import ExtratoInvalido, conciliar_extrato, ler_csv, ler_json
+from .importacao import importar_vendas, ler_xlsx
+from .projecao import DIMENSOES_PROJECAO, projetar_comissoes
+from .reprecificacao import reprecificar_plano
+from .roteamento import LeituraNaReplicaMixin, banco_de_leitura, na_replica
+from .exportacao import COLUNAS_RECEBIMENTOS, COLUNAS_VENDAS, resposta_exportacao, validar_formato
+from .instrumentacao import estatisticas_por_rota, limpar_estatisticas
+from .tarefas import enfileirar
+import datetime
+import io
+import os
 
 class RegisterView(generics.CreateAPIView):
     queryset = User.objects.all()
     serializer_class = UserSerializer
 
-class ClienteViewSet(viewsets.ModelViewSet):
+class RemocaoProtegidaMixin:
+    """Cadastros referenciados por vendas arquivadas (on_delete=PROTECT) respondem 400 à remoção."""
+
+    def perform_destroy(self, instance):
+        try:
+            instance.delete()
+        except ProtectedError:
+            raise ValidationError({'detail': 'Registro usado por vendas arquivadas; não pode ser removido.'})
+
+class ClienteViewSet(RemocaoProtegidaMixin, viewsets.ModelViewSet):
     queryset = Cliente.objects.all()
     serializer_class = ClienteSerializer
     permission_classes = [IsAuthenticated]
+    filtros = {'nome': 'nome__icontains'}
+    ordering_fields = ['id', 'nome']
 
-class PlanoViewSet(viewsets.ModelViewSet):
+class PlanoViewSet(RemocaoProtegidaMixin, viewsets.ModelViewSet):
     queryset = Plano.objects.all()
     serializer_class = PlanoSerializer
     permission_classes = [IsAuthenticated]
+    filtros = {'operadora': 'operadora', 'tipo': 'tipo', 'busca': 'operadora__icontains'}
+    ordering_fields = ['id', 'operadora']
+    # Diferenças devolvidas na resposta síncrona; a lista completa sai no arquivo da tarefa
+    amostra_diferencas = 100
+
+    @action(detail=True, methods=['post'], permission_classes=[IsAdminUser])
+    def reprecificar(self, request, pk=None):
+        """
+        Aplica novas porcentagens de parcela e/ou nova taxa às parcelas em aberto de todas as vendas do plano.
+
+        Corpo: {"porcentagens": {"1": "90.00"}, "taxa_plano_tipo": ..., "taxa_plano_valor": ...},
+        todos opcionais. Com ?simular=1 nada é gravado e a resposta traz as
+        diferenças que seriam aplicadas. Com ?assincrono=1 vira uma tarefa, e a
+        lista completa de diferenças fica no arquivo dela.
+        """
+        plano = self.get_object()
+        porcentagens = request.data.get('porcentagens') or {}
+        if not isinstance(porcentagens, dict):
+            return Response({'detail': 'porcentagens deve mapear o número da parcela à nova porcentagem.'}, status=status.HTTP_400_BAD_REQUEST)
+        parametros = {
+            'plano_id': plano.pk,
+            'porcentagens': {str(numero): str(valor) for numero, valor in porcentagens.items()},
+            'taxa_plano_tipo': request.data.get('taxa_plano_tipo'),
+            'taxa_plano_valor': None if request.data.get('taxa_plano_valor') is None else str(request.data['taxa_plano_valor']),
+            'simular': request.query_params.get('simular', '').lower() in ('1', 'true', 'sim'),
+        }
+        try:
+            # As condições são validadas já na chamada, antes de qualquer gravação
+            relatorio = reprecificar_plano(**parametros)
+        except ValueError as exc:
+            return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        if em_segundo_plano(request):
+            relatorio.close()
+            return resposta_tarefa(request, enfileirar('reprecificar_plano', parametros, usuario=request.user))
 
-class ParcelaViewSet(viewsets.ModelViewSet):
+        diferencas = []
+        resumo = None
+        for item in relatorio:
+            if 'resumo' in item:
+                resumo = item['resumo']
+            elif 'controle' in item and len(diferencas) < self.amostra_diferencas:
+                diferencas.append(item)
+        return Response({'resumo': resumo, 'diferencas': diferencas})
+
+class ParcelaViewSet(RemocaoProtegidaMixin, viewsets.ModelViewSet):
     queryset = Parcela.objects.all()
     serializer_class = ParcelaSerializer
     permission_classes = [IsAuthenticated]
+    # ?plano=1,2,3 traz as parcelas de uma página de planos de uma vez
+    filtros = {'plano': 'plano_id__in'}
+    ordering_fields = ['id', 'numero_parcela']
 
-class ConsultorViewSet(viewsets.ModelViewSet):
+class ConsultorViewSet(RemocaoProtegidaMixin, viewsets.ModelViewSet):
     queryset = Consultor.objects.all()
     serializer_class = ConsultorSerializer
     permission_classes = [IsAuthenticated]
+    filtros = {'nome': 'nome__icontains'}
+    ordering_fields = ['id', 'nome']
+
+def em_segundo_plano(request):
+    """?assincrono=1 pede que a operação vire uma tarefa do processar_tarefas."""
+    return request.query_params.get('assincrono', '').lower() in ('1', 'true', 'sim')
+
+def resposta_tarefa(request, tarefa):
+    """202 com o status da tarefa enfileirada; Location aponta para o acompanhamento."""
+    resposta = Response(TarefaSerializer(tarefa, context={'request': request}).data, status=status.HTTP_202_ACCEPTED)
+    resposta['Location'] = request.build_absolute_uri(reverse('tarefa-detail', args=[tarefa.pk]))
+    return resposta
 
-class VendaViewSet(viewsets.ModelViewSet):
+def exportar_queryset(view, request, queryset, colunas, nome):
+    """
+    Exporta o queryset da view com os mesmos filtros e ordenação da listagem.
+
+    Com ?incluir_arquivo=1 as vendas arquivadas entram depois das em operação;
+    com ?assincrono=1 a exportação é gerada por uma tarefa em segundo plano.
+    """
+    formato = request.query_params.get('formato', 'csv')
+    # As linhas são lidas depois que a view retorna: a réplica fica fixada nos querysets
+    with na_replica():
+        banco = banco_de_leitura()
+    queryset = view.filter_queryset(queryset.order_by('id')).using(banco)
+    arquivo = arquivados(queryset.model, request.query_params, view.filtros)
+    if arquivo is not None:
+        arquivo = arquivo.order_by(*queryset.query.order_by).using(banco)
+    try:
+        if not em_segundo_plano(request):
+            return resposta_exportacao(queryset, colunas, nome, formato, arquivados=arquivo)
+        validar_formato(formato)
+    except ValueError as exc:
+        return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+    tarefa = enfileirar('exportar', {
+        'exportacao': nome,
+        'formato': formato,
+        'consulta': {
+            parametro: request.query_params[parametro]
+            for parametro in [*view.filtros, 'incluir_arquivo'] if parametro in request.query_params
+        },
+        'filtros': view.filtros,
+        # Ordenação já resolvida pelo OrderingFilter
+        'ordenacao': list(queryset.query.order_by),
+    }, usuario=request.user)
+    return resposta_tarefa(request, tarefa)
+
+class VendaViewSet(ListagemEmCacheMixin, ListagemRapidaMixin, viewsets.ModelViewSet):
     queryset = Venda.objects.all()
     serializer_class = VendaSerializer
     permission_classes = [IsAuthenticated]
+    filtros = {
+        'cliente': 'cliente_id',
+        'consultor': 'consultor_id',
+        'plano': 'plano_id',
+        'operadora': 'plano__operadora',
+        'numero_proposta': 'numero_proposta',
+        'busca': 'numero_proposta__icontains|cliente__nome__icontains',
+        'data_venda_inicio': 'data_venda__gte',
+        'data_venda_fim': 'data_venda__lte',
+    }
+    ordering_fields = ['id', 'data_venda', 'data_vigencia']
+    # ?situacao=: vendas com alguma parcela a receber ou com todas recebidas
+    situacoes = {'em_andamento': True, 'finalizada': False}
+    # Mesma representação do VendaListSerializer, lida direto do banco
+    campos_listagem = {
+        'id': 'id',
+        'numero_proposta': 'numero_proposta',
+        'cliente': {'id': 'cliente_id', 'nome': 'cliente__nome'},
+        'plano': {'id': 'plano_id', 'operadora': 'plano__operadora', 'tipo': 'plano__tipo'},
+        'consultor': {'id': 'consultor_id', 'nome': 'consultor__nome'},
+        'valor_plano': 'valor_plano',
+        'desconto_consultor': 'desconto_consultor',
+        'data_venda': 'data_venda',
+        'data_vigencia': 'data_vigencia',
+        'data_vencimento': 'data_vencimento',
+    }
+
+    def get_queryset(self):
+        queryset = Venda.objects.select_related('cliente', 'plano', 'consultor')
+        if self.action == 'list':
+            campos = campos_solicitados(self.request)
+            if not campos or 'parcelas_recebimento' not in campos:
+                return queryset
+        return queryset.prefetch_related('controlederecebimento_set')
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        situacao = self.request.query_params.get('situacao')
+        if not situacao:
+            return queryset
+        if situacao not in self.situacoes:
+            raise ValidationError({'detail': f'Situação inválida: {situacao}. Use {", ".join(self.situacoes)}.'})
+        em_aberto = Exists(ControleDeRecebimento.objects.filter(venda=OuterRef('pk')).exclude(status='Recebido'))
+        return queryset.filter(em_aberto if self.situacoes[situacao] else ~em_aberto)
+
+    def get_serializer_class(self):
+        # A listagem usa a representação compacta, salvo quando ?fields= escolhe os campos
+        if self.action == 'list' and not campos_solicitados(self.request):
+            return VendaListSerializer
+        return VendaSerializer
+
+    @action(detail=False, methods=['get'])
+    def exportar(self, request):
+        """Exporta as vendas filtradas em CSV (em streaming) ou XLSX (?formato=xlsx)."""
+        return exportar_queryset(self, request, Venda.objects.all(), COLUNAS_VENDAS, 'vendas')
 
-class ControleDeRecebimentoViewSet(viewsets.ModelViewSet):
+class ControleDeRecebimentoViewSet(ListagemEmCacheMixin, ListagemRapidaMixin, viewsets.ModelViewSet):
     queryset = ControleDeRecebimento.objects.all()
     serializer_class = ControleDeRecebimentoSerializer
     permission_classes = [IsAuthenticated]
+    filtros = {
+        'venda': 'venda_id',
+        'consultor': 'venda__consultor_id',
+        'plano': 'venda__plano_id',
+        'operadora': 'venda__plano__operadora',
+        'status': 'status__in',
+        'data_prevista_inicio': 'data_prevista_recebimento__gte',
+        'data_prevista_fim': 'data_prevista_recebimento__lte',
+    }
+    ordering_fields = ['id', 'data_prevista_recebimento', 'data_recebimento']
+    # Mesma representação do ControleDeRecebimentoSerializer, lida direto do banco
+    campos_listagem = {
+        'id': 'id',
+        'venda': 'venda_id',
+        'parcela': 'parcela_id',
+        'valor_parcela': 'valor_parcela',
+        'data_prevista_recebimento': 'data_prevista_recebimento',
+        'data_recebimento': 'data_recebimento',
+        'status': 'status',
+        'numero_extrato': 'numero_extrato',
+    }
 
-class ParcelasAtrasadasList(APIView):
+    @action(detail=False, methods=['get'])
+    def exportar(self, request):
+        """Exporta as parcelas filtradas em CSV (em streaming) ou XLSX (?formato=xlsx)."""
+        return exportar_queryset(self, request, ControleDeRecebimento.objects.all(), COLUNAS_RECEBIMENTOS, 'recebimentos')
+
+class ParcelasAtrasadasList(LeituraNaReplicaMixin, ListagemEmCacheMixin, ListagemRapidaMixin, generics.ListAPIView):
+    """
+    Lista somente leitura e paginada das parcelas atrasadas.
+
+    O atraso é derivado da data prevista; o status gravado é mantido pelo
+    comando varrer_parcelas_atrasadas, fora do caminho da requisição.
+    """
+    serializer_class = ParcelaAtrasadaSerializer
     permission_classes = [IsAuthenticated]
+    filtros = {
+        'venda': 'venda_id',
+        'consultor': 'venda__consultor_id',
+        'plano': 'venda__plano_id',
+        'operadora': 'venda__plano__operadora',
+    }
+    ordering_fields = ['id', 'data_prevista_recebimento']
+    ordering = ['data_prevista_recebimento', 'id']
+    campos_listagem = {**ControleDeRecebimentoViewSet.campos_listagem, 'status': Value('Atrasado')}
 
-    def get(self, request):
-        hoje = date.today()
-        # Atualizar status para 'Atrasado' se data prevista < hoje e status ainda for 'Não Recebido'
-        ControleDeRecebimento.objects.filter(
-            status='Não Recebido',
-            data_prevista_recebimento__lt=hoje
-        ).update(status='Atrasado')
-
-        # Obter parcelas com status 'Atrasado'
-        parcelas_atrasadas = ControleDeRecebimento.objects.filter(status='Atrasado')
-        serializer = ControleDeRecebimentoSerializer(parcelas_atrasadas, many=True)
-        return Response(serializer.data)
+    def get_queryset(self):
+        return parcelas_atrasadas()
+
+    def validadores(self, versao, atualizado_em):
+        # A lista muda na virada do dia mesmo sem gravações
+        hoje = datetime.date.today()
+        virada = timezone.make_aware(datetime.datetime.combine(hoje, datetime.time.min))
+        return f'{versao}.{hoje:%Y%m%d}', max(atualizado_em, virada)
 
 @api_view(['POST'])
 def marcar_parcela_recebida(request, pk):
@@ -77,4 +314,304 @@ def marcar_parcela_recebida(request, pk):
     parcela.status = 'Recebido'
     parcela.data_recebimento = timezone.now().date()
     parcela.save()
-    return Response(status=status.HTTP_200_OK)
\ No newline at end of file
+    return Response(status=status.HTTP_200_OK)
+
+def arquivo_enviado(request, arquivo):
+    """Arquivo enviado (multipart) ou corpo da requisição, copiado em blocos para a entrada da tarefa."""
+    return arquivo if request.content_type.startswith('multipart/') else File(arquivo, name='entrada')
+
+class ConciliacaoExtratoView(APIView):
+    """
+    Concilia em lote um extrato da operadora (CSV ou JSON).
+
+    O extrato pode ser enviado no campo multipart "arquivo" ou direto no corpo
+    da requisição. A resposta é um relatório JSON Lines gerado à medida que os
+    lotes são processados, terminando com um resumo. Com ?assincrono=1 o
+    extrato é conciliado por uma tarefa em segundo plano e a resposta é 202
+    com a tarefa; o relatório fica no arquivo dela.
+    """
+    permission_classes = [IsAuthenticated]
+    parser_classes = [MultiPartParser]
+
+    def post(self, request):
+        if request.content_type.startswith('multipart/'):
+            arquivo = request.FILES.get('arquivo')
+            nome = arquivo.name.lower() if arquivo else ''
+        else:
+            arquivo = request.stream
+            nome = ''
+        if arquivo is None:
+            return Response({'detail': 'Envie o extrato no campo "arquivo" ou no corpo da requisição.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        formato = request.query_params.get('formato')
+        if not formato:
+            formato = 'json' if 'json' in request.content_type or nome.endswith(('.json', '.jsonl', '.ndjson')) else 'csv'
+        if formato not in ('csv', 'json'):
+            return Response({'detail': 'Formato deve ser "csv" ou "json".'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            tolerancia = Decimal(request.query_params.get('tolerancia', '0.00'))
+        except InvalidOperation:
+            return Response({'detail': 'Tolerância inválida.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        if em_segundo_plano(request):
+            tarefa = enfileirar(
+                'conciliar_extrato', {'formato': formato, 'tolerancia': str(tolerancia)},
+                entrada=arquivo_enviado(request, arquivo), usuario=request.user,
+            )
+            return resposta_tarefa(request, tarefa)
+
+        linhas = ler_json(arquivo) if formato == 'json' else ler_csv(arquivo)
+        relatorio = conciliar_extrato(linhas, tolerancia=tolerancia)
+
+        def em_linhas():
+            try:
+                for item in relatorio:
+                    yield json.dumps(item, ensure_ascii=False) + '\n'
+            except ExtratoInvalido as exc:
+                # A resposta já começou: o erro vai como última linha, no lugar do resumo
+                yield json.dumps({'erro': str(exc)}, ensure_ascii=False) + '\n'
+
+        return StreamingHttpResponse(em_linhas(), content_type='application/x-ndjson')
+
+
+class ImportacaoVendasView(APIView):
+    """
+    Importa vendas em lote a partir de uma planilha CSV ou XLSX.
+
+    A planilha pode ser enviada no campo multipart "arquivo" ou direto no corpo
+    da requisição. Clientes inexistentes são criados; a resposta é um relatório
+    JSON Lines com os erros por linha e o progresso de cada lote, terminando
+    com um resumo. Com ?assincrono=1 a importação vira uma tarefa em segundo
+    plano, como na conciliação.
+    """
+    permission_classes = [IsAuthenticated]
+    parser_classes = [MultiPartParser]
+
+    def post(self, request):
+        if request.content_type.startswith('multipart/'):
+            arquivo = request.FILES.get('arquivo')
+            nome = arquivo.name.lower() if arquivo else ''
+        else:
+            arquivo = request.stream
+            nome = ''
+        if arquivo is None:
+            return Response({'detail': 'Envie a planilha no campo "arquivo" ou no corpo da requisição.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        formato = request.query_params.get('formato')
+        if not formato:
+            formato = 'xlsx' if 'spreadsheetml' in request.content_type or nome.endswith('.xlsx') else 'csv'
+        if formato not in ('csv', 'xlsx'):
+            return Response({'detail': 'Formato deve ser "csv" ou "xlsx".'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            tamanho_lote = int(request.query_params.get('tamanho_lote', 500))
+        except ValueError:
+            tamanho_lote = 0
+        if not 1 <= tamanho_lote <= 5000:
+            return Response({'detail': 'tamanho_lote deve estar entre 1 e 5000.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        if em_segundo_plano(request):
+            tarefa = enfileirar(
+                'importar_vendas', {'formato': formato, 'tamanho_lote': tamanho_lote},
+                entrada=arquivo_enviado(request, arquivo), usuario=request.user,
+            )
+            return resposta_tarefa(request, tarefa)
+
+        if formato == 'xlsx':
+            try:
+                # O XLSX é um zip: precisa de acesso aleatório ao arquivo
+                linhas = ler_xlsx(arquivo if nome else io.BytesIO(request.body))
+            except ValueError as exc:
+                return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        else:
+            linhas = ler_csv(arquivo)
+        relatorio = importar_vendas(linhas, tamanho_lote=tamanho_lote)
+        return StreamingHttpResponse(
+            (json.dumps(item, ensure_ascii=False) + '\n' for item in relatorio),
+            content_type='application/x-ndjson',
+        )
+
+
+class RelatorioComissoesView(LeituraNaReplicaMixin, APIView):
+    """
+    Totais de comissão esperados, recebidos e em atraso, agregados no banco.
+
+    ?agrupar= combina consultor, operadora, tipo e mes; os filtros seguem os
+    da listagem de parcelas. Quando agrupamento e filtros cabem no resumo
+    mensal a resposta é lida dele; ?fonte=bruto força a agregação das parcelas.
+    ?incluir_arquivo=1 soma também as parcelas arquivadas (sempre agregando as parcelas).
+    """
+    permission_classes = [IsAuthenticated]
+    filtros = ControleDeRecebimentoViewSet.filtros
+    filtros_resumo = FILTROS_RESUMO
+
+    def get(self, request):
+        try:
+            agrupar = ler_dimensoes(request.query_params.get('agrupar'), DIMENSOES_COMISSOES)
+        except ParametroInvalido as exc:
+            return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        if usa_resumo(request.query_params, agrupar, self.filtros):
+            queryset = aplicar_filtros(request.query_params, ResumoComissaoMensal.objects.all(), self.filtros_resumo)
+            resultados = relatorio_comissoes_resumido(queryset, agrupar)
+            fonte = 'resumo'
+        else:
+            queryset = FiltroPorParametros().filter_queryset(request, ControleDeRecebimento.objects.all(), self)
+            arquivo = arquivados(ControleDeRecebimento, request.query_params, self.filtros)
+            resultados = relatorio_comissoes(queryset, agrupar, arquivados=arquivo)
+            fonte = 'bruto'
+        return Response({'agrupar': agrupar, 'fonte': fonte, 'resultados': resultados})
+
+
+class DashboardComissoesView(LeituraNaReplicaMixin, APIView):
+    """
+    Totais do dashboard lidos do resumo mensal: geral, por mês e por consultor.
+
+    Aceita os filtros consultor e operadora.
+    """
+    permission_classes = [IsAuthenticated]
+    filtros = RelatorioComissoesView.filtros_resumo
+
+    def get(self, request):
+        queryset = FiltroPorParametros().filter_queryset(request, ResumoComissaoMensal.objects.all(), self)
+        return Response({
+            'totais': relatorio_comissoes_resumido(queryset)[0],
+            'por_mes': relatorio_comissoes_resumido(queryset, ['mes']),
+            'por_consultor': relatorio_comissoes_resumido(queryset, ['consultor']),
+        })
+
+
+class ProjecaoComissoesView(LeituraNaReplicaMixin, APIView):
+    """
+    Projeção ("e se") do fluxo mensal de comissões das vendas em aberto.
+
+    ?meses= define o horizonte (padrão 12), ?atraso_dias= simula atraso nos
+    recebimentos em aberto e ?agrupar= combina consultor e operadora. Os
+    filtros seguem os da listagem de vendas. Nada é gravado.
+    """
+    permission_classes = [IsAuthenticated]
+    filtros = VendaViewSet.filtros
+
+    def get(self, request):
+        try:
+            agrupar = ler_dimensoes(request.query_params.get('agrupar'), DIMENSOES_PROJECAO)
+            meses = int(request.query_params.get('meses', 12))
+            atraso_dias = int(request.query_params.get('atraso_dias', 0))
+        except ParametroInvalido as exc:
+            return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        except ValueError:
+            return Response({'detail': 'meses e atraso_dias devem ser números inteiros.'}, status=status.HTTP_400_BAD_REQUEST)
+        if not 1 <= meses <= 60 or not 0 <= atraso_dias <= 365:
+            return Response({'detail': 'Use meses entre 1 e 60 e atraso_dias entre 0 e 365.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        queryset = FiltroPorParametros().filter_queryset(request, Venda.objects.all(), self)
+        return Response({
+            'meses': meses,
+            'atraso_dias': atraso_dias,
+            'agrupar': agrupar,
+            'resultados': projetar_comissoes(queryset, meses=meses, atraso_dias=atraso_dias, agrupar=agrupar),
+        })
+
+
+class RelatorioVendasView(LeituraNaReplicaMixin, APIView):
+    """Quantidade de vendas e valores bruto e líquido, agregados no banco; ?incluir_arquivo=1 soma as arquivadas."""
+    permission_classes = [IsAuthenticated]
+    filtros = VendaViewSet.filtros
+
+    def get(self, request):
+        try:
+            agrupar = ler_dimensoes(request.query_params.get('agrupar'), DIMENSOES_VENDAS)
+        except ParametroInvalido as exc:
+            return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        queryset = FiltroPorParametros().filter_queryset(request, Venda.objects.all(), self)
+        arquivo = arquivados(Venda, request.query_params, self.filtros)
+        return Response({'agrupar': agrupar, 'resultados': relatorio_vendas(queryset, agrupar, arquivados=arquivo)})
+
+
+class BuscaView(LeituraNaReplicaMixin, APIView):
+    """
+    Busca por trechos de nome, telefone ou e-mail de clientes, nome de consultores e número de proposta.
+
+    ?q= é o texto buscado (todos os termos precisam aparecer) e ?tipo= restringe
+    a cliente, consultor e/ou venda. Os resultados vêm do mais ao menos
+    relevante, paginados com ?pagina= e ?page_size=.
+    """
+    permission_classes = [IsAuthenticated]
+    tamanho_pagina = 20
+    tamanho_maximo_pagina = 100
+
+    def get(self, request):
+        try:
+            pagina = int(request.query_params.get('pagina', 1))
+            tamanho = int(request.query_params.get('page_size', self.tamanho_pagina))
+        except ValueError:
+            pagina = tamanho = 0
+        if pagina < 1 or not 1 <= tamanho <= self.tamanho_maximo_pagina:
+            return Response(
+                {'detail': f'pagina deve ser positiva e page_size entre 1 e {self.tamanho_maximo_pagina}.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        tipos = [tipo.strip() for tipo in request.query_params.get('tipo', '').split(',') if tipo.strip()]
+        try:
+            # Um resultado a mais indica se há próxima página, sem contar o total
+            resultados = buscar(
+                request.query_params.get('q', ''), tipos, limite=tamanho + 1, deslocamento=(pagina - 1) * tamanho,
+            )
+        except ValueError as exc:
+            return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        proxima = None
+        if len(resultados) > tamanho:
+            resultados = resultados[:tamanho]
+            proxima = replace_query_param(request.build_absolute_uri(), 'pagina', pagina + 1)
+        return Response({'pagina': pagina, 'proxima': proxima, 'resultados': resultados})
+
+
+class MetricasRotasView(APIView):
+    """
+    Latência (p50/p95) e consultas por rota medidas pelo InstrumentacaoMiddleware.
+
+    As amostras são do processo que atende a requisição (cada worker guarda
+    as suas); DELETE descarta as amostras. Restrito a administradores.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response({'processo': os.getpid(), 'rotas': estatisticas_por_rota()})
+
+    def delete(self, request):
+        limpar_estatisticas()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class TarefaViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Acompanhamento das tarefas em segundo plano (status, progresso e resultado).
+
+    Cada usuário vê as tarefas que enfileirou; administradores veem todas. O
+    arquivo gerado (relatório ou exportação) é baixado em /arquivo/.
+    """
+    serializer_class = TarefaSerializer
+    permission_classes = [IsAuthenticated]
+    filtros = {'status': 'status__in', 'tipo': 'tipo'}
+
+    def get_queryset(self):
+        queryset = Tarefa.objects.all()
+        if not self.request.user.is_staff:
+            queryset = queryset.filter(usuario=self.request.user)
+        return queryset
+
+    @action(detail=True, methods=['get'])
+    def arquivo(self, request, pk=None):
+        tarefa = self.get_object()
+        if not tarefa.saida:
+            return Response({'detail': 'A tarefa não gerou arquivo.'}, status=status.HTTP_404_NOT_FOUND)
+        # Lido do storage em blocos, sem carregar o arquivo inteiro
+        return FileResponse(
+            tarefa.saida.open('rb'), as_attachment=True, filename=tarefa.saida_nome, content_type=tarefa.saida_tipo,
+        )
+
+
+class ReconstrucaoResumosView(APIView):
+    """Enfileira a reconstrução do resumo mensal de comissões (o mesmo que o comando reconstruir_resumos)."""
+    permission_classes = [IsAdminUser]
+
+    def post(self, request):
+        return resposta_tarefa(request, enfileirar('reconstruir_resumos', usuario=request.user))
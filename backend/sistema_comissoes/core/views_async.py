@@ -0,0 +1,317 @@
+"""
+Variantes assíncronas das leituras mais pesadas da API.
+
+São views Django assíncronas (o DRF não tem views assíncronas) que usam as
+APIs assíncronas do ORM. Sob ASGI rodam no event loop do worker sem ocupar
+uma thread por requisição; sob WSGI continuam funcionando, executadas pelo
+Django em um loop próprio. Autenticação, filtros e formato das respostas
+seguem as views síncronas equivalentes.
+"""
+import asyncio
+import base64
+import binascii
+import functools
+import json
+import time
+from datetime import date
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models import Q
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from rest_framework.exceptions import ValidationError
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from .alteracoes import CONTROLE, VENDA, aler_alteracoes, aultimo_cursor
+from .arquivamento import arquivados
+from .atrasos import parcelas_atrasadas
+from .filters import aplicar_filtros
+from .listagem_rapida import linhas_rapidas
+from .models import ControleDeRecebimento, ResumoComissaoMensal, Venda
+from .pagination import PaginacaoPorCursor
+from .relatorios import (
+    DIMENSOES_COMISSOES,
+    DIMENSOES_VENDAS,
+    FILTROS_RESUMO,
+    ParametroInvalido,
+    arelatorio_comissoes,
+    arelatorio_comissoes_resumido,
+    arelatorio_vendas,
+    ler_dimensoes,
+    usa_resumo,
+)
+from .roteamento import leitura_na_replica
+from .serializers import ParcelaAtrasadaSerializer
+from .views import ControleDeRecebimentoViewSet, ParcelasAtrasadasList, VendaViewSet
+
+
+async def autenticar(request, token_na_url=False):
+    """
+    Usuário ativo do token JWT do cabeçalho Authorization, ou None.
+
+    Com `token_na_url` aceita também ?token=, para clientes que não enviam
+    cabeçalhos (EventSource do navegador).
+    """
+    autenticacao = JWTAuthentication()
+    cabecalho = autenticacao.get_header(request)
+    token = autenticacao.get_raw_token(cabecalho) if cabecalho else None
+    if token is None and token_na_url and request.GET.get('token'):
+        token = request.GET['token'].encode()
+    if token is None:
+        return None
+    try:
+        validado = autenticacao.get_validated_token(token)
+        usuario = await get_user_model().objects.aget(
+            **{jwt_settings.USER_ID_FIELD: validado[jwt_settings.USER_ID_CLAIM]}
+        )
+    except (InvalidToken, KeyError, get_user_model().DoesNotExist):
+        return None
+    return usuario if usuario.is_active else None
+
+
+def leitura_assincrona(view=None, token_na_url=False):
+    """
+    Prepara uma view assíncrona somente leitura.
+
+    Aceita apenas GET e HEAD, exige o mesmo token JWT das views DRF (ou
+    ?token=, com `token_na_url`) e converte parâmetros inválidos em respostas 400.
+    """
+    if view is None:
+        return functools.partial(leitura_assincrona, token_na_url=token_na_url)
+
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return JsonResponse({'detail': f'Método "{request.method}" não permitido.'}, status=405)
+        usuario = await autenticar(request, token_na_url)
+        if usuario is None:
+            return JsonResponse({'detail': 'As credenciais de autenticação não foram fornecidas ou são inválidas.'}, status=401)
+        request.user = usuario
+        try:
+            return await view(request, *args, **kwargs)
+        except ParametroInvalido as exc:
+            return JsonResponse({'detail': str(exc)}, status=400)
+        except ValidationError as exc:
+            return JsonResponse(exc.detail, status=400, safe=False)
+    return wrapper
+
+
+def _ler_cursor(valor):
+    """Posição (data prevista, id) codificada no parâmetro ?cursor=."""
+    try:
+        data, pk = base64.urlsafe_b64decode(valor.encode()).decode().split('|')
+        return date.fromisoformat(data), int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ParametroInvalido('Cursor inválido.')
+
+
+def _gerar_cursor(parcela):
+    texto = f'{parcela.data_prevista_recebimento.isoformat()}|{parcela.pk}'
+    return base64.urlsafe_b64encode(texto.encode()).decode()
+
+
+def _tamanho_pagina(parametros):
+    try:
+        tamanho = int(parametros.get(PaginacaoPorCursor.page_size_query_param) or PaginacaoPorCursor.page_size)
+    except ValueError:
+        raise ParametroInvalido('page_size deve ser um número inteiro.')
+    return max(1, min(tamanho, PaginacaoPorCursor.max_page_size))
+
+
+@leitura_assincrona
+@leitura_na_replica
+async def parcelas_atrasadas_async(request):
+    """
+    Parcelas atrasadas, como /api/parcelas-atrasadas/.
+
+    A paginação é por cursor na ordenação fixa (data prevista, id), somente
+    para frente: `next` traz o cursor da página seguinte.
+    """
+    queryset = aplicar_filtros(request.GET, parcelas_atrasadas(), ParcelasAtrasadasList.filtros)
+    if request.GET.get('cursor'):
+        data, pk = _ler_cursor(request.GET['cursor'])
+        queryset = queryset.filter(
+            Q(data_prevista_recebimento__gt=data) | Q(data_prevista_recebimento=data, pk__gt=pk)
+        )
+    tamanho = _tamanho_pagina(request.GET)
+    parcelas = [parcela async for parcela in queryset.order_by('data_prevista_recebimento', 'id')[:tamanho + 1]]
+
+    proxima = None
+    if len(parcelas) > tamanho:
+        parcelas = parcelas[:tamanho]
+        parametros = request.GET.copy()
+        parametros['cursor'] = _gerar_cursor(parcelas[-1])
+        proxima = request.build_absolute_uri(f'{request.path}?{parametros.urlencode()}')
+    return JsonResponse({
+        'next': proxima,
+        'previous': None,
+        'results': ParcelaAtrasadaSerializer(parcelas, many=True).data,
+    })
+
+
+@leitura_assincrona
+@leitura_na_replica
+async def dashboard_comissoes_async(request):
+    """Totais do dashboard lidos do resumo mensal, como /api/dashboard/comissoes/."""
+    queryset = aplicar_filtros(request.GET, ResumoComissaoMensal.objects.all(), FILTROS_RESUMO)
+    return JsonResponse({
+        'totais': (await arelatorio_comissoes_resumido(queryset))[0],
+        'por_mes': await arelatorio_comissoes_resumido(queryset, ['mes']),
+        'por_consultor': await arelatorio_comissoes_resumido(queryset, ['consultor']),
+    })
+
+
+@leitura_assincrona
+@leitura_na_replica
+async def relatorio_comissoes_async(request):
+    """Totais de comissão agregados no banco, como /api/relatorios/comissoes/."""
+    agrupar = ler_dimensoes(request.GET.get('agrupar'), DIMENSOES_COMISSOES)
+    filtros = ControleDeRecebimentoViewSet.filtros
+    if usa_resumo(request.GET, agrupar, filtros):
+        queryset = aplicar_filtros(request.GET, ResumoComissaoMensal.objects.all(), FILTROS_RESUMO)
+        resultados = await arelatorio_comissoes_resumido(queryset, agrupar)
+        fonte = 'resumo'
+    else:
+        queryset = aplicar_filtros(request.GET, ControleDeRecebimento.objects.all(), filtros)
+        arquivo = arquivados(ControleDeRecebimento, request.GET, filtros)
+        resultados = await arelatorio_comissoes(queryset, agrupar, arquivados=arquivo)
+        fonte = 'bruto'
+    return JsonResponse({'agrupar': agrupar, 'fonte': fonte, 'resultados': resultados})
+
+
+@leitura_assincrona
+@leitura_na_replica
+async def relatorio_vendas_async(request):
+    """Quantidade de vendas e valores bruto e líquido, como /api/relatorios/vendas/."""
+    agrupar = ler_dimensoes(request.GET.get('agrupar'), DIMENSOES_VENDAS)
+    queryset = aplicar_filtros(request.GET, Venda.objects.all(), VendaViewSet.filtros)
+    arquivo = arquivados(Venda, request.GET, VendaViewSet.filtros)
+    return JsonResponse({'agrupar': agrupar, 'resultados': await arelatorio_vendas(queryset, agrupar, arquivados=arquivo)})
+
+
+# Representação de cada tipo do feed: a mesma das listagens correspondentes
+FONTES_ALTERACOES = {
+    VENDA: (Venda, VendaViewSet.campos_listagem),
+    CONTROLE: (ControleDeRecebimento, ControleDeRecebimentoViewSet.campos_listagem),
+}
+
+
+def _ler_cursor_alteracoes(request):
+    # Last-Event-ID é enviado pelo EventSource ao reconectar e prevalece sobre ?cursor=
+    valor = request.headers.get('Last-Event-ID') or request.GET.get('cursor')
+    if not valor:
+        return None
+    try:
+        cursor = int(valor)
+    except ValueError:
+        raise ParametroInvalido('cursor deve ser um número inteiro.')
+    if cursor < 0:
+        raise ParametroInvalido('cursor deve ser um número inteiro.')
+    return cursor
+
+
+def _evento(nome, cursor, dados):
+    return f'id: {cursor}\nevent: {nome}\ndata: {json.dumps(dados, cls=DjangoJSONEncoder)}\n\n'.encode()
+
+
+async def _estado_atual(alteracoes):
+    """Registros alterados no estado atual; os que não existem mais saem como removidos."""
+    atuais = {}
+    for tipo, (modelo, campos) in FONTES_ALTERACOES.items():
+        ids = [objeto_id for (tipo_alterado, objeto_id), removido in alteracoes.items() if tipo_alterado == tipo and not removido]
+        if ids:
+            linhas, montar = linhas_rapidas(modelo.objects.filter(pk__in=ids), campos)
+            for dados in montar([linha async for linha in linhas]):
+                atuais[(tipo, dados['id'])] = dados
+    return [
+        {'tipo': tipo, 'id': objeto_id, 'removido': (tipo, objeto_id) not in atuais, 'dados': atuais.get((tipo, objeto_id))}
+        for tipo, objeto_id in alteracoes
+    ]
+
+
+@sync_to_async
+def _liberar_conexoes():
+    """
+    Fecha as conexões da thread das consultas do stream enquanto ele espera.
+
+    Sem isso a conexão aberta na primeira consulta só seria devolvida no fim
+    da resposta, até ALTERACOES_DURACAO_MAXIMA segundos depois: cada stream
+    aberto prenderia uma conexão do banco (ou do pooler). Conexões dentro de
+    uma transação ficam como estão.
+    """
+    for conexao in connections.all(initialized_only=True):
+        if not conexao.in_atomic_block:
+            conexao.close()
+
+
+async def _eventos_alteracoes(cursor, continuo):
+    """
+    Eventos SSE das alterações após `cursor`.
+
+    Sem `continuo` entrega o que houver e termina; o cliente reconecta depois
+    de ALTERACOES_RECONEXAO_MS com o último id. Contínuo, consulta o feed a
+    cada ALTERACOES_INTERVALO segundos por até ALTERACOES_DURACAO_MAXIMA
+    segundos, com um comentário a cada ALTERACOES_INTERVALO_PING segundos sem
+    eventos para que proxies não encerrem a conexão. Entre uma consulta e
+    outra não fica conexão aberta com o banco.
+    """
+    intervalo = getattr(settings, 'ALTERACOES_INTERVALO', 1.0)
+    ping = getattr(settings, 'ALTERACOES_INTERVALO_PING', 15)
+    duracao = getattr(settings, 'ALTERACOES_DURACAO_MAXIMA', 300)
+    yield f"retry: {getattr(settings, 'ALTERACOES_RECONEXAO_MS', 3000)}\n\n".encode()
+    if cursor is None:
+        # Primeira conexão: o cliente carrega a listagem depois deste evento e guarda o cursor
+        cursor = await aultimo_cursor()
+        yield _evento('cursor', cursor, {'cursor': cursor})
+
+    inicio = ultimo_envio = time.monotonic()
+    while True:
+        novo_cursor, alteracoes = await aler_alteracoes(cursor)
+        if novo_cursor is None:
+            # Cursor anterior às alterações podadas: a listagem precisa ser recarregada
+            cursor = await aultimo_cursor()
+            yield _evento('reiniciar', cursor, {'cursor': cursor})
+            return
+        if alteracoes:
+            cursor = novo_cursor
+            yield _evento('alteracoes', cursor, {'cursor': cursor, 'alteracoes': await _estado_atual(alteracoes)})
+            ultimo_envio = time.monotonic()
+            # Pode haver mais alterações na fila: lê de novo sem esperar
+            continue
+        if not continuo or time.monotonic() - inicio >= duracao:
+            return
+        if time.monotonic() - ultimo_envio >= ping:
+            yield b': ping\n\n'
+            ultimo_envio = time.monotonic()
+        await _liberar_conexoes()
+        await asyncio.sleep(intervalo)
+
+
+@leitura_assincrona(token_na_url=True)
+async def alteracoes_stream(request):
+    """
+    Server-Sent Events com as alterações de vendas e parcelas (core.alteracoes).
+
+    Cada evento "alteracoes" traz o cursor (também no id do evento) e, por
+    registro alterado, tipo ("venda" ou "controle"), id, removido e os dados na
+    representação de /api/venda/ e /api/controlederecebimento/. Sem cursor
+    (?cursor= ou Last-Event-ID), o primeiro evento "cursor" marca o ponto de
+    partida; um evento "reiniciar" pede que o cliente recarregue a listagem.
+    Sob ASGI a conexão fica aberta; sob WSGI a resposta traz o que houver e o
+    EventSource reconecta sozinho.
+    """
+    cursor = _ler_cursor_alteracoes(request)
+    cabecalhos = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    if isinstance(request, ASGIRequest):
+        return StreamingHttpResponse(
+            _eventos_alteracoes(cursor, continuo=True), content_type='text/event-stream', headers=cabecalhos,
+        )
+    # Sob WSGI uma conexão aberta prenderia uma thread do worker
+    conteudo = b''.join([parte async for parte in _eventos_alteracoes(cursor, continuo=False)])
+    return HttpResponse(conteudo, content_type='text/event-stream', headers=cabecalhos)
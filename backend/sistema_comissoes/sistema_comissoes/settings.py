@@ -46,6 +46,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Primeiro da lista para medir o tempo total da requisição
+    'core.instrumentacao.InstrumentacaoMiddleware',
+    # Uma leitura da versão dos planos por requisição quando não há PLANOS_CACHE
+    'core.planos.PlanosMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -63,6 +67,15 @@ REST_FRAMEWORK = {
         'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'core.renderers.JSONRapidoRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PAGINATION_CLASS': 'core.pagination.PaginacaoPorCursor',
+    'DEFAULT_FILTER_BACKENDS': (
+        'core.filters.FiltroPorParametros',
+        'rest_framework.filters.OrderingFilter',
+    ),
 }
     # Mantenha outras configurações existentes
 
@@ -100,15 +113,159 @@ SECRET_KEY = config('SECRET_KEY', default='your-default-secret-key')
 DEBUG = config('DEBUG', default=False, cast=bool)
 ALLOWED_HOSTS = config('ALLOWED_HOSTS', default='*').split(',')
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-        
+# DB_ENGINE=sqlite (padrão) ou postgresql
+DB_ENGINE = config('DB_ENGINE', default='sqlite')
+
+if DB_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': config('DB_NAME', default='commtrack'),
+            'USER': config('DB_USER', default='commtrack'),
+            'PASSWORD': config('DB_PASSWORD', default=''),
+            'HOST': config('DB_HOST', default='localhost'),
+            'PORT': config('DB_PORT', default='5432'),
+            'CONN_MAX_AGE': config('DB_CONN_MAX_AGE', default=60, cast=int),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {},
+        }
     }
-}
+    if config('DB_POOL', default=False, cast=bool):
+        # Pool de conexões do psycopg 3; não pode ser combinado com conexões persistentes
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': config('DB_POOL_MIN_SIZE', default=2, cast=int),
+            'max_size': config('DB_POOL_MAX_SIZE', default=10, cast=int),
+            'timeout': config('DB_POOL_TIMEOUT', default=10, cast=int),
+        }
+    # Réplica somente leitura para atrasadas, relatórios, exportações e busca (core.roteamento)
+    if config('DB_LEITURA_HOST', default=''):
+        DATABASES['leitura'] = {
+            **DATABASES['default'],
+            'HOST': config('DB_LEITURA_HOST'),
+            'PORT': config('DB_LEITURA_PORT', default=DATABASES['default']['PORT']),
+            'OPTIONS': dict(DATABASES['default']['OPTIONS']),
+            'TEST': {'MIRROR': 'default'},
+        }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': config('DB_NAME', default=str(BASE_DIR / 'db.sqlite3')),
+            'CONN_MAX_AGE': config('DB_CONN_MAX_AGE', default=0, cast=int),
+            'OPTIONS': {},
+        }
+    }
+    # Modo ajustado: WAL deixa leitores e o escritor trabalharem em paralelo e o
+    # busy timeout faz escritores aguardarem a trava em vez de falhar com
+    # "database is locked". Os arquivos -wal/-shm ficam ao lado do banco, então
+    # monte o diretório (e não só o arquivo) em containers.
+    if config('DB_SQLITE_TUNED', default=False, cast=bool):
+        DATABASES['default']['OPTIONS'] = {
+            'timeout': config('DB_SQLITE_TIMEOUT', default=20, cast=int),
+            'transaction_mode': 'IMMEDIATE',
+            'init_command': (
+                'PRAGMA journal_mode=WAL;'
+                'PRAGMA synchronous=NORMAL;'
+                f"PRAGMA busy_timeout={config('DB_SQLITE_TIMEOUT', default=20, cast=int) * 1000};"
+                f"PRAGMA mmap_size={config('DB_SQLITE_MMAP_SIZE', default=268435456, cast=int)};"
+                'PRAGMA temp_store=MEMORY;'
+                'PRAGMA cache_size=-20000;'
+            ),
+        }
+    # Segunda conexão, somente leitura (mode=ro), ao mesmo arquivo para atrasadas,
+    # relatórios, exportações e busca (core.roteamento). Em WAL ela lê enquanto o
+    # principal grava, e suas transações não pedem a trava de escrita que o
+    # transaction_mode IMMEDIATE do principal pede.
+    if config('DB_SQLITE_LEITURA', default=False, cast=bool):
+        DATABASES['leitura'] = {
+            **DATABASES['default'],
+            'NAME': f"file:{DATABASES['default']['NAME']}?mode=ro",
+            'OPTIONS': {
+                'timeout': config('DB_SQLITE_TIMEOUT', default=20, cast=int),
+                'init_command': (
+                    f"PRAGMA mmap_size={config('DB_SQLITE_MMAP_SIZE', default=268435456, cast=int)};"
+                    'PRAGMA temp_store=MEMORY;'
+                    'PRAGMA cache_size=-20000;'
+                ),
+            },
+            'TEST': {'MIRROR': 'default'},
+        }
 
         #'NAME': BASE_DIR / 'db' / 'db.sqlite3',
+
+# Leituras marcadas em core.roteamento vão para o alias 'leitura' quando ele existe
+DATABASE_ROUTERS = ['core.roteamento.RoteadorLeitura']
+
+# Cache: memória local do processo por padrão; com REDIS_URL o cache é
+# compartilhado entre os workers do gunicorn.
+REDIS_URL = config('REDIS_URL', default='')
+if REDIS_URL:
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': REDIS_URL}}
+else:
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+# Alias do cache que guarda a tabela de planos e a versão dela entre processos;
+# vazio mantém a tabela na memória de cada processo, com a versão lida do banco.
+PLANOS_CACHE = config('PLANOS_CACHE', default='default' if REDIS_URL else '')
+# Alias do cache das páginas serializadas das listagens com ETag (chaveadas pela versão dos dados)
+RESPOSTAS_CACHE = config('RESPOSTAS_CACHE', default='default')
+
+# Instrumentação por requisição (core.instrumentacao): Server-Timing, log
+# estruturado no logger core.instrumentacao e estatísticas por rota.
+INSTRUMENTACAO_ATIVA = config('INSTRUMENTACAO_ATIVA', default=True, cast=bool)
+LIMITE_CONSULTA_LENTA_MS = config('LIMITE_CONSULTA_LENTA_MS', default=100, cast=float)
+LIMITE_REQUISICAO_LENTA_MS = config('LIMITE_REQUISICAO_LENTA_MS', default=1000, cast=float)
+INSTRUMENTACAO_AMOSTRAS = config('INSTRUMENTACAO_AMOSTRAS', default=1000, cast=int)
+
+# Fila de tarefas em segundo plano (core.tarefas, comando processar_tarefas):
+# tarefas em execução sem progresso por TAREFAS_TEMPO_LIMITE segundos voltam à
+# fila, até TAREFAS_MAX_TENTATIVAS execuções.
+TAREFAS_TEMPO_LIMITE = config('TAREFAS_TEMPO_LIMITE', default=1800, cast=int)
+TAREFAS_MAX_TENTATIVAS = config('TAREFAS_MAX_TENTATIVAS', default=3, cast=int)
+# Os arquivos gerados pelas tarefas (relatórios e exportações) vão para o
+# storage padrão, em MEDIA_ROOT: o trabalhador e os processos web precisam
+# enxergar o mesmo diretório. Não há MEDIA_URL; o download passa pela API.
+MEDIA_ROOT = config('MEDIA_ROOT', default=str(BASE_DIR / 'media'))
+
+# Arquivamento (comando arquivar_vendas): vendas com todas as parcelas recebidas
+# há mais de ARQUIVO_HORIZONTE_DIAS saem das tabelas em operação
+ARQUIVO_HORIZONTE_DIAS = config('ARQUIVO_HORIZONTE_DIAS', default=730, cast=int)
+
+# Feed de alterações e stream SSE de /api/async/alteracoes/ (core.alteracoes):
+# o feed é consultado a cada ALTERACOES_INTERVALO segundos, cada conexão dura
+# até ALTERACOES_DURACAO_MAXIMA segundos (o EventSource reconecta com o último
+# id) e o comando podar_alteracoes mantém ALTERACOES_RETENCAO_DIAS de histórico.
+# A conexão com o banco é fechada entre as consultas: streams abertos não
+# ocupam conexões, mas cada consulta abre uma nova.
+ALTERACOES_INTERVALO = config('ALTERACOES_INTERVALO', default=1.0, cast=float)
+ALTERACOES_INTERVALO_PING = config('ALTERACOES_INTERVALO_PING', default=15, cast=int)
+ALTERACOES_DURACAO_MAXIMA = config('ALTERACOES_DURACAO_MAXIMA', default=300, cast=int)
+ALTERACOES_RECONEXAO_MS = config('ALTERACOES_RECONEXAO_MS', default=3000, cast=int)
+ALTERACOES_ESPERA_LACUNA = config('ALTERACOES_ESPERA_LACUNA', default=2, cast=float)
+ALTERACOES_RETENCAO_DIAS = config('ALTERACOES_RETENCAO_DIAS', default=7, cast=int)
+
+# Requisições lentas e consultas lentas saem como WARNING; INFO registra todas
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'core.instrumentacao': {
+            'handlers': ['console'],
+            'level': config('INSTRUMENTACAO_LOG_NIVEL', default='WARNING'),
+            'propagate': False,
+        },
+        'core.tarefas': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.urls import path, include
 from rest_framework import routers
-from core import views
+from core import views, views_async
 from rest_framework_simplejwt.views import ( # type: ignore
     TokenObtainPairView,
     TokenRefreshView,
@@ -15,12 +15,29 @@ router.register(r'controlederecebimento', views.ControleDeRecebimentoViewSet)
 router.register(r'parcela', views.ParcelaViewSet)
 router.register(r'plano', views.PlanoViewSet)
 router.register(r'venda', views.VendaViewSet)
+router.register(r'tarefas', views.TarefaViewSet, basename='tarefa')
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include(router.urls)),
     path('api/parcelas-atrasadas/', views.ParcelasAtrasadasList.as_view(), name='parcelas-atrasadas'),
     path('api/parcelas/<int:pk>/marcar-recebida/', views.marcar_parcela_recebida, name='marcar-parcela-recebida'),
+    path('api/parcelas/conciliar-extrato/', views.ConciliacaoExtratoView.as_view(), name='conciliar-extrato'),
+    path('api/vendas/importar/', views.ImportacaoVendasView.as_view(), name='importar-vendas'),
+    path('api/relatorios/comissoes/', views.RelatorioComissoesView.as_view(), name='relatorio-comissoes'),
+    path('api/relatorios/vendas/', views.RelatorioVendasView.as_view(), name='relatorio-vendas'),
+    path('api/projecoes/comissoes/', views.ProjecaoComissoesView.as_view(), name='projecao-comissoes'),
+    path('api/dashboard/comissoes/', views.DashboardComissoesView.as_view(), name='dashboard-comissoes'),
+    path('api/busca/', views.BuscaView.as_view(), name='busca'),
+    path('api/resumos/reconstruir/', views.ReconstrucaoResumosView.as_view(), name='reconstruir-resumos'),
+    path('api/metricas/rotas/', views.MetricasRotasView.as_view(), name='metricas-rotas'),
+
+    # Variantes assíncronas das leituras pesadas (ORM assíncrono; ver core/views_async.py)
+    path('api/async/parcelas-atrasadas/', views_async.parcelas_atrasadas_async, name='parcelas-atrasadas-async'),
+    path('api/async/relatorios/comissoes/', views_async.relatorio_comissoes_async, name='relatorio-comissoes-async'),
+    path('api/async/relatorios/vendas/', views_async.relatorio_vendas_async, name='relatorio-vendas-async'),
+    path('api/async/dashboard/comissoes/', views_async.dashboard_comissoes_async, name='dashboard-comissoes-async'),
+    path('api/async/alteracoes/', views_async.alteracoes_stream, name='alteracoes-stream'),
     
     # Rotas de autenticação JWT
     path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
@@ -17,4 +17,25 @@ api.interceptors.request.use(
   (error) => Promise.reject(error)
 );
 
+// Uma página da paginação por cursor: os `itens` e a URL da `proxima` (null na última)
+export const listarPagina = async (url, config = {}) => {
+  const response = await api.get(url, config);
+  return { itens: response.data.results, proxima: response.data.next };
+};
+
+// Percorre as páginas da paginação por cursor e devolve todos os resultados em `data`.
+// Só para listas pequenas de apoio, como os planos de um select; listagens usam useListaPaginada.
+export const listarTodos = async (url, config = {}) => {
+  let response = await api.get(url, config);
+  if (!response.data || !Array.isArray(response.data.results)) {
+    return response;
+  }
+  const resultados = [...response.data.results];
+  while (response.data.next) {
+    response = await api.get(response.data.next);
+    resultados.push(...response.data.results);
+  }
+  return { ...response, data: resultados };
+};
+
 export default api;
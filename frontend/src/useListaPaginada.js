@@ -0,0 +1,86 @@
+// src/useListaPaginada.js
+import { useCallback, useEffect, useRef, useState } from 'react';
+import { listarPagina } from './api';
+
+// Espera entre a última mudança de filtro e a nova consulta (digitação)
+const ESPERA_FILTROS_MS = 300;
+
+// Listagem paginada por cursor: busca a primeira página com os filtros aplicados no servidor
+// e as seguintes sob demanda (carregarMais), sem percorrer a listagem inteira.
+// Filtros vazios ('' ou null) não são enviados; mudar um filtro recomeça da primeira página.
+const useListaPaginada = (url, filtros = {}, tamanhoPagina = 50) => {
+  const [itens, setItens] = useState([]);
+  const [proxima, setProxima] = useState(null);
+  const [carregando, setCarregando] = useState(true);
+  const [erro, setErro] = useState(null);
+  const primeiraBusca = useRef(true);
+  // Muda a cada troca de filtros: descarta páginas seguintes pedidas para os filtros anteriores
+  const geracao = useRef(0);
+  const chaveFiltros = JSON.stringify(filtros);
+
+  useEffect(() => {
+    let cancelado = false;
+    geracao.current += 1;
+    const params = { page_size: tamanhoPagina };
+    Object.entries(JSON.parse(chaveFiltros)).forEach(([nome, valor]) => {
+      if (valor !== '' && valor !== null && valor !== undefined) {
+        params[nome] = valor;
+      }
+    });
+
+    const buscar = async () => {
+      setCarregando(true);
+      try {
+        const pagina = await listarPagina(url, { params });
+        if (!cancelado) {
+          setItens(pagina.itens);
+          setProxima(pagina.proxima);
+          setErro(null);
+        }
+      } catch (err) {
+        if (!cancelado) {
+          console.error(`Erro ao buscar ${url}:`, err);
+          setErro(err);
+        }
+      } finally {
+        if (!cancelado) {
+          setCarregando(false);
+        }
+      }
+    };
+
+    const espera = setTimeout(buscar, primeiraBusca.current ? 0 : ESPERA_FILTROS_MS);
+    primeiraBusca.current = false;
+    return () => {
+      cancelado = true;
+      clearTimeout(espera);
+    };
+  }, [url, chaveFiltros, tamanhoPagina]);
+
+  const carregarMais = useCallback(async () => {
+    if (!proxima) {
+      return;
+    }
+    const pedido = geracao.current;
+    setCarregando(true);
+    try {
+      const pagina = await listarPagina(proxima);
+      if (pedido === geracao.current) {
+        setItens((anteriores) => [...anteriores, ...pagina.itens]);
+        setProxima(pagina.proxima);
+        setErro(null);
+      }
+    } catch (err) {
+      console.error(`Erro ao buscar ${url}:`, err);
+      setErro(err);
+    } finally {
+      if (pedido === geracao.current) {
+        setCarregando(false);
+      }
+    }
+  }, [url, proxima]);
+
+  return { itens, setItens, proxima, carregarMais, carregando, erro };
+};
+
+export default useListaPaginada;
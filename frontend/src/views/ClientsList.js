@@ -2,6 +2,7 @@
 
 import React, { useState, useEffect } from 'react';
 import api from '../api'; // Substitua 'axios' por 'api'
+import useListaPaginada from '../useListaPaginada';
 import {
   Table,
   Container,
@@ -20,32 +21,29 @@ import {
 import Header from 'components/Headers/Header';
 
 const ClientsList = () => {
-  const [clients, setClients] = useState([]);
+  // Filtro por nome aplicado no servidor; as páginas seguintes vêm pelo cursor
+  const [busca, setBusca] = useState('');
+  const {
+    itens: clients,
+    setItens: setClients,
+    proxima,
+    carregarMais,
+    carregando,
+    erro,
+  } = useListaPaginada('api/clientes/', { nome: busca });
   const [selectedClient, setSelectedClient] = useState(null); // Cliente selecionado para edição
   const [newClient, setNewClient] = useState({
     nome: '',       // Corrigido de 'neme' para 'nome'
     telefone: '',
     email: '',
   });
-  const [loading, setLoading] = useState(true); // Estado de carregamento
   const [error, setError] = useState(null);     // Estado de erro
 
   useEffect(() => {
-    // Função para buscar clientes
-    const fetchClients = async () => {
-      try {
-        const response = await api.get('api/clientes/'); // Utiliza a instância 'api'
-        setClients(response.data);
-      } catch (err) {
-        console.error('Erro ao buscar clientes:', err);
-        setError('Erro ao buscar clientes. Tente novamente mais tarde.');
-      } finally {
-        setLoading(false);
-      }
-    };
-
-    fetchClients();
-  }, []);
+    if (erro) {
+      setError('Erro ao buscar clientes. Tente novamente mais tarde.');
+    }
+  }, [erro]);
 
   // Função para cadastrar ou modificar o cliente
   const handleSaveClient = async (e) => {
@@ -64,7 +62,8 @@ const ClientsList = () => {
       } else {
         // Adicionar novo cliente
         const response = await api.post('api/clientes/', newClient);
-        setClients([...clients, response.data]);
+        // A listagem vem dos mais recentes para os mais antigos
+        setClients([response.data, ...clients]);
         setNewClient({ nome: '', telefone: '', email: '' }); // Limpa o formulário
       }
       setError(null); // Limpa erros após operação bem-sucedida
@@ -116,21 +115,6 @@ const ClientsList = () => {
     }
   };
 
-  // Renderização Condicional de Carregamento e Erro
-  if (loading) {
-    return (
-      <>
-        <Header />
-        <Container className="mt--7" fluid>
-          <Row className="justify-content-center">
-            <Spinner color="primary" />
-            <p className="text-center mt-3">Carregando clientes...</p>
-          </Row>
-        </Container>
-      </>
-    );
-  }
-
   return (
     <>
       <Header />
@@ -225,8 +209,15 @@ const ClientsList = () => {
           {/* Coluna da lista de clientes */}
           <Col>
             <Card className="bg-default shadow">
-              <CardHeader className="bg-transparent border-0">
+              <CardHeader className="bg-transparent border-0 d-flex justify-content-between align-items-center">
                 <h3 className="text-white mb-0">Lista de Clientes</h3>
+                <Input
+                  type="text"
+                  value={busca}
+                  onChange={(e) => setBusca(e.target.value)}
+                  placeholder="Buscar por nome"
+                  style={{ maxWidth: '300px' }}
+                />
               </CardHeader>
               <Table
                 className="align-items-center table-dark table-flush"
@@ -254,14 +245,24 @@ const ClientsList = () => {
                       </tr>
                     ))
                   ) : (
-                    <tr>
-                      <td colSpan="3" className="text-center">
-                        Nenhum cliente encontrado.
-                      </td>
-                    </tr>
+                    !carregando && (
+                      <tr>
+                        <td colSpan="3" className="text-center">
+                          Nenhum cliente encontrado.
+                        </td>
+                      </tr>
+                    )
                   )}
                 </tbody>
               </Table>
+              <div className="p-3 text-center">
+                {carregando && <Spinner color="primary" size="sm" className="mr-2" />}
+                {proxima && (
+                  <Button color="primary" size="sm" onClick={carregarMais} disabled={carregando}>
+                    Carregar mais
+                  </Button>
+                )}
+              </div>
             </Card>
           </Col>
         </Row>
@@ -2,6 +2,7 @@
 
 import React, { useState, useEffect } from 'react';
 import api from '../api';
+import useListaPaginada from '../useListaPaginada';
 import {
   Table,
   Container,
@@ -20,7 +21,16 @@ import {
 import Header from 'components/Headers/Header';
 
 const ConsultoresList = () => {
-  const [consultores, setConsultores] = useState([]);
+  // Filtro por nome aplicado no servidor; as páginas seguintes vêm pelo cursor
+  const [busca, setBusca] = useState('');
+  const {
+    itens: consultores,
+    setItens: setConsultores,
+    proxima,
+    carregarMais,
+    carregando,
+    erro,
+  } = useListaPaginada('api/consultor/', { nome: busca });
   const [selectedConsultor, setSelectedConsultor] = useState(null);  // Consultor selecionado para edição
   const [newConsultor, setNewConsultor] = useState({ 
     nome: '',
@@ -28,26 +38,13 @@ const ConsultoresList = () => {
     email: ''
   });
 
-  const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
 
   useEffect(() => {
-    // Função para buscar consultores
-    const fetchConsultores = async () => {
-      try {
-        const response = await api.get('api/consultor/');
-        setConsultores(response.data);
-        setError(null);
-      } catch (err) {
-        console.error('Erro ao buscar consultores:', err);
-        setError('Erro ao buscar consultores. Tente novamente mais tarde.');
-      } finally {
-        setLoading(false);
-      }
-    };
-
-    fetchConsultores();
-  }, []);
+    if (erro) {
+      setError('Erro ao buscar consultores. Tente novamente mais tarde.');
+    }
+  }, [erro]);
 
   // Função para cadastrar ou modificar o consultor
   const handleSaveConsultor = async (e) => {
@@ -62,7 +59,8 @@ const ConsultoresList = () => {
       } else {
         // Adicionar novo consultor
         const response = await api.post('api/consultor/', newConsultor);
-        setConsultores([...consultores, response.data]);
+        // A listagem vem dos mais recentes para os mais antigos
+        setConsultores([response.data, ...consultores]);
         setNewConsultor({ nome: '', telefone: '', email: '' });  // Limpa o formulário
       }
       setError(null);
@@ -110,21 +108,6 @@ const ConsultoresList = () => {
     }
   };
 
-  // Renderização Condicional de Carregamento e Erro
-  if (loading) {
-    return (
-      <>
-        <Header />
-        <Container className="mt--7" fluid>
-          <Row className="justify-content-center">
-            <Spinner color="primary" />
-            <p className="text-center mt-3">Carregando consultores...</p>
-          </Row>
-        </Container>
-      </>
-    );
-  }
-
   return (
     <>
       <Header />
@@ -140,8 +123,15 @@ const ConsultoresList = () => {
           {/* Coluna da lista de consultores */}
           <Col xl="8">
             <Card className="bg-default shadow">
-              <CardHeader className="bg-transparent border-0">
+              <CardHeader className="bg-transparent border-0 d-flex justify-content-between align-items-center">
                 <h3 className="text-white mb-0">Lista de Consultores</h3>
+                <Input
+                  type="text"
+                  value={busca}
+                  onChange={(e) => setBusca(e.target.value)}
+                  placeholder="Buscar por nome"
+                  style={{ maxWidth: '300px' }}
+                />
               </CardHeader>
               <Table className="align-items-center table-dark table-flush" responsive hover>
                 <thead className="thead-dark">
@@ -178,14 +168,24 @@ const ConsultoresList = () => {
                       </tr>
                     ))
                   ) : (
-                    <tr>
-                      <td colSpan="4" className="text-center">
-                        Nenhum consultor encontrado.
-                      </td>
-                    </tr>
+                    !carregando && (
+                      <tr>
+                        <td colSpan="4" className="text-center">
+                          Nenhum consultor encontrado.
+                        </td>
+                      </tr>
+                    )
                   )}
                 </tbody>
               </Table>
+              <div className="p-3 text-center">
+                {carregando && <Spinner color="primary" size="sm" className="mr-2" />}
+                {proxima && (
+                  <Button color="primary" size="sm" onClick={carregarMais} disabled={carregando}>
+                    Carregar mais
+                  </Button>
+                )}
+              </div>
             </Card>
           </Col>
 
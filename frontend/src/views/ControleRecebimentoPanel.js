@@ -2,6 +2,7 @@
 
 import React, { useState, useEffect, useCallback } from 'react';
 import api from '../api';
+import useListaPaginada from '../useListaPaginada';
 import {
   Table,
   Container,
@@ -36,38 +37,46 @@ import {
   faTable,
 } from '@fortawesome/free-solid-svg-icons';
 
+// Valor do filtro ?situacao= da API para cada opção de status do painel
+const SITUACOES = {
+  'Em andamento': 'em_andamento',
+  Finalizados: 'finalizada',
+  Todos: '',
+};
+
 const ControleRecebimentoPanel = () => {
-  const [vendas, setVendas] = useState([]);
   const [openVendaIds, setOpenVendaIds] = useState([]);
   const [editingRecebimentos, setEditingRecebimentos] = useState({});
   const [searchTerm, setSearchTerm] = useState('');
-  const [debouncedSearchTerm, setDebouncedSearchTerm] = useState('');
   const [statusFilter, setStatusFilter] = useState('Em andamento');
   const [dateRange, setDateRange] = useState({
     startDate: '',
     endDate: '',
   });
 
-  const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
 
-  useEffect(() => {
-    fetchVendas();
-    // eslint-disable-next-line react-hooks/exhaustive-deps
-  }, []);
+  // Os filtros são aplicados no servidor; as páginas seguintes vêm pelo cursor
+  const {
+    itens: vendas,
+    setItens: setVendas,
+    proxima,
+    carregarMais,
+    carregando,
+    erro,
+  } = useListaPaginada('api/venda/', {
+    fields: 'id,numero_proposta,cliente,valor_plano,data_venda,parcelas_recebimento',
+    busca: searchTerm,
+    situacao: SITUACOES[statusFilter],
+    data_venda_inicio: dateRange.startDate,
+    data_venda_fim: dateRange.endDate,
+  });
 
-  const fetchVendas = async () => {
-    try {
-      const response = await api.get('api/venda/');
-      setVendas(response.data);
-      setError(null);
-    } catch (err) {
-      console.error('Erro ao buscar vendas:', err);
+  useEffect(() => {
+    if (erro) {
       setError('Erro ao buscar vendas. Tente novamente mais tarde.');
-    } finally {
-      setLoading(false);
     }
-  };
+  }, [erro]);
 
   const toggleCollapse = (vendaId) => {
     setOpenVendaIds((prevState) =>
@@ -178,381 +187,321 @@ const ControleRecebimentoPanel = () => {
     return 'danger';
   };
 
-  // Função para lidar com a mudança no campo de pesquisa com debounce
+  // A nova consulta espera a digitação terminar (ver useListaPaginada)
   const handleSearchChange = (e) => {
     setSearchTerm(e.target.value);
-    debouncedSearch(e.target.value);
   };
 
-  // eslint-disable-next-line react-hooks/exhaustive-deps
-  const debouncedSearch = useCallback(
-    debounce((value) => {
-      setDebouncedSearchTerm(value);
-    }, 300),
-    []
-  );
-
   useEffect(() => {
     return () => {
       // Cancelar o debounce ao desmontar o componente
-      debouncedSearch.cancel();
       debouncedUpdateRecebimento.cancel();
     };
-  }, [debouncedSearch, debouncedUpdateRecebimento]);
-
-  // Função para filtrar as vendas
-  const filteredVendas = vendas.filter((venda) => {
-    const search = debouncedSearchTerm.toLowerCase();
-
-    // Filtro de Pesquisa
-    const numeroPropostaMatch = venda.numero_proposta.toLowerCase().includes(search);
-    const clienteNomeMatch = venda.cliente.nome.toLowerCase().includes(search);
-
-    const matchesSearch = numeroPropostaMatch || clienteNomeMatch;
-
-    // Filtro de Status
-    let matchesStatus = true;
-    if (statusFilter === 'Em andamento') {
-      // Verificar se a venda ainda tem parcelas a receber
-      const parcelasNaoRecebidas = venda.parcelas_recebimento.some(
-        (recebimento) => recebimento.status.toLowerCase() !== 'recebido'
-      );
-      matchesStatus = parcelasNaoRecebidas;
-    } else if (statusFilter === 'Finalizados') {
-      // Verificar se todas as parcelas foram recebidas
-      const todasRecebidas = venda.parcelas_recebimento.every(
-        (recebimento) => recebimento.status.toLowerCase() === 'recebido'
-      );
-      matchesStatus = todasRecebidas;
-    }
-
-    // Filtro de Intervalo de Datas
-    let matchesDateRange = true;
-    if (dateRange.startDate && dateRange.endDate) {
-      const dataVenda = parseISO(venda.data_venda);
-      const startDate = parseISO(dateRange.startDate);
-      const endDate = parseISO(dateRange.endDate);
-
-      matchesDateRange = dataVenda >= startDate && dataVenda <= endDate;
-    } else if (dateRange.startDate) {
-      const dataVenda = parseISO(venda.data_venda);
-      const startDate = parseISO(dateRange.startDate);
-
-      matchesDateRange = dataVenda >= startDate;
-    } else if (dateRange.endDate) {
-      const dataVenda = parseISO(venda.data_venda);
-      const endDate = parseISO(dateRange.endDate);
-
-      matchesDateRange = dataVenda <= endDate;
-    }
-
-    return matchesSearch && matchesStatus && matchesDateRange;
-  });
+  }, [debouncedUpdateRecebimento]);
 
   return (
     <>
       <Header />
       <Container className="mt--7" fluid>
-        {loading ? (
-          <Row className="justify-content-center">
-            <Spinner color="primary" />
-            <p className="text-center mt-3">Carregando vendas...</p>
+        {error && (
+          <Row>
+            <Col>
+              <Alert color="danger">{error}</Alert>
+            </Col>
           </Row>
-        ) : (
-          <>
-            {error && (
-              <Row>
-                <Col>
-                  <Alert color="danger">{error}</Alert>
-                </Col>
-              </Row>
-            )}
-            <Row>
-              {/* Coluna dos Filtros */}
-              <Col>
-                <Card className="mb-4">
-                  <CardHeader>
-                    <h4 className="mb-0">
-                      <FontAwesomeIcon icon={faFilter} className="mr-2" />
-                      Filtros
-                    </h4>
-                  </CardHeader>
-                  <CardBody>
-                    <Form>
-                      <Row form>
-                        <Col md={6}>
-                          {/* Campo de Pesquisa */}
-                          <FormGroup>
-                            <Label for="search">Pesquisar Vendas:</Label>
-                            <InputGroup>
-                              <Input
-                                type="text"
-                                name="search"
-                                id="search"
-                                placeholder="Digite o número da proposta ou nome do cliente"
-                                value={searchTerm}
-                                onChange={handleSearchChange}
-                              />
-                              <InputGroupText addonType="append">
-                                <InputGroupText>
-                                  <FontAwesomeIcon icon={faSearch} />
-                                </InputGroupText>
-                              </InputGroupText>
-                            </InputGroup>
-                          </FormGroup>
-                        </Col>
-                        <Col md={6}>
-                          {/* Filtro de Status */}
-                          <FormGroup tag="fieldset">
-                            <legend>Status:</legend>
-                            <FormGroup check inline>
-                              <Label check>
-                                <Input
-                                  type="radio"
-                                  name="statusFilter"
-                                  value="Em andamento"
-                                  checked={statusFilter === 'Em andamento'}
-                                  onChange={(e) => setStatusFilter(e.target.value)}
-                                />{' '}
-                                Em andamento
-                              </Label>
-                            </FormGroup>
-                            <FormGroup check inline>
-                              <Label check>
-                                <Input
-                                  type="radio"
-                                  name="statusFilter"
-                                  value="Finalizados"
-                                  checked={statusFilter === 'Finalizados'}
-                                  onChange={(e) => setStatusFilter(e.target.value)}
-                                />{' '}
-                                Finalizados
-                              </Label>
-                            </FormGroup>
-                            <FormGroup check inline>
-                              <Label check>
-                                <Input
-                                  type="radio"
-                                  name="statusFilter"
-                                  value="Todos"
-                                  checked={statusFilter === 'Todos'}
-                                  onChange={(e) => setStatusFilter(e.target.value)}
-                                />{' '}
-                                Todos
-                              </Label>
-                            </FormGroup>
-                          </FormGroup>
-                        </Col>
-                      </Row>
-                      <Row form>
-                        <Col md={6}>
-                          {/* Data Inicial */}
-                          <FormGroup>
-                            <Label for="startDate">Data Inicial:</Label>
+        )}
+        <Row>
+          {/* Coluna dos Filtros */}
+          <Col>
+            <Card className="mb-4">
+              <CardHeader>
+                <h4 className="mb-0">
+                  <FontAwesomeIcon icon={faFilter} className="mr-2" />
+                  Filtros
+                </h4>
+              </CardHeader>
+              <CardBody>
+                <Form>
+                  <Row form>
+                    <Col md={6}>
+                      {/* Campo de Pesquisa */}
+                      <FormGroup>
+                        <Label for="search">Pesquisar Vendas:</Label>
+                        <InputGroup>
+                          <Input
+                            type="text"
+                            name="search"
+                            id="search"
+                            placeholder="Digite o número da proposta ou nome do cliente"
+                            value={searchTerm}
+                            onChange={handleSearchChange}
+                          />
+                          <InputGroupText addonType="append">
+                            <InputGroupText>
+                              <FontAwesomeIcon icon={faSearch} />
+                            </InputGroupText>
+                          </InputGroupText>
+                        </InputGroup>
+                      </FormGroup>
+                    </Col>
+                    <Col md={6}>
+                      {/* Filtro de Status */}
+                      <FormGroup tag="fieldset">
+                        <legend>Status:</legend>
+                        <FormGroup check inline>
+                          <Label check>
                             <Input
-                              type="date"
-                              name="startDate"
-                              id="startDate"
-                              value={dateRange.startDate}
-                              onChange={(e) =>
-                                setDateRange({ ...dateRange, startDate: e.target.value })
-                              }
-                            />
-                          </FormGroup>
-                        </Col>
-                        <Col md={6}>
-                          {/* Data Final */}
-                          <FormGroup>
-                            <Label for="endDate">Data Final:</Label>
+                              type="radio"
+                              name="statusFilter"
+                              value="Em andamento"
+                              checked={statusFilter === 'Em andamento'}
+                              onChange={(e) => setStatusFilter(e.target.value)}
+                            />{' '}
+                            Em andamento
+                          </Label>
+                        </FormGroup>
+                        <FormGroup check inline>
+                          <Label check>
                             <Input
-                              type="date"
-                              name="endDate"
-                              id="endDate"
-                              value={dateRange.endDate}
-                              onChange={(e) =>
-                                setDateRange({ ...dateRange, endDate: e.target.value })
-                              }
-                            />
-                          </FormGroup>
-                        </Col>
-                      </Row>
-                    </Form>
-                  </CardBody>
-                </Card>
-
-                {/* Card da Tabela de Controle de Recebimento */}
-                <Card className="shadow">
-                  <CardHeader className="border-0">
-                    <h3 className="mb-0">
-                      <FontAwesomeIcon icon={faTable} className="mr-2" />
-                      Controle de Recebimento de Comissões
-                    </h3>
-                  </CardHeader>
-                  <CardBody>
-                    {filteredVendas.length === 0 ? (
-                      <p>Nenhuma venda encontrada.</p>
-                    ) : (
-                      <Table responsive>
-                        <thead>
-                          <tr>
-                            <th>Número da Proposta</th>
-                            <th>Cliente</th>
-                            <th>Valor do Plano</th>
-                            <th>Data da Venda</th>
-                            <th>Recebimento</th>
-                            <th>Ações</th>
-                          </tr>
-                        </thead>
-                        <tbody>
-                          {filteredVendas.map((venda) => {
-                            const totalParcelas = venda.parcelas_recebimento.length;
-                            const parcelasRecebidas = venda.parcelas_recebimento.filter(
-                              (recebimento) => recebimento.status.toLowerCase() === 'recebido'
-                            ).length;
-                            const percentualRecebido =
-                              totalParcelas > 0 ? (parcelasRecebidas / totalParcelas) * 100 : 0;
-
-                            return (
-                              <React.Fragment key={venda.id}>
-                                <tr>
-                                  <td>{venda.numero_proposta}</td>
-                                  <td>{venda.cliente.nome}</td>
-                                  <td>{formatCurrency(venda.valor_plano)}</td>
-                                  <td>{format(parseISO(venda.data_venda), 'dd/MM/yyyy')}</td>
-                                  <td>
-                                    <div className="d-flex align-items-center">
-                                      <span className="mr-2">
-                                        {parcelasRecebidas}/{totalParcelas}
-                                      </span>
-                                      <div style={{ flex: 1 }}>
-                                        <Progress
-                                          value={percentualRecebido}
-                                          color={getProgressColor(percentualRecebido)}
-                                          barClassName="bg-gradient"
-                                        />
-                                      </div>
-                                    </div>
-                                  </td>
-                                  <td>
-                                    <Button
-                                      color="info"
-                                      size="sm"
-                                      onClick={() => toggleCollapse(venda.id)}
-                                    >
-                                      <FontAwesomeIcon
-                                        icon={openVendaIds.includes(venda.id) ? faEyeSlash : faEye}
-                                        className="mr-1"
-                                      />
-                                      {openVendaIds.includes(venda.id) ? 'Ocultar' : 'Detalhes'}
-                                    </Button>
-                                  </td>
-                                </tr>
-                                <tr>
-                                  <td colSpan="6" style={{ padding: 0 }}>
-                                    <Collapse isOpen={openVendaIds.includes(venda.id)}>
-                                      <CardBody>
-                                        <Table size="sm" responsive>
-                                          <thead>
-                                            <tr>
-                                              <th>Número da Parcela</th>
-                                              <th>Valor da Parcela</th>
-                                              <th>Data Prevista de Recebimento</th>
-                                              <th>Dias de Atraso</th>
-                                              <th>Data Real de Recebimento</th>
-                                              <th>Número do Extrato</th>
-                                              <th>Status</th>
-                                              <th>Ações</th>
-                                            </tr>
-                                          </thead>
-                                          <tbody>
-                                            {venda.parcelas_recebimento.map((recebimento) => (
-                                              <tr key={recebimento.id}>
-                                                <td>{recebimento.parcela.numero_parcela}</td>
-                                                <td>{formatCurrency(recebimento.valor_parcela)}</td>
-                                                <td>
-                                                  {format(
-                                                    parseISO(recebimento.data_prevista_recebimento),
-                                                    'dd/MM/yyyy'
-                                                  )}
-                                                </td>
-                                                <td>
-                                                  {calcularDiasAtraso(
+                              type="radio"
+                              name="statusFilter"
+                              value="Finalizados"
+                              checked={statusFilter === 'Finalizados'}
+                              onChange={(e) => setStatusFilter(e.target.value)}
+                            />{' '}
+                            Finalizados
+                          </Label>
+                        </FormGroup>
+                        <FormGroup check inline>
+                          <Label check>
+                            <Input
+                              type="radio"
+                              name="statusFilter"
+                              value="Todos"
+                              checked={statusFilter === 'Todos'}
+                              onChange={(e) => setStatusFilter(e.target.value)}
+                            />{' '}
+                            Todos
+                          </Label>
+                        </FormGroup>
+                      </FormGroup>
+                    </Col>
+                  </Row>
+                  <Row form>
+                    <Col md={6}>
+                      {/* Data Inicial */}
+                      <FormGroup>
+                        <Label for="startDate">Data Inicial:</Label>
+                        <Input
+                          type="date"
+                          name="startDate"
+                          id="startDate"
+                          value={dateRange.startDate}
+                          onChange={(e) =>
+                            setDateRange({ ...dateRange, startDate: e.target.value })
+                          }
+                        />
+                      </FormGroup>
+                    </Col>
+                    <Col md={6}>
+                      {/* Data Final */}
+                      <FormGroup>
+                        <Label for="endDate">Data Final:</Label>
+                        <Input
+                          type="date"
+                          name="endDate"
+                          id="endDate"
+                          value={dateRange.endDate}
+                          onChange={(e) =>
+                            setDateRange({ ...dateRange, endDate: e.target.value })
+                          }
+                        />
+                      </FormGroup>
+                    </Col>
+                  </Row>
+                </Form>
+              </CardBody>
+            </Card>
+
+            {/* Card da Tabela de Controle de Recebimento */}
+            <Card className="shadow">
+              <CardHeader className="border-0">
+                <h3 className="mb-0">
+                  <FontAwesomeIcon icon={faTable} className="mr-2" />
+                  Controle de Recebimento de Comissões
+                </h3>
+              </CardHeader>
+              <CardBody>
+                {vendas.length === 0 ? (
+                  !carregando && <p>Nenhuma venda encontrada.</p>
+                ) : (
+                  <Table responsive>
+                    <thead>
+                      <tr>
+                        <th>Número da Proposta</th>
+                        <th>Cliente</th>
+                        <th>Valor do Plano</th>
+                        <th>Data da Venda</th>
+                        <th>Recebimento</th>
+                        <th>Ações</th>
+                      </tr>
+                    </thead>
+                    <tbody>
+                      {vendas.map((venda) => {
+                        const totalParcelas = venda.parcelas_recebimento.length;
+                        const parcelasRecebidas = venda.parcelas_recebimento.filter(
+                          (recebimento) => recebimento.status.toLowerCase() === 'recebido'
+                        ).length;
+                        const percentualRecebido =
+                          totalParcelas > 0 ? (parcelasRecebidas / totalParcelas) * 100 : 0;
+
+                        return (
+                          <React.Fragment key={venda.id}>
+                            <tr>
+                              <td>{venda.numero_proposta}</td>
+                              <td>{venda.cliente.nome}</td>
+                              <td>{formatCurrency(venda.valor_plano)}</td>
+                              <td>{format(parseISO(venda.data_venda), 'dd/MM/yyyy')}</td>
+                              <td>
+                                <div className="d-flex align-items-center">
+                                  <span className="mr-2">
+                                    {parcelasRecebidas}/{totalParcelas}
+                                  </span>
+                                  <div style={{ flex: 1 }}>
+                                    <Progress
+                                      value={percentualRecebido}
+                                      color={getProgressColor(percentualRecebido)}
+                                      barClassName="bg-gradient"
+                                    />
+                                  </div>
+                                </div>
+                              </td>
+                              <td>
+                                <Button
+                                  color="info"
+                                  size="sm"
+                                  onClick={() => toggleCollapse(venda.id)}
+                                >
+                                  <FontAwesomeIcon
+                                    icon={openVendaIds.includes(venda.id) ? faEyeSlash : faEye}
+                                    className="mr-1"
+                                  />
+                                  {openVendaIds.includes(venda.id) ? 'Ocultar' : 'Detalhes'}
+                                </Button>
+                              </td>
+                            </tr>
+                            <tr>
+                              <td colSpan="6" style={{ padding: 0 }}>
+                                <Collapse isOpen={openVendaIds.includes(venda.id)}>
+                                  <CardBody>
+                                    <Table size="sm" responsive>
+                                      <thead>
+                                        <tr>
+                                          <th>Número da Parcela</th>
+                                          <th>Valor da Parcela</th>
+                                          <th>Data Prevista de Recebimento</th>
+                                          <th>Dias de Atraso</th>
+                                          <th>Data Real de Recebimento</th>
+                                          <th>Número do Extrato</th>
+                                          <th>Status</th>
+                                          <th>Ações</th>
+                                        </tr>
+                                      </thead>
+                                      <tbody>
+                                        {venda.parcelas_recebimento.map((recebimento) => (
+                                          <tr key={recebimento.id}>
+                                            <td>{recebimento.parcela.numero_parcela}</td>
+                                            <td>{formatCurrency(recebimento.valor_parcela)}</td>
+                                            <td>
+                                              {format(
+                                                parseISO(recebimento.data_prevista_recebimento),
+                                                'dd/MM/yyyy'
+                                              )}
+                                            </td>
+                                            <td>
+                                              {calcularDiasAtraso(
+                                                recebimento.data_prevista_recebimento,
+                                                recebimento.data_recebimento
+                                              ) > 0
+                                                ? `${calcularDiasAtraso(
                                                     recebimento.data_prevista_recebimento,
                                                     recebimento.data_recebimento
-                                                  ) > 0
-                                                    ? `${calcularDiasAtraso(
-                                                        recebimento.data_prevista_recebimento,
-                                                        recebimento.data_recebimento
-                                                      )} dias`
-                                                    : '-'}
-                                                </td>
-                                                <td>
-                                                  <Input
-                                                    type="date"
-                                                    value={
-                                                      editingRecebimentos[recebimento.id]?.data_recebimento ||
-                                                      recebimento.data_recebimento ||
-                                                      ''
-                                                    }
-                                                    onChange={(e) =>
-                                                      handleInputChange(
-                                                        recebimento.id,
-                                                        'data_recebimento',
-                                                        e.target.value
-                                                      )
-                                                    }
-                                                  />
-                                                </td>
-                                                <td>
-                                                  <Input
-                                                    type="text"
-                                                    value={
-                                                      editingRecebimentos[recebimento.id]?.numero_extrato ||
-                                                      recebimento.numero_extrato ||
-                                                      ''
-                                                    }
-                                                    onChange={(e) =>
-                                                      handleInputChange(
-                                                        recebimento.id,
-                                                        'numero_extrato',
-                                                        e.target.value
-                                                      )
-                                                    }
-                                                  />
-                                                </td>
-                                                <td>{recebimento.status}</td>
-                                                <td>
-                                                  {recebimento.status.toLowerCase() !== 'recebido' && (
-                                                    <Button
-                                                      color="success"
-                                                      size="sm"
-                                                      onClick={() => handleMarcarRecebida(recebimento.id)}
-                                                    >
-                                                      <FontAwesomeIcon icon={faSyncAlt} className="mr-1" />
-                                                      Recebida
-                                                    </Button>
-                                                  )}
-                                                </td>
-                                              </tr>
-                                            ))}
-                                          </tbody>
-                                        </Table>
-                                      </CardBody>
-                                    </Collapse>
-                                  </td>
-                                </tr>
-                              </React.Fragment>
-                            );
-                          })}
-                        </tbody>
-                      </Table>
-                    )}
-                  </CardBody>
-                </Card>
-              </Col>
-            </Row>
-          </>
-        )}
+                                                  )} dias`
+                                                : '-'}
+                                            </td>
+                                            <td>
+                                              <Input
+                                                type="date"
+                                                value={
+                                                  editingRecebimentos[recebimento.id]?.data_recebimento ||
+                                                  recebimento.data_recebimento ||
+                                                  ''
+                                                }
+                                                onChange={(e) =>
+                                                  handleInputChange(
+                                                    recebimento.id,
+                                                    'data_recebimento',
+                                                    e.target.value
+                                                  )
+                                                }
+                                              />
+                                            </td>
+                                            <td>
+                                              <Input
+                                                type="text"
+                                                value={
+                                                  editingRecebimentos[recebimento.id]?.numero_extrato ||
+                                                  recebimento.numero_extrato ||
+                                                  ''
+                                                }
+                                                onChange={(e) =>
+                                                  handleInputChange(
+                                                    recebimento.id,
+                                                    'numero_extrato',
+                                                    e.target.value
+                                                  )
+                                                }
+                                              />
+                                            </td>
+                                            <td>{recebimento.status}</td>
+                                            <td>
+                                              {recebimento.status.toLowerCase() !== 'recebido' && (
+                                                <Button
+                                                  color="success"
+                                                  size="sm"
+                                                  onClick={() => handleMarcarRecebida(recebimento.id)}
+                                                >
+                                                  <FontAwesomeIcon icon={faSyncAlt} className="mr-1" />
+                                                  Recebida
+                                                </Button>
+                                              )}
+                                            </td>
+                                          </tr>
+                                        ))}
+                                      </tbody>
+                                    </Table>
+                                  </CardBody>
+                                </Collapse>
+                              </td>
+                            </tr>
+                          </React.Fragment>
+                        );
+                      })}
+                    </tbody>
+                  </Table>
+                )}
+                <div className="text-center">
+                  {carregando && <Spinner color="primary" size="sm" className="mr-2" />}
+                  {proxima && (
+                    <Button color="primary" size="sm" onClick={carregarMais} disabled={carregando}>
+                      Carregar mais
+                    </Button>
+                  )}
+                </div>
+              </CardBody>
+            </Card>
+          </Col>
+        </Row>
       </Container>
     </>
   );
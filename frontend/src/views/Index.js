@@ -28,7 +28,7 @@ import {
 } from "variables/charts.js";
 import Header from "components/Headers/Header.js";
 import api from "../api";
-import { parseISO } from "date-fns";
+import { addDays, format, parseISO } from "date-fns";
 import debounce from "lodash.debounce";
 
 const Index = (props) => {
@@ -42,35 +42,32 @@ const Index = (props) => {
   const [pieChartData, setPieChartData] = useState({});
   const [doughnutChartData, setDoughnutChartData] = useState({});
 
-  // Estado para armazenar as vendas
-  const [vendas, setVendas] = useState([]);
-
   // Estados para busca (opcional, já que não há seções de busca nas tabelas)
   const [searchTerm, setSearchTerm] = useState("");
   const [debouncedSearchTerm, setDebouncedSearchTerm] = useState("");
 
+  // Quantidade de vendas agregada no servidor (api/relatorios/vendas/), sem baixar as vendas
+  const relatorioVendas = async (params) => {
+    const response = await api.get("api/relatorios/vendas/", { params });
+    return response.data.resultados;
+  };
+
   // Função para buscar dados do dashboard
   const fetchDashboardData = async () => {
     try {
       const [
-        vendasRes,
-        consultoresRes,
-        planosRes,
-        recebimentosRes,
+        vendasPorMesRes,
+        vendasPorConsultorRes,
+        vendasPorPlanoRes,
+        resumoRes,
       ] = await Promise.all([
-        api.get("api/venda/"),
-        api.get("api/consultor/"),
-        api.get("api/plano/"),
-        api.get("api/controlederecebimento/"),
+        relatorioVendas({ agrupar: "mes" }),
+        relatorioVendas({ agrupar: "consultor" }),
+        relatorioVendas({ agrupar: "operadora,tipo" }),
+        api.get("api/dashboard/comissoes/"),
       ]);
 
-      const vendasData = vendasRes.data;
-      const consultores = consultoresRes.data;
-      const planos = planosRes.data;
-      const recebimentos = recebimentosRes.data;
-
-      // Atualizar o estado de vendas
-      setVendas(vendasData);
+      const totais = resumoRes.data.totais;
 
       // Processar dados para o Gráfico de Linha (Total de Vendas ao Longo do Tempo)
       const meses = [
@@ -88,48 +85,37 @@ const Index = (props) => {
         "Dezembro",
       ];
 
-      const vendasPorMes = meses.map((mes, index) => {
-        const total = vendasData.filter(
-          (venda) => parseISO(venda.data_venda).getMonth() === index
-        ).length;
-        return total;
-      });
+      const vendasPorMes = meses.map((mes, index) =>
+        vendasPorMesRes
+          .filter((linha) => parseISO(linha.mes).getMonth() === index)
+          .reduce((total, linha) => total + linha.vendas, 0)
+      );
 
       setLineChartData(getLineChartData(meses, vendasPorMes));
 
       // Processar dados para o Gráfico de Barras (Vendas por Consultor)
-      const vendasPorConsultor = consultores.map((consultor) => {
-        const total = vendasData.filter(
-          (venda) => venda.consultor.id === consultor.id
-        ).length;
-        return total;
-      });
-
       setBarChartData(
-        getBarChartData(consultores.map((c) => c.nome), vendasPorConsultor)
+        getBarChartData(
+          vendasPorConsultorRes.map((linha) => linha.consultor_nome),
+          vendasPorConsultorRes.map((linha) => linha.vendas)
+        )
       );
 
       // Processar dados para o Gráfico de Pizza (Vendas por Plano)
-      const vendasPorPlano = planos.map((plano) => {
-        const total = vendasData.filter(
-          (venda) => venda.plano.id === plano.id
-        ).length;
-        return total;
-      });
-
       setPieChartData(
         getPieChartData(
-          planos.map((p) => `${p.operadora} - ${p.tipo}`),
-          vendasPorPlano
+          vendasPorPlanoRes.map((linha) => `${linha.operadora} - ${linha.tipo}`),
+          vendasPorPlanoRes.map((linha) => linha.vendas)
         )
       );
 
-      // Processar dados para o Gráfico de Donut (Recebimentos por Status)
-      const statusCounts = recebimentos.reduce((acc, recebimento) => {
-        const status = recebimento.status;
-        acc[status] = (acc[status] || 0) + 1;
-        return acc;
-      }, {});
+      // Processar dados para o Gráfico de Donut (Recebimentos por Status), a partir do resumo mensal
+      const statusCounts = {
+        Recebido: totais.parcelas_recebidas,
+        Atrasado: totais.parcelas_atrasadas,
+        "Não Recebido":
+          totais.parcelas - totais.parcelas_recebidas - totais.parcelas_atrasadas,
+      };
 
       setDoughnutChartData(
         getDoughnutChartData(Object.keys(statusCounts), Object.values(statusCounts))
@@ -172,32 +158,35 @@ const Index = (props) => {
   }, [debouncedSearch]);
 
   // Função para alternar entre mês e semana no gráfico de linha
-  const toggleNavs = (e, index) => {
+  const toggleNavs = async (e, index) => {
     e.preventDefault();
     setActiveNav(index);
     if (index === 1) {
       // Configurar dados para mês
       fetchDashboardData(); // Recarregar os dados
     } else if (index === 2) {
-      // Configurar dados para semana
-      // Implementar lógica para agregação semanal
+      // Configurar dados para semana: um total por semana, contado no servidor
       const semanas = ["Semana 1", "Semana 2", "Semana 3", "Semana 4"];
-      // Agregar vendas por semana (simplificação)
-      const vendasPorSemana = semanas.map((semana, indexSem) => {
-        const now = new Date();
-        const start = new Date(now);
-        start.setDate(now.getDate() - now.getDay() - 7 * (3 - indexSem));
-        start.setHours(0, 0, 0, 0);
-        const end = new Date(start);
-        end.setDate(start.getDate() + 7);
-        const total = vendas.filter((venda) => {
-          const data = parseISO(venda.data_venda);
-          return data >= start && data < end;
-        }).length;
-        return total;
-      });
+      try {
+        const vendasPorSemana = await Promise.all(
+          semanas.map(async (semana, indexSem) => {
+            const now = new Date();
+            const start = new Date(now);
+            start.setDate(now.getDate() - now.getDay() - 7 * (3 - indexSem));
+            const resultados = await relatorioVendas({
+              data_venda_inicio: format(start, "yyyy-MM-dd"),
+              data_venda_fim: format(addDays(start, 6), "yyyy-MM-dd"),
+            });
+            return resultados.length > 0 ? resultados[0].vendas : 0;
+          })
+        );
 
-      setLineChartData(getLineChartData(semanas, vendasPorSemana));
+        setLineChartData(getLineChartData(semanas, vendasPorSemana));
+        setError(null);
+      } catch (err) {
+        console.error("Erro ao buscar vendas por semana:", err);
+        setError("Erro ao carregar vendas por semana. Tente novamente mais tarde.");
+      }
     }
   };
 
@@ -1,7 +1,8 @@
 // src/views/PlanosList.js
 
 import React, { useState, useEffect } from 'react';
-import api from '../api';  
+import api, { listarTodos } from '../api';  
+import useListaPaginada from '../useListaPaginada';
 import { 
   Table, 
   Container, 
@@ -20,7 +21,16 @@ import {
 import Header from 'components/Headers/Header';
 
 const PlanosList = () => {
-  const [planos, setPlanos] = useState([]);
+  // Filtros aplicados no servidor; as páginas seguintes vêm pelo cursor
+  const [filtros, setFiltros] = useState({ busca: '', tipo: '' });
+  const {
+    itens: planos,
+    setItens: setPlanos,
+    proxima,
+    carregarMais,
+    carregando,
+    erro,
+  } = useListaPaginada('api/plano/', filtros);
   const [selectedPlano, setSelectedPlano] = useState(null);
   const [comissoes, setComissoes] = useState({});
   
@@ -33,19 +43,26 @@ const PlanosList = () => {
     taxa_plano_tipo: ''
   });
 
-  const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
+  // Planos cujas parcelas já foram carregadas
+  const [planosComParcelas, setPlanosComParcelas] = useState(new Set());
 
   useEffect(() => {
-    // Função para carregar planos e comissões
-    const fetchData = async () => {
-      try {
-        const [planoResponse, parcelaResponse] = await Promise.all([
-          api.get('api/plano/'),
-          api.get('api/parcela/')
-        ]);
+    if (erro) {
+      setError('Erro ao buscar planos. Tente novamente mais tarde.');
+    }
+  }, [erro]);
+
+  useEffect(() => {
+    // Carrega as comissões apenas dos planos das páginas já exibidas
+    const pendentes = planos.map(plano => plano.id).filter(id => !planosComParcelas.has(id));
+    if (pendentes.length === 0) return;
 
-        setPlanos(planoResponse.data);
+    const fetchParcelas = async () => {
+      try {
+        const parcelaResponse = await listarTodos('api/parcela/', {
+          params: { plano: pendentes.join(','), page_size: 500 }
+        });
 
         const comissoesMap = {};
         parcelaResponse.data.forEach((parcela) => {
@@ -54,18 +71,17 @@ const PlanosList = () => {
             porcentagem_parcela: parcela.porcentagem_parcela
           };
         });
-        setComissoes(comissoesMap);
+        setComissoes(prevComissoes => ({ ...comissoesMap, ...prevComissoes }));
+        setPlanosComParcelas(prev => new Set([...prev, ...pendentes]));
         setError(null);
       } catch (err) {
-        console.error('Erro ao buscar dados:', err);
-        setError('Erro ao buscar dados. Tente novamente mais tarde.');
-      } finally {
-        setLoading(false);
+        console.error('Erro ao buscar parcelas:', err);
+        setError('Erro ao buscar comissões. Tente novamente mais tarde.');
       }
     };
 
-    fetchData();
-  }, []);
+    fetchParcelas();
+  }, [planos, planosComParcelas]);
 
   const handleSaveComissao = async (planoId, numero_parcela) => {
     const key = `${planoId}-${numero_parcela}`;
@@ -176,7 +192,8 @@ const PlanosList = () => {
         setSelectedPlano(null);
       } else {
         const response = await api.post('api/plano/', planoData);
-        setPlanos([...planos, response.data]);
+        // A listagem vem dos mais recentes para os mais antigos
+        setPlanos([response.data, ...planos]);
         setNewPlano({
           operadora: '',
           tipo: '',
@@ -193,20 +210,6 @@ const PlanosList = () => {
     }
   };
 
-  if (loading) {
-    return (
-      <>
-        <Header />
-        <Container className="mt--7" fluid>
-          <Row className="justify-content-center">
-            <Spinner color="primary" />
-            <p className="text-center mt-3">Carregando planos...</p>
-          </Row>
-        </Container>
-      </>
-    );
-  }
-
   return (
     <>
       <Header />
@@ -348,8 +351,27 @@ const PlanosList = () => {
         <Row>
           <Col>
             <Card className="bg-default shadow">
-              <CardHeader className="bg-transparent border-0">
+              <CardHeader className="bg-transparent border-0 d-flex justify-content-between align-items-center">
                 <h3 className="text-white mb-0">Lista de Planos</h3>
+                <div className="d-flex">
+                  <Input
+                    type="text"
+                    value={filtros.busca}
+                    onChange={(e) => setFiltros({ ...filtros, busca: e.target.value })}
+                    placeholder="Buscar por operadora"
+                    className="mr-2"
+                  />
+                  <Input
+                    type="select"
+                    value={filtros.tipo}
+                    onChange={(e) => setFiltros({ ...filtros, tipo: e.target.value })}
+                  >
+                    <option value="">Todos os tipos</option>
+                    <option value="PME">PME</option>
+                    <option value="PF">Pessoa Física</option>
+                    <option value="Adesão">Adesão</option>
+                  </Input>
+                </div>
               </CardHeader>
               <Table className="align-items-center table-dark table-flush" responsive hover>
                 <thead className="thead-dark">
@@ -360,7 +382,7 @@ const PlanosList = () => {
                     <th>Total (%)</th>
                     <th>Taxa</th>
                     {/* Cabeçalhos das parcelas */}
-                    {Array.from({ length: Math.max(...planos.map(plano => plano.numero_parcelas)) }, (_, i) => (
+                    {Array.from({ length: Math.max(0, ...planos.map(plano => plano.numero_parcelas)) }, (_, i) => (
                       <th key={i}>Parcela {i + 1} (%)</th>
                     ))}
                   </tr>
@@ -397,6 +419,14 @@ const PlanosList = () => {
                   ))}
                 </tbody>
               </Table>
+              <div className="p-3 text-center">
+                {carregando && <Spinner color="primary" size="sm" className="mr-2" />}
+                {proxima && (
+                  <Button color="primary" size="sm" onClick={carregarMais} disabled={carregando}>
+                    Carregar mais
+                  </Button>
+                )}
+              </div>
             </Card>
           </Col>
         </Row>
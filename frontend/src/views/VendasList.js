@@ -1,7 +1,8 @@
 // src/views/VendasList.js
 
 import React, { useState, useEffect } from 'react';
-import api from '../api';
+import api, { listarTodos } from '../api';
+import useListaPaginada from '../useListaPaginada';
 import {
   Table,
   Container,
@@ -20,7 +21,16 @@ import {
 import Header from 'components/Headers/Header';
 
 const VendasList = () => {
-  const [vendas, setVendas] = useState([]);
+  // Busca por proposta ou cliente aplicada no servidor; as páginas seguintes vêm pelo cursor
+  const [busca, setBusca] = useState('');
+  const {
+    itens: vendas,
+    setItens: setVendas,
+    proxima,
+    carregarMais,
+    carregando,
+    erro,
+  } = useListaPaginada('api/venda/', { busca });
   const [selectedVenda, setSelectedVenda] = useState(null);
   const [newVenda, setNewVenda] = useState({
     cliente_id: '',
@@ -33,7 +43,9 @@ const VendasList = () => {
     data_vigencia: '',
     data_vencimento: '',
   });
-  const [clientes, setClientes] = useState([]);
+  // Clientes do select buscados pelo nome, uma página curta por vez
+  const [buscaCliente, setBuscaCliente] = useState('');
+  const { itens: clientesEncontrados } = useListaPaginada('api/clientes/', { nome: buscaCliente }, 20);
   const [planos, setPlanos] = useState([]);
   const [consultores, setConsultores] = useState([]);
 
@@ -41,20 +53,16 @@ const VendasList = () => {
   const [error, setError] = useState(null);
 
   useEffect(() => {
-    // Função para buscar todos os dados necessários
+    // Planos e consultores são listas curtas de apoio para os selects
     const fetchData = async () => {
       try {
-        const [clientesResponse, planosResponse, consultoresResponse, vendasResponse] = await Promise.all([
-          api.get('api/clientes/'),
-          api.get('api/plano/'),
-          api.get('api/consultor/'),
-          api.get('api/venda/')
+        const [planosResponse, consultoresResponse] = await Promise.all([
+          listarTodos('api/plano/'),
+          listarTodos('api/consultor/')
         ]);
 
-        setClientes(clientesResponse.data);
         setPlanos(planosResponse.data);
         setConsultores(consultoresResponse.data);
-        setVendas(vendasResponse.data);
         setError(null);
       } catch (err) {
         console.error('Erro ao buscar dados:', err);
@@ -67,6 +75,17 @@ const VendasList = () => {
     fetchData();
   }, []);
 
+  useEffect(() => {
+    if (erro) {
+      setError('Erro ao buscar vendas. Tente novamente mais tarde.');
+    }
+  }, [erro]);
+
+  // A venda em edição mantém o cliente dela entre as opções, mesmo fora da busca
+  const clientes = selectedVenda?.cliente && !clientesEncontrados.some(cliente => cliente.id === selectedVenda.cliente.id)
+    ? [selectedVenda.cliente, ...clientesEncontrados]
+    : clientesEncontrados;
+
   // Função para cadastrar ou modificar a venda
   const handleSaveVenda = async (e) => {
     e.preventDefault();
@@ -81,7 +100,8 @@ const VendasList = () => {
       } else {
         // Adicionar nova venda
         const response = await api.post('api/venda/', vendaData);
-        setVendas([...vendas, response.data]);
+        // A listagem vem das mais recentes para as mais antigas
+        setVendas([response.data, ...vendas]);
         setNewVenda({
           cliente_id: '',
           plano_id: '',
@@ -196,8 +216,15 @@ const VendasList = () => {
           {/* Coluna da lista de vendas */}
           <Col xl="8">
             <Card className="bg-default shadow">
-              <CardHeader className="bg-transparent border-0">
+              <CardHeader className="bg-transparent border-0 d-flex justify-content-between align-items-center">
                 <h3 className="text-white mb-0">Lista de Vendas</h3>
+                <Input
+                  type="text"
+                  value={busca}
+                  onChange={(e) => setBusca(e.target.value)}
+                  placeholder="Buscar por proposta ou cliente"
+                  style={{ maxWidth: '300px' }}
+                />
               </CardHeader>
               <Table className="align-items-center table-dark table-flush" responsive hover>
                 <thead className="thead-dark">
@@ -244,14 +271,24 @@ const VendasList = () => {
                       </tr>
                     ))
                   ) : (
-                    <tr>
-                      <td colSpan="11" className="text-center">
-                        Nenhuma venda encontrada.
-                      </td>
-                    </tr>
+                    !carregando && (
+                      <tr>
+                        <td colSpan="11" className="text-center">
+                          Nenhuma venda encontrada.
+                        </td>
+                      </tr>
+                    )
                   )}
                 </tbody>
               </Table>
+              <div className="p-3 text-center">
+                {carregando && <Spinner color="primary" size="sm" className="mr-2" />}
+                {proxima && (
+                  <Button color="primary" size="sm" onClick={carregarMais} disabled={carregando}>
+                    Carregar mais
+                  </Button>
+                )}
+              </div>
             </Card>
           </Col>
 
@@ -272,6 +309,13 @@ const VendasList = () => {
                 {/* Formulário de entrada de dados */}
                 <FormGroup>
                   <Label for="cliente_id">Cliente</Label>
+                  <Input
+                    type="text"
+                    className="mb-2"
+                    value={buscaCliente}
+                    onChange={(e) => setBuscaCliente(e.target.value)}
+                    placeholder="Buscar cliente pelo nome"
+                  />
                   <Input
                     type="select"
                     name="cliente_id"